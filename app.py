@@ -0,0 +1,102 @@
+"""Сборка приложения: одна точка, где бот получает хендлеры и фоновые потоки.
+
+Модули с хендлерами ничего не регистрируют при импорте — каждый объявляет
+``register(bot)``, а :func:`create_app` вызывает их один раз в фиксированном
+порядке. Порядок важен: telebot отдаёт апдейт первому подходящему
+хендлеру, поэтому режимы медиа и веб-поиска идут раньше общих команд,
+а ``bot.fallback`` — последним.
+
+Запуск: ``python -m app`` или, как раньше, ``python bot.py``.
+"""
+from __future__ import annotations
+
+import importlib
+import threading
+
+import startup_profiler
+from settings import bot
+
+# Реестр модулей с ``register(bot)``, в порядке подключения
+HANDLER_MODULES = (
+    "media",
+    "handlers.web",
+    "auto_post",
+    "bot",
+)
+
+_app_lock = threading.Lock()
+_app = None
+
+
+def startup() -> None:
+    """Подготовить хранилища до приёма апдейтов (импорт модулей их не трогает)."""
+
+    from storage import get_backend, init_db, init_media_tables
+    from usage_tracker import init_usage_tracking
+
+    with startup_profiler.phase("init_db"):
+        init_db()
+    with startup_profiler.phase("init_media_tables"):
+        init_media_tables()
+    with startup_profiler.phase("open_backend"):
+        # второй экземпляр бота со встроенным движком падает здесь, а не на первом сообщении
+        get_backend()
+    with startup_profiler.phase("init_usage_tracking"):
+        init_usage_tracking()
+
+
+def register_handlers(telebot_instance) -> None:
+    for name in HANDLER_MODULES:
+        importlib.import_module(name).register(telebot_instance)
+
+
+def create_app(*, start_background: bool = True):
+    """Собрать бота один раз на процесс и вернуть его; повторные вызовы ничего не делают."""
+
+    global _app
+    with _app_lock:
+        if _app is not None:
+            return _app
+
+        chat = importlib.import_module("bot")
+        chat.configure_logging()
+        startup()
+        with startup_profiler.phase("register_handlers"):
+            register_handlers(bot)
+        if start_background:
+            from storage import start_health_check
+
+            with startup_profiler.phase("background_threads"):
+                start_health_check()
+                threading.Thread(target=chat.background_checker, name="background-checker", daemon=True).start()
+        _app = bot
+        return _app
+
+
+def main() -> None:
+    from worker_media import start_media_worker
+
+    app = create_app()
+    with startup_profiler.phase("start_media_worker"):
+        start_media_worker()
+    if startup_profiler.ENABLED:
+        print(startup_profiler.phase_report())
+
+    log_exception = importlib.import_module("bot").log_exception
+    while True:
+        try:
+            app.polling(
+                none_stop=True,
+                timeout=60,
+                long_polling_timeout=60,
+                skip_pending=True,
+            )
+        except Exception as exc:  # noqa: BLE001 - хотим логировать любые сбои
+            log_exception(exc)
+
+
+__all__ = ["HANDLER_MODULES", "create_app", "main", "register_handlers", "startup"]
+
+
+if __name__ == "__main__":
+    main()
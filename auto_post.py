@@ -14,7 +14,6 @@ from io import BytesIO
 from pathlib import Path
 from typing import Optional, Tuple
 
-from PIL import Image, UnidentifiedImageError
 from telebot import types
 
 from internet import ask_gpt_web  # используем ваш рабочий веб-поиск
@@ -228,6 +227,9 @@ def _generate_news_payload() -> Tuple[str, str, str]:
 
 
 def _normalize_image(image_bytes: bytes) -> Optional[bytes]:
+    # Pillow нужен только при публикации поста с картинкой
+    from PIL import Image, UnidentifiedImageError
+
     try:
         with Image.open(BytesIO(image_bytes)) as img:
             if img.mode not in {"RGB", "L"}:
@@ -319,17 +321,14 @@ def _handle_post_request(message, mode: str) -> None:
             bot.delete_message(status_msg.chat.id, status_msg.message_id)
 
 
-@bot.message_handler(commands=["post_short"])
 def create_short_post(message):
     _handle_post_request(message, "short")
 
 
-@bot.message_handler(commands=["post_long"])
 def create_long_post(message):
     _handle_post_request(message, "long")
 
 
-@bot.message_handler(commands=["post_news"])
 def cmd_post_news(message):
     user_id = getattr(message.from_user, "id", None)
     if user_id != OWNER_ID:
@@ -350,7 +349,15 @@ def cmd_post_news(message):
     _publish_post(message, caption, image_bytes)
 
 
+def register(bot) -> None:
+    """Подключить команды автопостинга."""
+    bot.register_message_handler(create_short_post, commands=["post_short"])
+    bot.register_message_handler(create_long_post, commands=["post_long"])
+    bot.register_message_handler(cmd_post_news, commands=["post_news"])
+
+
 __all__ = [
+    "register",
     "create_short_post",
     "create_long_post",
     "cmd_post_news",
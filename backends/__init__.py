@@ -0,0 +1,52 @@
+"""Подключаемые движки хранения истории, настроек пользователей и счётчиков.
+
+Выбор движка — настройка ``STORAGE_BACKEND``: ``redis`` (по умолчанию,
+с локальным резервом ``SafeRedis``), ``sqlite`` (WAL-база рядом с ботом)
+или ``embedded`` (журнальный файл с чтением через mmap, без сервера).
+"""
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from backends.base import StorageBackend
+from backends.embedded import EmbeddedBackend, MmapKV
+from backends.redis_backend import RedisBackend
+from backends.sqlite_backend import SQLiteBackend
+
+BACKENDS = ("redis", "sqlite", "embedded")
+
+
+def create_backend(
+    name: str,
+    *,
+    redis_client: Any = None,
+    database: Any = None,
+    path: Optional[str] = None,
+) -> StorageBackend:
+    """Создать движок по имени из настроек."""
+
+    name = (name or "redis").strip().lower()
+    if name == "redis":
+        if redis_client is None:
+            raise ValueError("redis backend requires a client")
+        return RedisBackend(redis_client)
+    if name == "sqlite":
+        if database is None:
+            raise ValueError("sqlite backend requires a Database")
+        return SQLiteBackend(database)
+    if name == "embedded":
+        if not path:
+            raise ValueError("embedded backend requires a file path")
+        return EmbeddedBackend(path)
+    raise ValueError(f"unknown storage backend {name!r}; expected one of {', '.join(BACKENDS)}")
+
+
+__all__ = [
+    "BACKENDS",
+    "EmbeddedBackend",
+    "MmapKV",
+    "RedisBackend",
+    "SQLiteBackend",
+    "StorageBackend",
+    "create_backend",
+]
@@ -0,0 +1,48 @@
+"""Общий интерфейс хранилищ: история диалогов, ключ-значение и счётчики."""
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Protocol, runtime_checkable
+
+
+@runtime_checkable
+class StorageBackend(Protocol):
+    """Минимальный набор операций, который storage.py ожидает от движка.
+
+    Значения — строки (история хранится сериализованным JSON), ``ttl`` —
+    секунды; ``None`` означает «без срока жизни».
+    """
+
+    name: str
+
+    # --- история ---
+
+    def save_history(self, chat_id: int, payload: str, ttl: Optional[int] = None) -> None: ...
+
+    def load_history(self, chat_id: int) -> Optional[str]: ...
+
+    def delete_history(self, chat_id: int) -> None: ...
+
+    def history_chat_ids(self) -> List[int]: ...
+
+    def stale_history_chat_ids(self, before: float) -> List[int]:
+        """Чаты, история которых последний раз сохранялась раньше ``before`` (unix time)."""
+        ...
+
+    # --- ключ-значение ---
+
+    def get(self, key: str) -> Optional[str]: ...
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    # --- счётчики ---
+
+    def incr(self, key: str, field: str, amount: int = 1) -> int: ...
+
+    def counters(self, key: str) -> Dict[str, int]: ...
+
+    def close(self) -> None: ...
+
+
+__all__ = ["StorageBackend"]
@@ -0,0 +1,310 @@
+"""Встроенное хранилище «ключ-значение» без внешнего сервера.
+
+Файл — журнал записей только на добавление, индекс ``ключ → смещение``
+держится в памяти и восстанавливается сканированием при открытии, чтение
+идёт напрямую из ``mmap`` без системных вызовов. Когда мёртвые записи
+(перезаписанные, удалённые, истёкшие) занимают больше половины файла,
+живые данные переписываются в новый файл и атомарно подменяют старый.
+
+Файл открывает один процесс (эксклюзивная ``flock``-блокировка); внутри
+процесса доступ потокобезопасен.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_PUT = 1
+_DELETE = 2
+# op, длина ключа, длина значения, момент истечения (0 — без срока), crc32
+_HEADER = struct.Struct("<BIIdI")
+
+
+class MmapKV:
+    """Журнальный KV-движок с индексом в памяти и чтением через ``mmap``."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        sync: bool = False,
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 1 << 20,
+    ) -> None:
+        self.path = path
+        self.sync = sync
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.RLock()
+        # ключ -> (смещение значения, длина значения, expires_at, размер записи)
+        self._index: Dict[str, Tuple[int, int, float, int]] = {}
+        self._dead_bytes = 0
+        self._size = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._fd = self._open(path)
+        self._load()
+
+    # --- файл ---
+
+    @staticmethod
+    def _open(path: str) -> int:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if fcntl is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                raise RuntimeError(f"{path} уже открыт другим процессом") from None
+        return fd
+
+    def _remap(self) -> None:
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._size:
+            self._mm = mmap.mmap(self._fd, self._size, access=mmap.ACCESS_READ)
+
+    def _view(self, end: int) -> mmap.mmap:
+        # Файл растёт дописыванием: переотображаем, только если чтение вышло за границу
+        if self._mm is None or len(self._mm) < end:
+            self._remap()
+        return self._mm  # type: ignore[return-value]
+
+    def _load(self) -> None:
+        self._size = os.fstat(self._fd).st_size
+        self._remap()
+        offset = 0
+        mm = self._mm
+        while mm is not None and offset + _HEADER.size <= self._size:
+            op, key_len, value_len, expires_at, crc = _HEADER.unpack_from(mm, offset)
+            end = offset + _HEADER.size + key_len + value_len
+            if op not in (_PUT, _DELETE) or end > self._size:
+                break
+            body = mm[offset + _HEADER.size:end]
+            if zlib.crc32(body, zlib.crc32(_HEADER.pack(op, key_len, value_len, expires_at, 0))) != crc:
+                break
+            key = body[:key_len].decode("utf-8")
+            self._forget(key)
+            if op == _PUT:
+                self._index[key] = (offset + _HEADER.size + key_len, value_len, expires_at, end - offset)
+            else:
+                self._dead_bytes += end - offset
+            offset = end
+        if offset < self._size:
+            # Хвост недописанной записи после аварийного завершения
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            os.ftruncate(self._fd, offset)
+            self._size = offset
+            self._remap()
+
+    def _forget(self, key: str) -> None:
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._dead_bytes += previous[3]
+
+    def _append(self, op: int, key: str, value: bytes, expires_at: float) -> Tuple[int, int]:
+        key_bytes = key.encode("utf-8")
+        body = key_bytes + value
+        crc = zlib.crc32(body, zlib.crc32(_HEADER.pack(op, len(key_bytes), len(value), expires_at, 0)))
+        record = _HEADER.pack(op, len(key_bytes), len(value), expires_at, crc) + body
+        os.pwrite(self._fd, record, self._size)
+        if self.sync:
+            os.fsync(self._fd)
+        start = self._size
+        self._size += len(record)
+        return start + _HEADER.size + len(key_bytes), len(record)
+
+    # --- операции ---
+
+    def _live(self, key: str) -> Optional[Tuple[int, int, float, int]]:
+        entry = self._index.get(key)
+        if entry is None:
+            return None
+        if entry[2] and entry[2] <= time.time():
+            self._forget(key)
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            offset, length = entry[0], entry[1]
+            return self._view(offset + length)[offset:offset + length]
+
+    def put(self, key: str, value: bytes, *, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl else 0.0
+        with self._lock:
+            self._forget(key)
+            offset, size = self._append(_PUT, key, value, expires_at)
+            self._index[key] = (offset, len(value), expires_at, size)
+            self._maybe_compact()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._forget(key)
+            _, size = self._append(_DELETE, key, b"", 0.0)
+            self._dead_bytes += size
+            self._maybe_compact()
+            return True
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            current = self.get(key)
+            value = (int(current) if current else 0) + amount
+            self.put(key, str(value).encode("ascii"))
+            return value
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            return [key for key in list(self._index) if key.startswith(prefix) and self._live(key) is not None]
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, bytes]]:
+        for key in self.keys(prefix):
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._index), "file_bytes": self._size, "dead_bytes": self._dead_bytes}
+
+    # --- обслуживание ---
+
+    def _maybe_compact(self) -> None:
+        if self._dead_bytes >= self.compact_min_bytes and self._dead_bytes > self._size * self.compact_ratio:
+            self.compact()
+
+    def compact(self) -> None:
+        """Переписать только живые записи в новый файл и подменить им журнал."""
+
+        with self._lock:
+            tmp_path = self.path + ".compact"
+            now = time.time()
+            fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            index: Dict[str, Tuple[int, int, float, int]] = {}
+            size = 0
+            try:
+                chunks = []
+                for key, (offset, length, expires_at, _) in self._index.items():
+                    if expires_at and expires_at <= now:
+                        continue
+                    key_bytes = key.encode("utf-8")
+                    value = self._view(offset + length)[offset:offset + length]
+                    header = _HEADER.pack(_PUT, len(key_bytes), length, expires_at, 0)
+                    crc = zlib.crc32(key_bytes + value, zlib.crc32(header))
+                    record = _HEADER.pack(_PUT, len(key_bytes), length, expires_at, crc) + key_bytes + value
+                    index[key] = (size + _HEADER.size + len(key_bytes), length, expires_at, len(record))
+                    chunks.append(record)
+                    size += len(record)
+                os.write(fd, b"".join(chunks))
+                os.fsync(fd)
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BaseException:
+                os.close(fd)
+                os.unlink(tmp_path)
+                raise
+            os.replace(tmp_path, self.path)
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            os.close(self._fd)
+            self._fd = fd
+            self._index = index
+            self._size = size
+            self._dead_bytes = 0
+            self._remap()
+
+    def flush(self) -> None:
+        with self._lock:
+            os.fsync(self._fd)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+                self._mm = None
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+class EmbeddedBackend:
+    """Реализация ``StorageBackend`` поверх :class:`MmapKV`."""
+
+    name = "embedded"
+
+    _HISTORY = "h:"
+    _UPDATED = "u:"
+    _KV = "k:"
+    _COUNTER = "c:"
+
+    def __init__(self, path: str, **options) -> None:
+        self.kv = MmapKV(path, **options)
+
+    def save_history(self, chat_id: int, payload: str, ttl: Optional[int] = None) -> None:
+        self.kv.put(f"{self._HISTORY}{chat_id}", payload.encode("utf-8"), ttl=ttl)
+        self.kv.put(f"{self._UPDATED}{chat_id}", repr(time.time()).encode("ascii"))
+
+    def load_history(self, chat_id: int) -> Optional[str]:
+        value = self.kv.get(f"{self._HISTORY}{chat_id}")
+        return value.decode("utf-8") if value is not None else None
+
+    def delete_history(self, chat_id: int) -> None:
+        self.kv.delete(f"{self._HISTORY}{chat_id}")
+        self.kv.delete(f"{self._UPDATED}{chat_id}")
+
+    def history_chat_ids(self) -> List[int]:
+        return [int(key[len(self._HISTORY):]) for key in self.kv.keys(self._HISTORY)]
+
+    def stale_history_chat_ids(self, before: float) -> List[int]:
+        return [
+            int(key[len(self._UPDATED):])
+            for key, value in self.kv.items(self._UPDATED)
+            if float(value) <= before
+        ]
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.kv.get(self._KV + key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self.kv.put(self._KV + key, value.encode("utf-8"), ttl=ttl)
+
+    def delete(self, key: str) -> None:
+        self.kv.delete(self._KV + key)
+
+    def incr(self, key: str, field: str, amount: int = 1) -> int:
+        return self.kv.incr(f"{self._COUNTER}{key}\x00{field}", amount)
+
+    def counters(self, key: str) -> Dict[str, int]:
+        prefix = f"{self._COUNTER}{key}\x00"
+        return {name[len(prefix):]: int(value) for name, value in self.kv.items(prefix)}
+
+    def close(self) -> None:
+        self.kv.close()
+
+
+__all__ = ["EmbeddedBackend", "MmapKV"]
@@ -0,0 +1,73 @@
+"""Хранилище поверх Redis-совместимого клиента (``SafeRedis`` или ``InMemoryRedis``)."""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, List, Optional
+
+_CHAT_SET_KEY = "chat:ids"
+_UPDATED_KEY = "chat:updated"
+_COUNTER_PREFIX = "counters:"
+
+
+def _chat_key(chat_id: int) -> str:
+    return f"chat:{chat_id}"
+
+
+class RedisBackend:
+    """История — строки с TTL, множество ``chat:ids`` и zset времени обновления, счётчики — хэши."""
+
+    name = "redis"
+
+    def __init__(self, client: Any) -> None:
+        self.client = client
+
+    def save_history(self, chat_id: int, payload: str, ttl: Optional[int] = None) -> None:
+        pipe = self.client.pipeline()
+        if ttl:
+            pipe.setex(_chat_key(chat_id), ttl, payload)
+        else:
+            pipe.set(_chat_key(chat_id), payload)
+        pipe.sadd(_CHAT_SET_KEY, chat_id)
+        pipe.zadd(_UPDATED_KEY, {str(chat_id): time.time()})
+        pipe.execute()
+
+    def load_history(self, chat_id: int) -> Optional[str]:
+        return self.client.get(_chat_key(chat_id))
+
+    def delete_history(self, chat_id: int) -> None:
+        pipe = self.client.pipeline()
+        pipe.delete(_chat_key(chat_id))
+        pipe.srem(_CHAT_SET_KEY, chat_id)
+        pipe.zrem(_UPDATED_KEY, str(chat_id))
+        pipe.execute()
+
+    def history_chat_ids(self) -> List[int]:
+        return [int(member) for member in self.client.smembers(_CHAT_SET_KEY)]
+
+    def stale_history_chat_ids(self, before: float) -> List[int]:
+        return [int(member) for member in self.client.zrangebyscore(_UPDATED_KEY, "-inf", before)]
+
+    def get(self, key: str) -> Optional[str]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        if ttl:
+            self.client.setex(key, ttl, value)
+        else:
+            self.client.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str, field: str, amount: int = 1) -> int:
+        return int(self.client.hincrby(_COUNTER_PREFIX + key, field, amount))
+
+    def counters(self, key: str) -> Dict[str, int]:
+        return {field: int(value) for field, value in (self.client.hgetall(_COUNTER_PREFIX + key) or {}).items()}
+
+    def close(self) -> None:
+        # Клиент общий для процесса, его закрывает владелец
+        pass
+
+
+__all__ = ["RedisBackend"]
@@ -0,0 +1,128 @@
+"""Хранилище в SQLite (WAL) через общий слой ``db``: не требует Redis."""
+from __future__ import annotations
+
+import time
+from typing import Dict, List, Optional
+
+from db import Database
+
+
+class SQLiteBackend:
+    """Таблицы ``kv_history``, ``kv_store`` и ``kv_counters``; истёкшие записи удаляются лениво."""
+
+    name = "sqlite"
+
+    def __init__(self, database: Database) -> None:
+        self.database = database
+        with database.transaction():
+            database.execute("""
+            CREATE TABLE IF NOT EXISTS kv_history (
+                chat_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                expires_at REAL,
+                updated_at REAL
+            )
+            """)
+            # Миграция: колонка updated_at появилась вместе с архивом историй
+            columns = [row[1] for row in database.query_all("PRAGMA table_info(kv_history)")]
+            if "updated_at" not in columns:
+                database.execute("ALTER TABLE kv_history ADD COLUMN updated_at REAL")
+            database.execute("""
+            CREATE TABLE IF NOT EXISTS kv_store (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL
+            )
+            """)
+            database.execute("""
+            CREATE TABLE IF NOT EXISTS kv_counters (
+                key TEXT,
+                field TEXT,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (key, field)
+            )
+            """)
+
+    @staticmethod
+    def _expires_at(ttl: Optional[int]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    def save_history(self, chat_id: int, payload: str, ttl: Optional[int] = None) -> None:
+        self.database.execute(
+            """INSERT INTO kv_history(chat_id, payload, expires_at, updated_at) VALUES(?,?,?,?)
+               ON CONFLICT(chat_id) DO UPDATE SET
+               payload=excluded.payload, expires_at=excluded.expires_at, updated_at=excluded.updated_at""",
+            (chat_id, payload, self._expires_at(ttl), time.time()),
+        )
+
+    def load_history(self, chat_id: int) -> Optional[str]:
+        row = self.database.query_one(
+            "SELECT payload FROM kv_history WHERE chat_id=? AND (expires_at IS NULL OR expires_at > ?)",
+            (chat_id, time.time()),
+        )
+        return row[0] if row else None
+
+    def delete_history(self, chat_id: int) -> None:
+        self.database.execute("DELETE FROM kv_history WHERE chat_id=?", (chat_id,))
+
+    def history_chat_ids(self) -> List[int]:
+        rows = self.database.query_all(
+            "SELECT chat_id FROM kv_history WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+        )
+        return [row[0] for row in rows]
+
+    def stale_history_chat_ids(self, before: float) -> List[int]:
+        rows = self.database.query_all(
+            "SELECT chat_id FROM kv_history WHERE updated_at IS NULL OR updated_at <= ?", (before,)
+        )
+        return [row[0] for row in rows]
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.database.query_one(
+            "SELECT value FROM kv_store WHERE key=? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        )
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None) -> None:
+        self.database.execute(
+            """INSERT INTO kv_store(key, value, expires_at) VALUES(?,?,?)
+               ON CONFLICT(key) DO UPDATE SET value=excluded.value, expires_at=excluded.expires_at""",
+            (key, value, self._expires_at(ttl)),
+        )
+
+    def delete(self, key: str) -> None:
+        self.database.execute("DELETE FROM kv_store WHERE key=?", (key,))
+
+    def incr(self, key: str, field: str, amount: int = 1) -> int:
+        row = self.database.query_one(
+            """INSERT INTO kv_counters(key, field, value) VALUES(?,?,?)
+               ON CONFLICT(key, field) DO UPDATE SET value = value + excluded.value
+               RETURNING value""",
+            (key, field, amount),
+        )
+        return int(row[0])
+
+    def counters(self, key: str) -> Dict[str, int]:
+        rows = self.database.query_all("SELECT field, value FROM kv_counters WHERE key=?", (key,))
+        return {field: int(value) for field, value in rows}
+
+    def purge_expired(self) -> int:
+        """Удалить истёкшие записи; возвращает их количество."""
+
+        now = time.time()
+        with self.database.transaction():
+            removed = self.database.execute(
+                "DELETE FROM kv_history WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+            removed += self.database.execute(
+                "DELETE FROM kv_store WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+        return removed
+
+    def close(self) -> None:
+        # Соединения принадлежат общему Database
+        pass
+
+
+__all__ = ["SQLiteBackend"]
@@ -0,0 +1 @@
+"""Воспроизводимые замеры производительности SynteraGPT (запуск: ``python -m benchmarks.<name>``)."""
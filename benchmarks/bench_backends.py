@@ -0,0 +1,95 @@
+"""Одна и та же нагрузка на все движки ``backends``: история, ключ-значение, счётчики.
+
+Redis-движок по умолчанию работает поверх ``InMemoryRedis`` (нижняя граница
+без сети); чтобы замерить настоящий сервер, передайте ``--redis-url``.
+
+Запуск: ``python -m benchmarks.bench_backends [--iterations N] [--redis-url URL]``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+from backends import EmbeddedBackend, RedisBackend, SQLiteBackend, StorageBackend
+from benchmarks.harness import measure_latency, print_table
+from db import Database
+from memory_redis import InMemoryRedis
+
+_CHATS = 500
+_TTL = 3600
+
+
+def _history_payload(messages: int = 20) -> str:
+    turns = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": "Сообщение для проверки нагрузки " * 4}
+        for i in range(messages)
+    ]
+    return json.dumps(turns, ensure_ascii=False)
+
+
+def _workload(backend: StorageBackend) -> List[Tuple[str, Callable[[], object]]]:
+    payload = _history_payload()
+    counter = iter(range(10**9))
+
+    def save_history() -> None:
+        backend.save_history(next(counter) % _CHATS, payload, _TTL)
+
+    def load_history() -> None:
+        backend.load_history(next(counter) % _CHATS)
+
+    def kv_set() -> None:
+        backend.set(f"lang:{next(counter) % _CHATS}", "ru", _TTL)
+
+    def kv_get() -> None:
+        backend.get(f"lang:{next(counter) % _CHATS}")
+
+    def incr() -> None:
+        backend.incr(f"usage:{next(counter) % _CHATS}", "text")
+
+    return [
+        ("save_history", save_history),
+        ("load_history", load_history),
+        ("kv set", kv_set),
+        ("kv get", kv_get),
+        ("counter incr", incr),
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.redis_url:
+            import redis
+
+            redis_client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+            redis_label = "redis (server)"
+        else:
+            redis_client = InMemoryRedis()
+            redis_label = "redis (in-memory)"
+        database = Database(os.path.join(tmp, "bench.db"))
+        backends: Dict[str, StorageBackend] = {
+            redis_label: RedisBackend(redis_client),
+            "sqlite (WAL)": SQLiteBackend(database),
+            "embedded (mmap)": EmbeddedBackend(os.path.join(tmp, "bench.kv")),
+        }
+
+        results: Dict[str, List[Tuple[str, Dict[str, float]]]] = {}
+        for label, backend in backends.items():
+            for op, fn in _workload(backend):
+                results.setdefault(op, []).append((label, measure_latency(fn, iterations=args.iterations)))
+            backend.close()
+        database.close_all()
+
+    for op, rows in results.items():
+        print_table(op, rows)
+
+
+if __name__ == "__main__":
+    main()
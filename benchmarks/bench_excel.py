@@ -0,0 +1,116 @@
+"""Excel из большого CSV: прежний ``make_excel`` против потоковой записи ``spreadsheet``.
+
+«До» повторяет прежний ``make_excel``: ``split(",")`` каждой строки, все значения
+строками, обычная ``Workbook`` в памяти. «После» — ``media_utils.make_excel``
+(тот же текст в памяти, ``csv`` + типы столбцов + ``write_only``) и
+``media_utils.make_excel_file`` (CSV читается с диска потоком, как загруженный
+пользователем файл).
+
+CSV генерируется во временный файл: 8 столбцов (текст, целые, дробные с запятой,
+даты). Каждый вариант — в отдельном интерпретаторе; пиковый RSS считается от
+момента до чтения файла, так что текст в памяти входит в цену «до».
+
+Запуск: ``python -m benchmarks.bench_excel [--rows N] [--iterations N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import tempfile
+
+from benchmarks.harness import measure, peak_rss_kb, print_table, run_isolated, speedup
+
+_CITIES = ["Москва", "Казань", "Новосибирск", "Самара", "Пермь"]
+
+
+def _write_corpus(path: str, rows: int) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        fh.write("id,город,клиент,сумма,количество,дата,скидка,комментарий\n")
+        for n in range(rows):
+            fh.write(
+                f'{n},{_CITIES[n % 5]},Клиент {n % 977},"{n % 10000},{n % 100:02d}",{n % 50},'
+                f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d},{n % 30},заказ оформлен через бота\n"
+            )
+
+
+def _legacy_make_excel(csv_like_text: str) -> bytes:
+    from openpyxl import Workbook
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Sheet1"
+    for row in csv_like_text.splitlines():
+        cells = [cell.strip() for cell in row.split(",")]
+        ws.append(cells)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as fh:
+        return fh.read()
+
+
+def _child(variant: str, path: str, iterations: int) -> None:
+    import media_utils
+
+    media_utils.make_excel("a,b\n1,2")  # импорт openpyxl — до замера пика
+    if variant == "legacy":
+        render = lambda: _legacy_make_excel(_read(path))  # noqa: E731
+    elif variant == "text":
+        render = lambda: media_utils.make_excel(_read(path))  # noqa: E731
+    else:
+        render = lambda: media_utils.make_excel_file(path)  # noqa: E731
+    baseline = peak_rss_kb()
+    data = render()
+    peak = peak_rss_kb()
+    stats = measure(render, iterations=iterations, warmup=0)
+    print(json.dumps({"stats": stats, "bytes": len(data), "rss_delta_kb": peak - baseline}))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--iterations", type=int, default=2)
+    parser.add_argument("--child", choices=["legacy", "text", "file"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.path, args.iterations)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.csv")
+        _write_corpus(path, args.rows)
+        size = os.path.getsize(path)
+        results = {
+            variant: run_isolated(
+                "benchmarks.bench_excel",
+                ["--child", variant, "--path", path, "--iterations", str(args.iterations)],
+                cwd=tmp,
+            )
+            for variant in ("legacy", "text", "file")
+        }
+
+    rows = []
+    for name, variant in (
+        ("split + Workbook (before)", "legacy"),
+        ("csv + write_only, text (after)", "text"),
+        ("csv + write_only, file (after)", "file"),
+    ):
+        result = results[variant]
+        # в строке таблицы — строки CSV в секунду
+        result["rows_stats"] = dict(result["stats"], ops_per_sec=args.rows * result["stats"]["ops_per_sec"])
+        rows.append((name, result["rows_stats"]))
+    print_table(f"Excel, {args.rows:,} строк, CSV {size / 1e6:.1f} МБ (строк в секунду)", rows)
+    for variant, result in results.items():
+        print(f"  {variant:<6}  xlsx {result['bytes'] / 1e6:>6.2f} MB  peak RSS +{result['rss_delta_kb'] / 1024:.1f} MB")
+    print(f"\nspeedup (file vs before): x{speedup(results['legacy']['rows_stats'], results['file']['rows_stats']):.1f}")
+
+
+if __name__ == "__main__":
+    main()
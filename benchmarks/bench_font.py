@@ -0,0 +1,70 @@
+"""Задержка одного PDF: регистрация шрифта на каждый документ против одной на процесс.
+
+«До» повторяет прежний ``make_pdf``: ``ensure_font()`` и ``registerFont(TTFont(...))``
+на каждый вызов. «После» — текущий ``media_utils.make_pdf`` с ``font_registry``.
+
+Запуск: ``python -m benchmarks.bench_font [--iterations N] [--lines N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import tempfile
+
+from benchmarks.harness import measure_latency, print_table, speedup
+
+
+def _legacy_make_pdf(text: str, font_path: str) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    pdfmetrics.registerFont(TTFont("DejaVuLegacy", font_path))
+    c.setFont("DejaVuLegacy", 12)
+    width, height = A4
+    y = height - 50
+    for line in text.splitlines():
+        c.drawString(40, y, line[:120])
+        y -= 18
+        if y < 40:
+            c.showPage()
+            c.setFont("DejaVuLegacy", 12)
+            y = height - 50
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=40)
+    args = parser.parse_args()
+
+    import font_registry
+    import media_utils
+
+    text = "\n".join(f"Строка {i}: быстрый отчёт для проверки шрифта" for i in range(args.lines))
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)  # fonts/ создаётся относительно текущего каталога
+        try:
+            font_path = font_registry.materialize_font()
+            before = measure_latency(lambda: _legacy_make_pdf(text, font_path), iterations=args.iterations, warmup=2)
+            after = measure_latency(lambda: media_utils.make_pdf(text), iterations=args.iterations, warmup=2)
+        finally:
+            os.chdir(cwd)
+
+    print_table(
+        f"PDF, {args.lines} строк",
+        [("register per PDF (before)", before), ("register once (after)", after)],
+    )
+    print(f"\nspeedup: x{speedup(before, after):.1f}")
+
+
+if __name__ == "__main__":
+    main()
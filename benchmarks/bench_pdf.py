@@ -0,0 +1,139 @@
+"""PDF на ~1000 страниц: прежний ``make_pdf`` против вёрстки ``pdf_layout``.
+
+«До» повторяет прежний ``make_pdf``: ``drawString`` на каждую строку с обрезкой
+до 120 символов и сборка в ``BytesIO``. «После» — текущий ``media_utils.make_pdf``
+(перенос по ширине, страница одним текстовым объектом, ``SpooledTemporaryFile``).
+Два текста: ``short`` — строки короче ширины страницы (у обоих вариантов одни и те
+же ~N страниц) и ``paragraphs`` — абзацы по 2–3 строки: «после» даёт больше
+страниц, прежний вариант просто теряет хвосты строк, поэтому сравнивается
+скорость в страницах в секунду.
+
+Каждый вариант запускается в отдельном интерпретаторе, чтобы пиковый RSS
+(``ru_maxrss``) не смешивался: печатается прирост пика за время рендеринга.
+
+Запуск: ``python -m benchmarks.bench_pdf [--pages N] [--iterations N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import tempfile
+
+from benchmarks.harness import measure, peak_rss_kb, print_table, run_isolated, speedup
+
+_LINES_PER_PAGE = 42
+_WORDS = "быстрый отчёт по продажам за квартал с комментариями и выводами для руководства".split()
+
+
+def _corpus(kind: str, pages: int) -> str:
+    if kind == "short":
+        return "\n".join(
+            f"{n}. " + " ".join(_WORDS[(n + k) % len(_WORDS)] for k in range(3 + n % 6))
+            for n in range(pages * _LINES_PER_PAGE)
+        )
+    # ~2.5 строки на абзац: столько абзацев, чтобы после переноса вышло ~pages страниц
+    paragraphs = pages * _LINES_PER_PAGE * 2 // 5
+    return "\n".join(
+        f"{n}. " + " ".join(_WORDS[(n + k) % len(_WORDS)] for k in range(24 + n % 12)) for n in range(paragraphs)
+    )
+
+
+def _legacy_make_pdf(text: str) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    from font_registry import register_font
+
+    font = register_font()
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    c.setFont(font, 12)
+    c.setTitle("Document")
+    width, height = A4
+    y = height - 50
+    for line in text.splitlines() or ["(empty)"]:
+        c.drawString(40, y, line[:120])
+        y -= 18
+        if y < 40:
+            c.showPage()
+            c.setFont(font, 12)
+            y = height - 50
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _child(variant: str, corpus: str, pages: int, iterations: int) -> None:
+    import font_registry
+    import media_utils
+    import pdf_layout
+
+    font = font_registry.register_font()
+    text = _corpus(corpus, pages)
+    if variant == "legacy":
+        render = lambda: _legacy_make_pdf(text)  # noqa: E731
+    else:
+        render = lambda: media_utils.make_pdf(text, max_pages=pages * 10, max_bytes=None)  # noqa: E731
+    # таблица ширин и импорт reportlab — до замера пика
+    pdf_layout.glyph_widths(font)
+    media_utils.make_pdf("warmup")
+    baseline = peak_rss_kb()
+    data = render()
+    peak = peak_rss_kb()
+    stats = measure(render, iterations=iterations, warmup=0)
+    print(json.dumps({
+        "stats": stats,
+        "bytes": len(data),
+        "pages": data.count(b"/Type /Page\n") or data.count(b"/Type /Page"),
+        "rss_delta_kb": peak - baseline,
+        "input_bytes": len(text.encode("utf-8")),
+    }))
+
+
+def _run(variant: str, corpus: str, pages: int, iterations: int, workdir: str) -> dict:
+    return run_isolated(
+        "benchmarks.bench_pdf",
+        ["--child", variant, "--corpus", corpus, "--pages", str(pages), "--iterations", str(iterations)],
+        cwd=workdir,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--corpus", choices=["short", "paragraphs"], action="append")
+    parser.add_argument("--child", choices=["legacy", "layout"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    corpora = args.corpus or ["short", "paragraphs"]
+    if args.child:
+        _child(args.child, corpora[0], args.pages, args.iterations)
+        return
+
+    for corpus in corpora:
+        # fonts/ создаётся относительно текущего каталога — запускаем дочерние процессы во временном
+        with tempfile.TemporaryDirectory() as tmp:
+            before = _run("legacy", corpus, args.pages, args.iterations, tmp)
+            after = _run("layout", corpus, args.pages, args.iterations, tmp)
+        rows = []
+        for name, result in (("drawString + BytesIO (before)", before), ("pdf_layout + spool (after)", after)):
+            # в строке таблицы — страницы в секунду, а не документы
+            pages = dict(result["stats"], ops_per_sec=result["pages"] * result["stats"]["ops_per_sec"])
+            rows.append((name, pages))
+            result["pages_stats"] = pages
+        print_table(
+            f"PDF {corpus}, ~{args.pages} страниц, {before['input_bytes'] / 1e6:.1f} МБ текста (страниц в секунду)",
+            rows,
+        )
+        for name, result in (("before", before), ("after", after)):
+            print(
+                f"  {name:<6}  pages {result['pages']:>5}  PDF {result['bytes'] / 1e6:>6.2f} MB  "
+                f"peak RSS +{result['rss_delta_kb'] / 1024:.1f} MB"
+            )
+        print(f"  speedup (pages/s): x{speedup(before['pages_stats'], after['pages_stats']):.1f}")
+
+
+if __name__ == "__main__":
+    main()
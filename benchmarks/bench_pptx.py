@@ -0,0 +1,96 @@
+"""Презентации: прежний ``make_pptx`` против шаблона-прототипа ``presentation``.
+
+«До» повторяет прежний ``make_pptx``: ``Presentation()`` (разбор шаблона с диска)
+на каждый вызов и штатный ``add_slide`` с ``prs.slide_layouts[1]`` на каждый
+слайд. «После» — текущий ``media_utils.make_pptx``.
+
+Два замера: задержка небольшой колоды (разбор шаблона — основная цена) и
+скорость в слайдах в секунду для колод растущего размера (у штатного
+``add_slide`` время на слайд растёт с их числом).
+
+Запуск: ``python -m benchmarks.bench_pptx [--iterations N] [--sizes 250,1000,2000]``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+from datetime import datetime
+
+from benchmarks.harness import measure, measure_latency, print_table, speedup
+
+
+def _legacy_make_pptx(title_and_bullets: str) -> bytes:
+    from pptx import Presentation
+
+    prs = Presentation()
+    blocks = [b.strip() for b in title_and_bullets.split("===") if b.strip()]
+    if not blocks:
+        blocks = [f"Заголовок: Авто-слайды\n- Слайд создан {datetime.now():%Y-%m-%d %H:%M}"]
+
+    for block in blocks:
+        lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
+        title_line = lines[0] if lines else "Слайд"
+        title_text = title_line.replace("Заголовок:", "").strip() if "Заголовок:" in title_line else title_line
+
+        slide_layout = prs.slide_layouts[1]
+        slide = prs.slides.add_slide(slide_layout)
+        slide.shapes.title.text = title_text
+
+        body = slide.shapes.placeholders[1].text_frame
+        body.clear()
+        bullets = [ln[1:].strip() for ln in lines[1:] if ln.startswith("-")]
+        if bullets:
+            body.text = bullets[0]
+            for b in bullets[1:]:
+                p = body.add_paragraph()
+                p.text = b
+                p.level = 0
+        else:
+            body.text = " "
+
+    buf = io.BytesIO()
+    prs.save(buf)
+    return buf.getvalue()
+
+
+def _outline(slides: int) -> str:
+    return "\n===\n".join(
+        f"Заголовок: Слайд {n}\n- Выручка выросла на {n % 40}%\n- Новые клиенты: {n * 7}\n- Планы на квартал"
+        for n in range(slides)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--slides", type=int, default=5, help="слайдов в небольшой колоде")
+    parser.add_argument("--sizes", default="250,1000,2000", help="размеры больших колод")
+    args = parser.parse_args()
+
+    import media_utils
+
+    small = _outline(args.slides)
+    before = measure_latency(lambda: _legacy_make_pptx(small), iterations=args.iterations, warmup=3)
+    after = measure_latency(lambda: media_utils.make_pptx(small), iterations=args.iterations, warmup=3)
+    print_table(
+        f"Колода из {args.slides} слайдов (презентаций в секунду)",
+        [("Presentation() per deck (before)", before), ("parsed template clone (after)", after)],
+    )
+    print(f"\nspeedup: x{speedup(before, after):.1f}")
+
+    for size in (int(value) for value in args.sizes.split(",")):
+        text = _outline(size)
+        rows = []
+        for name, render in (
+            ("slides.add_slide (before)", lambda: _legacy_make_pptx(text)),
+            ("DeckBuilder (after)", lambda: media_utils.make_pptx(text)),
+        ):
+            stats = measure(render, iterations=1, warmup=0)
+            # в строке таблицы — слайды в секунду
+            rows.append((name, dict(stats, ops_per_sec=size * stats["ops_per_sec"])))
+        print_table(f"Колода из {size} слайдов (слайдов в секунду)", rows)
+        print(f"\nspeedup: x{speedup(rows[0][1], rows[1][1]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Списание медиа-лимитов под конкурентной нагрузкой: SELECT+UPDATE против ``quota``.
+
+Несколько потоков одновременно списывают фото с одного баланса. Старая схема
+(проверка остатка отдельным SELECT) перерасходует лимит, условный UPDATE —
+нет. Отдельно замеряется повторный отказ исчерпанному пользователю: его
+обслуживает кэш остатков без обращения к SQLite.
+
+Запуск: ``python -m benchmarks.bench_quota [--threads N] [--balance N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict
+
+from benchmarks.harness import measure, print_table, speedup
+from db import Database
+from quota import QuotaEngine, month_key
+
+_USERS = "CREATE TABLE IF NOT EXISTS users (chat_id INTEGER PRIMARY KEY, used_free INT DEFAULT 0, has_tariff INTEGER DEFAULT 0)"
+_CHAT_ID = 42
+
+
+def _legacy_dec(database: Database) -> Callable[[], bool]:
+    """Копия прежнего storage.dec_media: чтение и списание отдельными запросами."""
+
+    month = month_key()
+
+    def dec() -> bool:
+        row = database.query_one("SELECT photos_left FROM media_balance WHERE chat_id=? AND month=?", (_CHAT_ID, month))
+        if not row or row[0] < 1:
+            return False
+        time.sleep(0)  # переключение потоков между проверкой и записью, как под нагрузкой
+        database.execute(
+            "UPDATE media_balance SET photos_left = photos_left - 1 WHERE chat_id=? AND month=?", (_CHAT_ID, month)
+        )
+        return True
+
+    return dec
+
+
+def _hammer(fn: Callable[[], bool], *, threads: int, attempts: int) -> Dict[str, float]:
+    granted = [0] * threads
+
+    def worker(idx: int) -> None:
+        for _ in range(attempts):
+            if fn():
+                granted[idx] += 1
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = threads * attempts
+    return {
+        "iterations": float(total),
+        "seconds": elapsed,
+        "ops_per_sec": total / elapsed if elapsed else float("inf"),
+        "granted": float(sum(granted)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=250)
+    parser.add_argument("--balance", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(os.path.join(tmp, "quota.db"))
+        database.execute(_USERS)
+        engine = QuotaEngine(database, monthly_limits={})
+        engine.ensure_tables()
+
+        engine.set_balance(_CHAT_ID, args.balance, 0, 0)
+        legacy = _hammer(_legacy_dec(database), threads=args.threads, attempts=args.attempts)
+        engine.invalidate(_CHAT_ID)
+        legacy_left = engine.balance(_CHAT_ID)["photos"]
+
+        engine.set_balance(_CHAT_ID, args.balance, 0, 0)
+        atomic = _hammer(
+            lambda: engine.consume(_CHAT_ID, "photos", allow_trial=False) is not None,
+            threads=args.threads,
+            attempts=args.attempts,
+        )
+        atomic_left = engine.balance(_CHAT_ID)["photos"]
+
+        # Исчерпанный пользователь: отказ из кэша против запроса в SQLite
+        engine.set_balance(_CHAT_ID, 0, 0, 0)
+        engine.use_trial(_CHAT_ID, "photos")
+        uncached = QuotaEngine(database, monthly_limits={}, cache_ttl=0)
+        deny_db = measure(lambda: uncached.consume(_CHAT_ID, "photos"), iterations=args.iterations)
+        deny_cached = measure(lambda: engine.consume(_CHAT_ID, "photos"), iterations=args.iterations)
+        database.close_all()
+
+    print_table(
+        f"Concurrent consume, {args.threads} threads, balance {args.balance}",
+        [("SELECT + UPDATE (legacy)", legacy), ("conditional UPDATE (quota)", atomic)],
+    )
+    for name, stats, left in (("legacy", legacy, legacy_left), ("quota", atomic, atomic_left)):
+        overspent = int(stats["granted"]) - args.balance
+        print(f"{name:<7} granted {int(stats['granted'])}, left {left}, overspent {max(overspent, 0)}")
+
+    print_table("Denied request", [("SQLite round-trip", deny_db), ("in-process cache", deny_cached)])
+    print(f"\ncached deny speedup: x{speedup(deny_db, deny_cached):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Сравнение «соединение на каждый вызов» и постоянных WAL-соединений из ``db``.
+
+Запуск: ``python -m benchmarks.bench_sqlite [--iterations N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import tempfile
+
+from benchmarks.harness import measure, print_table, speedup
+from db import Database
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    chat_id INTEGER PRIMARY KEY,
+    used_free INT DEFAULT 0,
+    has_tariff INTEGER DEFAULT 0
+)
+"""
+_SELECT = "SELECT used_free, has_tariff FROM users WHERE chat_id = ?"
+_UPSERT = (
+    "INSERT INTO users(chat_id, used_free, has_tariff) VALUES(?, 1, 0) "
+    "ON CONFLICT(chat_id) DO UPDATE SET used_free = used_free + 1"
+)
+
+
+def _naive_ops(path: str):
+    counter = iter(range(10**9))
+
+    def read() -> None:
+        conn = sqlite3.connect(path)
+        conn.execute(_SELECT, (next(counter) % 1000,)).fetchone()
+        conn.close()
+
+    def write() -> None:
+        conn = sqlite3.connect(path)
+        conn.execute(_UPSERT, (next(counter) % 1000,))
+        conn.commit()
+        conn.close()
+
+    return read, write
+
+
+def _pooled_ops(database: Database):
+    counter = iter(range(10**9))
+
+    def read() -> None:
+        database.query_one(_SELECT, (next(counter) % 1000,))
+
+    def write() -> None:
+        database.execute(_UPSERT, (next(counter) % 1000,))
+
+    return read, write
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        naive_path = os.path.join(tmp, "naive.db")
+        conn = sqlite3.connect(naive_path)
+        conn.execute(_SCHEMA)
+        conn.commit()
+        conn.close()
+
+        database = Database(os.path.join(tmp, "pooled.db"))
+        database.execute(_SCHEMA)
+
+        naive_read, naive_write = _naive_ops(naive_path)
+        pooled_read, pooled_write = _pooled_ops(database)
+
+        results = [
+            ("read  / connect per call", measure(naive_read, iterations=args.iterations)),
+            ("read  / persistent WAL", measure(pooled_read, iterations=args.iterations)),
+            ("write / connect per call", measure(naive_write, iterations=args.iterations)),
+            ("write / persistent WAL", measure(pooled_write, iterations=args.iterations)),
+        ]
+        database.close_all()
+
+    print_table("SQLite access layer", results)
+    print(f"\nread speedup:  x{speedup(results[0][1], results[1][1]):.1f}")
+    print(f"write speedup: x{speedup(results[2][1], results[3][1]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Пропускная способность генерации документов: рендер и отправка вместе против раздельных стадий.
+
+Поднимает локальный поддельный Bot API (``sendDocument`` отвечает с задержкой
+``--latency`` и выдаёт 429 с ``retry_after``, если превышен ``--rate`` запросов
+в секунду). telebot направляется на него через ``apihelper.API_URL``.
+
+* «до» — процесс пула рендерит PDF и сам синхронно его отправляет;
+* «после» — пул только рендерит, а ``media_upload.Uploader`` отправляет
+  файлы параллельно с повторами.
+
+Запуск: ``python -m benchmarks.bench_upload [--jobs N] [--workers N] [--uploads N] [--latency SEC] [--rate N]``.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from media_engine import MediaEngine
+from media_upload import Document, Uploader, telegram_sender
+
+_BOT = None
+_TEXT = "\n".join(f"Строка {i}: отчёт для проверки отправки" for i in range(40))
+
+
+class _FakeBotApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float, rate: float) -> None:
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = latency
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.window_started = time.monotonic()
+        self.window_count = 0
+        self.counts: Dict[str, int] = {"documents": 0, "rate_limited": 0}
+
+    def admit(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_started >= 1.0:
+                self.window_started, self.window_count = now, 0
+            if self.window_count >= self.rate:
+                self.counts["rate_limited"] += 1
+                return False
+            self.window_count += 1
+            return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _FakeBotApi
+
+    def log_message(self, *args) -> None:  # тишина в консоли
+        pass
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        method = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+        if method != "sendDocument":
+            self._reply(200, {"ok": True, "result": True})
+            return
+        if not self.server.admit():
+            self._reply(429, {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 1}})
+            return
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.counts["documents"] += 1
+        message = {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}
+        self._reply(200, {"ok": True, "result": message})
+
+    do_GET = do_POST
+
+
+def _init_worker() -> None:
+    from font_registry import register_font
+
+    register_font()
+
+
+def _render(chat_id: int, kind: str, payload: str) -> Document:
+    import media_utils
+
+    return Document("document.pdf", "PDF", media_utils.make_pdf(payload))
+
+
+def _render_and_send(chat_id: int, kind: str, payload: str) -> None:
+    document = _render(chat_id, kind, payload)
+    _BOT.send_document(chat_id, io.BytesIO(document.data), visible_file_name=document.filename, caption=document.caption)
+
+
+def _run(mode: str, server: _FakeBotApi, args) -> Dict[str, float]:
+    failures = []
+    uploader = None
+    if mode == "after":
+        uploader = Uploader(
+            telegram_sender(_BOT),
+            concurrency=args.uploads,
+            on_failure=lambda chat_id, document, exc: failures.append(exc),
+        )
+        run_job, on_result = _render, (lambda job, document: uploader.submit(job.chat_id, document))
+    else:
+        run_job, on_result = _render_and_send, None
+
+    engine = MediaEngine(
+        run_job,
+        workers=args.workers,
+        queue_limit=args.jobs,
+        per_chat_limit=args.jobs,
+        executor_factory=lambda workers: ProcessPoolExecutor(workers, mp.get_context("fork"), initializer=_init_worker),
+        on_error=lambda job, exc: failures.append(exc),
+        on_result=on_result,
+    )
+    # прогрев: процессы пула и шрифт
+    engine.submit(0, "pdf", "warmup")
+    while server.counts["documents"] < 1 and not failures:
+        time.sleep(0.01)
+
+    with server.lock:
+        server.counts.update(documents=0, rate_limited=0)
+    started = time.perf_counter()
+    for job in range(args.jobs):
+        engine.submit(job + 1, "pdf", _TEXT)
+    while server.counts["documents"] + len(failures) < args.jobs:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    engine.shutdown()
+    if uploader is not None:
+        uploader.shutdown()
+    return {
+        "iterations": float(args.jobs),
+        "seconds": elapsed,
+        "ops_per_sec": args.jobs / elapsed,
+        "failed": float(len(failures)),
+        "rate_limited": float(server.counts["rate_limited"]),
+    }
+
+
+def main() -> None:
+    global _BOT
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=60)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--uploads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="задержка ответа sendDocument, с")
+    parser.add_argument("--rate", type=float, default=1000, help="запросов в секунду до ответа 429")
+    args = parser.parse_args()
+
+    from telebot import TeleBot, apihelper
+
+    from benchmarks.harness import print_table, speedup
+
+    server = _FakeBotApi(args.latency, args.rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    apihelper.API_URL = f"http://127.0.0.1:{server.server_address[1]}/bot{{0}}/{{1}}"
+    _BOT = TeleBot("123:bench", threaded=False)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)  # fonts/ создаётся относительно текущего каталога
+        try:
+            before = _run("before", server, args)
+            after = _run("after", server, args)
+        finally:
+            os.chdir(cwd)
+    server.shutdown()
+
+    print_table(
+        f"{args.jobs} PDF, {args.workers} воркера, задержка Bot API {args.latency * 1000:.0f} мс",
+        [("render+send in worker (before)", before), (f"render | {args.uploads} uploads (after)", after)],
+    )
+    for label, stats in (("before", before), ("after", after)):
+        print(f"{label}: failed {stats['failed']:.0f}, 429 responses {stats['rate_limited']:.0f}")
+    print(f"\nspeedup: x{speedup(before, after):.1f}")
+
+
+if __name__ == "__main__":
+    main()
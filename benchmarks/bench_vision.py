@@ -0,0 +1,127 @@
+"""Подготовка фото к vision: самое большое фото целиком против ``image_prep``.
+
+Поднимает локальный сервер файлов: для одного снимка он отдаёт лестницу
+размеров, как Telegram (320, 800, 1280 и 2560 px по длинной стороне, JPEG),
+с ограничением полосы ``--mbps`` (по умолчанию 40 Мбит/с). Итог каждой
+операции — data URL для запроса к модели.
+
+* «до» — прежний ``on_photo_message``: ``requests.get`` самого большого фото
+  (новое соединение на запрос), base64 как есть;
+* «после» — ``pick_photo_size`` + поток через общую сессию + ``prepare_image``.
+
+Печатается задержка, объём скачанного и отправляемого модели и оценка токенов.
+
+Запуск: ``python -m benchmarks.bench_vision [--iterations N] [--mbps N] [--detail auto|low|high]``.
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict
+
+import requests
+
+from benchmarks import corpora
+from benchmarks.harness import measure_latency, print_table, speedup
+
+_LADDER = (320, 800, 1280, 2560)
+
+
+def _photo_ladder() -> Dict[str, bytes]:
+    """Один «снимок» 4:3 в размерах Telegram; шум делает JPEG похожим на фото по объёму."""
+
+    from PIL import Image
+
+    banner = corpora.png_banner(2560, 1920)
+    with Image.open(io.BytesIO(banner)) as img:
+        photo = img.convert("RGB")
+    files = {}
+    for side in _LADDER:
+        buf = io.BytesIO()
+        photo.resize((side, side * 3 // 4), Image.Resampling.LANCZOS).save(buf, format="JPEG", quality=87)
+        files[f"{side}x{side * 3 // 4}"] = buf.getvalue()
+    return files
+
+
+def _serve(files: Dict[str, bytes], mbps: float) -> ThreadingHTTPServer:
+    bytes_per_sec = mbps * 1e6 / 8
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):  # noqa: N802 - имя задаёт http.server
+            body = files[self.path.strip("/")]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            # отдаём кусками, выдерживая полосу
+            for start in range(0, len(body), 64 * 1024):
+                chunk = body[start:start + 64 * 1024]
+                self.wfile.write(chunk)
+                time.sleep(len(chunk) / bytes_per_sec)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--mbps", type=float, default=40.0)
+    parser.add_argument("--detail", default="auto", choices=("auto", "low", "high"))
+    args = parser.parse_args()
+
+    import image_prep
+
+    files = _photo_ladder()
+    sizes = [
+        SimpleNamespace(file_id=name, width=int(name.split("x")[0]), height=int(name.split("x")[1]), file_size=len(data))
+        for name, data in files.items()
+    ]
+    server = _serve(files, args.mbps)
+    base = f"http://127.0.0.1:{server.server_address[1]}/"
+    largest = sizes[-1]
+    payload: Dict[str, int] = {}
+
+    def before() -> None:
+        resp = requests.get(base + largest.file_id, timeout=30)
+        resp.raise_for_status()
+        payload["before"] = len(f"data:image/jpeg;base64,{base64.b64encode(resp.content).decode('utf-8')}")
+
+    def after() -> None:
+        photo = image_prep.pick_photo_size(sizes, args.detail)
+        prepared = image_prep.prepare_image(image_prep.download(base + photo.file_id), detail=args.detail)
+        payload["after"] = len(prepared.data_url())
+        payload["after_downloaded"] = prepared.source_bytes
+        payload["after_width"], payload["after_height"] = prepared.width, prepared.height
+
+    try:
+        old = measure_latency(before, iterations=args.iterations, warmup=2)
+        new = measure_latency(after, iterations=args.iterations, warmup=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print_table(
+        f"Фото 2560x1920 для vision, {args.mbps:g} Мбит/с, detail={args.detail}",
+        [("largest photo, base64 as is (before)", old), ("image_prep (after)", new)],
+    )
+    width, height = payload["after_width"], payload["after_height"]
+    print(f"\nspeedup: x{speedup(old, new):.1f}")
+    print(f"  before  download {largest.file_size / 1024:7.0f} KB  data URL {payload['before'] / 1024:7.0f} KB  "
+          f"~{image_prep.vision_tokens(largest.width, largest.height)} tokens")
+    print(f"  after   download {payload['after_downloaded'] / 1024:7.0f} KB  data URL {payload['after'] / 1024:7.0f} KB  "
+          f"~{image_prep.vision_tokens(width, height, args.detail)} tokens ({width}x{height})")
+
+
+if __name__ == "__main__":
+    main()
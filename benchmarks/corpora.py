@@ -0,0 +1,139 @@
+"""Синтетические входные данные для замеров: одинаковые при каждом запуске.
+
+Все генераторы детерминированы (свой ``random.Random`` с фиксированным
+зерном), поэтому результаты разных прогонов сравнимы между собой.
+"""
+from __future__ import annotations
+
+import io
+import random
+from datetime import date, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+SEED = 20240601
+
+_WORDS = (
+    "отчёт выручка клиенты квартал рост прибыль расходы маркетинг продажи план аналитика "
+    "сотрудники офис проект сроки бюджет риски стратегия рынок конкуренты доля запуск "
+    "продукт команда результат показатели динамика прогноз регион партнёры договор"
+).split()
+_LINKS = (
+    "https://en.wikipedia.org/wiki/Revenue",
+    "https://www.google.com/search?q=отчёт",
+    "https://www.bbc.com/news/business-1",
+    "https://ya.ru/search/?text=выручка",
+    "https://habr.com/ru/articles/1/",
+)
+
+
+def cyrillic_text(paragraphs: int, *, seed: int = SEED) -> str:
+    """Абзацы кириллического текста разной длины (от строки до нескольких строк PDF)."""
+
+    rnd = random.Random(seed)
+    lines = []
+    for n in range(paragraphs):
+        words = rnd.choices(_WORDS, k=rnd.randint(4, 60))
+        words[0] = words[0].capitalize()
+        lines.append(f"{n + 1}. " + " ".join(words) + ".")
+    return "\n".join(lines)
+
+
+def model_answer(paragraphs: int, *, seed: int = SEED) -> str:
+    """Ответ модели: текст со служебной разметкой, HTML-символами и ссылками."""
+
+    rnd = random.Random(seed)
+    parts = ["<think>план ответа</think>"]
+    for n, paragraph in enumerate(cyrillic_text(paragraphs, seed=seed).splitlines()):
+        if n % 3 == 0:
+            paragraph += f" Источник: {rnd.choice(_LINKS)}"
+        if n % 5 == 0:
+            paragraph += ' <b>итог</b> & "цитата" <reasoning>шаг</reasoning>'
+        parts.append(paragraph)
+    return "\n".join(parts)
+
+
+def csv_text(rows: int, *, seed: int = SEED) -> str:
+    """CSV с заголовком, разделитель ``;``, русские числа и даты, кавычки внутри полей."""
+
+    rnd = random.Random(seed)
+    start = date(2023, 1, 1)
+    out = ["Клиент;Город;Сумма;Количество;Дата;Комментарий"]
+    cities = ("Москва", "Казань", "Пермь", "Самара", "Тверь")
+    for n in range(rows):
+        amount = f"{rnd.randint(100, 999_999)},{rnd.randint(0, 99):02d}"
+        comment = " ".join(rnd.choices(_WORDS, k=rnd.randint(1, 8)))
+        if n % 7 == 0:
+            comment = f'"{comment}; срочно"'
+        day = start + timedelta(days=rnd.randint(0, 700))
+        out.append(f"ООО Клиент {n};{rnd.choice(cities)};{amount};{rnd.randint(1, 500)};{day:%d.%m.%Y};{comment}")
+    return "\n".join(out) + "\n"
+
+
+def slide_plan(slides: int, *, seed: int = SEED) -> str:
+    """План презентации в формате ``make_pptx``: блоки через ``===``."""
+
+    rnd = random.Random(seed)
+    blocks = []
+    for n in range(slides):
+        bullets = "\n".join(
+            "- " + " ".join(rnd.choices(_WORDS, k=rnd.randint(3, 10))) for _ in range(rnd.randint(2, 6))
+        )
+        blocks.append(f"Заголовок: Слайд {n + 1}. {rnd.choice(_WORDS).capitalize()}\n{bullets}")
+    return "\n===\n".join(blocks)
+
+
+def png_banner(width: int, height: int, *, seed: int = SEED) -> bytes:
+    """PNG-баннер с прозрачностью: градиент и шум, чтобы сжатие не было вырожденным."""
+
+    from PIL import Image
+
+    rnd = random.Random(seed)
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.frombytes("L", (width, height), rnd.randbytes(width * height))
+    image = Image.merge("RGBA", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient))
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _part(text: str) -> SimpleNamespace:
+    return SimpleNamespace(type="output_text", text=text, annotations=[SimpleNamespace(type="url_citation")])
+
+
+def sdk_responses(count: int, *, parts: int = 8, seed: int = SEED) -> List[Any]:
+    """Ответы в формах разных версий SDK: Responses API, Chat Completions и ``model_dump()``.
+
+    В ответах Responses API ``output_text`` пуст, поэтому текст собирается
+    обходом вложенных элементов ``output`` — самый длинный путь извлечения.
+    """
+
+    rnd = random.Random(seed)
+    responses: List[Any] = []
+    for n in range(count):
+        texts = [" ".join(rnd.choices(_WORDS, k=rnd.randint(5, 30))) + " " for _ in range(parts)]
+        if n % 3 == 0:
+            responses.append(
+                SimpleNamespace(
+                    output_text="",
+                    output=[
+                        SimpleNamespace(type="reasoning", summary=[SimpleNamespace(type="summary_text", text="план")]),
+                        SimpleNamespace(type="message", role="assistant", content=[_part(text) for text in texts]),
+                    ],
+                )
+            )
+        elif n % 3 == 1:
+            message = SimpleNamespace(role="assistant", content=[{"type": "text", "text": text} for text in texts])
+            responses.append(SimpleNamespace(choices=[SimpleNamespace(index=0, message=message)]))
+        else:
+            dumped: Dict[str, Any] = {
+                "output": [
+                    {"type": "reasoning", "summary": []},
+                    {"type": "message", "content": [{"type": "output_text", "text": text} for text in texts]},
+                ]
+            }
+            responses.append(SimpleNamespace(model_dump=lambda dumped=dumped: dumped))
+    return responses
+
+
+__all__ = ["SEED", "csv_text", "cyrillic_text", "model_answer", "png_banner", "sdk_responses", "slide_plan"]
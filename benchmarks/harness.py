@@ -0,0 +1,126 @@
+"""Минимальные утилиты замеров для скриптов в ``benchmarks``."""
+from __future__ import annotations
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterable, List, Sequence
+
+
+def measure(fn: Callable[[], object], *, iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """Выполнить ``fn`` заданное число раз и вернуть пропускную способность."""
+
+    for _ in range(warmup):
+        fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": float(iterations),
+        "seconds": elapsed,
+        "ops_per_sec": iterations / elapsed if elapsed else float("inf"),
+    }
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    """Перцентиль ``q`` (0..1) уже отсортированной выборки, без интерполяции."""
+
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def measure_latency(fn: Callable[[], object], *, iterations: int, warmup: int = 10) -> Dict[str, float]:
+    """Как :func:`measure`, но с задержкой каждой операции (p50/p90/p99 и максимум в микросекундах)."""
+
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        started = clock()
+        fn()
+        samples.append(clock() - started)
+    elapsed = sum(samples)
+    samples.sort()
+    return {
+        "iterations": float(iterations),
+        "seconds": elapsed,
+        "ops_per_sec": iterations / elapsed if elapsed else float("inf"),
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p90_us": percentile(samples, 0.90) * 1e6,
+        "p99_us": percentile(samples, 0.99) * 1e6,
+        "max_us": samples[-1] * 1e6,
+    }
+
+
+def traced_peak_kb(fn: Callable[[], object]) -> float:
+    """Пик памяти, выделенной Python-аллокатором за один вызов ``fn`` (КБ, ``tracemalloc``).
+
+    Память C-библиотек со своим ``malloc`` (libxml2, Pillow) сюда не входит —
+    её видно только в RSS процесса.
+    """
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+def print_table(title: str, rows: Iterable[tuple[str, Dict[str, float]]]) -> None:
+    """Напечатать результаты замеров в виде простой таблицы."""
+
+    rows = list(rows)
+    width = max((len(name) for name, _ in rows), default=10)
+    print(f"\n{title}")
+    print("-" * (width + 30))
+    for name, stats in rows:
+        line = f"{name:<{width}}  {stats['ops_per_sec']:>12,.0f} ops/s  {stats['seconds']:>8.3f} s"
+        if "p50_us" in stats:
+            line += f"  p50 {stats['p50_us']:>8.1f} us  p99 {stats['p99_us']:>8.1f} us"
+        print(line)
+
+
+def peak_rss_kb() -> int:
+    """Пиковый RSS текущего процесса (КБ, Linux)."""
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_isolated(module: str, args: Sequence[str], *, cwd: str) -> dict:
+    """Запустить ``python -m module args`` в отдельном интерпретаторе и вернуть JSON из последней строки вывода.
+
+    Нужен для замеров пикового RSS: у каждого варианта свой процесс. Каталог
+    репозитория добавляется в ``PYTHONPATH``, поэтому ``cwd`` может быть любым.
+    """
+
+    root = os.getcwd()
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+    output = subprocess.run(
+        [sys.executable, "-m", module, *args], cwd=cwd, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def speedup(before: Dict[str, float], after: Dict[str, float]) -> float:
+    return after["ops_per_sec"] / before["ops_per_sec"] if before["ops_per_sec"] else 0.0
+
+
+__all__: List[str] = [
+    "measure",
+    "measure_latency",
+    "peak_rss_kb",
+    "percentile",
+    "print_table",
+    "run_isolated",
+    "speedup",
+    "traced_peak_kb",
+]
@@ -0,0 +1,254 @@
+"""Набор замеров рендереров ``media_utils`` и текстовых утилит с сохранением в JSON.
+
+Каждый случай — одна функция на синтетическом корпусе из
+:mod:`benchmarks.corpora` (кириллический текст, большой CSV, план на много
+слайдов, PNG-баннер, вложенные ответы SDK). Для случая печатаются
+операций в секунду, единиц в секунду (строк, слайдов, символов), задержка
+p50/p90/p99 и память: пик ``tracemalloc`` за один вызов и пиковый RSS
+процесса.
+
+Каждый случай идёт в отдельном интерпретаторе (:func:`harness.run_isolated`)
+во временном каталоге: пиковый RSS не смешивается между случаями, ленивые
+импорты и кэши одного случая не ускоряют другой, а файлы рендереров
+(``fonts/``) и корпусов не остаются в репозитории. Результаты сохраняются в
+JSON вместе с версией Python, платформой и коммитом; ``--compare`` сравнивает
+прогон с сохранённым.
+
+``auto_post`` читает ``settings``: для замера ``_normalize_image`` без
+настроенного окружения подставляются фиктивные ``BOT_TOKEN`` и
+``OPENAI_API_KEY`` (сеть не используется).
+
+Запуск::
+
+    python -m benchmarks.suite [--quick] [--only pdf,excel] [--output PATH] [--compare OLD.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks import corpora
+from benchmarks.harness import measure_latency, peak_rss_kb, run_isolated, traced_peak_kb
+
+_RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    # размер корпуса -> (операция, единиц работы за операцию)
+    build: Callable[[int], Tuple[Callable[[], object], int]]
+    unit: str
+    size: int
+    quick_size: int
+    iterations: int
+    quick_iterations: int
+
+
+def _pdf(size: int):
+    import media_utils
+
+    text = corpora.cyrillic_text(size)
+    return (lambda: media_utils.make_pdf(text)), size
+
+
+def _excel(size: int):
+    import media_utils
+
+    text = corpora.csv_text(size)
+    return (lambda: media_utils.make_excel(text)), size
+
+
+def _excel_file(size: int):
+    import media_utils
+
+    # рабочий каталог замера временный и удаляется после него
+    path = os.path.abspath("corpus.csv")
+    with open(path, "w", encoding="utf-8", newline="") as fh:
+        fh.write(corpora.csv_text(size))
+    return (lambda: media_utils.make_excel_file(path)), size
+
+
+def _pptx(size: int):
+    import media_utils
+
+    plan = corpora.slide_plan(size)
+    return (lambda: media_utils.make_pptx(plan)), size
+
+
+def _normalize_image(size: int):
+    os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from auto_post import _normalize_image
+
+    banner = corpora.png_banner(size, size * 9 // 16)
+    return (lambda: _normalize_image(banner)), 1
+
+
+def _sanitize(size: int):
+    from text_utils import sanitize_for_telegram
+
+    text = corpora.model_answer(size)
+    return (lambda: sanitize_for_telegram(text)), len(text)
+
+
+def _map_links(size: int):
+    from text_utils import map_links_ru
+
+    text = corpora.model_answer(size)
+    return (lambda: map_links_ru(text)), len(text)
+
+
+def _extract(size: int):
+    from openai_adapter import extract_response_text
+
+    responses = corpora.sdk_responses(size)
+    return (lambda: [extract_response_text(response) for response in responses]), size
+
+
+CASES: List[Case] = [
+    Case("pdf.make_pdf", _pdf, "paragraphs", 2000, 100, 10, 3),
+    Case("excel.make_excel", _excel, "rows", 50_000, 2_000, 3, 2),
+    Case("excel.make_excel_file", _excel_file, "rows", 50_000, 2_000, 3, 2),
+    Case("pptx.make_pptx", _pptx, "slides", 300, 20, 10, 3),
+    Case("image.normalize_image", _normalize_image, "images", 1920, 640, 10, 3),
+    Case("text.sanitize_for_telegram", _sanitize, "chars", 400, 40, 2000, 200),
+    Case("text.map_links_ru", _map_links, "chars", 400, 40, 2000, 200),
+    Case("openai.extract_response_text", _extract, "responses", 300, 30, 300, 30),
+]
+
+
+def run_case(case: Case, *, quick: bool) -> Dict[str, float]:
+    """Замер одного случая в текущем процессе."""
+
+    size = case.quick_size if quick else case.size
+    iterations = case.quick_iterations if quick else case.iterations
+    fn, units = case.build(size)
+    rss_before = peak_rss_kb()
+    stats = measure_latency(fn, iterations=iterations, warmup=max(1, iterations // 10))
+    stats["rss_peak_mb"] = peak_rss_kb() / 1024
+    stats["rss_growth_mb"] = (peak_rss_kb() - rss_before) / 1024
+    stats["traced_peak_mb"] = traced_peak_kb(fn) / 1024
+    stats["size"] = float(size)
+    stats["units_per_op"] = float(units)
+    stats["units_per_sec"] = units * stats["ops_per_sec"]
+    return stats
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _meta(quick: bool) -> Dict[str, object]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "quick": quick,
+        "seed": corpora.SEED,
+    }
+
+
+def _print_results(results: Dict[str, Dict[str, float]]) -> None:
+    units = {case.name: case.unit for case in CASES}
+    width = max((len(name) for name in results), default=10)
+    print(f"\n{'case':<{width}}  {'ops/s':>10}  {'units/s':>20}  {'p50 ms':>9}  {'p90 ms':>9}  {'p99 ms':>9}  "
+          f"{'traced MB':>9}  {'RSS MB':>7}")
+    print("-" * (width + 95))
+    for name, stats in results.items():
+        rate = f"{stats['units_per_sec']:,.0f} {units.get(name, '')}"
+        print(
+            f"{name:<{width}}  {stats['ops_per_sec']:>10,.1f}  {rate:>20}  {stats['p50_us'] / 1e3:>9.2f}  "
+            f"{stats['p90_us'] / 1e3:>9.2f}  {stats['p99_us'] / 1e3:>9.2f}  {stats['traced_peak_mb']:>9.1f}  "
+            f"{stats['rss_peak_mb']:>7.0f}"
+        )
+
+
+def _print_comparison(old: Dict[str, Dict[str, float]], new: Dict[str, Dict[str, float]]) -> None:
+    """Изменение относительно старого прогона: > 1 — быстрее (ops/s) или больше (память)."""
+
+    print(f"\n{'case':<32}  {'ops/s':>8}  {'p99':>8}  {'traced':>8}  {'RSS':>8}")
+    for name, stats in new.items():
+        before = old.get(name)
+        if before is None:
+            print(f"{name:<32}  {'new':>8}")
+            continue
+        if before.get("size") != stats.get("size"):
+            print(f"{name:<32}  размер корпуса изменился, не сравнивается")
+            continue
+        ratios = [
+            stats["ops_per_sec"] / before["ops_per_sec"] if before["ops_per_sec"] else 0.0,
+            stats["p99_us"] / before["p99_us"] if before["p99_us"] else 0.0,
+            stats["traced_peak_mb"] / before["traced_peak_mb"] if before["traced_peak_mb"] else 0.0,
+            stats["rss_peak_mb"] / before["rss_peak_mb"] if before["rss_peak_mb"] else 0.0,
+        ]
+        print(f"{name:<32}  " + "  ".join(f"x{ratio:>7.2f}" for ratio in ratios))
+
+
+def _selected(only: Optional[str]) -> List[Case]:
+    if not only:
+        return CASES
+    prefixes = [prefix.strip() for prefix in only.split(",") if prefix.strip()]
+    cases = [case for case in CASES if any(case.name.startswith(prefix) for prefix in prefixes)]
+    if not cases:
+        raise SystemExit(f"нет случаев для --only {only!r}; есть: {', '.join(case.name for case in CASES)}")
+    return cases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="маленькие корпуса и мало итераций (проверка набора)")
+    parser.add_argument("--only", help="случаи через запятую (по началу имени: pdf, text, excel.make_excel)")
+    parser.add_argument("--output", help=f"файл JSON (по умолчанию {_RESULTS_DIR}/<время>.json)")
+    parser.add_argument("--compare", help="JSON прежнего прогона для сравнения")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        # дочерний процесс: один случай, JSON последней строкой
+        case = next(case for case in CASES if case.name == args.case)
+        print(json.dumps(run_case(case, quick=args.quick)))
+        return
+
+    results: Dict[str, Dict[str, float]] = {}
+    for case in _selected(args.only):
+        started = time.perf_counter()
+        child_args = ["--case", case.name] + (["--quick"] if args.quick else [])
+        with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+            try:
+                results[case.name] = run_isolated("benchmarks.suite", child_args, cwd=tmp)
+            except subprocess.CalledProcessError as exc:
+                print(f"{case.name}: ошибка\n{exc.stderr}", file=sys.stderr)
+                continue
+        print(f"{case.name}: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+    _print_results(results)
+
+    output = args.output or os.path.join(_RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump({"meta": _meta(args.quick), "results": results}, fh, ensure_ascii=False, indent=2)
+    print(f"\nрезультаты: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            _print_comparison(json.load(fh)["results"], results)
+
+
+if __name__ == "__main__":
+    main()
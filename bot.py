@@ -1,7 +1,5 @@
 import logging
-import re
 import sys
-import threading
 import time
 import traceback
 from contextlib import suppress
@@ -9,54 +7,30 @@ from pathlib import Path
 from threading import Lock
 
 from storage import (
-    init_db,
+    archive_stale_histories,
+    format_redis_status,
     clear_history,
-    iter_history_chat_ids,
     load_history,
+    load_language,
     save_history,
-    r,
-    TTL,
+    save_language,
 )
 from telebot import types
-from telebot.apihelper import ApiTelegramException
 
-# Ensure media handlers are registered
-import media
-from media import multimedia_menu
-
-# Register web search handlers (command /web)
-import handlers.web  # noqa: F401 - регистрация хендлеров через импорт
+from media import format_image_stats, multimedia_menu
+from worker_media import format_media_stats
+from subscription import CHANNEL_CHAT_ID, ensure_subscription, send_subscription_prompt
 
 from internet import ask_gpt_web, should_escalate_to_web, should_prefer_web
 
 from bot_utils import show_typing
 
-# --- RU-only links mapping: ONLY for final user-visible text (do not touch SDK objects) ---
-def map_links_ru(text):
-    """
-    Безопасная фильтрация ссылок: оставляем российские домены,
-    заменяем зарубежные на доступные для РФ источники.
-    """
-    if not isinstance(text, str) or "http" not in text:
-        return text
-    rules = [
-        (r'https?://(?:www\.)?weather\.com[^\s)]+', 'https://yandex.ru/pogoda'),
-        (r'https?://(?:en\.)?wikipedia\.org[^\s)]+', 'https://ru.wikipedia.org'),
-        (r'https?://(?:www\.)?google\.com[^\s)]+',  'https://yandex.ru'),
-        (r'https?://(?:www\.)?bbc\.com[^\s)]+',     'https://tass.ru'),
-        (r'https?://(?:www\.)?cnn\.com[^\s)]+',     'https://ria.ru'),
-    ]
-    for pat, repl in rules:
-        text = re.sub(pat, repl, text, flags=re.IGNORECASE)
-    return text
-
 # --- Конфиг: значения централизованы в settings.py ---
 from settings import (
     bot,
     client,
     CHAT_MODEL,
     HISTORY_LIMIT,
-    OWNER_ID,
     is_owner,
     SYSTEM_PROMPT,
 )
@@ -64,31 +38,33 @@ from openai_adapter import (
     extract_response_text,
     prepare_responses_input,
 )
-from text_utils import sanitize_for_telegram, sanitize_model_output
-
-# Регистрация команд автопостинга
-import auto_post  # noqa: F401 - регистрация хендлеров автопостинга при импорте
+from text_utils import map_links_ru, sanitize_for_telegram, sanitize_model_output
 
 from usage_tracker import (
     compose_display_name,
     format_usage_report,
     format_user_stats,
-    init_usage_tracking,
     record_user_activity,
 )
 
-# Initialize the SQLite storage before handling any requests
-init_db()
-init_usage_tracking()
-
 # --- Логирование с записью в файл ---
 LOG_FILE = Path(__file__).resolve().parent / "gpsbot.log"
+STREAM_LOG_DIR = Path("/root/SynteraGPT/logs")
 
-logging.basicConfig(
-    filename=str(LOG_FILE),
-    level=logging.ERROR,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+
+def configure_logging() -> None:
+    """Настроить файлы логов; вызывается один раз из ``app.create_app``."""
+    logging.basicConfig(
+        filename=str(LOG_FILE),
+        level=logging.ERROR,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    _logger.setLevel(logging.INFO)
+    STREAM_LOG_DIR.mkdir(parents=True, exist_ok=True)
+    # настроим простой file handler (по желанию)
+    fh = logging.FileHandler(STREAM_LOG_DIR / "stream_gpt.log")
+    fh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    _logger.addHandler(fh)
 
 
 def log_exception(exc: Exception) -> None:
@@ -100,13 +76,7 @@ def log_exception(exc: Exception) -> None:
     sys.stdout.flush()
 
 
-# --- Константы подписки ---
-CHANNEL_USERNAME = "AI Systems"
-CHANNEL_LINK = "https://t.me/SynteraAI"
-CHANNEL_CHAT_ID = "@SynteraAI"
-GROUP_NAME = "Hubconsult"
-GROUP_LINK = "https://t.me/HubConsult"
-GROUP_CHAT_ID = "@HubConsult"
+# --- Стартовое окно ---
 BOT_DEEP_LINK = "https://t.me/SynteraGPT_bot"
 PHOTO_FILE = Path(__file__).resolve().parent / "baner_dlya_perehoda.png"
 START_CAPTION = (
@@ -121,72 +91,6 @@ START_CAPTION = (
     "Перед использованием подпишись на канал AI Systems и вступи в сообщество Hubconsult."
 )
 
-REQUIRED_CHATS = (
-    {"id": CHANNEL_CHAT_ID, "title": CHANNEL_USERNAME, "link": CHANNEL_LINK},
-    {"id": GROUP_CHAT_ID, "title": GROUP_NAME, "link": GROUP_LINK},
-)
-SUBSCRIPTION_PROMPT_COOLDOWN = 30
-_subscription_prompted: dict[int, float] = {}
-
-SUBSCRIPTION_MESSAGE = (
-    "<b>Доступ к SynteraGPT</b>\n\n"
-    "Перед использованием подпишись на канал AI Systems и вступи в группу Hubconsult. "
-    "После подписки нажми \"Проверить подписку\"."
-)
-
-
-def _fetch_subscription_status(user_id: int) -> bool:
-    for chat in REQUIRED_CHATS:
-        try:
-            member = bot.get_chat_member(chat["id"], user_id)
-        except ApiTelegramException:
-            return False
-
-        status = getattr(member, "status", None)
-        if status not in {"creator", "administrator", "member", "owner"}:
-            return False
-
-    return True
-
-
-def _send_subscription_prompt(chat_id: int, *, force: bool = False) -> None:
-    now = time.time()
-    last_prompt = _subscription_prompted.get(chat_id, 0)
-    if not force and now - last_prompt < SUBSCRIPTION_PROMPT_COOLDOWN:
-        return
-
-    _subscription_prompted[chat_id] = now
-
-    kb = types.InlineKeyboardMarkup(row_width=1)
-    for chat in REQUIRED_CHATS:
-        kb.add(
-            types.InlineKeyboardButton(
-                f"Подписаться: {chat['title']}",
-                url=chat["link"],
-            )
-        )
-
-    kb.add(types.InlineKeyboardButton("🔄 Проверить подписку", callback_data="check_subscription"))
-
-    bot.send_message(chat_id, SUBSCRIPTION_MESSAGE, parse_mode="HTML", reply_markup=kb)
-
-
-def ensure_subscription(chat_id: int, user_id: int | None = None, *, notify: bool = True) -> bool:
-    uid = user_id or chat_id
-
-    if is_owner(uid):
-        return True
-
-    status = _fetch_subscription_status(uid)
-
-    if status:
-        _subscription_prompted.pop(chat_id, None)
-        return True
-
-    if notify:
-        _send_subscription_prompt(chat_id, force=True)
-    return False
-
 
 def _display_name_from_user(user) -> str:
     if user is None:
@@ -244,7 +148,6 @@ def send_start_window(chat_id) -> None:
 
 
 # --- /media
-@bot.message_handler(commands=["media"])
 def cmd_media(m):
     if not ensure_subscription(m.chat.id, getattr(m.from_user, "id", None)):
         return
@@ -256,7 +159,6 @@ def cmd_media(m):
 
 
 # --- /profile
-@bot.message_handler(commands=["profile"])
 def cmd_profile(m):
     if not ensure_subscription(m.chat.id, getattr(m.from_user, "id", None)):
         return
@@ -299,12 +201,10 @@ def main_menu():
     return kb
 
 
-@bot.message_handler(func=lambda m: m.text == "Профиль")
 def show_profile(m):
     cmd_profile(m)
 
 
-@bot.message_handler(func=lambda m: m.text == "Медиа")
 def show_media(m):
     cmd_media(m)
 
@@ -312,18 +212,12 @@ def show_media(m):
 
 
 def set_language(chat_id: int, lang: str) -> None:
-    try:
-        r.set(f"lang:{chat_id}", lang, ex=TTL)
-    except Exception:
-        pass
+    save_language(chat_id, lang)
     _language_cache[chat_id] = lang
 
 
 def get_language(chat_id: int) -> str:
-    try:
-        lang = r.get(f"lang:{chat_id}")
-    except Exception:
-        lang = None
+    lang = load_language(chat_id)
 
     if lang:
         if isinstance(lang, bytes):
@@ -385,12 +279,6 @@ CONTEXT_MESSAGES = 4
 # Статический словарь блокировок по chat_id — предотвращает параллельные стримы в одном чате.
 _chat_locks: dict[int, Lock] = {}
 _logger = logging.getLogger("synteragpt.stream")
-_logger.setLevel(logging.INFO)
-Path("/root/SynteraGPT/logs").mkdir(parents=True, exist_ok=True)
-# настроим простой file handler (по желанию)
-fh = logging.FileHandler("/root/SynteraGPT/logs/stream_gpt.log")
-fh.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
-_logger.addHandler(fh)
 
 
 
@@ -612,14 +500,12 @@ def stream_gpt_answer(
             lock.release()
 
 # --- Хэндлеры ---
-@bot.message_handler(commands=["start"])
 def start(m):
     if not ensure_subscription(m.chat.id, getattr(m.from_user, "id", None)):
         return
     send_welcome_menu(m.chat.id)
 
 
-@bot.message_handler(commands=["publish"])
 def publish(m):
     if not is_owner(m.from_user.id):
         bot.reply_to(m, "❌ У вас нет прав для публикации стартового окна.")
@@ -637,7 +523,6 @@ def publish(m):
     )
 
 
-@bot.message_handler(func=lambda msg: msg.text == "Очистить")
 def cmd_clear(msg):
     if not ensure_subscription(msg.chat.id, getattr(msg.from_user, "id", None)):
         return
@@ -648,7 +533,6 @@ def cmd_clear(msg):
     send_and_store(msg.chat.id, "🧹 История диалога очищена", reply_markup=main_menu())
 
 
-@bot.message_handler(func=lambda msg: msg.text and msg.text.startswith("Lang"))
 def cmd_language(msg):
     if not ensure_subscription(msg.chat.id, getattr(msg.from_user, "id", None)):
         return
@@ -660,7 +544,6 @@ def cmd_language(msg):
     bot.send_message(msg.chat.id, "🌐 Choose your language:", reply_markup=kb)
 
 
-@bot.callback_query_handler(func=lambda call: call.data == "check_subscription")
 def on_subscription_check(call):
     subscribed = ensure_subscription(
         call.message.chat.id,
@@ -676,10 +559,9 @@ def on_subscription_check(call):
             "⚠️ Подписка не найдена. Проверьте, что вы подписаны на оба сообщества.",
             show_alert=False,
         )
-        _send_subscription_prompt(call.message.chat.id, force=True)
+        send_subscription_prompt(call.message.chat.id, force=True)
 
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("lang_"))
 def on_language_change(call):
     if not ensure_subscription(call.message.chat.id, getattr(call.from_user, "id", None)):
         bot.answer_callback_query(call.id, "Сначала подпишитесь на канал и группу")
@@ -693,7 +575,6 @@ def on_language_change(call):
     send_and_store(call.message.chat.id, f"✅ Now I will talk in {chosen}", reply_markup=main_menu())
 
 
-@bot.message_handler(commands=["top_users"])
 def show_top_users(m):
     if not is_owner(getattr(m.from_user, "id", 0)):
         bot.reply_to(m, "⛔ Команда доступна только владельцу.")
@@ -702,11 +583,13 @@ def show_top_users(m):
     if not ensure_subscription(m.chat.id, getattr(m.from_user, "id", None)):
         return
 
-    report = format_usage_report()
+    # /top_users [total|text|image|doc]
+    parts = (m.text or "").split(maxsplit=1)
+    category = parts[1].strip().lower() if len(parts) > 1 else "total"
+    report = format_usage_report(category=category)
     bot.send_message(m.chat.id, report, parse_mode="HTML")
 
 
-@bot.message_handler(commands=["user_stats"])
 def show_user_stats(m):
     if not is_owner(getattr(m.from_user, "id", 0)):
         bot.reply_to(m, "⛔ Команда доступна только владельцу.")
@@ -740,6 +623,26 @@ def show_user_stats(m):
     report = format_user_stats(target_id, hint_name)
     bot.send_message(m.chat.id, report, parse_mode="HTML")
 
+
+def show_redis_stats(m):
+    if not is_owner(getattr(m.from_user, "id", 0)):
+        bot.reply_to(m, "⛔ Команда доступна только владельцу.")
+        return
+
+    bot.send_message(m.chat.id, format_redis_status(), parse_mode="HTML")
+
+
+def show_media_stats(m):
+    if not is_owner(getattr(m.from_user, "id", 0)):
+        bot.reply_to(m, "⛔ Команда доступна только владельцу.")
+        return
+
+    report = format_media_stats()
+    images = format_image_stats()
+    if images:
+        report += "\n" + images
+    bot.send_message(m.chat.id, report, parse_mode="HTML")
+
 # --- Фоновая проверка окончаний подписок и очистка истории ---
 def background_checker():
     counter = 1
@@ -755,17 +658,16 @@ def background_checker():
                     except Exception:
                         pass
             user_messages.clear()
-            for chat_id in iter_history_chat_ids():
-                clear_history(chat_id)
-            print("🧹 История всех пользователей и сообщения очищены")
+            # Горячие истории целиком уходят в архив и вернутся, когда пользователь напишет снова
+            moved = archive_stale_histories(max_age_hours=0)
+            print(f"🧹 Сообщения очищены, историй перенесено в архив: {moved}")
+        else:
+            archive_stale_histories()
 
         counter += 1
         time.sleep(86400)  # раз в сутки
 
 # --- fallback — если текст не совпал с меню, отправляем в GPT ---
-@bot.message_handler(
-    func=lambda msg: bool(getattr(msg, "text", "")) and not msg.text.startswith("/")
-)
 def fallback(m):
     if not ensure_subscription(m.chat.id, getattr(m.from_user, "id", None)):
         return
@@ -786,23 +688,33 @@ def fallback(m):
         allow_web_fallback=not prefer_web,
     )
 
-# --- Запуск ---
-if __name__ == "__main__":
-    from worker_media import start_media_worker
-
-    start_media_worker()
-    threading.Thread(target=background_checker, daemon=True).start()
-
-    while True:
-        try:
-            bot.polling(
-                none_stop=True,
-                timeout=60,
-                long_polling_timeout=60,
-                skip_pending=True,
-            )
-        except Exception as exc:  # noqa: BLE001 - хотим логировать любые сбои
-            log_exception(exc)
+# --- Регистрация хендлеров ---
+def register(bot) -> None:
+    """Подключить команды и меню чата; порядок важен — ``fallback`` последним."""
+    bot.register_message_handler(cmd_media, commands=["media"])
+    bot.register_message_handler(cmd_profile, commands=["profile"])
+    bot.register_message_handler(show_profile, func=lambda m: m.text == "Профиль")
+    bot.register_message_handler(show_media, func=lambda m: m.text == "Медиа")
+    bot.register_message_handler(start, commands=["start"])
+    bot.register_message_handler(publish, commands=["publish"])
+    bot.register_message_handler(cmd_clear, func=lambda msg: msg.text == "Очистить")
+    bot.register_message_handler(cmd_language, func=lambda msg: msg.text and msg.text.startswith("Lang"))
+    bot.register_callback_query_handler(on_subscription_check, func=lambda call: call.data == "check_subscription")
+    bot.register_callback_query_handler(on_language_change, func=lambda call: call.data.startswith("lang_"))
+    bot.register_message_handler(show_top_users, commands=["top_users"])
+    bot.register_message_handler(show_user_stats, commands=["user_stats"])
+    bot.register_message_handler(show_redis_stats, commands=["redis_stats"])
+    bot.register_message_handler(show_media_stats, commands=["media_stats"])
+    bot.register_message_handler(
+        fallback,
+        func=lambda msg: bool(getattr(msg, "text", "")) and not msg.text.startswith("/"),
+    )
 
 
+# --- Запуск ---
+if __name__ == "__main__":
+    # ``python bot.py``: модуль доступен как ``bot``, и фабрика не импортирует этот файл второй раз
+    sys.modules.setdefault("bot", sys.modules[__name__])
+    from app import main
 
+    main()
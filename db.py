@@ -0,0 +1,165 @@
+"""Общий слой доступа к SQLite для storage и usage_tracker.
+
+Каждый поток получает собственное постоянное соединение (``sqlite3`` не
+разрешает делить соединение между потоками без внешней блокировки), база
+переводится в WAL, чтобы писатели не блокировали читателей, а повторные
+запросы используют кэш подготовленных выражений соединения.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+# Имя файла базы (создастся автоматически при первом запуске)
+DB_PATH = "users.db"
+
+_BUSY_TIMEOUT_SEC = 5.0
+_LOCK_RETRIES = 5
+_STATEMENT_CACHE_SIZE = 256
+
+
+class Database:
+    """Пул постоянных соединений SQLite по одному на поток."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        busy_timeout: float = _BUSY_TIMEOUT_SEC,
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 8192,
+    ) -> None:
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self.cache_size_kib = cache_size_kib
+        self._local = threading.local()
+        self._registry_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    # --- соединения ---
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # транзакциями управляем сами
+            cached_statements=_STATEMENT_CACHE_SIZE,
+        )
+        if self.path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        with self._registry_lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        """Вернуть соединение текущего потока, открыв его при первом обращении."""
+
+        local = self._local
+        conn = getattr(local, "conn", None)
+        # После fork соединение родителя использовать нельзя
+        if conn is None or getattr(local, "pid", None) != os.getpid():
+            conn = self._open()
+            local.conn = conn
+            local.pid = os.getpid()
+            local.depth = 0
+        return conn
+
+    def close(self) -> None:
+        """Закрыть соединение текущего потока."""
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._registry_lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close_all(self) -> None:
+        """Закрыть все соединения, открытые этим объектом (например, при остановке)."""
+
+        with self._registry_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    # --- запросы ---
+
+    def _run(self, method: str, sql: str, params: Any) -> sqlite3.Cursor:
+        conn = self.connection()
+        if method == "executemany" and not isinstance(params, (list, tuple)):
+            # генератор строк при повторе был бы уже прочитан
+            params = list(params)
+        delay = 0.01
+        for attempt in range(_LOCK_RETRIES):
+            try:
+                return getattr(conn, method)(sql, params)
+            except sqlite3.OperationalError as exc:
+                # busy_timeout уже подождал; внутри транзакции повтор бессмысленен
+                locked = "locked" in str(exc) or "busy" in str(exc)
+                if not locked or conn.in_transaction or attempt == _LOCK_RETRIES - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        raise sqlite3.OperationalError("database is locked")  # pragma: no cover
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self._run("execute", sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        return self._run("executemany", sql, rows)
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[tuple]:
+        return self.execute(sql, params).fetchone()
+
+    def query_all(self, sql: str, params: Sequence[Any] = ()) -> List[tuple]:
+        return self.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self, *, immediate: bool = True) -> Iterator[sqlite3.Connection]:
+        """Выполнить блок в одной транзакции; вложенные вызовы присоединяются к внешней.
+
+        ``BEGIN IMMEDIATE`` сразу берёт блокировку записи, поэтому
+        конкурирующие писатели ждут на старте, а не падают посреди блока.
+        """
+
+        conn = self.connection()
+        local = self._local
+        if local.depth:
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        self._run("execute", "BEGIN IMMEDIATE" if immediate else "BEGIN", ())
+        local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            local.depth = 0
+            conn.rollback()
+            raise
+        else:
+            local.depth = 0
+            conn.commit()
+
+
+database = Database(DB_PATH)
+
+__all__ = ["DB_PATH", "Database", "database"]
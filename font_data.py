@@ -1,4 +1,3 @@
-import base64
 import os
 
 FONT_BASE64 = """
@@ -9,9 +8,7 @@ FONT_DIR = "fonts"
 FONT_PATH = os.path.join(FONT_DIR, "DejaVuSans.ttf")
 
 def ensure_font():
-    """Creates fonts/DejaVuSans.ttf from base64 if not present."""
-    os.makedirs(FONT_DIR, exist_ok=True)
-    if not os.path.exists(FONT_PATH):
-        with open(FONT_PATH, "wb") as f:
-            f.write(base64.b64decode(FONT_BASE64))
-    return FONT_PATH
+    """Creates fonts/DejaVuSans.ttf from base64 if not present (see font_registry)."""
+    from font_registry import materialize_font
+
+    return materialize_font(FONT_PATH)
@@ -0,0 +1,120 @@
+"""Шрифт DejaVu для документов: один файл на диске, одна регистрация на процесс.
+
+Файл ``fonts/DejaVuSans.ttf`` собирается из ``font_data`` только если его ещё
+нет (или он обрезан): запись идёт во временный файл и атомарно заменяет
+целевой через ``os.replace``, так что параллельные воркеры не увидят
+недописанный шрифт. После сборки модуль ``font_data`` выгружается — base64-
+строка (~1 МБ) больше не держится в памяти процесса.
+
+``register_font()`` разбирает TTF и регистрирует его в reportlab один раз;
+повторные вызовы бесплатны. Остальным модулям шрифт доступен через
+``font_buffer()`` — общее для всех процессов отображение файла (mmap) только
+для чтения.
+"""
+from __future__ import annotations
+
+import base64
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from typing import Optional
+
+FONT_NAME = "DejaVu"
+FONT_DIR = "fonts"
+FONT_PATH = os.path.join(FONT_DIR, "DejaVuSans.ttf")
+
+_lock = threading.Lock()
+_registered_path: Optional[str] = None
+_buffer: Optional[mmap.mmap] = None
+_buffer_path: Optional[str] = None
+
+_SFNT_VERSIONS = {b"\x00\x01\x00\x00", b"true", b"OTTO"}
+
+
+def _is_complete_font(path: str) -> bool:
+    """Проверить, что таблицы TTF из заголовка целиком помещаются в файл."""
+
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as fh:
+            header = fh.read(12)
+            if len(header) < 12 or header[:4] not in _SFNT_VERSIONS:
+                return False
+            (num_tables,) = struct.unpack(">H", header[4:6])
+            directory = fh.read(16 * num_tables)
+    except OSError:
+        return False
+    if num_tables == 0 or len(directory) < 16 * num_tables:
+        return False
+    for index in range(num_tables):
+        offset, length = struct.unpack_from(">II", directory, index * 16 + 8)
+        if offset + length > size:
+            return False
+    return True
+
+
+def _decode_embedded_font() -> bytes:
+    from font_data import FONT_BASE64
+
+    data = base64.b64decode(FONT_BASE64)
+    # Строка нужна один раз: отпускаем модуль, чтобы память вернулась
+    sys.modules.pop("font_data", None)
+    return data
+
+
+def materialize_font(path: str = FONT_PATH) -> str:
+    """Убедиться, что файл шрифта есть и цел; создать его атомарно, если нет."""
+
+    if _is_complete_font(path):
+        return path
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    data = _decode_embedded_font()
+    fd, tmp_path = tempfile.mkstemp(prefix=".font-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+def register_font(path: str = FONT_PATH) -> str:
+    """Зарегистрировать шрифт в reportlab (один раз на процесс) и вернуть его имя."""
+
+    global _registered_path
+    if _registered_path == path:
+        return FONT_NAME
+    with _lock:
+        if _registered_path != path:
+            from reportlab.pdfbase import pdfmetrics
+            from reportlab.pdfbase.ttfonts import TTFont
+
+            pdfmetrics.registerFont(TTFont(FONT_NAME, materialize_font(path)))
+            _registered_path = path
+    return FONT_NAME
+
+
+def font_buffer(path: str = FONT_PATH) -> mmap.mmap:
+    """Файл шрифта, отображённый в память только для чтения (страницы общие с другими процессами)."""
+
+    global _buffer, _buffer_path
+    with _lock:
+        if _buffer is None or _buffer_path != path:
+            with open(materialize_font(path), "rb") as fh:
+                buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            if _buffer is not None:
+                _buffer.close()
+            _buffer, _buffer_path = buffer, path
+        return _buffer
+
+
+__all__ = ["FONT_NAME", "FONT_PATH", "font_buffer", "materialize_font", "register_font"]
@@ -1,6 +1,7 @@
 from bot_utils import show_typing
 from internet import ask_gpt_web
 from settings import bot
+from subscription import ensure_subscription
 from telebot import util as telebot_util
 
 from usage_tracker import compose_display_name, record_user_activity
@@ -17,13 +18,10 @@ def _sanitize_answer(text: str) -> str:
 
 
 def _ensure_subscription(message) -> bool:
-    from bot import ensure_subscription
-
     user_id = getattr(message.from_user, "id", None)
     return ensure_subscription(message.chat.id, user_id)
 
 
-@bot.message_handler(commands=["web"])
 def cmd_web(m):
     if not _ensure_subscription(m):
         return
@@ -31,7 +29,6 @@ def cmd_web(m):
     bot.send_message(m.chat.id, "🔎 Что найти в интернете? Напиши запрос одной строкой.")
 
 
-@bot.message_handler(func=lambda msg: _web_mode.get(msg.chat.id) is True)
 def handle_web_query(m):
     if not _ensure_subscription(m):
         _web_mode.pop(m.chat.id, None)
@@ -68,3 +65,9 @@ def handle_web_query(m):
 
     bot.send_message(m.chat.id, _sanitize_answer(answer), parse_mode="HTML")
     _web_mode.pop(m.chat.id, None)
+
+
+def register(bot) -> None:
+    """Подключить команду /web и обработку поискового запроса."""
+    bot.register_message_handler(cmd_web, commands=["web"])
+    bot.register_message_handler(handle_web_query, func=lambda msg: _web_mode.get(msg.chat.id) is True)
@@ -0,0 +1,285 @@
+"""Холодный архив историй диалогов на диске.
+
+Истории, которые давно не обновлялись, уходят из горячего хранилища в
+сегментные файлы только на добавление. Каждая запись — сжатый zlib
+JSON-снимок истории («фрагмент»); архив чата — последовательность
+фрагментов в порядке архивации. Индекс ``chat_id → фрагменты`` строится
+при открытии по заголовкам записей, а сами данные читаются через ``mmap``
+только когда пользователь возвращается.
+
+Возврат пользователя «поднимает» последний фрагмент обратно в горячее
+хранилище и помечает его снятым, поэтому при следующей архивации снимок
+не дублирует уже сохранённые сообщения.
+
+Снятые и удалённые фрагменты остаются в сегментах мёртвыми байтами;
+:meth:`HistoryArchive.maybe_compact` переписывает архив, когда их доля
+превышает ``compact_ratio``.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+_PUT = 1  # новый фрагмент
+_POP = 2  # снять последний фрагмент (поднят в горячее хранилище)
+_DROP = 3  # удалить весь архив чата
+# op, chat_id, archived_at, длина сжатых данных, crc32 данных
+_HEADER = struct.Struct("<BqdII")
+_SEGMENT_RE = re.compile(r"^seg-(\d{6})\.log$")
+
+# (номер сегмента, смещение данных, длина, archived_at)
+_ChunkRef = Tuple[int, int, int, float]
+
+
+class HistoryArchive:
+    """Сегментный архив со сжатием и чтением через mmap."""
+
+    def __init__(
+        self,
+        directory: str,
+        *,
+        segment_bytes: int = 64 * 1024 * 1024,
+        level: int = 6,
+        compact_ratio: float = 0.5,
+        compact_min_bytes: int = 1 << 20,
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.level = level
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.RLock()
+        self._opened = False
+        self._index: Dict[int, List[_ChunkRef]] = {}
+        self._maps: Dict[int, mmap.mmap] = {}
+        self._sizes: Dict[int, int] = {}
+        self._active = 0
+        self._fd = -1
+        self._dead_bytes = 0
+        self.stats = {"archived": 0, "restored": 0, "raw_bytes": 0, "stored_bytes": 0}
+
+    # --- сегменты ---
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f"seg-{number:06d}.log")
+
+    def _segments(self) -> List[int]:
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def _ensure_open(self) -> None:
+        # Каталог и индекс создаются при первом обращении, а не при импорте
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segments()
+        for number in segments:
+            self._scan(number)
+        self._active = segments[-1] if segments else 1
+        self._open_active()
+        self._opened = True
+
+    def _open_active(self) -> None:
+        self._fd = os.open(self._segment_path(self._active), os.O_RDWR | os.O_CREAT, 0o600)
+        self._sizes[self._active] = os.fstat(self._fd).st_size
+
+    def _map(self, number: int, end: int) -> mmap.mmap:
+        mm = self._maps.get(number)
+        if mm is None or len(mm) < end:
+            if mm is not None:
+                mm.close()
+            with open(self._segment_path(number), "rb") as fh:
+                mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[number] = mm
+        return mm
+
+    def _scan(self, number: int) -> None:
+        path = self._segment_path(number)
+        size = os.path.getsize(path)
+        self._sizes[number] = size
+        if not size:
+            return
+        mm = self._map(number, size)
+        offset = 0
+        while offset + _HEADER.size <= size:
+            op, chat_id, archived_at, length, crc = _HEADER.unpack_from(mm, offset)
+            start = offset + _HEADER.size
+            if op not in (_PUT, _POP, _DROP) or start + length > size:
+                break
+            if op == _PUT:
+                if zlib.crc32(mm[start:start + length]) != crc:
+                    break
+                self._index.setdefault(chat_id, []).append((number, start, length, archived_at))
+            elif op == _POP:
+                chunks = self._index.get(chat_id)
+                if chunks:
+                    self._dead_bytes += _HEADER.size + chunks.pop()[2]
+                    if not chunks:
+                        del self._index[chat_id]
+            else:
+                self._dead_bytes += self._chunk_bytes(self._index.pop(chat_id, []))
+            if op != _PUT:
+                self._dead_bytes += _HEADER.size
+            offset = start + length
+        if offset < size:
+            # Недописанная запись после аварии: обрезаем хвост
+            mm.close()
+            self._maps.pop(number, None)
+            with open(path, "r+b") as fh:
+                fh.truncate(offset)
+            self._sizes[number] = offset
+
+    def _write(self, op: int, chat_id: int, data: bytes = b"", archived_at: Optional[float] = None) -> Tuple[int, int]:
+        size = self._sizes[self._active]
+        if op == _PUT and size and size + _HEADER.size + len(data) > self.segment_bytes:
+            os.close(self._fd)
+            self._active += 1
+            self._open_active()
+            size = 0
+        if archived_at is None:
+            archived_at = time.time()
+        record = _HEADER.pack(op, chat_id, archived_at, len(data), zlib.crc32(data)) + data
+        os.pwrite(self._fd, record, size)
+        self._sizes[self._active] = size + len(record)
+        return self._active, size + _HEADER.size
+
+    @staticmethod
+    def _chunk_bytes(refs: List[_ChunkRef]) -> int:
+        return sum(_HEADER.size + ref[2] for ref in refs)
+
+    def _read(self, ref: _ChunkRef) -> List[Dict[str, Any]]:
+        number, offset, length, _ = ref
+        data = self._map(number, offset + length)[offset:offset + length]
+        return json.loads(zlib.decompress(data))
+
+    # --- API ---
+
+    def append(self, chat_id: int, payload: str) -> None:
+        """Добавить снимок истории (сериализованный JSON) как новый фрагмент."""
+
+        raw = payload.encode("utf-8")
+        data = zlib.compress(raw, self.level)
+        archived_at = time.time()
+        with self._lock:
+            self._ensure_open()
+            number, offset = self._write(_PUT, chat_id, data, archived_at)
+            self._index.setdefault(chat_id, []).append((number, offset, len(data), archived_at))
+            self.stats["archived"] += 1
+            self.stats["raw_bytes"] += len(raw)
+            self.stats["stored_bytes"] += len(data)
+
+    def latest(self, chat_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Последний фрагмент архива или None."""
+
+        with self._lock:
+            self._ensure_open()
+            chunks = self._index.get(chat_id)
+            if not chunks:
+                return None
+            return self._read(chunks[-1])
+
+    def pop(self, chat_id: int) -> None:
+        """Снять последний фрагмент после того, как он поднят в горячее хранилище."""
+
+        with self._lock:
+            self._ensure_open()
+            chunks = self._index.get(chat_id)
+            if not chunks:
+                return
+            self._write(_POP, chat_id)
+            self._dead_bytes += 2 * _HEADER.size + chunks.pop()[2]
+            if not chunks:
+                del self._index[chat_id]
+            self.stats["restored"] += 1
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock:
+            self._ensure_open()
+            refs = self._index.pop(chat_id, None)
+            if refs is not None:
+                self._write(_DROP, chat_id)
+                self._dead_bytes += _HEADER.size + self._chunk_bytes(refs)
+
+    def chat_ids(self) -> List[int]:
+        with self._lock:
+            self._ensure_open()
+            return list(self._index)
+
+    def __contains__(self, chat_id: int) -> bool:
+        with self._lock:
+            self._ensure_open()
+            return chat_id in self._index
+
+    @property
+    def dead_bytes(self) -> int:
+        with self._lock:
+            return self._dead_bytes
+
+    def maybe_compact(self) -> bool:
+        """Сжать архив, если мёртвые байты занимают больше ``compact_ratio`` сегментов."""
+
+        with self._lock:
+            self._ensure_open()
+            total = sum(self._sizes.values())
+            if self._dead_bytes < self.compact_min_bytes or self._dead_bytes <= total * self.compact_ratio:
+                return False
+            self.compact()
+            return True
+
+    def compact(self) -> None:
+        """Переписать живые фрагменты в новые сегменты и удалить старые файлы.
+
+        Время архивации фрагментов сохраняется, чтобы политики по возрасту
+        работали и после сжатия.
+        """
+
+        with self._lock:
+            self._ensure_open()
+            old_segments = self._segments()
+            live = {
+                chat_id: [(self._map(ref[0], ref[1] + ref[2])[ref[1]:ref[1] + ref[2]], ref[3]) for ref in refs]
+                for chat_id, refs in self._index.items()
+            }
+            os.close(self._fd)
+            self._active = (old_segments[-1] if old_segments else 0) + 1
+            self._open_active()
+            self._index = {}
+            for chat_id, chunks in live.items():
+                for data, archived_at in chunks:
+                    number, offset = self._write(_PUT, chat_id, data, archived_at)
+                    self._index.setdefault(chat_id, []).append((number, offset, len(data), archived_at))
+            os.fsync(self._fd)
+            for number in old_segments:
+                mm = self._maps.pop(number, None)
+                if mm is not None:
+                    mm.close()
+                self._sizes.pop(number, None)
+                os.unlink(self._segment_path(number))
+            self._dead_bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            for mm in self._maps.values():
+                mm.close()
+            self._maps.clear()
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+            self._opened = False
+            self._index = {}
+            self._sizes = {}
+            self._dead_bytes = 0
+
+
+__all__ = ["HistoryArchive"]
@@ -0,0 +1,262 @@
+"""Генерация картинок очередью: вне потока хендлера, с пределом и статусом для пользователя.
+
+Вызов ``images.generate`` идёт 30–60 секунд. В хендлере telebot он держал
+поток приёма апдейтов, а пользователь всё это время ничего не видел.
+:class:`ImageJobs` ставит запрос в :class:`media_engine.MediaEngine` (честный
+обход чатов, предел очереди) с пулом из ``workers`` потоков — запрос сетевой,
+процессы не нужны. Пользователь сразу получает статус: место в очереди и
+ожидание, затем «рисую»; пока картинка генерируется, в чате виден индикатор
+«отправляет фото». Готовая картинка уходит через :class:`media_upload.Uploader`
+(повторы, общая пауза на 429), после чего статус удаляется.
+
+Ожидание в очереди, время генерации и места в очереди при постановке — в
+:meth:`ImageJobs.stats`.
+"""
+from __future__ import annotations
+
+import io
+import threading
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+from media_engine import Admission, MediaEngine, MediaJob
+from media_upload import Document, Uploader
+
+KIND = "image"
+# Пока статистики нет, ожидание считается по этой длительности генерации
+_DEFAULT_SERVICE_SEC = 30.0
+_PROGRESS_INTERVAL = 4.0
+_POSITION_SAMPLES = 512
+
+
+@dataclass
+class ImageJob:
+    chat_id: int
+    prompt: str
+    # данные вызывающего (списание лимита, ключ кэша), возвращаются в on_done/on_failed
+    context: Any = None
+    status_id: Optional[int] = None
+    running: bool = False
+    # статус уже говорит «рисую»
+    announced: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+@dataclass
+class _Delivery(Document):
+    job: Optional[ImageJob] = None
+
+
+def _format_wait(seconds: float) -> str:
+    if seconds < 60:
+        return f"{max(1, round(seconds))} с"
+    return f"{round(seconds / 60)} мин"
+
+
+class ImageJobs:
+    """Очередь ``generate(prompt) -> bytes`` с отправкой результата в чат."""
+
+    def __init__(
+        self,
+        generate: Callable[[str], bytes],
+        *,
+        bot,
+        workers: int,
+        queue_limit: int,
+        per_chat_limit: int,
+        caption: str = "Готово ✅",
+        on_done: Optional[Callable[[ImageJob, object, bytes], None]] = None,
+        on_failed: Optional[Callable[[ImageJob, BaseException], None]] = None,
+        upload_attempts: int = 4,
+        progress_interval: float = _PROGRESS_INTERVAL,
+    ) -> None:
+        self._generate = generate
+        self._bot = bot
+        self._caption = caption
+        self._on_done = on_done
+        self._on_failed = on_failed
+        self._progress_interval = progress_interval
+        self._engine = MediaEngine(
+            self._run,
+            workers=workers,
+            queue_limit=queue_limit,
+            per_chat_limit=per_chat_limit,
+            executor_factory=lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="image-gen"),
+            on_error=self._on_error,
+            on_result=self._on_result,
+            default_service_sec=_DEFAULT_SERVICE_SEC,
+        )
+        self._uploader = Uploader(
+            self._send_photo,
+            concurrency=max(1, workers),
+            max_attempts=upload_attempts,
+            on_sent=self._on_sent,
+            on_failure=self._on_upload_failed,
+        )
+        self._lock = threading.Lock()
+        self._running: Dict[int, ImageJob] = {}
+        self._positions: Deque[int] = deque(maxlen=_POSITION_SAMPLES)
+        self._stop = threading.Event()
+        self._ticker: Optional[threading.Thread] = None
+
+    # --- приём ---
+
+    def submit(self, chat_id: int, prompt: str, *, context: Any = None) -> Admission:
+        """Поставить генерацию в очередь; при отказе пользователю ничего не отправлено."""
+
+        job = ImageJob(chat_id, prompt, context)
+        busy = self._engine.stats()["in_flight"] >= self._engine.workers
+        admission = self._engine.submit(chat_id, KIND, job)
+        if not admission.accepted:
+            return admission
+        with self._lock:
+            self._positions.append(admission.position)
+        # Поток пула мог уже начать задачу: статус и его правка в _run идут под замком задачи
+        with job.lock:
+            job.announced = job.running or (not admission.position and not busy)
+            if job.announced:
+                text = "🎨 Рисую картинку, обычно это до минуты…"
+            else:
+                ahead = f": перед тобой {admission.position}" if admission.position else ""
+                text = f"🎨 Картинка в очереди{ahead}, примерно через {_format_wait(admission.eta_seconds)}."
+            try:
+                job.status_id = self._bot.send_message(chat_id, text).message_id
+            except Exception as exc:  # noqa: BLE001 - без статуса картинка всё равно придёт
+                print(f"[MEDIA] image status for chat {chat_id} failed: {exc!r}")
+        self._start_ticker()
+        return admission
+
+    # --- выполнение (поток пула) ---
+
+    def _run(self, chat_id: int, kind: str, job: ImageJob) -> bytes:
+        with job.lock:
+            job.running = True
+            if not job.announced:
+                job.announced = True
+                self._set_status(job, "🎨 Очередь дошла, рисую картинку…")
+        with self._lock:
+            self._running[id(job)] = job
+        try:
+            return self._generate(job.prompt)
+        finally:
+            with self._lock:
+                self._running.pop(id(job), None)
+
+    def _set_status(self, job: ImageJob, text: str) -> None:
+        if job.status_id is None:
+            return
+        try:
+            self._bot.edit_message_text(text, job.chat_id, job.status_id)
+        except Exception:  # noqa: BLE001 - статус вспомогательный
+            pass
+
+    def _drop_status(self, job: ImageJob) -> None:
+        if job.status_id is None:
+            return
+        try:
+            self._bot.delete_message(job.chat_id, job.status_id)
+        except Exception:  # noqa: BLE001 - старое сообщение могло быть удалено
+            pass
+
+    def _on_result(self, media_job: MediaJob, data: bytes) -> None:
+        job = media_job.payload
+        self._uploader.submit(job.chat_id, _Delivery("image.png", self._caption, data, job=job))
+
+    def _on_error(self, media_job: MediaJob, exc: BaseException) -> None:
+        job = media_job.payload
+        if isinstance(exc, CancelledError):
+            self._set_status(job, "⚠️ Генерация отменена: бот перезапускается. Попробуй ещё раз чуть позже.")
+        else:
+            print(f"[MEDIA] image generation for chat {job.chat_id} failed: {exc!r}")
+            self._set_status(job, f"⚠️ Ошибка генерации: {exc}")
+        self._failed(job, exc)
+
+    def _failed(self, job: ImageJob, exc: BaseException) -> None:
+        if self._on_failed is not None:
+            try:
+                self._on_failed(job, exc)
+            except Exception as callback_exc:  # noqa: BLE001
+                print(f"[MEDIA] image failure callback failed: {callback_exc!r}")
+
+    # --- отправка ---
+
+    def _send_photo(self, chat_id: int, document: Document):
+        return self._bot.send_photo(chat_id, photo=io.BytesIO(document.data), caption=document.caption)
+
+    def _on_sent(self, chat_id: int, document: _Delivery, message: object) -> None:
+        self._drop_status(document.job)
+        if self._on_done is not None:
+            self._on_done(document.job, message, document.data)
+
+    def _on_upload_failed(self, chat_id: int, document: _Delivery, exc: BaseException) -> None:
+        self._set_status(document.job, f"⚠️ Картинка готова, но отправить её не удалось: {exc}")
+        self._failed(document.job, exc)
+
+    # --- индикатор «отправляет фото» ---
+
+    def _start_ticker(self) -> None:
+        with self._lock:
+            if self._ticker is not None and self._ticker.is_alive():
+                return
+            self._ticker = threading.Thread(target=self._tick, name="image-progress", daemon=True)
+            self._ticker.start()
+
+    def _tick(self) -> None:
+        # Индикатор чата гаснет через ~5 с, поэтому обновляется чаще
+        while not self._stop.wait(self._progress_interval):
+            with self._lock:
+                chats = {job.chat_id for job in self._running.values()}
+            for chat_id in chats:
+                try:
+                    self._bot.send_chat_action(chat_id, "upload_photo")
+                except Exception:  # noqa: BLE001 - индикатор вспомогательный
+                    pass
+
+    # --- метрики и остановка ---
+
+    def stats(self) -> Dict[str, Any]:
+        engine = self._engine.stats()
+        with self._lock:
+            positions = list(self._positions)
+        return {
+            "queued": engine["queued"],
+            "running": engine["in_flight"],
+            "workers": engine["workers"],
+            "accepted": engine["accepted"],
+            "rejected": engine["rejected"],
+            "completed": engine["completed"],
+            "failed": engine["failed"],
+            "position_avg": sum(positions) / len(positions) if positions else 0.0,
+            "position_max": max(positions, default=0),
+            "wait_avg_sec": engine["wait_avg_sec"],
+            "wait_p95_sec": engine["wait_p95_sec"],
+            "wait_max_sec": engine["wait_max_sec"],
+            "generate_sec": engine["service_sec"].get(KIND, 0.0),
+            "upload": self._uploader.stats(),
+        }
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        self._stop.set()
+        self._engine.shutdown(wait=wait)
+        # Задачи из очереди не начнутся: статус и возврат лимита как при отмене
+        for media_job in self._engine.drain():
+            self._on_error(media_job, CancelledError())
+        self._uploader.shutdown(wait=wait)
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Строка для ``/media_stats``."""
+
+    upload = stats.get("upload") or {}
+    return (
+        f"Картинки: в очереди {stats['queued']}, рисуется {stats['running']} из {stats['workers']}, "
+        f"готово {stats['completed']}, ошибок {stats['failed']}, отказов {stats['rejected']}, "
+        f"не отправлено {upload.get('failed', 0)}; место в очереди: среднее {stats['position_avg']:.1f}, "
+        f"максимум {stats['position_max']}; ожидание: среднее {stats['wait_avg_sec']:.1f} с, "
+        f"p95 {stats['wait_p95_sec']:.1f} с; генерация {stats['generate_sec']:.1f} с"
+    )
+
+
+__all__ = ["ImageJob", "ImageJobs", "format_stats"]
@@ -0,0 +1,234 @@
+"""Подготовка фото к анализу vision-моделью: меньше байт, та же картинка для модели.
+
+Прежде бралось самое большое фото (``m.photo[-1]``, до 2560 px), целиком
+скачивалось в память, кодировалось в base64 и уходило модели. Модель всё
+равно уменьшает картинку: в режиме ``high`` — до 2048 px по длинной стороне и
+768 px по короткой, в режиме ``low`` — до 512 × 512. Всё, что крупнее, —
+лишние байты на скачивание, отправку и ожидание.
+
+Здесь:
+
+* :func:`pick_photo_size` выбирает наименьший ``PhotoSize`` Telegram, который
+  ещё не мельче того, что увидит модель;
+* :func:`download` качает файл потоком через общую ``requests.Session`` с пулом
+  соединений и пределом размера;
+* :func:`prepare_image` уменьшает и пережимает картинку Pillow в JPEG (для
+  JPEG декодер сразу читает уменьшенную копию — ``Image.draft``); если
+  уменьшать нечего, отправляются исходные байты;
+* :func:`vision_tokens` оценивает стоимость картинки в токенах, а
+  :func:`stats` копит сэкономленные байты и время для ``/media_stats``.
+"""
+from __future__ import annotations
+
+import base64
+import io
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# detail -> (короткая сторона, длинная сторона), до которых модель уменьшает картинку
+_DETAIL_BOX = {"low": (512, 512), "high": (768, 2048), "auto": (768, 2048)}
+DETAILS = tuple(_DETAIL_BOX)
+JPEG_QUALITY = 85
+MAX_DOWNLOAD_BYTES = 20 * 1024 * 1024
+_CHUNK = 64 * 1024
+# Токены картинки (OpenAI, gpt-4o-класс): база + плитка 512×512 в режиме high
+_BASE_TOKENS = 85
+_TILE_TOKENS = 170
+
+_SESSION: Optional[requests.Session] = None
+_SESSION_LOCK = threading.Lock()
+_STATS_LOCK = threading.Lock()
+_STATS: Dict[str, float] = {
+    "images": 0,
+    "largest_bytes": 0,
+    "downloaded_bytes": 0,
+    "sent_bytes": 0,
+    "download_sec": 0.0,
+    "prepare_sec": 0.0,
+    "tokens_before": 0,
+    "tokens_after": 0,
+}
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime: str
+    width: int
+    height: int
+    # размеры и объём того, что пришло на вход
+    source_width: int
+    source_height: int
+    source_bytes: int
+
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def target_size(width: int, height: int, detail: str = "auto") -> Tuple[int, int]:
+    """Размер, до которого картинку уменьшит модель при данном ``detail`` (не больше исходного)."""
+
+    short_side, long_side = _DETAIL_BOX.get(detail, _DETAIL_BOX["auto"])
+    # сначала вписать в квадрат long_side, затем (кроме low) ограничить короткую сторону
+    scale = min(1.0, long_side / max(width, height))
+    if detail != "low":
+        scale = min(scale, short_side / max(1, min(width, height)))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def vision_tokens(width: int, height: int, detail: str = "auto") -> int:
+    """Оценка токенов картинки: в ``low`` — фиксированная база, иначе база + плитки 512 px."""
+
+    if detail == "low":
+        return _BASE_TOKENS
+    w, h = target_size(width, height, "high")
+    return _BASE_TOKENS + _TILE_TOKENS * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def pick_photo_size(sizes: Sequence[Any], detail: str = "auto") -> Any:
+    """Наименьший ``PhotoSize``, не мельче того, что увидит модель; иначе самый большой."""
+
+    ordered = sorted(sizes, key=lambda size: size.width * size.height)
+    short_side, long_side = _DETAIL_BOX.get(detail, _DETAIL_BOX["auto"])
+    for size in ordered:
+        if detail == "low":
+            if max(size.width, size.height) >= long_side:
+                return size
+        elif min(size.width, size.height) >= short_side or max(size.width, size.height) >= long_side:
+            return size
+    return ordered[-1]
+
+
+def session() -> requests.Session:
+    """Общая для процесса сессия: TCP и TLS к api.telegram.org переиспользуются."""
+
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                http = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                http.mount("https://", adapter)
+                http.mount("http://", adapter)
+                _SESSION = http
+    return _SESSION
+
+
+def download(url: str, *, max_bytes: int = MAX_DOWNLOAD_BYTES, timeout: float = 30) -> bytes:
+    """Скачать файл потоком; больше ``max_bytes`` — ``ValueError`` без чтения остатка."""
+
+    buf = io.BytesIO()
+    with session().get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(_CHUNK):
+            if buf.tell() + len(chunk) > max_bytes:
+                raise ValueError(f"файл больше {max_bytes // 2**20} МБ")
+            buf.write(chunk)
+    return buf.getvalue()
+
+
+def prepare_image(data: bytes, *, detail: str = "auto", quality: int = JPEG_QUALITY) -> PreparedImage:
+    """Уменьшить до размера, который увидит модель, и пережать в JPEG."""
+
+    # Pillow нужен только при анализе фото
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as img:
+        source_format = img.format
+        width, height = img.size
+        size = target_size(width, height, detail)
+        orientation = img.getexif().get(0x0112, 1)
+        if source_format == "JPEG" and size == (width, height) and orientation == 1:
+            # уменьшать нечего: исходный JPEG меньше любой перекодировки
+            return PreparedImage(data, "image/jpeg", width, height, width, height, len(data))
+        if source_format == "JPEG":
+            # декодер JPEG сразу отдаёт копию в 2/4/8 раз меньше, не мельче нужной
+            img.draft("RGB", size)
+        img = ImageOps.exif_transpose(img)
+        if orientation in (5, 6, 7, 8):
+            size = size[::-1]
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, "white")
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality)
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    return PreparedImage(out.getvalue(), "image/jpeg", size[0], size[1], width, height, len(data))
+
+
+def record(
+    prepared: PreparedImage,
+    *,
+    largest_bytes: int,
+    largest_size: Tuple[int, int],
+    detail: str,
+    download_sec: float,
+    prepare_sec: float,
+) -> None:
+    """Учесть одну картинку: сколько весило бы самое большое фото и сколько ушло на деле."""
+
+    with _STATS_LOCK:
+        _STATS["images"] += 1
+        _STATS["largest_bytes"] += largest_bytes
+        _STATS["downloaded_bytes"] += prepared.source_bytes
+        _STATS["sent_bytes"] += len(prepared.data)
+        _STATS["download_sec"] += download_sec
+        _STATS["prepare_sec"] += prepare_sec
+        _STATS["tokens_before"] += vision_tokens(*largest_size, "auto")
+        _STATS["tokens_after"] += vision_tokens(prepared.width, prepared.height, detail)
+
+
+def fetch_for_vision(url: str, *, detail: str, largest_bytes: int, largest_size: Tuple[int, int]) -> PreparedImage:
+    """Скачать выбранное фото, подготовить и учесть в статистике."""
+
+    started = time.perf_counter()
+    data = download(url)
+    downloaded = time.perf_counter()
+    prepared = prepare_image(data, detail=detail)
+    finished = time.perf_counter()
+    record(
+        prepared,
+        largest_bytes=largest_bytes or prepared.source_bytes,
+        largest_size=largest_size,
+        detail=detail,
+        download_sec=downloaded - started,
+        prepare_sec=finished - downloaded,
+    )
+    print(
+        f"[MEDIA] vision photo {prepared.source_width}x{prepared.source_height} "
+        f"({prepared.source_bytes // 1024} KB, largest {largest_bytes // 1024} KB) -> "
+        f"{prepared.width}x{prepared.height} ({len(prepared.data) // 1024} KB), "
+        f"download {downloaded - started:.2f} s, prepare {finished - downloaded:.2f} s"
+    )
+    return prepared
+
+
+def stats() -> Dict[str, float]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+__all__ = [
+    "DETAILS",
+    "PreparedImage",
+    "download",
+    "fetch_for_vision",
+    "pick_photo_size",
+    "prepare_image",
+    "session",
+    "stats",
+    "target_size",
+    "vision_tokens",
+]
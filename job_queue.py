@@ -0,0 +1,523 @@
+"""Долговременная очередь задач генерации документов.
+
+Раньше задачи жили только в памяти процесса бота и пропадали при каждом
+``systemctl restart``. Теперь бот кладёт задачу в хранилище, а
+обработчики (сам бот или отдельный сервис ``gpsbot-media``) забирают её
+оттуда. Два движка с одинаковым контрактом:
+
+* :class:`RedisStreamQueue` — Redis Streams с группой потребителей:
+  ``XREADGROUP`` выдаёт новые записи, ``XAUTOCLAIM`` забирает записи,
+  которые упавший обработчик не подтвердил дольше ``visibility_timeout``;
+* :class:`SQLiteJobQueue` — таблица ``media_jobs`` с арендой
+  (``lease_until``), если Redis нет.
+
+Доставка «хотя бы один раз»: задача подтверждается (``ack``) только после
+того, как файл отправлен или пользователь узнал об ошибке. Пока задача в
+работе, аренда продлевается (``touch``). ``job_id`` задаёт вызывающий,
+повторная постановка с тем же id ничего не делает.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Protocol, Sequence, Tuple
+
+from db import Database
+
+# Сколько помнить id выполненных задач, чтобы не принять их повторно
+_DEDUP_TTL_SEC = 24 * 3600
+# Данные обработчика, который давно не отчитывался, не показываем
+_CONSUMER_STATS_TTL_SEC = 60
+
+
+@dataclass
+class QueuedJob:
+    job_id: str
+    chat_id: int
+    kind: str
+    payload: str
+    # сколько раз задачу выдавали обработчикам, включая текущую выдачу
+    deliveries: int
+    # id записи в потоке Redis; для SQLite совпадает с job_id
+    receipt: str
+
+
+@dataclass(frozen=True)
+class EnqueueResult:
+    job_id: str
+    # False — задача с таким id уже была принята раньше
+    created: bool
+
+
+class JobQueue(Protocol):
+    """Операции, которые ``worker_media`` ожидает от очереди."""
+
+    name: str
+
+    def enqueue(self, chat_id: int, kind: str, payload: str, *, job_id: str) -> EnqueueResult: ...
+
+    def depth(self) -> int:
+        """Неподтверждённые задачи: ждущие и выданные в работу."""
+        ...
+
+    def chat_depth(self, chat_id: int) -> int: ...
+
+    def claim(self, consumer: str, count: int) -> List[QueuedJob]: ...
+
+    def touch(self, jobs: Sequence[QueuedJob], consumer: str) -> None: ...
+
+    def release(self, job: QueuedJob, consumer: str, *, failed: bool = False) -> None:
+        """Вернуть задачу в очередь, чтобы её сразу мог взять любой обработчик.
+
+        Без ``failed`` выдача не засчитывается в ``deliveries``: задачу
+        вернули не из-за сбоя, а, например, при остановке обработчика.
+        """
+        ...
+
+    def ack(self, job: QueuedJob) -> None: ...
+
+    def publish_stats(self, consumer: str, stats: Dict[str, Any]) -> None: ...
+
+    def consumers(self) -> Dict[str, Dict[str, Any]]: ...
+
+
+class RedisStreamQueue:
+    """Поток ``media:jobs`` и группа ``media-workers``; подтверждённые записи удаляются."""
+
+    name = "redis"
+
+    def __init__(
+        self,
+        client: Any,
+        *,
+        stream: str = "media:jobs",
+        group: str = "media-workers",
+        visibility_timeout: float = 120.0,
+        dedup_ttl: int = _DEDUP_TTL_SEC,
+    ) -> None:
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.visibility_ms = max(1, int(visibility_timeout * 1000))
+        self.dedup_ttl = dedup_ttl
+        self._chats_key = f"{stream}:chats"
+        self._deliveries_key = f"{stream}:deliveries"
+        self._consumers_key = f"{stream}:consumers"
+        self._dedup_prefix = f"{stream}:id:"
+        try:
+            client.xgroup_create(stream, group, id="0", mkstream=True)
+        except Exception as exc:  # noqa: BLE001 - redis.ResponseError, если группа уже есть
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    def enqueue(self, chat_id: int, kind: str, payload: str, *, job_id: str) -> EnqueueResult:
+        if not self.client.set(self._dedup_prefix + job_id, "1", nx=True, ex=self.dedup_ttl):
+            return EnqueueResult(job_id, created=False)
+        pipe = self.client.pipeline()
+        pipe.xadd(self.stream, {"job_id": job_id, "chat_id": chat_id, "kind": kind, "payload": payload})
+        pipe.hincrby(self._chats_key, str(chat_id), 1)
+        try:
+            pipe.execute()
+        except Exception:
+            # иначе повторная постановка той же задачи будет отброшена как дубль
+            self.client.delete(self._dedup_prefix + job_id)
+            raise
+        return EnqueueResult(job_id, created=True)
+
+    def depth(self) -> int:
+        return int(self.client.xlen(self.stream))
+
+    def chat_depth(self, chat_id: int) -> int:
+        return int(self.client.hget(self._chats_key, str(chat_id)) or 0)
+
+    def _jobs(self, entries: Sequence[Tuple[str, Optional[Dict[str, str]]]]) -> List[QueuedJob]:
+        entries = list(entries or [])
+        gone = [entry_id for entry_id, fields in entries if not fields]
+        if gone:
+            # запись удалили после выдачи — подтверждать нечего, просто убираем из PEL
+            self.client.xack(self.stream, self.group, *gone)
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return []
+        pipe = self.client.pipeline()
+        for _, fields in entries:
+            pipe.hincrby(self._deliveries_key, fields["job_id"], 1)
+        deliveries = pipe.execute()
+        return [
+            QueuedJob(
+                job_id=fields["job_id"],
+                chat_id=int(fields["chat_id"]),
+                kind=fields["kind"],
+                payload=fields.get("payload", ""),
+                deliveries=int(count),
+                receipt=entry_id,
+            )
+            for (entry_id, fields), count in zip(entries, deliveries)
+        ]
+
+    def claim(self, consumer: str, count: int) -> List[QueuedJob]:
+        if count <= 0:
+            return []
+        # Сначала — задачи обработчиков, которые не продлевали аренду (упали или зависли)
+        reclaimed = self.client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=self.visibility_ms, start_id="0-0", count=count
+        )
+        jobs = self._jobs(reclaimed[1])
+        if len(jobs) < count:
+            response = self.client.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count - len(jobs))
+            for _, entries in response or []:
+                jobs.extend(self._jobs(entries))
+        return jobs
+
+    def touch(self, jobs: Sequence[QueuedJob], consumer: str) -> None:
+        if jobs:
+            # XCLAIM сбрасывает время простоя записи — это и есть продление аренды
+            self.client.xclaim(
+                self.stream, self.group, consumer, 0, [job.receipt for job in jobs], justid=True
+            )
+
+    def release(self, job: QueuedJob, consumer: str, *, failed: bool = False) -> None:
+        if not failed:
+            self.client.hincrby(self._deliveries_key, job.job_id, -1)
+        self.client.xclaim(
+            self.stream, self.group, consumer, 0, [job.receipt], idle=self.visibility_ms, justid=True
+        )
+
+    def ack(self, job: QueuedJob) -> None:
+        if not self.client.xack(self.stream, self.group, job.receipt):
+            # задачу уже подтвердил другой обработчик, взявший её после истечения аренды
+            return
+        pipe = self.client.pipeline()
+        pipe.xdel(self.stream, job.receipt)
+        pipe.hdel(self._deliveries_key, job.job_id)
+        pipe.hincrby(self._chats_key, str(job.chat_id), -1)
+        *_, left = pipe.execute()
+        if left <= 0:
+            self.client.hdel(self._chats_key, str(job.chat_id))
+
+    def publish_stats(self, consumer: str, stats: Dict[str, Any]) -> None:
+        self.client.hset(self._consumers_key, consumer, json.dumps({**stats, "updated_at": time.time()}))
+
+    def consumers(self) -> Dict[str, Dict[str, Any]]:
+        fresh, stale = _split_consumers(self.client.hgetall(self._consumers_key) or {})
+        if stale:
+            self.client.hdel(self._consumers_key, *stale)
+        return fresh
+
+
+class SQLiteJobQueue:
+    """Таблица ``media_jobs``: задача свободна, если ``lease_until`` в прошлом и она не выполнена."""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        database: Database,
+        *,
+        visibility_timeout: float = 120.0,
+        dedup_ttl: int = _DEDUP_TTL_SEC,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.database = database
+        self.visibility_timeout = visibility_timeout
+        self.dedup_ttl = dedup_ttl
+        self._clock = clock
+        with database.transaction():
+            database.execute("""
+            CREATE TABLE IF NOT EXISTS media_jobs (
+                job_id TEXT PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                consumer TEXT,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                done_at REAL
+            )
+            """)
+            database.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_jobs_ready ON media_jobs(done_at, lease_until, created_at)"
+            )
+            database.execute("""
+            CREATE TABLE IF NOT EXISTS media_consumers (
+                name TEXT PRIMARY KEY,
+                stats TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """)
+
+    def enqueue(self, chat_id: int, kind: str, payload: str, *, job_id: str) -> EnqueueResult:
+        cursor = self.database.execute(
+            "INSERT OR IGNORE INTO media_jobs(job_id, chat_id, kind, payload, created_at) VALUES(?,?,?,?,?)",
+            (job_id, chat_id, kind, payload, self._clock()),
+        )
+        return EnqueueResult(job_id, created=cursor.rowcount == 1)
+
+    def depth(self) -> int:
+        return int(self.database.query_one("SELECT COUNT(*) FROM media_jobs WHERE done_at IS NULL")[0])
+
+    def chat_depth(self, chat_id: int) -> int:
+        row = self.database.query_one(
+            "SELECT COUNT(*) FROM media_jobs WHERE done_at IS NULL AND chat_id=?", (chat_id,)
+        )
+        return int(row[0])
+
+    def claim(self, consumer: str, count: int) -> List[QueuedJob]:
+        if count <= 0:
+            return []
+        now = self._clock()
+        with self.database.transaction():
+            rows = self.database.query_all(
+                """UPDATE media_jobs SET consumer=?, lease_until=?, deliveries=deliveries+1
+                   WHERE job_id IN (
+                       SELECT job_id FROM media_jobs
+                       WHERE done_at IS NULL AND lease_until <= ?
+                       ORDER BY created_at LIMIT ?
+                   )
+                   RETURNING job_id, chat_id, kind, payload, deliveries, created_at""",
+                (consumer, now + self.visibility_timeout, now, count),
+            )
+        rows.sort(key=lambda row: row[5])
+        return [
+            QueuedJob(job_id=job_id, chat_id=chat_id, kind=kind, payload=payload, deliveries=deliveries, receipt=job_id)
+            for job_id, chat_id, kind, payload, deliveries, _ in rows
+        ]
+
+    def touch(self, jobs: Sequence[QueuedJob], consumer: str) -> None:
+        if jobs:
+            self.database.executemany(
+                "UPDATE media_jobs SET lease_until=? WHERE job_id=? AND consumer=? AND done_at IS NULL",
+                [(self._clock() + self.visibility_timeout, job.job_id, consumer) for job in jobs],
+            )
+
+    def release(self, job: QueuedJob, consumer: str, *, failed: bool = False) -> None:
+        self.database.execute(
+            """UPDATE media_jobs SET lease_until=0, deliveries=deliveries-?
+               WHERE job_id=? AND consumer=? AND done_at IS NULL""",
+            (0 if failed else 1, job.job_id, consumer),
+        )
+
+    def ack(self, job: QueuedJob) -> None:
+        now = self._clock()
+        with self.database.transaction():
+            self.database.execute("UPDATE media_jobs SET done_at=? WHERE job_id=? AND done_at IS NULL", (now, job.job_id))
+            # Выполненные задачи хранятся ради идемпотентности, но не вечно
+            self.database.execute(
+                "DELETE FROM media_jobs WHERE done_at IS NOT NULL AND done_at < ?", (now - self.dedup_ttl,)
+            )
+
+    def publish_stats(self, consumer: str, stats: Dict[str, Any]) -> None:
+        self.database.execute(
+            """INSERT INTO media_consumers(name, stats, updated_at) VALUES(?,?,?)
+               ON CONFLICT(name) DO UPDATE SET stats=excluded.stats, updated_at=excluded.updated_at""",
+            (consumer, json.dumps({**stats, "updated_at": time.time()}), time.time()),
+        )
+
+    def consumers(self) -> Dict[str, Dict[str, Any]]:
+        rows = self.database.query_all("SELECT name, stats FROM media_consumers")
+        fresh, stale = _split_consumers(dict(rows))
+        if stale:
+            self.database.executemany("DELETE FROM media_consumers WHERE name=?", [(name,) for name in stale])
+        return fresh
+
+
+def _split_consumers(raw: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+    fresh: Dict[str, Dict[str, Any]] = {}
+    stale: List[str] = []
+    cutoff = time.time() - _CONSUMER_STATS_TTL_SEC
+    for name, payload in raw.items():
+        try:
+            stats = json.loads(payload)
+        except (TypeError, ValueError):
+            stale.append(name)
+            continue
+        if float(stats.get("updated_at", 0)) < cutoff:
+            stale.append(name)
+        else:
+            fresh[name] = stats
+    return fresh, stale
+
+
+class JobPump:
+    """Переносит задачи из очередей в обработчик и подтверждает их по готовности.
+
+    ``submit(job)`` передаёт задачу дальше (в ``MediaEngine``) и возвращает
+    False, если её не приняли. Берём не больше ``capacity`` задач сразу:
+    остальное остаётся в очереди для других обработчиков. Когда задача
+    закончена, вызывающий сообщает :meth:`done` (подтвердить) или
+    :meth:`retry` (вернуть в очередь). Задача, выданная больше
+    ``max_deliveries`` раз, отдаётся ``on_dead`` и подтверждается.
+    """
+
+    def __init__(
+        self,
+        queues: Sequence[JobQueue],
+        submit: Callable[[QueuedJob], bool],
+        *,
+        consumer: str,
+        capacity: int,
+        max_deliveries: int = 3,
+        on_dead: Optional[Callable[[QueuedJob], None]] = None,
+        poll_interval: float = 1.0,
+        lease_refresh: float = 30.0,
+        stats: Optional[Callable[[], Dict[str, Any]]] = None,
+        stats_interval: float = 10.0,
+    ) -> None:
+        self.queues = list(queues)
+        self.consumer = consumer
+        self.capacity = max(1, capacity)
+        self.max_deliveries = max(1, max_deliveries)
+        self._submit = submit
+        self._on_dead = on_dead
+        self._poll_interval = poll_interval
+        self._lease_refresh = lease_refresh
+        self._stats = stats
+        self._stats_interval = stats_interval
+
+        self._lock = threading.Lock()
+        self._held: Dict[str, Tuple[JobQueue, QueuedJob]] = {}
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters: Dict[str, int] = {"claimed": 0, "acked": 0, "retried": 0, "dead": 0, "errors": 0}
+
+    # --- жизненный цикл ---
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._loop, name="media-pump", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Перестать забирать задачи; уже взятые можно довести до конца и подтвердить."""
+
+        self._stopped.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def release_held(self) -> int:
+        """Вернуть в очередь все незавершённые задачи, чтобы их сразу взял другой обработчик."""
+
+        with self._lock:
+            held, self._held = list(self._held.values()), {}
+        for queue, job in held:
+            self._call(queue.release, job, self.consumer)
+        return len(held)
+
+    # --- завершение задач ---
+
+    def done(self, job_id: str) -> None:
+        with self._lock:
+            entry = self._held.pop(job_id, None)
+        if entry is not None:
+            queue, job = entry
+            if self._call(queue.ack, job):
+                self.counters["acked"] += 1
+        self._wake.set()
+
+    def retry(self, job_id: str) -> None:
+        """Задача сорвалась (например, упал процесс пула): вернуть её с учётом попытки."""
+
+        with self._lock:
+            entry = self._held.pop(job_id, None)
+        if entry is not None:
+            queue, job = entry
+            self._call(queue.release, job, self.consumer, failed=True)
+            self.counters["retried"] += 1
+        self._wake.set()
+
+    def held(self) -> int:
+        with self._lock:
+            return len(self._held)
+
+    # --- цикл ---
+
+    def _call(self, method: Callable, *args, **kwargs) -> bool:
+        try:
+            method(*args, **kwargs)
+            return True
+        except Exception as exc:  # noqa: BLE001 - хранилище может быть недоступно, повторим позже
+            self.counters["errors"] += 1
+            print(f"[MEDIA] job queue {getattr(method, '__name__', method)} failed: {exc!r}")
+            return False
+
+    def poll_once(self) -> int:
+        """Забрать задачи в пределах свободного места; возвращает число переданных дальше."""
+
+        passed = 0
+        for queue in self.queues:
+            free = self.capacity - self.held()
+            if free <= 0:
+                break
+            try:
+                jobs = queue.claim(self.consumer, free)
+            except Exception as exc:  # noqa: BLE001 - повторим на следующем круге
+                self.counters["errors"] += 1
+                print(f"[MEDIA] job queue {queue.name} claim failed: {exc!r}")
+                continue
+            for job in jobs:
+                self.counters["claimed"] += 1
+                if job.deliveries > self.max_deliveries:
+                    # Задача раз за разом роняет обработчик: дальше не пробуем
+                    self.counters["dead"] += 1
+                    if self._on_dead is not None:
+                        self._call(self._on_dead, job)
+                    self._call(queue.ack, job)
+                    continue
+                with self._lock:
+                    self._held[job.job_id] = (queue, job)
+                if self._submit(job):
+                    passed += 1
+                else:
+                    with self._lock:
+                        self._held.pop(job.job_id, None)
+                    self._call(queue.release, job, self.consumer)
+        return passed
+
+    def refresh_leases(self) -> None:
+        with self._lock:
+            held = list(self._held.values())
+        for queue in self.queues:
+            jobs = [job for owner, job in held if owner is queue]
+            if jobs:
+                self._call(queue.touch, jobs, self.consumer)
+
+    def publish_stats(self) -> None:
+        if self._stats is None:
+            return
+        stats = {**self._stats(), "pump": dict(self.counters), "held": self.held()}
+        for queue in self.queues:
+            self._call(queue.publish_stats, self.consumer, stats)
+
+    def _loop(self) -> None:
+        last_refresh = last_stats = 0.0
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if now - last_refresh >= self._lease_refresh:
+                self.refresh_leases()
+                last_refresh = now
+            if now - last_stats >= self._stats_interval:
+                self.publish_stats()
+                last_stats = now
+            passed = self.poll_once()
+            if not passed:
+                self._wake.wait(self._poll_interval)
+                self._wake.clear()
+
+
+__all__ = [
+    "EnqueueResult",
+    "JobPump",
+    "JobQueue",
+    "QueuedJob",
+    "RedisStreamQueue",
+    "SQLiteJobQueue",
+]
@@ -1,12 +1,40 @@
 import base64
 import io
-import requests
+import json
+import threading
+import time
 from telebot import types
 
-from settings import bot, client, TOKEN, IMAGE_MODEL, VISION_MODEL
+from settings import (
+    bot, client, TOKEN, IMAGE_MODEL, VISION_MODEL, VISION_DETAIL, MEDIA_ETA_NOTICE_SEC, MEDIA_PER_CHAT_LIMIT,
+    CSV_UPLOAD_MAX_MB, IMAGE_GEN_CONCURRENCY, IMAGE_QUEUE_LIMIT, IMAGE_PER_CHAT_LIMIT,
+)
+import image_jobs
+from image_prep import fetch_for_vision, pick_photo_size
+from media_upload import sent_file_id
+from result_cache import result_key
+from storage import media_quota, result_cache, vision_cache
 from usage_tracker import compose_display_name, record_user_activity
+from vision_cache import prompt_version
 from worker_media import enqueue_media_task
 
+_QUOTA_EXHAUSTED = {
+    "photos": "⛔ Лимит генерации изображений на этот месяц исчерпан.",
+    "analysis": "⛔ Лимит анализа фото на этот месяц исчерпан.",
+}
+
+_QUEUE_REJECTED = {
+    "queue_full": "⏳ Сейчас очередь документов переполнена. Попробуй через пару минут.",
+    "chat_limit": f"⏳ У тебя уже есть документы в очереди (не больше {MEDIA_PER_CHAT_LIMIT}). Дождись их, потом присылай новые.",
+    "stopped": "⚠️ Генерация документов временно недоступна.",
+}
+
+_IMAGE_REJECTED = {
+    "queue_full": "⏳ Сейчас очередь картинок переполнена. Попробуй через пару минут.",
+    "chat_limit": f"⏳ У тебя уже рисуются картинки (не больше {IMAGE_PER_CHAT_LIMIT}). Дождись их, потом присылай новые.",
+    "stopped": "⚠️ Генерация картинок временно недоступна.",
+}
+
 # Состояние простое: что от пользователя ждём далее
 user_media_state = {}   # {chat_id: {"mode": "photo_gen"/"photo_analyze"/"pdf"/"excel"/"pptx"}}
 
@@ -35,31 +63,30 @@ def _display_name(user) -> str:
 
 # --- Ветки функций ---
 
-@bot.callback_query_handler(func=lambda call: call.data == "mm_photo_gen")
 def on_photo_gen(call):
     bot.answer_callback_query(call.id)
     user_media_state[call.message.chat.id] = {"mode": "photo_gen"}
     bot.send_message(call.message.chat.id, "Опиши картинку, которую хочешь получить:")
 
-@bot.callback_query_handler(func=lambda call: call.data == "mm_photo_ana")
 def on_photo_analyze(call):
     bot.answer_callback_query(call.id)
     user_media_state[call.message.chat.id] = {"mode": "photo_analyze"}
     bot.send_message(call.message.chat.id, "Пришли фото сообщением, я опишу и проанализирую его.")
 
-@bot.callback_query_handler(func=lambda call: call.data == "mm_pdf")
 def on_pdf(call):
     bot.answer_callback_query(call.id)
     user_media_state[call.message.chat.id] = {"mode": "pdf"}
     bot.send_message(call.message.chat.id, "Пришли текст для PDF (каждая строка будет перенесена).")
 
-@bot.callback_query_handler(func=lambda call: call.data == "mm_excel")
 def on_excel(call):
     bot.answer_callback_query(call.id)
     user_media_state[call.message.chat.id] = {"mode": "excel"}
-    bot.send_message(call.message.chat.id, "Пришли данные в виде CSV-подобного текста:\nЗаголовок1, Заголовок2\nЗначение1, Значение2")
+    bot.send_message(
+        call.message.chat.id,
+        "Пришли данные в виде CSV-подобного текста:\nЗаголовок1, Заголовок2\nЗначение1, Значение2\n"
+        f"или CSV-файлом до {CSV_UPLOAD_MAX_MB} МБ.",
+    )
 
-@bot.callback_query_handler(func=lambda call: call.data == "mm_pptx")
 def on_pptx(call):
     bot.answer_callback_query(call.id)
     user_media_state[call.message.chat.id] = {"mode": "pptx"}
@@ -67,83 +94,226 @@ def on_pptx(call):
 
 # --- Обработка текстов для режимов photo_gen/pdf/excel/pptx ---
 
-@bot.message_handler(func=lambda msg: user_media_state.get(msg.chat.id, {}).get("mode") in ("photo_gen","pdf","excel","pptx"))
+# Параметры генерации входят в ключ кэша: смена модели или размера даёт новые картинки
+_IMAGE_SIZE = "1024x1024"
+_IMAGE_QUALITY = "high"
+
+
+def _image_key(prompt: str) -> str:
+    return result_key("image", f"{IMAGE_MODEL}:{_IMAGE_SIZE}:{_IMAGE_QUALITY}", prompt)
+
+
+def _send_cached_image(chat_id: int, key: str) -> bool:
+    """Тот же запрос уже выполнялся: отправить картинку по file_id или с диска."""
+    try:
+        cached = result_cache.lookup(key)
+    except Exception as e:
+        print(f"[MEDIA] result cache lookup failed: {e!r}")
+        return False
+    if cached is None:
+        return False
+    if cached.file_id:
+        try:
+            bot.send_photo(chat_id, photo=cached.file_id, caption="Готово ✅")
+            return True
+        except Exception:
+            # Telegram больше не принимает file_id — отправим байты
+            result_cache.forget_file_id(key)
+    if cached.data:
+        sent = bot.send_photo(chat_id, photo=io.BytesIO(cached.data), caption="Готово ✅")
+        _remember_image(key, sent)
+        return True
+    return False
+
+
+def _remember_image(key: str, sent, data: bytes = b"") -> None:
+    try:
+        if data:
+            result_cache.store_blob(key, data)
+        file_id = sent_file_id(sent)
+        if file_id:
+            result_cache.remember_file_id(key, file_id)
+    except Exception as e:
+        print(f"[MEDIA] result cache store failed: {e!r}")
+
+
+def _generate_image(prompt: str) -> bytes:
+    result = client.images.generate(
+        model=IMAGE_MODEL,
+        prompt=prompt,
+        size=_IMAGE_SIZE,
+        quality=_IMAGE_QUALITY,
+    )
+    return base64.b64decode(result.data[0].b64_json)
+
+
+def _image_done(job: image_jobs.ImageJob, sent, data: bytes) -> None:
+    _remember_image(job.context["key"], sent, data)
+
+
+def _image_failed(job: image_jobs.ImageJob, exc: BaseException) -> None:
+    media_quota.refund(job.context["charge"])
+
+
+_IMAGE_JOBS = None
+_IMAGE_JOBS_LOCK = threading.Lock()
+
+
+def _image_jobs() -> image_jobs.ImageJobs:
+    """Очередь генерации создаётся при первой картинке: пул потоков не нужен, пока картинок не просят."""
+    global _IMAGE_JOBS
+    with _IMAGE_JOBS_LOCK:
+        if _IMAGE_JOBS is None:
+            _IMAGE_JOBS = image_jobs.ImageJobs(
+                _generate_image,
+                bot=bot,
+                workers=IMAGE_GEN_CONCURRENCY,
+                queue_limit=IMAGE_QUEUE_LIMIT,
+                per_chat_limit=IMAGE_PER_CHAT_LIMIT,
+                on_done=_image_done,
+                on_failed=_image_failed,
+            )
+        return _IMAGE_JOBS
+
+
+def format_image_stats() -> str:
+    """Строка очереди картинок для /media_stats (пустая, если картинок ещё не просили)."""
+    with _IMAGE_JOBS_LOCK:
+        jobs = _IMAGE_JOBS
+    return image_jobs.format_stats(jobs.stats()) if jobs is not None else ""
+
+
+def _format_eta(seconds: float) -> str:
+    if seconds < 60:
+        return f"{max(1, round(seconds))} с"
+    return f"{round(seconds / 60)} мин"
+
+
+def _queue_document(m, kind: str, accepted_text: str, payload: str | None = None) -> None:
+    user_media_state.pop(m.chat.id, None)
+    if payload is None:
+        payload = m.text or ""
+    # id сообщения делает постановку идемпотентной: повторно доставленный апдейт не создаст второй файл
+    admission = enqueue_media_task(m.chat.id, kind, payload, job_id=f"{m.chat.id}:{m.message_id}")
+    if not admission.accepted:
+        bot.send_message(m.chat.id, _QUEUE_REJECTED.get(admission.reason, _QUEUE_REJECTED["stopped"]))
+        return
+    if admission.reason == "duplicate":
+        return
+    record_user_activity(
+        getattr(m.from_user, "id", m.chat.id),
+        category="document",
+        display_name=_display_name(m.from_user),
+    )
+    if admission.eta_seconds >= MEDIA_ETA_NOTICE_SEC:
+        accepted_text += (
+            f"\nПеред тобой в очереди: {admission.position}, "
+            f"ориентировочно будет готово через {_format_eta(admission.eta_seconds)}."
+        )
+    bot.send_message(m.chat.id, accepted_text)
+
+
 def media_text_router(m):
     state = user_media_state.get(m.chat.id, {})
     mode = state.get("mode")
     if mode == "photo_gen":
         # генерация фото
+        user_media_state.pop(m.chat.id, None)
         prompt = m.text.strip()
+        key = _image_key(prompt)
+        # Повтор уже сделанной картинки не обращается к OpenAI и не расходует лимит
+        if _send_cached_image(m.chat.id, key):
+            return
+        # Списываем лимит до постановки в очередь; при отказе или ошибке генерации возвращаем
+        charge = media_quota.consume(m.chat.id, "photos", user_id=getattr(m.from_user, "id", None))
+        if charge is None:
+            bot.send_message(m.chat.id, _QUOTA_EXHAUSTED["photos"])
+            return
+        # Генерация идёт в пуле image_jobs: хендлер сразу освобождается, статус пришлёт очередь
+        admission = _image_jobs().submit(m.chat.id, prompt, context={"key": key, "charge": charge})
+        if not admission.accepted:
+            media_quota.refund(charge)
+            bot.send_message(m.chat.id, _IMAGE_REJECTED.get(admission.reason, _IMAGE_REJECTED["stopped"]))
+            return
         record_user_activity(
             getattr(m.from_user, "id", m.chat.id),
             category="image",
             display_name=_display_name(m.from_user),
         )
-        try:
-            result = client.images.generate(
-                model=IMAGE_MODEL,
-                prompt=prompt,
-                size="1024x1024",
-                quality="high",
-            )
-            b64 = result.data[0].b64_json
-            img_bytes = base64.b64decode(b64)
-            bot.send_photo(m.chat.id, photo=io.BytesIO(img_bytes), caption="Готово ✅")
-        except Exception as e:
-            bot.send_message(m.chat.id, f"⚠️ Ошибка генерации: {e}")
-        finally:
-            user_media_state.pop(m.chat.id, None)
         return
 
     if mode == "pdf":
-        record_user_activity(
-            getattr(m.from_user, "id", m.chat.id),
-            category="document",
-            display_name=_display_name(m.from_user),
-        )
-        bot.send_message(m.chat.id, "📄 Готовлю PDF, пришлю файл чуть позже…")
-        enqueue_media_task(m.chat.id, "pdf", m.text or "")
-        user_media_state.pop(m.chat.id, None)
+        _queue_document(m, "pdf", "📄 Готовлю PDF, пришлю файл чуть позже…")
         return
 
     if mode == "excel":
-        record_user_activity(
-            getattr(m.from_user, "id", m.chat.id),
-            category="document",
-            display_name=_display_name(m.from_user),
-        )
-        bot.send_message(m.chat.id, "📊 Формирую Excel, отправлю, как только соберу данные…")
-        enqueue_media_task(m.chat.id, "excel", m.text or "")
-        user_media_state.pop(m.chat.id, None)
+        _queue_document(m, "excel", "📊 Формирую Excel, отправлю, как только соберу данные…")
         return
 
     if mode == "pptx":
-        record_user_activity(
-            getattr(m.from_user, "id", m.chat.id),
-            category="document",
-            display_name=_display_name(m.from_user),
-        )
-        bot.send_message(m.chat.id, "🖼️ Собираю презентацию, скоро пришлю готовый файл…")
-        enqueue_media_task(m.chat.id, "pptx", m.text or "")
-        user_media_state.pop(m.chat.id, None)
+        _queue_document(m, "pptx", "🖼️ Собираю презентацию, скоро пришлю готовый файл…")
         return
 
+# --- Приём CSV-файла для Excel ---
+
+_CSV_EXTENSIONS = (".csv", ".tsv", ".txt")
+
+
+def on_csv_document(m):
+    doc = m.document
+    name = (doc.file_name or "").lower()
+    if not name.endswith(_CSV_EXTENSIONS) and not (doc.mime_type or "").startswith("text/"):
+        bot.send_message(m.chat.id, "Нужен CSV-файл (.csv, .tsv или .txt) — или пришли данные текстом.")
+        return
+    if (doc.file_size or 0) > CSV_UPLOAD_MAX_MB * 1024 * 1024:
+        bot.send_message(m.chat.id, f"Файл больше {CSV_UPLOAD_MAX_MB} МБ — такой Telegram не отдаёт боту.")
+        return
+    # В очередь уходит ссылка на файл: сам файл скачивает воркер, потоком
+    payload = json.dumps({"file_id": doc.file_id, "file_unique_id": doc.file_unique_id, "name": doc.file_name})
+    _queue_document(m, "excel_file", "📊 Формирую Excel из файла, отправлю, как только соберу данные…", payload)
+
+
 # --- Приём фото для анализа ---
 
-@bot.message_handler(content_types=["photo"])
+_VISION_PROMPT = "Опиши и проанализируй это фото кратко и по делу."
+# Входит в ключ кэша анализа: смена модели, detail или запроса даёт новые ответы
+_VISION_VERSION = prompt_version(VISION_MODEL, VISION_DETAIL, _VISION_PROMPT)
+
+
 def on_photo_message(m):
     state = user_media_state.get(m.chat.id, {})
     if state.get("mode") != "photo_analyze":
         return  # не ждём фото — игнорируем, отработает общий fallback
 
+    # Модель всё равно уменьшит фото: берём наименьший размер, который она увидит целиком
+    largest = max(m.photo, key=lambda size: size.width * size.height)
+    photo = pick_photo_size(m.photo, VISION_DETAIL)
+    # Пересланная копия того же фото: ответ из кэша, без скачивания, модели и списания лимита
+    cached = vision_cache.lookup(largest.file_unique_id, _VISION_VERSION, size=photo.file_size or 0)
+    if cached is not None:
+        user_media_state.pop(m.chat.id, None)
+        bot.send_message(m.chat.id, cached)
+        return
+
+    charge = media_quota.consume(m.chat.id, "analysis", user_id=getattr(m.from_user, "id", None))
+    if charge is None:
+        user_media_state.pop(m.chat.id, None)
+        bot.send_message(m.chat.id, _QUOTA_EXHAUSTED["analysis"])
+        return
+
     try:
-        file_id = m.photo[-1].file_id
-        file_info = bot.get_file(file_id)
+        started = time.perf_counter()
+        file_info = bot.get_file(photo.file_id)
         url = f"https://api.telegram.org/file/bot{TOKEN}/{file_info.file_path}"
-        img_resp = requests.get(url, timeout=30)
-        img_resp.raise_for_status()
-        img_b64 = base64.b64encode(img_resp.content).decode("utf-8")
-        data_url = f"data:image/jpeg;base64,{img_b64}"
+        prepared = fetch_for_vision(
+            url,
+            detail=VISION_DETAIL,
+            largest_bytes=largest.file_size or 0,
+            largest_size=(largest.width, largest.height),
+        )
+        image_url = {"url": prepared.data_url()}
+        if VISION_DETAIL != "auto":
+            image_url["detail"] = VISION_DETAIL
 
         record_user_activity(
             getattr(m.from_user, "id", m.chat.id),
@@ -157,14 +327,36 @@ def on_photo_message(m):
             messages=[{
                 "role": "user",
                 "content": [
-                    {"type": "text", "text": "Опиши и проанализируй это фото кратко и по делу."},
-                    {"type": "image_url", "image_url": {"url": data_url}},
+                    {"type": "text", "text": _VISION_PROMPT},
+                    {"type": "image_url", "image_url": image_url},
                 ]
             }],
         )
         text = resp.choices[0].message.content.strip()
+        vision_cache.store(largest.file_unique_id, _VISION_VERSION, text, elapsed=time.perf_counter() - started)
         bot.send_message(m.chat.id, text or "Готово ✅")
     except Exception as e:
+        media_quota.refund(charge)
         bot.send_message(m.chat.id, f"⚠️ Ошибка анализа: {e}")
     finally:
         user_media_state.pop(m.chat.id, None)
+
+
+def _awaits_media_text(msg) -> bool:
+    return user_media_state.get(msg.chat.id, {}).get("mode") in ("photo_gen", "pdf", "excel", "pptx")
+
+
+def _awaits_csv(msg) -> bool:
+    return user_media_state.get(msg.chat.id, {}).get("mode") == "excel"
+
+
+def register(bot) -> None:
+    """Подключить хендлеры мультимедиа (вызывается из ``app.create_app``)."""
+    bot.register_callback_query_handler(on_photo_gen, func=lambda call: call.data == "mm_photo_gen")
+    bot.register_callback_query_handler(on_photo_analyze, func=lambda call: call.data == "mm_photo_ana")
+    bot.register_callback_query_handler(on_pdf, func=lambda call: call.data == "mm_pdf")
+    bot.register_callback_query_handler(on_excel, func=lambda call: call.data == "mm_excel")
+    bot.register_callback_query_handler(on_pptx, func=lambda call: call.data == "mm_pptx")
+    bot.register_message_handler(media_text_router, func=_awaits_media_text)
+    bot.register_message_handler(on_photo_message, content_types=["photo"])
+    bot.register_message_handler(on_csv_document, content_types=["document"], func=_awaits_csv)
@@ -0,0 +1,308 @@
+"""Очередь генерации документов: пул процессов, допуск и честный обход чатов.
+
+Задачи не уходят в пул сразу. Они ждут в :class:`FairQueue` — по очереди
+на чат, и чаты обходятся по кругу. Поэтому пачка больших презентаций от
+одного пользователя не задерживает остальных дольше, чем на одну задачу.
+Поток-диспетчер держит в пуле не больше ``workers`` задач одновременно:
+всё, что сверх, ждёт в очереди, где порядок задаём мы, а не FIFO пула.
+
+Приём ограничен: общий размер очереди и число задач одного чата. Отказ
+возвращается сразу (:class:`Admission`), вместе с местом в очереди и
+оценкой ожидания. Она строится по скользящему среднему времени
+выполнения задач каждого типа.
+"""
+from __future__ import annotations
+
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# Вес нового замера в скользящем среднем времени выполнения
+_EWMA_ALPHA = 0.2
+_WAIT_SAMPLES = 512
+_DEFAULT_SERVICE_SEC = 3.0
+
+
+@dataclass
+class MediaJob:
+    job_id: int
+    chat_id: int
+    kind: str
+    payload: Any
+    enqueued_at: float
+    # метка вызывающего (например, id задачи в долговременной очереди), в пул не передаётся
+    ref: Any = None
+
+
+@dataclass(frozen=True)
+class Admission:
+    accepted: bool
+    # сколько задач из очереди будет взято в работу раньше этой
+    position: int = 0
+    eta_seconds: float = 0.0
+    # отказ: "queue_full" | "chat_limit" | "stopped"; принята ранее: "duplicate"
+    reason: str = ""
+
+
+class FairQueue:
+    """Очереди по чатам; ``pop`` берёт по одной задаче у каждого чата по кругу."""
+
+    def __init__(self) -> None:
+        self._chats: "OrderedDict[int, Deque[MediaJob]]" = OrderedDict()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put(self, job: MediaJob) -> None:
+        self._chats.setdefault(job.chat_id, deque()).append(job)
+        self._size += 1
+
+    def pop(self) -> Optional[MediaJob]:
+        if not self._chats:
+            return None
+        chat_id, jobs = next(iter(self._chats.items()))
+        job = jobs.popleft()
+        if jobs:
+            self._chats.move_to_end(chat_id)
+        else:
+            del self._chats[chat_id]
+        self._size -= 1
+        return job
+
+    def pending(self, chat_id: int) -> int:
+        jobs = self._chats.get(chat_id)
+        return len(jobs) if jobs else 0
+
+    def ahead_of_new(self, chat_id: int) -> int:
+        """Сколько стоящих задач будет выбрано раньше новой задачи чата (оценка сверху)."""
+
+        own = self.pending(chat_id)
+        # Новая задача будет (own + 1)-й у своего чата: за это время
+        # каждый другой чат успеет отдать не больше own + 1 задач
+        return own + sum(min(len(jobs), own + 1) for cid, jobs in self._chats.items() if cid != chat_id)
+
+    def depth_by_chat(self) -> Dict[int, int]:
+        return {chat_id: len(jobs) for chat_id, jobs in self._chats.items()}
+
+
+class MediaEngine:
+    """Приём, планирование и выполнение задач ``run_job(chat_id, kind, payload)`` в пуле."""
+
+    def __init__(
+        self,
+        run_job: Callable[[int, str, Any], Any],
+        *,
+        workers: int,
+        queue_limit: int,
+        per_chat_limit: int,
+        executor_factory: Callable[[int], Executor],
+        on_error: Optional[Callable[[MediaJob, BaseException], None]] = None,
+        on_result: Optional[Callable[[MediaJob, Any], None]] = None,
+        default_service_sec: float = _DEFAULT_SERVICE_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.queue_limit = max(1, int(queue_limit))
+        self.per_chat_limit = max(1, int(per_chat_limit))
+        self._run_job = run_job
+        self._executor_factory = executor_factory
+        self._on_error = on_error
+        self._on_result = on_result
+        self._default_service = default_service_sec
+        self._clock = clock
+
+        self._cond = threading.Condition()
+        self._queue = FairQueue()
+        self._executor: Optional[Executor] = None
+        self._dispatcher: Optional[threading.Thread] = None
+        self._stopped = False
+        self._ids = itertools.count(1)
+
+        self._in_flight = 0
+        self._accepted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._failed = 0
+        self._pool_restarts = 0
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._wait_max = 0.0
+        self._service: Dict[str, float] = {}
+
+    # --- жизненный цикл ---
+
+    def start(self) -> None:
+        with self._cond:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._stopped = False
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="media-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            executor, self._executor = self._executor, None
+            dispatcher = self._dispatcher
+        if dispatcher is not None and wait:
+            dispatcher.join(timeout=5)
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def drain(self) -> List[MediaJob]:
+        """Забрать задачи, которые ещё не дошли до пула (после :meth:`shutdown` они не начнутся)."""
+
+        with self._cond:
+            jobs = []
+            while len(self._queue):
+                jobs.append(self._queue.pop())
+            return jobs
+
+    # --- приём ---
+
+    def submit(self, chat_id: int, kind: str, payload: Any, *, ref: Any = None) -> Admission:
+        with self._cond:
+            if self._stopped:
+                return Admission(False, reason="stopped")
+            if len(self._queue) >= self.queue_limit:
+                self._rejected += 1
+                return Admission(False, position=len(self._queue), eta_seconds=self._eta_locked(chat_id, kind), reason="queue_full")
+            if self._queue.pending(chat_id) >= self.per_chat_limit:
+                self._rejected += 1
+                return Admission(False, position=self._queue.pending(chat_id), reason="chat_limit")
+
+            position = self._queue.ahead_of_new(chat_id)
+            eta = self._eta_locked(chat_id, kind)
+            self._queue.put(MediaJob(next(self._ids), chat_id, kind, payload, self._clock(), ref))
+            self._accepted += 1
+            self._cond.notify_all()
+        self.start()
+        return Admission(True, position=position, eta_seconds=eta)
+
+    def _eta_locked(self, chat_id: int, kind: str) -> float:
+        """Время до готовности новой задачи: разбор очереди «волнами» по ``workers`` задач."""
+
+        ahead = self._queue.ahead_of_new(chat_id) + self._in_flight
+        return estimate_wait(ahead, self.workers, self._service, kind, default=self._default_service)
+
+    # --- выполнение ---
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._executor_factory(self.workers)
+        return self._executor
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and (self._in_flight >= self.workers or not len(self._queue)):
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                job = self._queue.pop()
+                self._in_flight += 1
+                started = self._clock()
+                waited = started - job.enqueued_at
+                self._waits.append(waited)
+                self._wait_max = max(self._wait_max, waited)
+                executor = self._get_executor()
+            try:
+                future = executor.submit(self._run_job, job.chat_id, job.kind, job.payload)
+            except (BrokenProcessPool, RuntimeError) as exc:
+                self._finish(job, started, executor, exc)
+                continue
+            future.add_done_callback(
+                lambda fut, job=job, started=started, executor=executor: self._finish(
+                    job, started, executor, _exception(fut), fut
+                )
+            )
+
+    def _finish(
+        self,
+        job: MediaJob,
+        started: float,
+        executor: Executor,
+        exc: Optional[BaseException],
+        future: Optional[Future] = None,
+    ) -> None:
+        elapsed = self._clock() - started
+        with self._cond:
+            self._in_flight -= 1
+            if exc is None:
+                self._completed += 1
+                previous = self._service.get(job.kind)
+                self._service[job.kind] = elapsed if previous is None else previous + _EWMA_ALPHA * (elapsed - previous)
+            else:
+                self._failed += 1
+            if isinstance(exc, BrokenProcessPool) and self._executor is executor:
+                # Упавший процесс ломает весь пул: следующая задача получит новый
+                self._executor = None
+                self._pool_restarts += 1
+                threading.Thread(target=executor.shutdown, kwargs={"wait": False}, daemon=True).start()
+            self._cond.notify_all()
+        try:
+            if exc is not None and self._on_error is not None:
+                self._on_error(job, exc)
+            elif exc is None and future is not None and self._on_result is not None:
+                # Слот воркера уже свободен: результат (например, загрузку) обрабатывают отдельно
+                self._on_result(job, future.result())
+        except Exception as callback_exc:  # noqa: BLE001 - сбой обработчика не должен ронять диспетчер
+            handler = "on_error" if exc is not None else "on_result"
+            print(f"[MEDIA] {handler} for job {job.job_id} ({job.kind}) failed: {callback_exc!r}")
+
+    # --- метрики ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self._waits)
+            depth = self._queue.depth_by_chat()
+            return {
+                "workers": self.workers,
+                "queued": len(self._queue),
+                "queue_limit": self.queue_limit,
+                "chats_waiting": len(depth),
+                "max_chat_depth": max(depth.values(), default=0),
+                "in_flight": self._in_flight,
+                "accepted": self._accepted,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "failed": self._failed,
+                "pool_restarts": self._pool_restarts,
+                "wait_avg_sec": sum(waits) / len(waits) if waits else 0.0,
+                "wait_p95_sec": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+                "wait_max_sec": self._wait_max,
+                "service_sec": dict(self._service),
+            }
+
+
+def estimate_wait(
+    ahead: int,
+    workers: int,
+    service_sec: Dict[str, float],
+    kind: str,
+    *,
+    default: float = _DEFAULT_SERVICE_SEC,
+) -> float:
+    """Ожидание задачи, перед которой ``ahead`` задач (включая выполняемые), при ``workers`` воркерах."""
+
+    workers = max(1, workers)
+    average = (sum(service_sec.values()) / len(service_sec)) if service_sec else default
+    waves = math.ceil(max(0, ahead + 1 - workers) / workers)
+    return waves * average + service_sec.get(kind, default)
+
+
+def _exception(future: Future) -> Optional[BaseException]:
+    try:
+        return future.exception()
+    except CancelledError as exc:
+        return exc
+
+
+__all__ = ["Admission", "FairQueue", "MediaEngine", "MediaJob", "estimate_wait"]
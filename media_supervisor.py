@@ -0,0 +1,411 @@
+"""Пул воркеров под надзором: пульс, предел времени задачи и предел памяти.
+
+``ProcessPoolExecutor`` не умеет остановить одну зависшую задачу: процесс
+рендерит её бесконечно, а упавший процесс ломает весь пул вместе с
+чужими задачами. :class:`SupervisedPool` — ``Executor`` для
+:class:`media_engine.MediaEngine`, у которого каждый воркер — отдельный
+процесс со своим каналом:
+
+* воркер раз в ``heartbeat_interval`` секунд шлёт пульс (с текущим RSS);
+  если пульса нет дольше ``heartbeat_timeout`` (процесс остановлен или завис
+  в коде, держащем GIL), процесс убивается;
+* задача дольше ``job_timeout`` секунд убивается вместе с процессом;
+* адресное пространство воркера ограничено ``RLIMIT_AS``: сверх размера на
+  старте он может занять не больше ``memory_limit`` байт (``RLIMIT_RSS``
+  Linux не соблюдает). Упёршаяся в предел задача получает ``MemoryError``,
+  а воркер после неё перезапускается;
+* упавший процесс (segfault, OOM killer) срывает только свою задачу.
+
+Сорванная задача завершается :class:`JobAborted` с причиной, а на место
+воркера сразу запускается новый. Счётчики перезапусков по причинам — в
+:meth:`SupervisedPool.stats`.
+"""
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from multiprocessing.connection import wait as wait_ready
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+_HEARTBEAT_INTERVAL = 1.0
+# Сколько ждать выхода воркера после команды остановиться
+_STOP_GRACE_SEC = 5.0
+
+REASONS = ("crashed", "timeout", "hung", "memory")
+
+
+class JobAborted(RuntimeError):
+    """Задача сорвана вместе с воркером: ``reason`` — одна из :data:`REASONS`."""
+
+    def __init__(self, reason: str, detail: str = "") -> None:
+        super().__init__(f"media worker {reason}" + (f": {detail}" if detail else ""))
+        self.reason = reason
+
+
+def _address_space() -> int:
+    """Текущий размер адресного пространства процесса (0, если неизвестен)."""
+
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _rss() -> int:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _limit_memory(limit: int) -> None:
+    """``RLIMIT_AS`` = размер на старте + ``limit``.
+
+    После fork воркер наследует адресное пространство родителя, поэтому
+    предел считается от текущего размера, а не от нуля.
+    """
+
+    if limit <= 0:
+        return
+    try:
+        import resource
+    except ImportError:  # не Unix
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    soft = _address_space() + limit
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    except (ValueError, OSError) as exc:
+        print(f"[MEDIA] worker memory limit is not applied: {exc!r}")
+
+
+def _worker_main(conn, initializer: Optional[Callable[[], None]], memory_limit: int, heartbeat_interval: float) -> None:
+    """Цикл воркера: задачи по каналу, ответы и пульс — обратно по нему же."""
+
+    # Остановкой управляет супервизор: Ctrl+C в терминале и обработчики родителя не для воркера
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    send_lock = threading.Lock()
+
+    def send(message: tuple) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def beat() -> None:
+        while True:
+            try:
+                send(("beat", _rss()))
+            except (OSError, EOFError, ValueError):
+                return
+            time.sleep(heartbeat_interval)
+
+    threading.Thread(target=beat, name="media-heartbeat", daemon=True).start()
+    _limit_memory(memory_limit)
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            item = conn.recv()
+        except (EOFError, OSError):
+            return
+        if item is None:
+            return
+        task_id, fn, args, kwargs = item
+        try:
+            outcome = ("ok", fn(*args, **kwargs))
+        except BaseException as exc:  # noqa: BLE001 - любая ошибка задачи уходит вызывающему
+            outcome = ("error", exc)
+        try:
+            send(("done", task_id) + outcome)
+        except Exception as exc:  # noqa: BLE001 - результат или исключение не сериализуются
+            send(("done", task_id, "error", RuntimeError(f"result is not picklable: {exc!r}")))
+
+
+class _Task:
+    __slots__ = ("task_id", "future", "fn", "args", "kwargs")
+
+    def __init__(self, task_id: int, future: Future, fn: Callable, args: tuple, kwargs: dict) -> None:
+        self.task_id = task_id
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+
+
+class _Worker:
+    def __init__(self, process, conn, now: float) -> None:
+        self.process = process
+        self.conn = conn
+        self.last_beat = now
+        self.rss = 0
+        self.task: Optional[_Task] = None
+        self.deadline = 0.0
+
+
+class SupervisedPool(Executor):
+    """``workers`` процессов под надзором; задачи сверх свободных воркеров ждут в FIFO."""
+
+    def __init__(
+        self,
+        workers: int,
+        *,
+        initializer: Optional[Callable[[], None]] = None,
+        job_timeout: float = 120.0,
+        memory_limit: int = 0,
+        heartbeat_interval: float = _HEARTBEAT_INTERVAL,
+        heartbeat_timeout: float = 30.0,
+        mp_context=None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.job_timeout = float(job_timeout)
+        self.memory_limit = max(0, int(memory_limit))
+        self.heartbeat_interval = float(heartbeat_interval)
+        self.heartbeat_timeout = max(float(heartbeat_timeout), 2 * self.heartbeat_interval)
+        self._initializer = initializer
+        self._ctx = mp_context or multiprocessing.get_context()
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._pending: Deque[_Task] = deque()
+        self._ids = itertools.count(1)
+        self._shutdown = False
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self._slots: List[Optional[_Worker]] = [None] * self.workers
+        self._restarts: Dict[str, int] = dict.fromkeys(REASONS, 0)
+        self._spawned = 0
+        self._spawn_errors = 0
+
+        for index in range(self.workers):
+            self._spawn(index)
+        self._thread = threading.Thread(target=self._supervise, name="media-supervisor", daemon=True)
+        self._thread.start()
+
+    # --- Executor ---
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future: Future = Future()
+            self._pending.append(_Task(next(self._ids), future, fn, args, kwargs))
+        self._wake()
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while self._pending:
+                    self._pending.popleft().future.cancel()
+        self._wake()
+        if wait:
+            self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            workers = [worker for worker in self._slots if worker is not None]
+            return {
+                "alive": len(workers),
+                "busy": sum(1 for worker in workers if worker.task is not None),
+                "pending": len(self._pending),
+                "spawned": self._spawned,
+                "spawn_errors": self._spawn_errors,
+                "restarts": dict(self._restarts),
+                "heartbeat_age_max_sec": max((now - worker.last_beat for worker in workers), default=0.0),
+                "rss_max_mb": max((worker.rss for worker in workers), default=0) / 2**20,
+            }
+
+    # --- процессы ---
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send_bytes(b"")
+        except (OSError, ValueError):  # супервизор уже закрыл канал
+            pass
+
+    def _spawn(self, index: int) -> None:
+        parent, child = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child, self._initializer, self.memory_limit, self.heartbeat_interval),
+            name=f"media-worker-{index}",
+            daemon=True,
+        )
+        try:
+            process.start()
+        except OSError as exc:
+            # Нет ресурсов на процесс: слот пуст, попробуем при следующей задаче
+            self._spawn_errors += 1
+            print(f"[MEDIA] worker {index} failed to start: {exc!r}")
+            parent.close()
+            return
+        finally:
+            child.close()
+        self._slots[index] = _Worker(process, parent, self._clock())
+        self._spawned += 1
+
+    def _replace(self, index: int, reason: str, error: Optional[BaseException]) -> None:
+        """Убить воркер ``index``, сорвать его задачу и запустить новый."""
+
+        worker = self._slots[index]
+        self._slots[index] = None
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=_STOP_GRACE_SEC)
+        worker.conn.close()
+        self._restarts[reason] += 1
+        task = worker.task
+        if task is not None:
+            print(f"[MEDIA] worker {worker.process.pid} {reason}, task {task.task_id} aborted")
+            task.future.set_exception(error or JobAborted(reason))
+        else:
+            print(f"[MEDIA] idle worker {worker.process.pid} {reason}, restarting")
+        if not self._shutdown:
+            self._spawn(index)
+
+    # --- супервизор ---
+
+    def _assign(self) -> None:
+        for index, worker in enumerate(self._slots):
+            if not self._pending:
+                return
+            if worker is None:
+                self._spawn(index)
+                worker = self._slots[index]
+                if worker is None:
+                    continue
+            if worker.task is not None:
+                continue
+            task = self._pending.popleft()
+            if not task.future.set_running_or_notify_cancel():
+                continue
+            try:
+                worker.conn.send((task.task_id, task.fn, task.args, task.kwargs))
+            except Exception as exc:  # noqa: BLE001 - задача не сериализуется или воркер уже мёртв
+                task.future.set_exception(exc)
+                continue
+            worker.task = task
+            worker.deadline = self._clock() + self.job_timeout
+
+    def _on_message(self, index: int, message: tuple) -> None:
+        worker = self._slots[index]
+        worker.last_beat = self._clock()
+        if message[0] == "beat":
+            worker.rss = message[1]
+            return
+        _, task_id, status, value = message
+        task, worker.task = worker.task, None
+        if task is None or task.task_id != task_id:
+            return
+        if status == "ok":
+            task.future.set_result(value)
+        elif isinstance(value, MemoryError):
+            # Куча воркера после MemoryError ненадёжна: задачу срываем, процесс меняем
+            worker.task = task
+            self._replace(index, "memory", JobAborted("memory", f"limit {self.memory_limit // 2**20} MB"))
+        else:
+            task.future.set_exception(value)
+
+    def _check_deadlines(self, now: float) -> None:
+        for index, worker in enumerate(self._slots):
+            if worker is None:
+                continue
+            if worker.task is not None and now >= worker.deadline:
+                self._replace(index, "timeout", JobAborted("timeout", f"longer than {self.job_timeout:g} s"))
+            elif now - worker.last_beat > self.heartbeat_timeout:
+                self._replace(index, "hung", JobAborted("hung", f"no heartbeat for {now - worker.last_beat:.0f} s"))
+
+    def _next_timeout(self, now: float) -> float:
+        timeout = self.heartbeat_interval
+        for worker in self._slots:
+            if worker is not None and worker.task is not None:
+                timeout = min(timeout, worker.deadline - now)
+        return max(0.0, timeout)
+
+    def _idle(self) -> bool:
+        return not self._pending and all(worker is None or worker.task is None for worker in self._slots)
+
+    def _supervise(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if self._shutdown and self._idle():
+                        break
+                    self._assign()
+                    now = self._clock()
+                    timeout = self._next_timeout(now)
+                    conns = {worker.conn: index for index, worker in enumerate(self._slots) if worker is not None}
+                    sentinels = {
+                        worker.process.sentinel: index for index, worker in enumerate(self._slots) if worker is not None
+                    }
+                ready = wait_ready([self._wake_r, *conns, *sentinels], timeout)
+                with self._lock:
+                    if self._wake_r in ready:
+                        while self._wake_r.poll():
+                            self._wake_r.recv_bytes()
+                    for conn, index in conns.items():
+                        if conn in ready:
+                            self._drain(index, conn)
+                    for sentinel, index in sentinels.items():
+                        worker = self._slots[index]
+                        if sentinel in ready and worker is not None and worker.conn in conns:
+                            self._drain(index, worker.conn)
+                            if self._slots[index] is worker:
+                                code = worker.process.exitcode
+                                self._replace(index, "crashed", JobAborted("crashed", f"exit code {code}"))
+                    self._check_deadlines(self._clock())
+        finally:
+            self._stop_workers()
+
+    def _drain(self, index: int, conn) -> None:
+        """Прочитать все сообщения воркера; закрытый канал — упавший воркер."""
+
+        while self._slots[index] is not None and self._slots[index].conn is conn:
+            try:
+                if not conn.poll():
+                    return
+                message = conn.recv()
+            except (EOFError, OSError):
+                worker = self._slots[index]
+                worker.process.join(timeout=_STOP_GRACE_SEC)
+                self._replace(index, "crashed", JobAborted("crashed", f"exit code {worker.process.exitcode}"))
+                return
+            self._on_message(index, message)
+
+    def _stop_workers(self) -> None:
+        with self._lock:
+            workers = [worker for worker in self._slots if worker is not None]
+            self._slots = [None] * self.workers
+            while self._pending:
+                self._pending.popleft().future.cancel()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        deadline = time.monotonic() + _STOP_GRACE_SEC
+        for worker in workers:
+            worker.process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+            if worker.task is not None:
+                worker.task.future.set_exception(JobAborted("crashed", "pool stopped"))
+        self._wake_r.close()
+        self._wake_w.close()
+
+
+__all__ = ["JobAborted", "REASONS", "SupervisedPool"]
@@ -0,0 +1,204 @@
+"""Отправка готовых документов в Telegram отдельно от их рендеринга.
+
+Процессы пула только рендерят байты (CPU), а загрузку в Bot API (сеть)
+выполняет :class:`Uploader` в процессе бота — несколькими потоками. Поэтому
+медленная отправка больше не задерживает следующий рендер.
+
+Повторы:
+
+* 429 — ждём ровно ``retry_after`` из ответа, причём пауза общая для всех
+  загрузок: Telegram ограничивает бота целиком, а не один запрос;
+* 5xx и сетевые ошибки — экспоненциальная задержка со случайным разбросом;
+* прочие 4xx (чат не найден, бот заблокирован) — без повторов.
+
+После последней неудачи вызывается ``on_failure`` — он сообщает об ошибке в чат.
+"""
+from __future__ import annotations
+
+import io
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+# Сетевые ошибки requests/urllib3 распознаём по имени, чтобы не тянуть их сюда
+_TRANSIENT_ERRORS = {"ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout", "ChunkedEncodingError"}
+
+
+@dataclass
+class Document:
+    filename: str
+    caption: str
+    data: bytes
+    # уже загруженный в Telegram файл: отправляется по id, без байтов
+    file_id: Optional[str] = None
+    # ключ в кэше результатов, см. result_cache
+    cache_key: Optional[str] = None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Пауза из ответа 429 (``parameters.retry_after``), если это он."""
+
+    if getattr(exc, "error_code", None) != 429:
+        return None
+    parameters = (getattr(exc, "result_json", None) or {}).get("parameters") or {}
+    try:
+        return max(0.0, float(parameters.get("retry_after", 1)))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def is_transient(exc: BaseException) -> bool:
+    code = getattr(exc, "error_code", None)
+    if code is None:
+        # ответ без JSON (например, 502 от прокси): смотрим HTTP-статус
+        code = getattr(getattr(exc, "result", None), "status_code", None)
+    if isinstance(code, int):
+        return code == 429 or code >= 500
+    return type(exc).__name__ in _TRANSIENT_ERRORS or isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class Uploader:
+    """Параллельная отправка ``send(chat_id, Document)`` с повторами."""
+
+    def __init__(
+        self,
+        send: Callable[[int, Document], object],
+        *,
+        concurrency: int = 4,
+        max_attempts: int = 4,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        on_start: Optional[Callable[[int], object]] = None,
+        on_sent: Optional[Callable[[int, Document, object], object]] = None,
+        on_failure: Optional[Callable[[int, Document, BaseException], object]] = None,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._send = send
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="media-upload")
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._on_start = on_start
+        self._on_sent = on_sent
+        self._on_failure = on_failure
+        self._sleep = sleep
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._pending = 0
+        self._counters: Dict[str, float] = {
+            "uploaded": 0,
+            "failed": 0,
+            "retries": 0,
+            "rate_limited": 0,
+            "upload_seconds": 0.0,
+        }
+
+    def submit(self, chat_id: int, document: Document) -> Future:
+        with self._lock:
+            self._pending += 1
+        return self._executor.submit(self._upload, chat_id, document)
+
+    def _wait_for_rate_limit(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._paused_until - self._clock()
+            if delay <= 0:
+                return
+            self._sleep(delay)
+
+    def _backoff(self, attempt: int) -> float:
+        # «Полный» джиттер, как у переподключения к Redis
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _upload(self, chat_id: int, document: Document) -> bool:
+        started = self._clock()
+        try:
+            if self._on_start is not None:
+                try:
+                    self._on_start(chat_id)
+                except Exception:  # noqa: BLE001 - индикатор «отправляет файл» не обязателен
+                    pass
+            for attempt in range(1, self.max_attempts + 1):
+                self._wait_for_rate_limit()
+                try:
+                    sent = self._send(chat_id, document)
+                except Exception as exc:  # noqa: BLE001 - классифицируем ниже
+                    pause = retry_after(exc)
+                    if attempt >= self.max_attempts or not is_transient(exc):
+                        self._fail(chat_id, document, exc)
+                        return False
+                    with self._lock:
+                        self._counters["retries"] += 1
+                        if pause is not None:
+                            self._counters["rate_limited"] += 1
+                            self._paused_until = max(self._paused_until, self._clock() + pause)
+                    if pause is None:
+                        self._sleep(self._backoff(attempt))
+                    continue
+                with self._lock:
+                    self._counters["uploaded"] += 1
+                    self._counters["upload_seconds"] += self._clock() - started
+                if self._on_sent is not None:
+                    try:
+                        self._on_sent(chat_id, document, sent)
+                    except Exception:  # noqa: BLE001 - файл уже у пользователя
+                        pass
+                return True
+            return False
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _fail(self, chat_id: int, document: Document, exc: BaseException) -> None:
+        with self._lock:
+            self._counters["failed"] += 1
+        print(f"[MEDIA] upload of {document.filename} to chat {chat_id} failed: {exc!r}")
+        if self._on_failure is not None:
+            try:
+                self._on_failure(chat_id, document, exc)
+            except Exception:  # noqa: BLE001 - сообщение об ошибке тоже может не уйти
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["pending"] = self._pending
+            stats["upload_avg_sec"] = stats["upload_seconds"] / stats["uploaded"] if stats["uploaded"] else 0.0
+            stats["paused_sec"] = max(0.0, self._paused_until - self._clock())
+        return stats
+
+    def shutdown(self, *, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+def telegram_sender(bot) -> Callable[[int, Document], object]:
+    """``send`` для :class:`Uploader` поверх ``telebot.TeleBot``; буфер создаётся заново на каждую попытку."""
+
+    def send(chat_id: int, document: Document):
+        return bot.send_document(
+            chat_id,
+            document.file_id or io.BytesIO(document.data),
+            visible_file_name=document.filename,
+            caption=document.caption,
+        )
+
+    return send
+
+
+def sent_file_id(message: object) -> Optional[str]:
+    """``file_id`` отправленного документа или фото (самого крупного размера)."""
+
+    document = getattr(message, "document", None)
+    if document is not None:
+        return document.file_id
+    photos = getattr(message, "photo", None)
+    return photos[-1].file_id if photos else None
+
+
+__all__ = ["Document", "Uploader", "is_transient", "retry_after", "sent_file_id", "telegram_sender"]
@@ -1,36 +1,36 @@
+"""Генерация PDF, Excel и PPTX.
+
+Тяжёлые библиотеки (reportlab, openpyxl, python-pptx) и реестр шрифта
+импортируются внутри функций: модуль загружается только в процессе
+медиа-воркера, и каждый формат тянет лишь свои зависимости.
+"""
 import io
+import tempfile
 from datetime import datetime
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from openpyxl import Workbook
-from pptx import Presentation
-from pptx.util import Inches, Pt
+from typing import Optional
 
-from font_data import ensure_font
 
+# До этого размера готовый файл остаётся в памяти, больший уходит во временный файл
+_PDF_SPOOL_BYTES = 4 * 1024 * 1024
+_XLSX_SPOOL_BYTES = 4 * 1024 * 1024
 
-def make_pdf(text: str) -> bytes:
-    buf = io.BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-
-    font_path = ensure_font()
-    pdfmetrics.registerFont(TTFont("DejaVu", font_path))
-    c.setFont("DejaVu", 12)
-    c.setTitle("Document")
-    width, height = A4
-    y = height - 50
-    for line in text.splitlines() or ["(empty)"]:
-        c.drawString(40, y, line[:120])  # простая обрезка
-        y -= 18
-        if y < 40:
-            c.showPage()
-            c.setFont("DejaVu", 12)
-            y = height - 50
-    c.showPage()
-    c.save()
-    return buf.getvalue()
+
+def make_pdf(text: str, *, max_pages: Optional[int] = None, max_bytes: Optional[int] = None) -> bytes:
+    """Текст в PDF с переносом строк по ширине (см. :mod:`pdf_layout`)."""
+    import pdf_layout
+    from font_registry import register_font
+
+    font = register_font()  # разбор TTF — один раз на процесс воркера
+    with tempfile.SpooledTemporaryFile(max_size=_PDF_SPOOL_BYTES) as out:
+        pdf_layout.render_text(
+            text,
+            out,
+            font_name=font,
+            max_pages=pdf_layout.DEFAULT_MAX_PAGES if max_pages is None else max_pages,
+            max_bytes=pdf_layout.DEFAULT_MAX_BYTES if max_bytes is None else max_bytes,
+        )
+        out.seek(0)
+        return out.read()
 
 def make_excel(csv_like_text: str) -> bytes:
     """
@@ -38,18 +38,29 @@ def make_excel(csv_like_text: str) -> bytes:
     Заголовок1, Заголовок2
     Значение1, Значение2
     ...
+    Разделитель (``,``, ``;``, табуляция) и типы столбцов определяются
+    автоматически, см. :mod:`spreadsheet`.
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Sheet1"
-    for row in csv_like_text.splitlines():
-        cells = [cell.strip() for cell in row.split(",")]
-        ws.append(cells)
-    buf = io.BytesIO()
-    wb.save(buf)
-    return buf.getvalue()
+    return _xlsx_bytes(io.StringIO(csv_like_text, newline=""))
+
+
+def make_excel_file(path: str) -> bytes:
+    """Excel из загруженного CSV-файла: читается потоком, без загрузки в память целиком."""
+    import spreadsheet
 
-def make_pptx(title_and_bullets: str) -> bytes:
+    with spreadsheet.open_csv(path) as source:
+        return _xlsx_bytes(source)
+
+
+def _xlsx_bytes(source) -> bytes:
+    import spreadsheet
+
+    with tempfile.SpooledTemporaryFile(max_size=_XLSX_SPOOL_BYTES) as out:
+        spreadsheet.write_workbook(source, out)
+        out.seek(0)
+        return out.read()
+
+def make_pptx(title_and_bullets: str, *, template: Optional[str] = None, logo: Optional[str] = None) -> bytes:
     """
     Текст формата:
     Заголовок: Моя презентация
@@ -59,8 +70,13 @@ def make_pptx(title_and_bullets: str) -> bytes:
     Заголовок: Второй слайд
     - Пункт A
     - Пункт B
+
+    ``template`` — свой .pptx вместо стандартного, ``logo`` — картинка на каждом
+    слайде; оба разбираются один раз на процесс (см. :mod:`presentation`).
     """
-    prs = Presentation()
+    from presentation import DeckBuilder, deck_template
+
+    deck = DeckBuilder(deck_template(template, logo))
     blocks = [b.strip() for b in title_and_bullets.split("===") if b.strip()]
     if not blocks:
         blocks = [f"Заголовок: Авто-слайды\n- Слайд создан {datetime.now():%Y-%m-%d %H:%M}"]
@@ -69,23 +85,9 @@ def make_pptx(title_and_bullets: str) -> bytes:
         lines = [ln.strip() for ln in block.splitlines() if ln.strip()]
         title_line = lines[0] if lines else "Слайд"
         title_text = title_line.replace("Заголовок:", "").strip() if "Заголовок:" in title_line else title_line
-
-        slide_layout = prs.slide_layouts[1]  # Title and Content
-        slide = prs.slides.add_slide(slide_layout)
-        slide.shapes.title.text = title_text
-
-        body = slide.shapes.placeholders[1].text_frame
-        body.clear()
         bullets = [ln[1:].strip() for ln in lines[1:] if ln.startswith("-")]
-        if bullets:
-            body.text = bullets[0]
-            for b in bullets[1:]:
-                p = body.add_paragraph()
-                p.text = b
-                p.level = 0
-        else:
-            body.text = " "
+        deck.add_slide(title_text, bullets)
 
     buf = io.BytesIO()
-    prs.save(buf)
+    deck.save(buf)
     return buf.getvalue()
@@ -0,0 +1,738 @@
+"""Встроенная замена Redis для офлайн-режима SynteraGPT.
+
+Поддерживает строки, списки, хэши, множества и sorted set'ы с семантикой
+redis-py (``decode_responses=True``), активное удаление просроченных ключей
+фоновым потоком по куче сроков жизни, ограничение памяти с вытеснением по LRU
+и буферизованные пайплайны, которые исполняются атомарно под общей блокировкой.
+"""
+from __future__ import annotations
+
+import bisect
+import fnmatch
+import functools
+import heapq
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+try:
+    from redis.exceptions import ResponseError as _RedisResponseError  # type: ignore
+except ImportError:  # pragma: no cover - redis не установлен
+    _RedisResponseError = Exception
+
+
+class ResponseError(_RedisResponseError):
+    """Ошибка выполнения команды (совместима с ``redis.exceptions.ResponseError``)."""
+
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+# Приблизительные накладные расходы на ключ и элемент коллекции (байты)
+_KEY_OVERHEAD = 64
+_ITEM_OVERHEAD = 16
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, bool):
+        raise ResponseError("Invalid input of type: 'bool'. Convert to a bytes, string, int or float first.")
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, int):
+        return str(value)
+    raise ResponseError(f"Invalid input of type: '{type(value).__name__}'.")
+
+
+def _parse_bound(value: Any) -> Tuple[float, bool]:
+    """Разобрать границу ZRANGEBYSCORE: число, ``-inf``/``+inf`` или ``(число``."""
+
+    if isinstance(value, (int, float)):
+        return float(value), False
+    text = _encode(value)
+    exclusive = text.startswith("(")
+    if exclusive:
+        text = text[1:]
+    return float(text), exclusive
+
+
+def _normalize_range(start: int, end: int, size: int) -> Tuple[int, int]:
+    if start < 0:
+        start = max(size + start, 0)
+    if end < 0:
+        end = size + end
+    end = min(end, size - 1)
+    return start, end
+
+
+class _SortedSet:
+    """Упорядоченное множество: словарь очков и отсортированный список для диапазонов."""
+
+    def __init__(self) -> None:
+        self.scores: Dict[str, float] = {}
+        self._ordered: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def set(self, member: str, score: float) -> bool:
+        previous = self.scores.get(member)
+        if previous is not None:
+            del self._ordered[bisect.bisect_left(self._ordered, (previous, member))]
+        self.scores[member] = score
+        bisect.insort(self._ordered, (score, member))
+        return previous is None
+
+    def remove(self, member: str) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self._ordered[bisect.bisect_left(self._ordered, (score, member))]
+        return True
+
+    def range(self, start: int, end: int, desc: bool = False) -> List[Tuple[str, float]]:
+        size = len(self._ordered)
+        start, end = _normalize_range(start, end, size)
+        if start > end:
+            return []
+        if desc:
+            # Индексы считаются с конца: как в Redis, больший счёт — раньше
+            window = reversed(self._ordered[size - 1 - end:size - start])
+        else:
+            window = iter(self._ordered[start:end + 1])
+        return [(member, score) for score, member in window]
+
+    def range_by_score(self, low: Tuple[float, bool], high: Tuple[float, bool]) -> List[Tuple[str, float]]:
+        (min_score, min_excl), (max_score, max_excl) = low, high
+        left = bisect.bisect_left(self._ordered, (min_score, ""))
+        result = []
+        for score, member in self._ordered[left:]:
+            if score > max_score or (max_excl and score == max_score):
+                break
+            if min_excl and score == min_score:
+                continue
+            result.append((member, score))
+        return result
+
+
+def _command(method: Callable) -> Callable:
+    """Выполнять команду под общей (реентерабельной) блокировкой хранилища."""
+
+    @functools.wraps(method)
+    def wrapper(self: "InMemoryRedis", *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class InMemoryRedis:
+    """Потокобезопасное in-memory хранилище с подмножеством команд Redis.
+
+    ``maxmemory`` — приблизительное ограничение в байтах (0 — без ограничения).
+    При его превышении вытесняются давно не использовавшиеся ключи, как при
+    политике ``allkeys-lru`` в Redis; только что записанный ключ не трогается.
+    """
+
+    def __init__(self, *, maxmemory: int = 0, sweep_interval: float = 1.0) -> None:
+        self.maxmemory = int(maxmemory)
+        self.sweep_interval = sweep_interval
+        self._lock = threading.RLock()
+        # Порядок словаря — порядок последнего обращения (голова — кандидат на вытеснение)
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._used = 0
+        self._expires: Dict[str, float] = {}
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stats = {"expired_keys": 0, "evicted_keys": 0}
+
+    # --- служебное: память, сроки жизни, вытеснение ---
+
+    @property
+    def used_memory(self) -> int:
+        return self._used
+
+    def _estimate(self, key: str, value: Any) -> int:
+        size = _KEY_OVERHEAD + len(key)
+        if isinstance(value, str):
+            return size + len(value)
+        if isinstance(value, dict):
+            return size + sum(len(f) + len(v) + _ITEM_OVERHEAD for f, v in value.items())
+        if isinstance(value, _SortedSet):
+            return size + sum(len(m) + _ITEM_OVERHEAD * 2 for m in value.scores)
+        return size + sum(len(item) + _ITEM_OVERHEAD for item in value)
+
+    def _account(self, key: str, delta: int) -> None:
+        self._sizes[key] = self._sizes.get(key, 0) + delta
+        self._used += delta
+
+    def _store(self, key: str, value: Any) -> None:
+        self._drop(key, keep_ttl=False)
+        self._data[key] = value
+        self._account(key, self._estimate(key, value))
+
+    def _drop(self, key: str, *, keep_ttl: bool = False) -> bool:
+        existed = self._data.pop(key, None) is not None
+        self._used -= self._sizes.pop(key, 0)
+        if not keep_ttl:
+            self._expires.pop(key, None)
+        return existed
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._drop(key)
+            self.stats["expired_keys"] += 1
+            return False
+        return key in self._data
+
+    def _lookup(self, key: str, kind: type) -> Any:
+        if not self._alive(key):
+            return None
+        value = self._data[key]
+        if not isinstance(value, kind):
+            raise ResponseError(WRONGTYPE)
+        self._data.move_to_end(key)
+        return value
+
+    def _create(self, key: str, kind: type) -> Any:
+        value = self._lookup(key, kind)
+        if value is None:
+            value = kind()
+            self._data[key] = value
+            self._account(key, _KEY_OVERHEAD + len(key))
+        return value
+
+    def _cleanup_empty(self, key: str) -> None:
+        value = self._data.get(key)
+        if value is not None and not isinstance(value, str) and len(value) == 0:
+            self._drop(key)
+
+    def _set_expiry(self, key: str, expires_at: float) -> None:
+        self._expires[key] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        self._ensure_sweeper()
+
+    def _enforce_memory(self, protect: Optional[str] = None) -> None:
+        if not self.maxmemory or self._used <= self.maxmemory:
+            return
+        for key in list(self._data.keys()):
+            if self._used <= self.maxmemory:
+                break
+            if key == protect:
+                continue
+            self._drop(key)
+            self.stats["evicted_keys"] += 1
+
+    def _written(self, key: str) -> None:
+        self._cleanup_empty(key)
+        self._enforce_memory(protect=key if key in self._data else None)
+
+    # --- активное удаление просроченных ключей ---
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is not None or self.sweep_interval <= 0:
+            return
+        self._sweeper = threading.Thread(target=self._sweep_loop, name="memory-redis-expiry", daemon=True)
+        self._sweeper.start()
+
+    def _sweep_loop(self) -> None:
+        while not self._stop.wait(self.sweep_interval):
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Удалить все ключи с истёкшим сроком жизни; вернуть их количество."""
+
+        removed = 0
+        now = time.time()
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                expires_at, key = heapq.heappop(heap)
+                # В куче могут остаться устаревшие записи после EXPIRE/SET
+                if self._expires.get(key) == expires_at:
+                    self._drop(key)
+                    removed += 1
+            self.stats["expired_keys"] += removed
+        return removed
+
+    def close(self) -> None:
+        self._stop.set()
+
+    # --- общие команды ---
+
+    @_command
+    def ping(self) -> bool:
+        return True
+
+    @_command
+    def exists(self, *names: str) -> int:
+        return sum(1 for name in names if self._alive(name))
+
+    @_command
+    def delete(self, *names: str) -> int:
+        return sum(1 for name in names if self._alive(name) and self._drop(name))
+
+    @_command
+    def type(self, name: str) -> str:
+        if not self._alive(name):
+            return "none"
+        kinds = {str: "string", list: "list", dict: "hash", set: "set", _SortedSet: "zset"}
+        return kinds[type(self._data[name])]
+
+    @_command
+    def expire(self, name: str, time_seconds: int | float) -> bool:
+        if not self._alive(name):
+            return False
+        self._set_expiry(name, time.time() + float(time_seconds))
+        return True
+
+    @_command
+    def persist(self, name: str) -> bool:
+        if not self._alive(name):
+            return False
+        return self._expires.pop(name, None) is not None
+
+    @_command
+    def ttl(self, name: str) -> int:
+        if not self._alive(name):
+            return -2
+        expires_at = self._expires.get(name)
+        if expires_at is None:
+            return -1
+        return max(0, int(math.ceil(expires_at - time.time())))
+
+    @_command
+    def keys(self, pattern: str = "*") -> List[str]:
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatchcase(key, pattern)]
+
+    def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None) -> Iterator[str]:
+        yield from self.keys(match or "*")
+
+    @_command
+    def dbsize(self) -> int:
+        return sum(1 for key in list(self._data) if self._alive(key))
+
+    @_command
+    def flushall(self) -> bool:
+        self._data.clear()
+        self._sizes.clear()
+        self._expires.clear()
+        self._expiry_heap.clear()
+        self._used = 0
+        return True
+
+    flushdb = flushall
+
+    # --- строки ---
+
+    @_command
+    def get(self, name: str) -> Optional[str]:
+        return self._lookup(name, str)
+
+    @_command
+    def mget(self, keys: List[str], *args: str) -> List[Optional[str]]:
+        names = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        names.extend(args)
+        result = []
+        for name in names:
+            value = self._data.get(name) if self._alive(name) else None
+            result.append(value if isinstance(value, str) else None)
+        return result
+
+    @_command
+    def set(
+        self,
+        name: str,
+        value: Any,
+        ex: Optional[float] = None,
+        px: Optional[int] = None,
+        nx: bool = False,
+        xx: bool = False,
+        keepttl: bool = False,
+    ) -> Optional[bool]:
+        exists = self._alive(name)
+        if (nx and exists) or (xx and not exists):
+            return None
+        ttl_before = self._expires.get(name) if keepttl else None
+        self._store(name, _encode(value))
+        if ex:
+            self._set_expiry(name, time.time() + float(ex))
+        elif px:
+            self._set_expiry(name, time.time() + px / 1000.0)
+        elif ttl_before is not None:
+            self._expires[name] = ttl_before
+        self._written(name)
+        return True
+
+    @_command
+    def setex(self, name: str, time_seconds: int | float, value: Any) -> bool:
+        return self.set(name, value, ex=time_seconds)
+
+    @_command
+    def incrby(self, name: str, amount: int = 1) -> int:
+        current = self._lookup(name, str)
+        try:
+            result = int(current or 0) + int(amount)
+        except ValueError:
+            raise ResponseError("value is not an integer or out of range") from None
+        ttl = self._expires.get(name)
+        self._store(name, str(result))
+        if ttl is not None:
+            self._expires[name] = ttl
+        self._written(name)
+        return result
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, amount)
+
+    def decr(self, name: str, amount: int = 1) -> int:
+        return self.incrby(name, -amount)
+
+    # --- списки ---
+
+    def _push(self, name: str, values: Tuple[Any, ...], left: bool) -> int:
+        items = self._create(name, list)
+        encoded = [_encode(value) for value in values]
+        if left:
+            items[:0] = reversed(encoded)
+        else:
+            items.extend(encoded)
+        self._account(name, sum(len(item) + _ITEM_OVERHEAD for item in encoded))
+        length = len(items)
+        self._written(name)
+        return length
+
+    @_command
+    def lpush(self, name: str, *values: Any) -> int:
+        return self._push(name, values, left=True)
+
+    @_command
+    def rpush(self, name: str, *values: Any) -> int:
+        return self._push(name, values, left=False)
+
+    def _pop(self, name: str, count: Optional[int], left: bool):
+        items = self._lookup(name, list)
+        if not items:
+            return None
+        take = 1 if count is None else min(count, len(items))
+        if left:
+            popped, items[:take] = items[:take], []
+        else:
+            popped = items[len(items) - take:][::-1]
+            del items[len(items) - take:]
+        self._account(name, -sum(len(item) + _ITEM_OVERHEAD for item in popped))
+        self._cleanup_empty(name)
+        return popped if count is not None else popped[0]
+
+    @_command
+    def lpop(self, name: str, count: Optional[int] = None):
+        return self._pop(name, count, left=True)
+
+    @_command
+    def rpop(self, name: str, count: Optional[int] = None):
+        return self._pop(name, count, left=False)
+
+    @_command
+    def lrange(self, name: str, start: int, end: int) -> List[str]:
+        items = self._lookup(name, list) or []
+        start, end = _normalize_range(start, end, len(items))
+        return items[start:end + 1] if start <= end else []
+
+    @_command
+    def llen(self, name: str) -> int:
+        return len(self._lookup(name, list) or [])
+
+    @_command
+    def ltrim(self, name: str, start: int, end: int) -> bool:
+        items = self._lookup(name, list)
+        if items is None:
+            return True
+        start, end = _normalize_range(start, end, len(items))
+        kept = items[start:end + 1] if start <= end else []
+        removed = len(items) - len(kept)
+        if removed:
+            freed = sum(len(item) + _ITEM_OVERHEAD for item in items) - sum(len(item) + _ITEM_OVERHEAD for item in kept)
+            items[:] = kept
+            self._account(name, -freed)
+            self._cleanup_empty(name)
+        return True
+
+    # --- хэши ---
+
+    @_command
+    def hset(
+        self,
+        name: str,
+        key: Optional[str] = None,
+        value: Any = None,
+        mapping: Optional[Dict[Any, Any]] = None,
+    ) -> int:
+        items: Dict[Any, Any] = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        if not items:
+            raise ResponseError("'hset' with no key value pairs")
+        fields = self._create(name, dict)
+        added = 0
+        for field, item in items.items():
+            field, item = _encode(field), _encode(item)
+            previous = fields.get(field)
+            if previous is None:
+                added += 1
+                self._account(name, len(field) + len(item) + _ITEM_OVERHEAD)
+            else:
+                self._account(name, len(item) - len(previous))
+            fields[field] = item
+        self._written(name)
+        return added
+
+    @_command
+    def hget(self, name: str, key: str) -> Optional[str]:
+        return (self._lookup(name, dict) or {}).get(_encode(key))
+
+    @_command
+    def hmget(self, name: str, keys: List[str], *args: str) -> List[Optional[str]]:
+        fields = self._lookup(name, dict) or {}
+        names = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        names.extend(args)
+        return [fields.get(_encode(field)) for field in names]
+
+    @_command
+    def hgetall(self, name: str) -> Dict[str, str]:
+        return dict(self._lookup(name, dict) or {})
+
+    @_command
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        fields = self._create(name, dict)
+        field = _encode(key)
+        previous = fields.get(field)
+        try:
+            result = int(previous or 0) + int(amount)
+        except ValueError:
+            raise ResponseError("hash value is not an integer") from None
+        fields[field] = str(result)
+        if previous is None:
+            self._account(name, len(field) + len(fields[field]) + _ITEM_OVERHEAD)
+        else:
+            self._account(name, len(fields[field]) - len(previous))
+        self._written(name)
+        return result
+
+    @_command
+    def hdel(self, name: str, *keys: str) -> int:
+        fields = self._lookup(name, dict)
+        if not fields:
+            return 0
+        removed = 0
+        for key in keys:
+            field = _encode(key)
+            if field in fields:
+                self._account(name, -(len(field) + len(fields.pop(field)) + _ITEM_OVERHEAD))
+                removed += 1
+        self._cleanup_empty(name)
+        return removed
+
+    @_command
+    def hexists(self, name: str, key: str) -> bool:
+        return _encode(key) in (self._lookup(name, dict) or {})
+
+    @_command
+    def hlen(self, name: str) -> int:
+        return len(self._lookup(name, dict) or {})
+
+    # --- множества ---
+
+    @_command
+    def sadd(self, name: str, *values: Any) -> int:
+        members = self._create(name, set)
+        added = 0
+        for value in values:
+            member = _encode(value)
+            if member not in members:
+                members.add(member)
+                self._account(name, len(member) + _ITEM_OVERHEAD)
+                added += 1
+        self._written(name)
+        return added
+
+    @_command
+    def srem(self, name: str, *values: Any) -> int:
+        members = self._lookup(name, set)
+        if not members:
+            return 0
+        removed = 0
+        for value in values:
+            member = _encode(value)
+            if member in members:
+                members.discard(member)
+                self._account(name, -(len(member) + _ITEM_OVERHEAD))
+                removed += 1
+        self._cleanup_empty(name)
+        return removed
+
+    @_command
+    def smembers(self, name: str) -> Set[str]:
+        return set(self._lookup(name, set) or set())
+
+    @_command
+    def sismember(self, name: str, value: Any) -> bool:
+        return _encode(value) in (self._lookup(name, set) or set())
+
+    @_command
+    def scard(self, name: str) -> int:
+        return len(self._lookup(name, set) or set())
+
+    @_command
+    def spop(self, name: str, count: Optional[int] = None):
+        members = self._lookup(name, set)
+        if not members:
+            return [] if count is not None else None
+        popped = [members.pop() for _ in range(min(count or 1, len(members)))]
+        self._account(name, -sum(len(member) + _ITEM_OVERHEAD for member in popped))
+        self._cleanup_empty(name)
+        return popped if count is not None else popped[0]
+
+    # --- sorted set'ы ---
+
+    @_command
+    def zadd(self, name: str, mapping: Dict[Any, float], nx: bool = False, xx: bool = False) -> int:
+        zset = self._create(name, _SortedSet)
+        added = 0
+        for value, score in mapping.items():
+            member = _encode(value)
+            exists = member in zset.scores
+            if (nx and exists) or (xx and not exists):
+                continue
+            if zset.set(member, float(score)):
+                self._account(name, len(member) + _ITEM_OVERHEAD * 2)
+                added += 1
+        self._written(name)
+        return added
+
+    @_command
+    def zincrby(self, name: str, amount: float, value: Any) -> float:
+        zset = self._create(name, _SortedSet)
+        member = _encode(value)
+        if member not in zset.scores:
+            self._account(name, len(member) + _ITEM_OVERHEAD * 2)
+        score = zset.scores.get(member, 0.0) + float(amount)
+        zset.set(member, score)
+        self._written(name)
+        return score
+
+    @_command
+    def zscore(self, name: str, value: Any) -> Optional[float]:
+        zset = self._lookup(name, _SortedSet)
+        return zset.scores.get(_encode(value)) if zset else None
+
+    @_command
+    def zcard(self, name: str) -> int:
+        zset = self._lookup(name, _SortedSet)
+        return len(zset) if zset else 0
+
+    @_command
+    def zrem(self, name: str, *values: Any) -> int:
+        zset = self._lookup(name, _SortedSet)
+        if not zset:
+            return 0
+        removed = 0
+        for value in values:
+            member = _encode(value)
+            if zset.remove(member):
+                self._account(name, -(len(member) + _ITEM_OVERHEAD * 2))
+                removed += 1
+        self._cleanup_empty(name)
+        return removed
+
+    @_command
+    def zrange(self, name: str, start: int, end: int, desc: bool = False, withscores: bool = False):
+        zset = self._lookup(name, _SortedSet)
+        items = zset.range(start, end, desc=desc) if zset else []
+        return items if withscores else [member for member, _ in items]
+
+    def zrevrange(self, name: str, start: int, end: int, withscores: bool = False):
+        return self.zrange(name, start, end, desc=True, withscores=withscores)
+
+    @_command
+    def zrangebyscore(
+        self,
+        name: str,
+        min: Any,  # noqa: A002 - имена как в redis-py
+        max: Any,  # noqa: A002
+        start: Optional[int] = None,
+        num: Optional[int] = None,
+        withscores: bool = False,
+    ):
+        zset = self._lookup(name, _SortedSet)
+        items = zset.range_by_score(_parse_bound(min), _parse_bound(max)) if zset else []
+        if start is not None and num is not None:
+            items = items[start:start + num] if num >= 0 else items[start:]
+        return items if withscores else [member for member, _ in items]
+
+    @_command
+    def zremrangebyscore(self, name: str, min: Any, max: Any) -> int:  # noqa: A002
+        zset = self._lookup(name, _SortedSet)
+        if not zset:
+            return 0
+        members = [member for member, _ in zset.range_by_score(_parse_bound(min), _parse_bound(max))]
+        return self.zrem(name, *members) if members else 0
+
+    # --- пайплайны ---
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryPipeline":
+        return InMemoryPipeline(self)
+
+
+class InMemoryPipeline:
+    """Буфер команд; ``execute`` выполняет их подряд под блокировкой хранилища."""
+
+    def __init__(self, store: InMemoryRedis) -> None:
+        self._store = store
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, command: str):
+        if command.startswith("_") or not callable(getattr(InMemoryRedis, command, None)):
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs) -> "InMemoryPipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self) -> "InMemoryPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._commands.clear()
+
+    def execute(self, raise_on_error: bool = True) -> List[Any]:
+        commands, self._commands = self._commands, []
+        results: List[Any] = []
+        with self._store._lock:
+            for command, args, kwargs in commands:
+                try:
+                    results.append(getattr(self._store, command)(*args, **kwargs))
+                except ResponseError as exc:
+                    results.append(exc)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
+
+
+__all__ = ["InMemoryPipeline", "InMemoryRedis", "ResponseError"]
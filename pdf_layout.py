@@ -0,0 +1,251 @@
+"""Вёрстка простого текста в PDF: перенос по ширине, страницы, пределы.
+
+Строка переносится по реальной ширине в выбранном шрифте, а не обрезается по
+числу символов. Ширины символов берутся из метрик зарегистрированного шрифта
+один раз и хранятся в таблице :class:`GlyphWidths` (одна на шрифт в процессе
+воркера); ширины частых слов кэшируются там же.
+
+Каждая строка исходного текста — абзац: длинный абзац занимает несколько строк,
+пустые строки сохраняются. Текст читается построчно и раскладывается по
+страницам по мере отрисовки, страница целиком выводится одним текстовым
+объектом. Готовый файл пишется в переданный поток — ``make_pdf`` использует
+``SpooledTemporaryFile``, который для больших документов уходит на диск.
+
+Пределы: после ``max_pages`` страниц вёрстка останавливается, а последняя
+строка заменяется пометкой об обрезке; файл больше ``max_bytes`` не
+отдаётся — :class:`PdfLimitError`.
+"""
+from __future__ import annotations
+
+import io
+import re
+import threading
+from dataclasses import dataclass
+from itertools import islice
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_MAX_PAGES = 500
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+_TAB_SIZE = 4
+# Пробелы перед словом и само слово; перенос возможен только между ними
+_TOKENS = re.compile(r"(\s*)(\S+)")
+_WORD_CACHE_LIMIT = 8192
+# reportlab.lib.pagesizes.A4: модуль не тянет reportlab до первой вёрстки
+_A4 = (595.2755905511812, 841.8897637795277)
+
+
+class PdfLimitError(ValueError):
+    """Документ не укладывается в заданные пределы."""
+
+
+class _CharWidths(dict):
+    """Ширина символа при кегле 1; отсутствующие символы досчитываются при первом обращении."""
+
+    def __init__(self, lookup) -> None:
+        super().__init__()
+        self._lookup = lookup
+
+    def __missing__(self, char: str) -> float:
+        width = self[char] = self._lookup(char)
+        return width
+
+
+class GlyphWidths:
+    """Таблица ширин символов шрифта reportlab (в пунктах на 1 pt кегля)."""
+
+    def __init__(self, font_name: str) -> None:
+        from reportlab.pdfbase import pdfmetrics
+
+        font = pdfmetrics.getFont(font_name)
+        face = getattr(font, "face", None)
+        char_widths = getattr(face, "charWidths", None)
+        if char_widths is not None:
+            # TTF: ширины в тысячных долях кегля прямо из таблицы hmtx
+            default = face.defaultWidth
+            lookup = lambda char: char_widths.get(ord(char), default) / 1000.0  # noqa: E731
+        else:
+            lookup = lambda char: font.stringWidth(char, 1)  # noqa: E731
+        self.font_name = font_name
+        self._chars = _CharWidths(lookup)
+        self._words: Dict[str, float] = {}
+
+    def char(self, char: str) -> float:
+        return self._chars[char]
+
+    def measure(self, text: str) -> float:
+        """Ширина ``text`` при кегле 1."""
+
+        width = self._words.get(text)
+        if width is None:
+            width = sum(map(self._chars.__getitem__, text))
+            if len(self._words) >= _WORD_CACHE_LIMIT:
+                self._words.clear()
+            self._words[text] = width
+        return width
+
+    def wrap(self, line: str, max_width: float) -> Iterator[str]:
+        """Разбить строку на части не шире ``max_width`` (в единицах кегля 1).
+
+        Переносы — по пробелам; слово шире строки режется по символам.
+        Отступ в начале абзаца сохраняется, пробелы на месте переноса — нет.
+        """
+
+        line = line.expandtabs(_TAB_SIZE).rstrip()
+        parts: List[str] = []
+        width = 0.0
+        for gap, word in _TOKENS.findall(line):
+            gap_width = self.measure(gap) if gap else 0.0
+            word_width = self.measure(word)
+            if parts and width + gap_width + word_width > max_width:
+                yield "".join(parts)
+                parts, width = [], 0.0
+                gap, gap_width = "", 0.0
+            if width + gap_width + word_width <= max_width:
+                parts += (gap, word)
+                width += gap_width + word_width
+                continue
+            if gap:
+                parts.append(gap)
+                width += gap_width
+            for char in word:
+                char_width = self._chars[char]
+                if parts and width + char_width > max_width:
+                    yield "".join(parts)
+                    parts, width = [], 0.0
+                parts.append(char)
+                width += char_width
+        yield "".join(parts)
+
+
+_TABLES: Dict[str, GlyphWidths] = {}
+_TABLES_LOCK = threading.Lock()
+
+
+def glyph_widths(font_name: str) -> GlyphWidths:
+    """Общая для процесса таблица ширин шрифта ``font_name``."""
+
+    table = _TABLES.get(font_name)
+    if table is None:
+        with _TABLES_LOCK:
+            table = _TABLES.get(font_name)
+            if table is None:
+                table = _TABLES[font_name] = GlyphWidths(font_name)
+    return table
+
+
+@dataclass(frozen=True)
+class LayoutResult:
+    pages: int
+    lines: int
+    truncated: bool
+    size: int
+
+
+@dataclass(frozen=True)
+class PageStyle:
+    """Геометрия страницы в пунктах; по умолчанию — A4 как у прежнего ``make_pdf``."""
+
+    page_size: Tuple[float, float] = _A4
+    font_size: float = 12
+    leading: float = 18
+    left: float = 40
+    right: float = 40
+    top: float = 50
+    bottom: float = 40
+
+    @property
+    def text_width(self) -> float:
+        return self.page_size[0] - self.left - self.right
+
+    @property
+    def lines_per_page(self) -> int:
+        # первая строка на высоте top, последняя — не ниже bottom
+        return max(1, int((self.page_size[1] - self.top - self.bottom) // self.leading) + 1)
+
+
+def _source_lines(text: str) -> Iterator[str]:
+    # StringIO отдаёт строки по одной, без копии всего текста в список
+    for line in io.StringIO(text, newline=None):
+        yield line.rstrip("\n")
+
+
+def layout_lines(text: str, widths: GlyphWidths, style: PageStyle = PageStyle()) -> Iterator[str]:
+    """Строки документа после переноса, лениво."""
+
+    max_width = style.text_width / style.font_size
+    empty = True
+    for paragraph in _source_lines(text):
+        empty = False
+        yield from widths.wrap(paragraph, max_width)
+    if empty:
+        yield "(empty)"
+
+
+def _paginate(lines: Iterable[str], per_page: int, max_pages: int, notice: str) -> Iterator[Tuple[List[str], bool]]:
+    lines = iter(lines)
+    number = 0
+    while True:
+        page = list(islice(lines, per_page))
+        if not page:
+            return
+        number += 1
+        if number >= max_pages:
+            truncated = next(lines, None) is not None
+            if truncated:
+                page[-1] = notice
+            yield page, truncated
+            return
+        yield page, False
+
+
+def render_text(
+    text: str,
+    out: BinaryIO,
+    *,
+    font_name: str,
+    style: PageStyle = PageStyle(),
+    max_pages: int = DEFAULT_MAX_PAGES,
+    max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+    title: str = "Document",
+) -> LayoutResult:
+    """Сверстать ``text`` в PDF и записать в ``out`` (с текущей позиции)."""
+
+    from reportlab.pdfgen import canvas
+
+    max_pages = max(1, int(max_pages))
+    widths = glyph_widths(font_name)
+    start = out.tell()
+    c = canvas.Canvas(out, pagesize=style.page_size, pageCompression=1)
+    c.setTitle(title)
+    x = style.left
+    y = style.page_size[1] - style.top
+    notice = f"… текст обрезан: документ длиннее {max_pages} стр."
+    pages = lines = 0
+    truncated = False
+    for page, truncated in _paginate(layout_lines(text, widths, style), style.lines_per_page, max_pages, notice):
+        block = c.beginText(x, y)
+        block.setFont(font_name, style.font_size, style.leading)
+        block.textLines(page, trim=0)
+        c.drawText(block)
+        c.showPage()
+        pages += 1
+        lines += len(page)
+    c.save()
+    size = out.tell() - start
+    if max_bytes is not None and size > max_bytes:
+        raise PdfLimitError(f"PDF получается больше {max_bytes // (1024 * 1024)} МБ — сократите текст")
+    return LayoutResult(pages=pages, lines=lines, truncated=truncated, size=size)
+
+
+__all__ = [
+    "DEFAULT_MAX_BYTES",
+    "DEFAULT_MAX_PAGES",
+    "GlyphWidths",
+    "LayoutResult",
+    "PageStyle",
+    "PdfLimitError",
+    "glyph_widths",
+    "layout_lines",
+    "render_text",
+]
@@ -0,0 +1,216 @@
+"""Презентации PPTX: шаблон разбирается один раз на процесс, слайды добавляются за O(1).
+
+``Presentation()`` распаковывает и разбирает пакет шаблона (zip + XML) на каждый
+вызов. :class:`DeckTemplate` делает это один раз: из шаблона удаляются его
+собственные слайды, выбирается макет «заголовок + текст», при необходимости на
+мастер-слайд ставится логотип — и готовый объект служит прототипом. Каждая
+презентация — ``copy.deepcopy`` прототипа, без чтения файла и разбора XML.
+
+Шаблон может быть своим (фирменный ``.pptx`` Syntera, ``PPTX_TEMPLATE``):
+макет ищется по составу заполнителей, а не по номеру, так что порядок макетов
+в файле не важен. Логотип (``PPTX_LOGO``) ставится на мастер один раз, и
+слайды наследуют его без копии картинки на каждом.
+
+``Slides.add_slide`` в python-pptx на каждый слайд перебирает все связи
+презентации и все id слайдов — большая колода строится за квадратичное время.
+:class:`DeckBuilder` добавляет связь и id напрямую (новый слайд не может быть
+уже связан), а заполнители макета разбирает один раз и дальше вставляет их
+копии. Если внутренние атрибуты python-pptx изменятся, он возвращается к
+штатному ``add_slide``.
+"""
+from __future__ import annotations
+
+import copy
+import io
+import os
+import threading
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple
+
+# Доля высоты слайда под логотип и отступ от края
+_LOGO_HEIGHT = 0.08
+_LOGO_MARGIN = 0.03
+# Первый допустимый id слайда в PresentationML
+_MIN_SLIDE_ID = 256
+
+
+def _drop_slides(prs) -> None:
+    """Убрать из шаблона его собственные слайды (в фирменном шаблоне бывают примеры)."""
+
+    sld_id_lst = prs.slides._sldIdLst
+    for sld_id in list(sld_id_lst):
+        prs.part.drop_rel(sld_id.rId)
+        sld_id_lst.remove(sld_id)
+
+
+def _content_layout(prs) -> Tuple[int, int]:
+    """Номер макета с заголовком и текстовым блоком и ``idx`` этого блока."""
+
+    from pptx.enum.shapes import PP_PLACEHOLDER
+
+    titles = {PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE}
+    bodies = {PP_PLACEHOLDER.BODY, PP_PLACEHOLDER.OBJECT}
+    for index, layout in enumerate(prs.slide_layouts):
+        has_title, body = False, None
+        for placeholder in layout.placeholders:
+            kind = placeholder.placeholder_format.type
+            if kind in titles:
+                has_title = True
+            elif kind in bodies and body is None:
+                body = placeholder.placeholder_format.idx
+        if has_title and body is not None:
+            return index, body
+    raise ValueError("В шаблоне презентации нет макета с заголовком и текстом")
+
+
+def _add_logo(prs, logo_path: str) -> None:
+    """Логотип в правый нижний угол каждого мастер-слайда."""
+
+    height = int(prs.slide_height * _LOGO_HEIGHT)
+    margin = int(prs.slide_height * _LOGO_MARGIN)
+    for master in prs.slide_masters:
+        image_part, rId = master.part.get_or_add_image_part(logo_path)
+        cx, cy = image_part.scale(None, height)
+        master.shapes._spTree.add_pic(
+            master.shapes._next_shape_id, "Logo", "", rId,
+            prs.slide_width - cx - margin, prs.slide_height - cy - margin, cx, cy,
+        )
+
+
+class DeckTemplate:
+    """Разобранный шаблон-прототип; :meth:`new` отдаёт независимую копию."""
+
+    def __init__(self, path: Optional[str] = None, logo: Optional[str] = None) -> None:
+        from pptx import Presentation
+
+        prs = Presentation(path) if path else Presentation()
+        _drop_slides(prs)
+        self.layout_index, self.body_idx = _content_layout(prs)
+        if logo:
+            try:
+                _add_logo(prs, logo)
+            except Exception as exc:  # noqa: BLE001 - без логотипа лучше, чем без презентации
+                print(f"[MEDIA] presentation logo {logo!r} skipped: {exc!r}")
+                logo = None
+        self.path = path
+        self.logo = logo
+        # Прототип открывается заново из подготовленных байтов и больше не трогается.
+        # deepcopy элемента lxml копирует его поддерево отдельно: объекты python-pptx,
+        # успевшие закэшировать дочерний элемент (список слайдов, фигуры), в копии
+        # ссылались бы на оторванный от документа XML. У нетронутого прототипа есть
+        # только корни частей, и копия целостна.
+        buf = io.BytesIO()
+        prs.save(buf)
+        buf.seek(0)
+        self._prototype = Presentation(buf)
+
+    def new(self):
+        return copy.deepcopy(self._prototype)
+
+
+_TEMPLATES: Dict[Tuple[Optional[str], Optional[str], float], DeckTemplate] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+
+def _stamp(path: Optional[str]) -> float:
+    return os.path.getmtime(path) if path else 0.0
+
+
+def deck_template(path: Optional[str] = None, logo: Optional[str] = None) -> DeckTemplate:
+    """Шаблон из кэша процесса; изменённый на диске файл разбирается заново."""
+
+    key = (path or None, logo or None, _stamp(path) + _stamp(logo))
+    template = _TEMPLATES.get(key)
+    if template is None:
+        with _TEMPLATES_LOCK:
+            template = _TEMPLATES.get(key)
+            if template is None:
+                template = DeckTemplate(key[0], key[1])
+                # старые версии тех же файлов больше не нужны
+                for stale in [k for k in _TEMPLATES if k[:2] == key[:2]]:
+                    del _TEMPLATES[stale]
+                _TEMPLATES[key] = template
+    return template
+
+
+class DeckBuilder:
+    """Одна презентация из шаблона: слайды «заголовок + пункты»."""
+
+    def __init__(self, template: DeckTemplate) -> None:
+        self.prs = template.new()
+        self._layout = self.prs.slide_layouts[template.layout_index]
+        self._body_idx = template.body_idx
+        self._sld_id_lst = self.prs.slides._sldIdLst
+        self._next_id = _MIN_SLIDE_ID
+        rels = getattr(self.prs.part, "_rels", None)
+        self._fast = hasattr(rels, "_add_relationship") and hasattr(self._sld_id_lst, "_add_sldId")
+        # Заполнители первого слайда: следующие слайды получают их копии вместо
+        # повторного обхода макета с XPath-запросами на каждый заполнитель
+        self._placeholders: Optional[List] = None
+        self._title_pos = self._body_pos = 0
+
+    @property
+    def slide_count(self) -> int:
+        return len(self._sld_id_lst)
+
+    def _new_slide(self):
+        """Новый слайд по макету и его фигуры (заголовок, текстовый блок)."""
+
+        if not self._fast:
+            slide = self.prs.slides.add_slide(self._layout)
+            return slide.shapes.title, slide.placeholders[self._body_idx]
+        from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+        from pptx.opc.packuri import PackURI
+        from pptx.parts.slide import SlidePart
+        from pptx.shapes.shapetree import SlideShapeFactory
+
+        part = self.prs.part
+        partname = PackURI(f"/ppt/slides/slide{self.slide_count + 1}.xml")
+        slide_part = SlidePart.new(partname, part.package, self._layout.part)
+        # новая часть ещё ни с чем не связана: перебор существующих связей не нужен
+        rId = part._rels._add_relationship(RT.SLIDE, slide_part)
+        shapes = slide_part.slide.shapes
+        tree = shapes._spTree
+        if self._placeholders is None:
+            shapes.clone_layout_placeholders(self._layout)
+            elements = list(tree.iter_shape_elms())
+            self._remember_placeholders(elements)
+        else:
+            elements = []
+            for prototype in self._placeholders:
+                element = copy.deepcopy(prototype)
+                tree.insert_element_before(element, "p:extLst")
+                elements.append(element)
+        self._sld_id_lst._add_sldId(id=self._next_id, rId=rId)
+        self._next_id += 1
+        return (
+            SlideShapeFactory(elements[self._title_pos], shapes),
+            SlideShapeFactory(elements[self._body_pos], shapes),
+        )
+
+    def _remember_placeholders(self, elements: List) -> None:
+        from pptx.enum.shapes import PP_PLACEHOLDER
+
+        titles = {PP_PLACEHOLDER.TITLE, PP_PLACEHOLDER.CENTER_TITLE}
+        self._title_pos = next(pos for pos, element in enumerate(elements) if element.ph_type in titles)
+        self._body_pos = next(pos for pos, element in enumerate(elements) if element.ph_idx == self._body_idx)
+        self._placeholders = [copy.deepcopy(element) for element in elements]
+
+    def add_slide(self, title: str, bullets: Sequence[str]) -> None:
+        title_shape, body_shape = self._new_slide()
+        title_shape.text = title
+        body = body_shape.text_frame
+        body.clear()
+        if not bullets:
+            body.text = " "
+            return
+        body.text = bullets[0]
+        for bullet in bullets[1:]:
+            paragraph = body.add_paragraph()
+            paragraph.text = bullet
+            paragraph.level = 0
+
+    def save(self, out: BinaryIO) -> None:
+        self.prs.save(out)
+
+
+__all__ = ["DeckBuilder", "DeckTemplate", "deck_template"]
@@ -0,0 +1,327 @@
+"""Атомарный учёт медиа-лимитов: месячные балансы и разовые триалы.
+
+Проверка и списание выполняются одним условным ``UPDATE``: строка меняется
+только если остатка хватает, поэтому два параллельных запроса не могут
+оба пройти проверку. Месячная строка баланса создаётся лениво при первом
+обращении в новом месяце, а остатки кэшируются в процессе (write-through)
+для показа баланса. Отказ кэш не решает: пакет могли купить в другом
+процессе, а ``add()`` сбрасывает только свой кэш, поэтому перед отказом
+остаток, тариф и триал перечитываются из SQLite.
+"""
+from __future__ import annotations
+
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from db import Database
+
+KINDS = ("photos", "docs", "analysis")
+_BALANCE_COLUMNS = {"photos": "photos_left", "docs": "docs_left", "analysis": "analysis_left"}
+_TRIAL_COLUMNS = {"photos": "photo_used", "docs": "doc_used", "analysis": "analysis_used"}
+
+
+def month_key(d: datetime.date | None = None) -> str:
+    d = d or datetime.date.today()
+    return d.strftime("%Y-%m")  # например '2025-09'
+
+
+@dataclass(frozen=True)
+class Charge:
+    """Результат успешного списания; нужен, чтобы вернуть лимит при ошибке."""
+
+    chat_id: int
+    kind: str
+    amount: int
+    source: str  # "owner" | "balance" | "trial"
+    month: str
+
+
+@dataclass
+class _CacheEntry:
+    month: str
+    balance: Optional[Dict[str, int]] = None  # при отсутствии строки — нули
+    has_row: bool = False
+    trials: Optional[Dict[str, int]] = None
+    expires_at: float = 0.0
+    has_tariff: Optional[bool] = None
+
+
+class QuotaEngine:
+    """Списание медиа-лимитов поверх таблиц ``media_balance`` и ``media_trials``."""
+
+    def __init__(
+        self,
+        database: Database,
+        *,
+        monthly_limits: Mapping[str, int],
+        is_owner: Callable[[int], bool] = lambda _uid: False,
+        cache_ttl: float = 30.0,
+        clock: Callable[[], datetime.date] = datetime.date.today,
+    ) -> None:
+        self.database = database
+        self.monthly_limits = {kind: int(monthly_limits.get(kind, 0)) for kind in KINDS}
+        self._is_owner = is_owner
+        self.cache_ttl = cache_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._cache: Dict[int, _CacheEntry] = {}
+        self.stats = {"granted": 0, "denied": 0, "refunded": 0, "rollovers": 0}
+
+    # --- схема ---
+
+    def ensure_tables(self) -> None:
+        with self.database.transaction():
+            # Текущий баланс лимитов на месяц (осталось)
+            self.database.execute("""
+            CREATE TABLE IF NOT EXISTS media_balance (
+                chat_id INTEGER,
+                month TEXT,
+                photos_left INT DEFAULT 0,
+                docs_left INT DEFAULT 0,
+                analysis_left INT DEFAULT 0,
+                PRIMARY KEY (chat_id, month)
+            )
+            """)
+            # Триальные разовые лимиты для неоформивших тариф
+            self.database.execute("""
+            CREATE TABLE IF NOT EXISTS media_trials (
+                chat_id INTEGER PRIMARY KEY,
+                photo_used INT DEFAULT 0,
+                doc_used INT DEFAULT 0,
+                analysis_used INT DEFAULT 0
+            )
+            """)
+
+    # --- кэш ---
+
+    def _cached(self, chat_id: int, month: str) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = self._cache.get(chat_id)
+            if entry is None or entry.month != month or entry.expires_at < time.monotonic():
+                return None
+            return _CacheEntry(
+                entry.month,
+                dict(entry.balance) if entry.balance is not None else None,
+                entry.has_row,
+                dict(entry.trials) if entry.trials is not None else None,
+                entry.expires_at,
+                entry.has_tariff,
+            )
+
+    def _remember(
+        self,
+        chat_id: int,
+        month: str,
+        *,
+        balance: Optional[Dict[str, int]] = None,
+        missing: bool = False,
+        trials: Optional[Dict[str, int]] = None,
+        update: Optional[Tuple[str, str, int]] = None,
+        has_tariff: Optional[bool] = None,
+    ) -> None:
+        """Записать в кэш полный снимок или результат списания одного поля.
+
+        Пополнения (пакеты, возвраты) не обновляют кэш, а сбрасывают его.
+        """
+
+        with self._lock:
+            entry = self._cache.get(chat_id)
+            if entry is None or entry.month != month:
+                entry = _CacheEntry(month)
+                self._cache[chat_id] = entry
+            if balance is not None or missing:
+                entry.balance = dict(balance) if balance is not None else dict.fromkeys(KINDS, 0)
+                entry.has_row = not missing
+                entry.expires_at = time.monotonic() + self.cache_ttl
+            if trials is not None:
+                entry.trials = dict(trials)
+                entry.expires_at = time.monotonic() + self.cache_ttl
+            if has_tariff is not None:
+                entry.has_tariff = has_tariff
+            if update is not None:
+                table, kind, value = update
+                if table == "balance" and entry.balance is not None and entry.has_row:
+                    # Ответы параллельных списаний приходят в произвольном порядке:
+                    # актуален наименьший остаток
+                    entry.balance[kind] = min(entry.balance[kind], value)
+                elif table == "trials" and entry.trials is not None:
+                    entry.trials[kind] = value
+
+    def invalidate(self, chat_id: int) -> None:
+        with self._lock:
+            self._cache.pop(chat_id, None)
+
+    # --- чтение ---
+
+    def balance(self, chat_id: int) -> Optional[Dict[str, int]]:
+        """Остатки текущего месяца или None, если строка ещё не создана."""
+
+        month = month_key(self._clock())
+        entry = self._cached(chat_id, month)
+        if entry is not None and entry.balance is not None:
+            return entry.balance if entry.has_row else None
+        row = self.database.query_one(
+            "SELECT photos_left, docs_left, analysis_left FROM media_balance WHERE chat_id=? AND month=?",
+            (chat_id, month),
+        )
+        if not row:
+            self._remember(chat_id, month, missing=True)
+            return None
+        balance = dict(zip(KINDS, row))
+        self._remember(chat_id, month, balance=balance)
+        return balance
+
+    def trials(self, chat_id: int) -> Dict[str, int]:
+        month = month_key(self._clock())
+        entry = self._cached(chat_id, month)
+        if entry is not None and entry.trials is not None:
+            return entry.trials
+        row = self.database.query_one(
+            "SELECT photo_used, doc_used, analysis_used FROM media_trials WHERE chat_id=?", (chat_id,)
+        )
+        trials = dict(zip(KINDS, row or (0, 0, 0)))
+        self._remember(chat_id, month, trials=trials)
+        return trials
+
+    def _has_tariff(self, chat_id: int, month: str) -> bool:
+        entry = self._cached(chat_id, month)
+        if entry is not None and entry.has_tariff is not None:
+            return entry.has_tariff
+        row = self.database.query_one("SELECT has_tariff FROM users WHERE chat_id=?", (chat_id,))
+        has_tariff = bool(row and row[0])
+        self._remember(chat_id, month, has_tariff=has_tariff)
+        return has_tariff
+
+    # --- запись ---
+
+    def set_balance(self, chat_id: int, photos: int, docs: int, analysis: int) -> None:
+        """Жёстко выставить баланс на текущий месяц."""
+
+        month = month_key(self._clock())
+        self.database.execute(
+            """INSERT INTO media_balance(chat_id, month, photos_left, docs_left, analysis_left)
+               VALUES(?,?,?,?,?)
+               ON CONFLICT(chat_id, month) DO UPDATE SET
+               photos_left=excluded.photos_left,
+               docs_left=excluded.docs_left,
+               analysis_left=excluded.analysis_left""",
+            (chat_id, month, photos, docs, analysis),
+        )
+        self._remember(chat_id, month, balance={"photos": photos, "docs": docs, "analysis": analysis})
+
+    def ensure_month(self, chat_id: int, defaults: Optional[Mapping[str, int]] = None) -> Dict[str, int]:
+        """Ленивый перенос на новый месяц: создать строку по лимитам тарифа, если её нет."""
+
+        month = month_key(self._clock())
+        limits = self.monthly_limits if defaults is None else {k: int(defaults.get(k, 0)) for k in KINDS}
+        cursor = self.database.execute(
+            """INSERT OR IGNORE INTO media_balance(chat_id, month, photos_left, docs_left, analysis_left)
+               VALUES(?,?,?,?,?)""",
+            (chat_id, month, limits["photos"], limits["docs"], limits["analysis"]),
+        )
+        if cursor.rowcount:
+            with self._lock:
+                self.stats["rollovers"] += 1
+            self._remember(chat_id, month, balance=limits)
+            return dict(limits)
+        self.invalidate(chat_id)
+        return self.balance(chat_id) or dict(limits)
+
+    def add(self, chat_id: int, kind: str, amount: int) -> None:
+        """Добавить купленный пакет в остаток текущего месяца."""
+
+        col = _BALANCE_COLUMNS[kind]
+        month = month_key(self._clock())
+        self.database.execute(
+            f"""INSERT INTO media_balance(chat_id, month, {col}) VALUES(?,?,?)
+                ON CONFLICT(chat_id, month) DO UPDATE SET {col} = {col} + excluded.{col}""",
+            (chat_id, month, amount),
+        )
+        self.invalidate(chat_id)
+
+    def _take_balance(self, chat_id: int, kind: str, amount: int, month: str) -> bool:
+        col = _BALANCE_COLUMNS[kind]
+        row = self.database.query_one(
+            f"UPDATE media_balance SET {col} = {col} - ? "
+            f"WHERE chat_id=? AND month=? AND {col} >= ? RETURNING {col}",
+            (amount, chat_id, month, amount),
+        )
+        if row is None:
+            return False
+        self._remember(chat_id, month, update=("balance", kind, row[0]))
+        return True
+
+    def use_trial(self, chat_id: int, kind: str) -> bool:
+        """Атомарно израсходовать разовый триал; False, если он уже использован."""
+
+        month = month_key(self._clock())
+        col = _TRIAL_COLUMNS[kind]
+        cursor = self.database.execute(
+            f"""INSERT INTO media_trials(chat_id, {col}) VALUES(?, 1)
+                ON CONFLICT(chat_id) DO UPDATE SET {col} = 1 WHERE {col} = 0""",
+            (chat_id,),
+        )
+        taken = cursor.rowcount > 0
+        self._remember(chat_id, month, update=("trials", kind, 1))
+        return taken
+
+    def consume(
+        self,
+        chat_id: int,
+        kind: str,
+        amount: int = 1,
+        *,
+        user_id: Optional[int] = None,
+        allow_trial: bool = True,
+    ) -> Optional[Charge]:
+        """Списать ``amount`` единиц ``kind``; None, если лимит исчерпан.
+
+        Порядок: владелец → баланс месяца (с ленивым созданием строки для
+        пользователей с тарифом) → разовый триал.
+        """
+
+        if kind not in _BALANCE_COLUMNS:
+            raise ValueError(f"unknown media kind: {kind}")
+        month = month_key(self._clock())
+        if self._is_owner(user_id if user_id is not None else chat_id):
+            return Charge(chat_id, kind, amount, "owner", month)
+
+        charge: Optional[Charge] = None
+        if self._take_balance(chat_id, kind, amount, month):
+            charge = Charge(chat_id, kind, amount, "balance", month)
+        else:
+            # Остатка не хватило: снимок мог устареть (строку или тариф создал другой процесс)
+            self.invalidate(chat_id)
+            if self.balance(chat_id) is None and self._has_tariff(chat_id, month):
+                self.ensure_month(chat_id)
+                if self._take_balance(chat_id, kind, amount, month):
+                    charge = Charge(chat_id, kind, amount, "balance", month)
+        if charge is None and allow_trial and amount == 1 and self.use_trial(chat_id, kind):
+            charge = Charge(chat_id, kind, amount, "trial", month)
+        with self._lock:
+            self.stats["granted" if charge else "denied"] += 1
+        return charge
+
+    def refund(self, charge: Charge) -> None:
+        """Вернуть списанное, если операция не удалась (ошибка OpenAI, очередь и т.п.)."""
+
+        if charge.source == "owner":
+            return
+        if charge.source == "balance":
+            col = _BALANCE_COLUMNS[charge.kind]
+            self.database.execute(
+                f"UPDATE media_balance SET {col} = {col} + ? WHERE chat_id=? AND month=?",
+                (charge.amount, charge.chat_id, charge.month),
+            )
+        else:
+            col = _TRIAL_COLUMNS[charge.kind]
+            self.database.execute(f"UPDATE media_trials SET {col} = 0 WHERE chat_id=?", (charge.chat_id,))
+        self.invalidate(charge.chat_id)
+        with self._lock:
+            self.stats["refunded"] += 1
+
+
+__all__ = ["Charge", "KINDS", "QuotaEngine", "month_key"]
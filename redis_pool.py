@@ -0,0 +1,218 @@
+"""Единый пул соединений Redis для всех модулей бота.
+
+Пул блокирующий: при исчерпании соединений поток ждёт не дольше
+``REDIS_POOL_TIMEOUT`` секунд, а не открывает новые сокеты без ограничения.
+Для асинхронного рантайма есть отдельный пул ``redis.asyncio`` с теми же
+параметрами соединений и таймаутами (асинхронные соединения привязаны к
+event loop и не могут делиться с потоками). Метрики обоих пулов считаются
+одинаково и показываются раздельно.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import redis  # type: ignore
+    import redis.asyncio as redis_async  # type: ignore
+    from redis.asyncio.retry import Retry as AsyncRetry  # type: ignore
+    from redis.backoff import ExponentialBackoff  # type: ignore
+    from redis.retry import Retry  # type: ignore
+except ImportError:  # pragma: no cover - redis не установлен
+    redis = None
+    redis_async = None
+
+from settings import (
+    REDIS_CONN_HEALTH_CHECK_INTERVAL,
+    REDIS_CONNECT_TIMEOUT,
+    REDIS_DB,
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PASSWORD,
+    REDIS_POOL_TIMEOUT,
+    REDIS_PORT,
+    REDIS_RETRIES,
+    REDIS_SOCKET_TIMEOUT,
+)
+
+_pool_lock = threading.Lock()
+_pool = None
+_async_pool = None
+
+RUNTIMES = ("sync", "async")
+_stats: Dict[str, Dict[str, float]] = {
+    runtime: {
+        "checkouts": 0,
+        "in_use": 0,
+        "peak_in_use": 0,
+        "exhausted": 0,
+        "wait_seconds_total": 0.0,
+        "wait_seconds_max": 0.0,
+    }
+    for runtime in RUNTIMES
+}
+_stats_lock = threading.Lock()
+
+
+def _connection_kwargs() -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {
+        "host": REDIS_HOST,
+        "port": REDIS_PORT,
+        "db": REDIS_DB,
+        "decode_responses": True,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_keepalive": True,
+        "health_check_interval": REDIS_CONN_HEALTH_CHECK_INTERVAL,
+        "retry_on_timeout": True,
+    }
+    if REDIS_PASSWORD:
+        kwargs["password"] = REDIS_PASSWORD
+    return kwargs
+
+
+def _count_exhausted(runtime: str, exc: Exception) -> None:
+    if "No connection available" in str(exc):
+        with _stats_lock:
+            _stats[runtime]["exhausted"] += 1
+
+
+def _count_checkout(runtime: str, checked_out: set, connection: Any, waited: float) -> None:
+    with _stats_lock:
+        stats = _stats[runtime]
+        checked_out.add(id(connection))
+        stats["checkouts"] += 1
+        stats["in_use"] += 1
+        stats["peak_in_use"] = max(stats["peak_in_use"], stats["in_use"])
+        stats["wait_seconds_total"] += waited
+        stats["wait_seconds_max"] = max(stats["wait_seconds_max"], waited)
+
+
+def _count_release(runtime: str, checked_out: set, connection: Any) -> None:
+    # id выданных соединений: при неудачном connect() redis-py сам вызывает release
+    # для соединения, которое мы ещё не учли
+    with _stats_lock:
+        if id(connection) in checked_out:
+            checked_out.discard(id(connection))
+            _stats[runtime]["in_use"] -= 1
+
+
+if redis is not None:
+
+    class _InstrumentedPool(redis.BlockingConnectionPool):
+        """Пул, который считает ожидание свободного соединения и отказы по таймауту."""
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self._checked_out: set = set()
+
+        def get_connection(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                connection = super().get_connection(*args, **kwargs)
+            except redis.ConnectionError as exc:
+                _count_exhausted("sync", exc)
+                raise
+            _count_checkout("sync", self._checked_out, connection, time.perf_counter() - started)
+            return connection
+
+        def release(self, connection) -> None:
+            _count_release("sync", self._checked_out, connection)
+            super().release(connection)
+
+    class _InstrumentedAsyncPool(redis_async.BlockingConnectionPool):
+        """То же для ``redis.asyncio``: пул одного event loop."""
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            self._checked_out: set = set()
+
+        async def get_connection(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                connection = await super().get_connection(*args, **kwargs)
+            except redis.ConnectionError as exc:
+                _count_exhausted("async", exc)
+                raise
+            _count_checkout("async", self._checked_out, connection, time.perf_counter() - started)
+            return connection
+
+        async def release(self, connection) -> None:
+            _count_release("async", self._checked_out, connection)
+            await super().release(connection)
+
+
+def get_pool():
+    """Вернуть общий потоковый пул (создаётся при первом обращении)."""
+
+    global _pool
+    if redis is None:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = _InstrumentedPool(
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                retry=Retry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES),
+                **_connection_kwargs(),
+            )
+        return _pool
+
+
+def create_client(*, ping: bool = True) -> "redis.Redis | None":
+    """Создать клиента поверх общего пула; None, если Redis недоступен."""
+
+    pool = get_pool()
+    if pool is None:
+        return None
+    client = redis.Redis(connection_pool=pool)
+    if not ping:
+        return client
+    try:
+        client.ping()
+    except redis.RedisError:
+        return None
+    return client
+
+
+def get_async_client() -> "redis_async.Redis | None":
+    """Клиент для asyncio-рантайма с теми же таймаутами и лимитом соединений.
+
+    Пул создаётся при первом вызове и должен использоваться из одного event loop.
+    """
+
+    global _async_pool
+    if redis is None:
+        return None
+    with _pool_lock:
+        if _async_pool is None:
+            _async_pool = _InstrumentedAsyncPool(
+                max_connections=REDIS_MAX_CONNECTIONS,
+                timeout=REDIS_POOL_TIMEOUT,
+                retry=AsyncRetry(ExponentialBackoff(cap=1.0, base=0.05), REDIS_RETRIES),
+                **_connection_kwargs(),
+            )
+    return redis_async.Redis(connection_pool=_async_pool)
+
+
+def pool_stats(runtime: str = "sync") -> Dict[str, float]:
+    """Снимок метрик пула ``runtime`` (``sync``/``async``): занятость, пик, ожидание и отказы."""
+
+    with _stats_lock:
+        snapshot = dict(_stats[runtime])
+    snapshot["max_connections"] = REDIS_MAX_CONNECTIONS
+    checkouts = snapshot["checkouts"]
+    snapshot["wait_ms_avg"] = (snapshot["wait_seconds_total"] / checkouts * 1000) if checkouts else 0.0
+    if runtime == "sync":
+        pool: Optional[Any] = _pool
+        if pool is not None:
+            snapshot["opened"] = len(getattr(pool, "_connections", []))
+    else:
+        pool = _async_pool
+        if pool is not None:
+            snapshot["opened"] = len(pool._available_connections) + len(pool._in_use_connections)
+    return snapshot
+
+
+__all__ = ["RUNTIMES", "create_client", "get_async_client", "get_pool", "pool_stats"]
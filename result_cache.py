@@ -0,0 +1,204 @@
+"""Кэш готовых документов и картинок по содержимому запроса.
+
+Ключ — sha256 от (тип задачи, версия рендерера, входные данные): одинаковый
+запрос даёт тот же ключ, а смена версии рендерера (или модели) — новый.
+Для ключа хранятся:
+
+* ``file_id`` из ответа Telegram на первую отправку — повтор уходит по нему,
+  без загрузки байтов;
+* сами байты в каталоге ``blob_dir`` — на случай, если ``file_id`` перестал
+  работать; общий размер ограничен ``max_bytes``, вытесняются давно не
+  использованные файлы.
+
+Индекс (``file_id``, размер файла, время последнего обращения) — таблица
+``result_cache`` в общей SQLite-базе, поэтому бот и сервис ``gpsbot-media``
+видят один и тот же кэш.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from db import Database
+
+# Строки без файла и без file_id не нужны; строки только с file_id дешёвые, но не бесконечные
+_MAX_ENTRIES = 50_000
+_EVICT_BATCH = 32
+
+
+def result_key(kind: str, version: str, payload: str | bytes) -> str:
+    """Ключ кэша для результата задачи ``kind`` рендерером версии ``version``."""
+
+    digest = hashlib.sha256(f"{kind}\0{version}\0".encode("utf-8"))
+    digest.update(payload.encode("utf-8") if isinstance(payload, str) else payload)
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    file_id: Optional[str]
+    # None — байтов на диске нет (вытеснены или ещё не сохранены)
+    data: Optional[bytes]
+
+
+class ResultCache:
+    """``file_id`` и байты результатов по ключу :func:`result_key`."""
+
+    def __init__(
+        self,
+        database: Database,
+        blob_dir: str | os.PathLike,
+        *,
+        max_bytes: int,
+        max_entries: int = _MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.database = database
+        self.blob_dir = Path(blob_dir)
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_entries = max(1, int(max_entries))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "file_id_hits": 0,
+            "blob_hits": 0,
+            "misses": 0,
+            "stored": 0,
+            "evicted": 0,
+            "file_id_dropped": 0,
+        }
+
+    def ensure_tables(self) -> None:
+        with self.database.transaction():
+            self.database.execute("""
+            CREATE TABLE IF NOT EXISTS result_cache (
+                key TEXT PRIMARY KEY,
+                file_id TEXT,
+                blob_size INTEGER NOT NULL DEFAULT 0,
+                used_at REAL NOT NULL
+            )
+            """)
+            self.database.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_used ON result_cache(used_at)")
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def _blob_path(self, key: str) -> Path:
+        # Подкаталог по первым символам: в одном каталоге не копятся десятки тысяч файлов
+        return self.blob_dir / key[:2] / key
+
+    # --- чтение ---
+
+    def lookup(self, key: str) -> Optional[CachedResult]:
+        row = self.database.query_one("SELECT file_id, blob_size FROM result_cache WHERE key=?", (key,))
+        if row is None:
+            self._count("misses")
+            return None
+        file_id, blob_size = row
+        data = None
+        if blob_size:
+            try:
+                data = self._blob_path(key).read_bytes()
+            except OSError:
+                # файл удалили снаружи: индекс догоняет диск
+                self.database.execute("UPDATE result_cache SET blob_size=0 WHERE key=?", (key,))
+        if file_id is None and data is None:
+            self.database.execute("DELETE FROM result_cache WHERE key=?", (key,))
+            self._count("misses")
+            return None
+        self.database.execute("UPDATE result_cache SET used_at=? WHERE key=?", (self._clock(), key))
+        self._count("file_id_hits" if file_id else "blob_hits")
+        return CachedResult(file_id=file_id, data=data)
+
+    # --- запись ---
+
+    def store_blob(self, key: str, data: bytes) -> bool:
+        """Сохранить байты результата; False, если они не помещаются в кэш целиком."""
+
+        if not data or len(data) > self.max_bytes:
+            return False
+        path = self._blob_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись через временный файл: читатель не увидит недописанный файл
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        self.database.execute(
+            """INSERT INTO result_cache(key, blob_size, used_at) VALUES(?,?,?)
+               ON CONFLICT(key) DO UPDATE SET blob_size=excluded.blob_size, used_at=excluded.used_at""",
+            (key, len(data), self._clock()),
+        )
+        self._count("stored")
+        self._evict()
+        return True
+
+    def remember_file_id(self, key: str, file_id: str) -> None:
+        self.database.execute(
+            """INSERT INTO result_cache(key, file_id, used_at) VALUES(?,?,?)
+               ON CONFLICT(key) DO UPDATE SET file_id=excluded.file_id, used_at=excluded.used_at""",
+            (key, file_id, self._clock()),
+        )
+
+    def forget_file_id(self, key: str) -> None:
+        """Telegram не принял ``file_id``: дальше отправляем байты."""
+
+        self.database.execute("UPDATE result_cache SET file_id=NULL WHERE key=?", (key,))
+        self._count("file_id_dropped")
+
+    # --- вытеснение ---
+
+    def _evict(self) -> None:
+        total = int(self.database.query_one("SELECT COALESCE(SUM(blob_size), 0) FROM result_cache")[0])
+        while total > self.max_bytes:
+            rows = self.database.query_all(
+                "SELECT key, blob_size FROM result_cache WHERE blob_size > 0 ORDER BY used_at LIMIT ?",
+                (_EVICT_BATCH,),
+            )
+            if not rows:
+                break
+            for key, blob_size in rows:
+                self._blob_path(key).unlink(missing_ok=True)
+                # file_id остаётся: повтор всё ещё можно отправить без байтов
+                self.database.execute("UPDATE result_cache SET blob_size=0 WHERE key=?", (key,))
+                self._count("evicted")
+                total -= blob_size
+                if total <= self.max_bytes:
+                    break
+        overflow = self.database.query_all(
+            "SELECT key, blob_size FROM result_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?", (self.max_entries,)
+        )
+        for key, blob_size in overflow:
+            if blob_size:
+                self._blob_path(key).unlink(missing_ok=True)
+        with self.database.transaction():
+            self.database.execute("DELETE FROM result_cache WHERE file_id IS NULL AND blob_size=0")
+            self.database.executemany("DELETE FROM result_cache WHERE key=?", [(key,) for key, _ in overflow])
+
+    # --- метрики ---
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+        entries, blob_bytes = self.database.query_one(
+            "SELECT COUNT(*), COALESCE(SUM(blob_size), 0) FROM result_cache"
+        )
+        stats.update(entries=int(entries), blob_bytes=int(blob_bytes), max_bytes=self.max_bytes)
+        return stats
+
+
+__all__ = ["CachedResult", "ResultCache", "result_key"]
@@ -5,11 +5,6 @@ from dotenv import load_dotenv
 import telebot
 from openai import OpenAI
 
-try:
-    import redis  # type: ignore
-except ImportError:  # pragma: no cover - redis is optional in some environments
-    redis = None
-
 # Загружаем переменные из .env рядом с файлом
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
@@ -22,9 +17,105 @@ REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB = int(os.getenv("REDIS_DB", "0"))
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD") or None
 
+# Общий пул соединений: лимит соединений, ожидание свободного (сек) и таймауты сокета
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "5"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "2"))
+# Повторы команды при таймауте/обрыве и PING простаивающего соединения перед использованием
+REDIS_RETRIES = int(os.getenv("REDIS_RETRIES", "2"))
+REDIS_CONN_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_CONN_HEALTH_CHECK_INTERVAL", "15"))
+
+# Проверка Redis и переподключение после сбоя (секунды)
+REDIS_HEALTH_INTERVAL = float(os.getenv("REDIS_HEALTH_INTERVAL", "30"))
+REDIS_RECONNECT_BASE_DELAY = float(os.getenv("REDIS_RECONNECT_BASE_DELAY", "1"))
+REDIS_RECONNECT_MAX_DELAY = float(os.getenv("REDIS_RECONNECT_MAX_DELAY", "60"))
+# Сколько записей, сделанных во время сбоя Redis, хранить для повтора после восстановления
+# и предел их общего объёма (МБ, 0 — без предела)
+REDIS_OUTAGE_JOURNAL_LIMIT = int(os.getenv("REDIS_OUTAGE_JOURNAL_LIMIT", "50000"))
+REDIS_OUTAGE_JOURNAL_MAX_MB = int(os.getenv("REDIS_OUTAGE_JOURNAL_MAX_MB", "64"))
+
+# Движок для истории диалогов и языка: redis | sqlite | embedded
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "redis")
+# Файл встроенного хранилища (для STORAGE_BACKEND=embedded)
+EMBEDDED_KV_PATH = os.getenv("EMBEDDED_KV_PATH", "storage.kv")
+
+# Холодный архив историй: через сколько часов без обновлений история уходит на диск
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "history_archive")
+HISTORY_ARCHIVE_AFTER_HOURS = float(os.getenv("HISTORY_ARCHIVE_AFTER_HOURS", "48"))
+HISTORY_ARCHIVE_SEGMENT_MB = int(os.getenv("HISTORY_ARCHIVE_SEGMENT_MB", "64"))
+
+# Предел памяти (байт) для локального хранилища на время недоступности Redis
+MEMORY_FALLBACK_MAXMEMORY = int(os.getenv("MEMORY_FALLBACK_MAXMEMORY", str(64 * 1024 * 1024)))
+
+# Как часто (в секундах) счётчики активности из Redis сбрасываются в SQLite
+USAGE_FLUSH_INTERVAL = int(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+
+# Месячные медиа-лимиты тарифа: строка баланса создаётся при первом обращении в месяце
+MEDIA_MONTHLY_LIMITS = {
+    "photos": int(os.getenv("MEDIA_MONTHLY_PHOTOS", "30")),
+    "docs": int(os.getenv("MEDIA_MONTHLY_DOCS", "30")),
+    "analysis": int(os.getenv("MEDIA_MONTHLY_ANALYSIS", "60")),
+}
+# Сколько секунд остатки лимитов кэшируются в процессе
+MEDIA_QUOTA_CACHE_TTL = float(os.getenv("MEDIA_QUOTA_CACHE_TTL", "30"))
+
+
+def _default_media_workers() -> int:
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:  # не Linux
+        cores = os.cpu_count() or 1
+    # одно ядро оставляем процессу бота
+    return max(1, cores - 1)
+
+
+# Пул процессов для PDF/Excel/PPTX: число воркеров и пределы очереди (всего и на один чат)
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "0")) or _default_media_workers()
+MEDIA_QUEUE_LIMIT = int(os.getenv("MEDIA_QUEUE_LIMIT", "100"))
+MEDIA_PER_CHAT_LIMIT = int(os.getenv("MEDIA_PER_CHAT_LIMIT", "3"))
+# С какого ожидаемого ожидания (сек) пользователю сообщается место в очереди и ETA
+MEDIA_ETA_NOTICE_SEC = float(os.getenv("MEDIA_ETA_NOTICE_SEC", "15"))
+# Отправка готовых файлов в Telegram: параллельных загрузок и попыток на файл
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", "4"))
+MEDIA_UPLOAD_ATTEMPTS = int(os.getenv("MEDIA_UPLOAD_ATTEMPTS", "4"))
+# Долговременная очередь документов: auto (Redis Streams, если Redis доступен, иначе SQLite), redis или sqlite
+MEDIA_QUEUE_BACKEND = os.getenv("MEDIA_QUEUE_BACKEND", "auto").strip().lower()
+# Разбирать очередь в процессе бота; 0 — только отдельным сервисом gpsbot-media (python worker_media.py)
+MEDIA_INLINE_WORKER = int(os.getenv("MEDIA_INLINE_WORKER", "1"))
+# Аренда задачи (сек): без продления задача достанется другому обработчику; и сколько раз её выдавать
+MEDIA_JOB_VISIBILITY_SEC = float(os.getenv("MEDIA_JOB_VISIBILITY_SEC", "120"))
+MEDIA_JOB_MAX_DELIVERIES = int(os.getenv("MEDIA_JOB_MAX_DELIVERIES", "3"))
+# Надзор за воркерами: предел времени одной задачи (сек), прирост памяти воркера (МБ, 0 — без предела)
+# и сколько секунд без пульса воркер считается зависшим
+MEDIA_JOB_TIMEOUT_SEC = float(os.getenv("MEDIA_JOB_TIMEOUT_SEC", "120"))
+MEDIA_WORKER_MEMORY_MB = int(os.getenv("MEDIA_WORKER_MEMORY_MB", "1024"))
+MEDIA_HEARTBEAT_TIMEOUT_SEC = float(os.getenv("MEDIA_HEARTBEAT_TIMEOUT_SEC", "30"))
+# Генерация картинок в фоне: одновременных запросов к OpenAI и пределы очереди (всего и на один чат)
+IMAGE_GEN_CONCURRENCY = int(os.getenv("IMAGE_GEN_CONCURRENCY", "2"))
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", "20"))
+IMAGE_PER_CHAT_LIMIT = int(os.getenv("IMAGE_PER_CHAT_LIMIT", "2"))
+# Кэш готовых документов и картинок: file_id Telegram и байты на диске (предел, МБ)
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "result_cache")
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+# Пределы PDF: после PDF_MAX_PAGES страниц текст обрезается с пометкой, файл больше PDF_MAX_MB не отправляется
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+PDF_MAX_MB = int(os.getenv("PDF_MAX_MB", "20"))
+# Предел загружаемого CSV для Excel (МБ); Bot API отдаёт боту файлы не больше 20 МБ
+CSV_UPLOAD_MAX_MB = int(os.getenv("CSV_UPLOAD_MAX_MB", "20"))
+# Фирменный шаблон презентаций (.pptx) и логотип на каждом слайде; пусто — стандартный шаблон без логотипа
+PPTX_TEMPLATE = os.getenv("PPTX_TEMPLATE", "").strip()
+PPTX_LOGO = os.getenv("PPTX_LOGO", "").strip()
+
 # --- Новые настройки моделей для мультимедиа ---
 IMAGE_MODEL = os.getenv("IMAGE_MODEL", "gpt-image-1")     # генерация изображений (минимальная стоимость)
 VISION_MODEL = os.getenv("VISION_MODEL", "gpt-4o-mini")   # анализ изображений (vision)
+# Подсказка detail для vision: auto (не передаётся), low (512 px, фиксированная цена) или high
+VISION_DETAIL = os.getenv("VISION_DETAIL", "auto").strip().lower()
+if VISION_DETAIL not in ("auto", "low", "high"):
+    VISION_DETAIL = "auto"
+# Сколько секунд хранить анализ фото по file_unique_id (Redis); 0 — не кэшировать
+VISION_CACHE_TTL_SEC = int(os.getenv("VISION_CACHE_TTL_SEC", str(7 * 24 * 3600)))
 
 # --- Модель для основного чата (GPT-5 mini) ---
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-5-mini")
@@ -56,43 +147,64 @@ bot = telebot.TeleBot(TOKEN, parse_mode="HTML")
 client = OpenAI(api_key=OPENAI_API_KEY)
 
 
-def _init_redis_client():
-    if redis is None:
-        return None
-
-    connection_kwargs = {
-        "host": REDIS_HOST,
-        "port": REDIS_PORT,
-        "db": REDIS_DB,
-        "decode_responses": True,
-    }
-    if REDIS_PASSWORD:
-        connection_kwargs["password"] = REDIS_PASSWORD
-
-    try:
-        client = redis.Redis(**connection_kwargs)
-        client.ping()
-        return client
-    except redis.RedisError:
-        return None
-
-
-r = _init_redis_client()
-
 # Explicit re-exports for clearer "from settings import ..." usage
 __all__ = [
     "bot",
     "client",
-    "r",
     "SYSTEM_PROMPT",
     "OWNER_ID",
     "is_owner",
     "HISTORY_LIMIT",
     "IMAGE_MODEL",
     "VISION_MODEL",
+    "VISION_DETAIL",
+    "VISION_CACHE_TTL_SEC",
     "CHAT_MODEL",
     "REDIS_HOST",
     "REDIS_PORT",
     "REDIS_DB",
     "REDIS_PASSWORD",
+    "REDIS_MAX_CONNECTIONS",
+    "REDIS_POOL_TIMEOUT",
+    "REDIS_SOCKET_TIMEOUT",
+    "REDIS_CONNECT_TIMEOUT",
+    "REDIS_RETRIES",
+    "REDIS_CONN_HEALTH_CHECK_INTERVAL",
+    "USAGE_FLUSH_INTERVAL",
+    "STORAGE_BACKEND",
+    "EMBEDDED_KV_PATH",
+    "HISTORY_ARCHIVE_DIR",
+    "HISTORY_ARCHIVE_AFTER_HOURS",
+    "HISTORY_ARCHIVE_SEGMENT_MB",
+    "MEDIA_MONTHLY_LIMITS",
+    "MEDIA_QUOTA_CACHE_TTL",
+    "MEDIA_WORKERS",
+    "MEDIA_QUEUE_LIMIT",
+    "MEDIA_PER_CHAT_LIMIT",
+    "MEDIA_ETA_NOTICE_SEC",
+    "MEDIA_UPLOAD_CONCURRENCY",
+    "MEDIA_UPLOAD_ATTEMPTS",
+    "MEDIA_QUEUE_BACKEND",
+    "MEDIA_INLINE_WORKER",
+    "MEDIA_JOB_VISIBILITY_SEC",
+    "MEDIA_JOB_MAX_DELIVERIES",
+    "MEDIA_JOB_TIMEOUT_SEC",
+    "MEDIA_WORKER_MEMORY_MB",
+    "MEDIA_HEARTBEAT_TIMEOUT_SEC",
+    "IMAGE_GEN_CONCURRENCY",
+    "IMAGE_QUEUE_LIMIT",
+    "IMAGE_PER_CHAT_LIMIT",
+    "RESULT_CACHE_DIR",
+    "RESULT_CACHE_MAX_MB",
+    "PDF_MAX_PAGES",
+    "PDF_MAX_MB",
+    "CSV_UPLOAD_MAX_MB",
+    "PPTX_TEMPLATE",
+    "PPTX_LOGO",
+    "MEMORY_FALLBACK_MAXMEMORY",
+    "REDIS_HEALTH_INTERVAL",
+    "REDIS_RECONNECT_BASE_DELAY",
+    "REDIS_RECONNECT_MAX_DELAY",
+    "REDIS_OUTAGE_JOURNAL_LIMIT",
+    "REDIS_OUTAGE_JOURNAL_MAX_MB",
 ]
@@ -0,0 +1,282 @@
+"""Таблица в Excel из CSV: разбор модулем ``csv``, типы столбцов, потоковая запись.
+
+Разделитель и кавычки определяет ``csv.Sniffer`` по началу текста (``,``, ``;``,
+табуляция или ``|``; если угадать не вышло — запятая). По первым
+``_SAMPLE_ROWS`` строкам для каждого столбца выбирается тип: целые, дробные
+(точка или запятая, пробелы между разрядами), даты и дата-время, иначе текст;
+тип нужен 90% значений выборки. Значение, которое не подошло под тип
+столбца, записывается как текст.
+
+Первая строка — заголовок, если в ней нет ни чисел, ни дат. Заголовок
+выделяется жирным и закрепляется, ширина столбцов подбирается по выборке.
+
+Книга пишется в режиме ``write_only`` openpyxl: строки уходят во временный файл
+по мере чтения, в памяти — только выборка. Поэтому загруженный CSV на десятки
+мегабайт читается потоком (:func:`open_csv`) и не держится целиком ни как
+текст, ни как книга. Строки сверх предела Excel (1 048 576) переходят на
+следующий лист.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import re
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import chain, islice
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Sequence, TextIO
+
+# Предел строк на лист в Excel
+SHEET_MAX_ROWS = 1_048_576
+# Предел длины текста в ячейке Excel
+_CELL_MAX_CHARS = 32_767
+
+_SNIFF_CHARS = 64 * 1024
+_SAMPLE_ROWS = 500
+_DELIMITERS = ",;\t|"
+_MAX_COLUMN_WIDTH = 60
+# Доля значений выборки, которые должны разобраться, чтобы столбец получил тип («н/д», «-» не мешают)
+_TYPE_SHARE = 0.9
+
+# Ведущие нули (коды, индексы) и больше 15 цифр (номера карт, ID) остаются текстом:
+# Excel хранит числа как double и потерял бы их
+_INT = re.compile(r"[+-]?(?:0|[1-9]\d{0,14})")
+_INT_GROUPED = re.compile(r"[+-]?[1-9]\d{0,2}(?:[ \u00a0\u202f]\d{3}){1,4}")
+_FLOAT = re.compile(r"[+-]?(?:0|[1-9]\d{0,14})(?:[.,]\d+)?(?:[eE][+-]?\d+)?")
+_FLOAT_GROUPED = re.compile(r"[+-]?[1-9]\d{0,2}(?:[ \u00a0\u202f]\d{3}){1,4}(?:[.,]\d+)?")
+_DOTTED_DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_ISO_DATETIME = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d{1,6})?)?")
+_GROUP_SPACES = str.maketrans("", "", " \u00a0\u202f")
+
+
+def _to_int(value: str) -> int:
+    if _INT.fullmatch(value):
+        return int(value)
+    if _INT_GROUPED.fullmatch(value):
+        return int(value.translate(_GROUP_SPACES))
+    raise ValueError(value)
+
+
+def _to_float(value: str) -> float:
+    if _FLOAT.fullmatch(value) or _FLOAT_GROUPED.fullmatch(value):
+        return float(value.translate(_GROUP_SPACES).replace(",", "."))
+    raise ValueError(value)
+
+
+def _to_date(value: str) -> date:
+    match = _DOTTED_DATE.fullmatch(value)
+    if match:
+        day, month, year = map(int, match.groups())
+        return date(year, month, day)
+    if _ISO_DATE.fullmatch(value):
+        return date.fromisoformat(value)
+    raise ValueError(value)
+
+
+def _to_datetime(value: str) -> datetime:
+    if _ISO_DATETIME.fullmatch(value):
+        return datetime.fromisoformat(value)
+    raise ValueError(value)
+
+
+# От узкого к широкому: столбец получает тип, под который подходит больше всего значений выборки
+_CONVERTERS: Sequence[Callable[[str], object]] = (_to_int, _to_float, _to_date, _to_datetime)
+
+
+def _parses(convert: Callable[[str], object], value: str) -> bool:
+    try:
+        convert(value)
+    except ValueError:
+        return False
+    return True
+
+
+def infer_column_types(rows: Sequence[Sequence[str]]) -> List[Optional[Callable[[str], object]]]:
+    """Преобразователь для каждого столбца выборки; None — текстовый столбец."""
+
+    columns = max((len(row) for row in rows), default=0)
+    types: List[Optional[Callable[[str], object]]] = []
+    for index in range(columns):
+        values = [row[index].strip() for row in rows if index < len(row) and row[index].strip()]
+        chosen, best = None, 0
+        for convert in _CONVERTERS:
+            # при равенстве остаётся более узкий тип: 1, 2, 3 — целые, а не дробные
+            parsed = sum(_parses(convert, value) for value in values)
+            if parsed > best and parsed >= _TYPE_SHARE * len(values):
+                chosen, best = convert, parsed
+        types.append(chosen)
+    return types
+
+
+def sniff_dialect(sample: str) -> type[csv.Dialect] | csv.Dialect:
+    """Диалект CSV по началу текста; запятая, если разделитель не угадывается."""
+
+    # последняя строка выборки может быть оборвана
+    head = sample.rsplit("\n", 1)[0] if "\n" in sample else sample
+    try:
+        return csv.Sniffer().sniff(head, delimiters=_DELIMITERS)
+    except csv.Error:
+        return csv.excel
+
+
+def _is_header(row: Sequence[str]) -> bool:
+    return any(row) and not any(
+        _parses(convert, cell.strip()) for cell in row if cell.strip() for convert in _CONVERTERS
+    )
+
+
+@dataclass(frozen=True)
+class SheetResult:
+    rows: int
+    columns: int
+    sheets: int
+    header: bool
+
+
+class _SheetWriter:
+    """Листы книги write_only: новый лист, когда текущий заполнен."""
+
+    def __init__(self, workbook, header: Optional[List[str]], widths: List[float]) -> None:
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        self._workbook = workbook
+        self._cell = WriteOnlyCell
+        self._bold = Font(bold=True)
+        self._header = header
+        self._widths = widths
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self) -> None:
+        from openpyxl.utils import get_column_letter
+
+        self.sheets += 1
+        self._sheet = self._workbook.create_sheet("Sheet1" if self.sheets == 1 else f"Sheet{self.sheets}")
+        # размеры столбцов и закрепление — до первой строки: в режиме write_only потом уже нельзя
+        for index, width in enumerate(self._widths, start=1):
+            self._sheet.column_dimensions[get_column_letter(index)].width = width
+        self._left = SHEET_MAX_ROWS
+        if self._header is not None:
+            self._sheet.freeze_panes = "A2"
+            cells = []
+            for value in self._header:
+                cell = self._text_cell(value)
+                cell.font = self._bold
+                cells.append(cell)
+            self._sheet.append(cells)
+            self._left -= 1
+
+    def _text_cell(self, value: str):
+        cell = self._cell(self._sheet, value=value[:_CELL_MAX_CHARS])
+        # openpyxl считает формулой строку с «=» в начале: из CSV приходят только значения
+        cell.data_type = "s"
+        return cell
+
+    def text(self, value: str):
+        if value.startswith("="):
+            return self._text_cell(value)
+        return value[:_CELL_MAX_CHARS]
+
+    def append(self, values: list) -> None:
+        if self._left == 0:
+            self._new_sheet()
+        self._sheet.append(values)
+        self._left -= 1
+
+
+def _convert_row(row: Sequence[str], types, writer: _SheetWriter) -> list:
+    values = []
+    for index, raw in enumerate(row):
+        value = raw.strip()
+        if not value:
+            values.append(None)
+            continue
+        convert = types[index] if index < len(types) else None
+        if convert is not None:
+            try:
+                values.append(convert(value))
+                continue
+            except ValueError:
+                pass
+        values.append(writer.text(value))
+    return values
+
+
+def _column_widths(rows: Iterable[Sequence[str]], columns: int) -> List[float]:
+    widths = [8.0] * columns
+    for row in rows:
+        for index, value in enumerate(row[:columns]):
+            widths[index] = max(widths[index], min(_MAX_COLUMN_WIDTH, len(value.strip()) + 2))
+    return widths
+
+
+def write_workbook(source: TextIO, out: BinaryIO) -> SheetResult:
+    """Прочитать CSV из ``source`` и записать книгу xlsx в ``out``."""
+
+    from openpyxl import Workbook
+
+    sample_text = source.read(_SNIFF_CHARS)
+    dialect = sniff_dialect(sample_text)
+    lines: Iterator[str] = chain(io.StringIO(sample_text, newline=""), source)
+    reader = csv.reader(_joined_lines(lines), dialect)
+
+    sample = [row for row in islice(reader, _SAMPLE_ROWS) if any(cell.strip() for cell in row)]
+    header = None
+    if sample and _is_header(sample[0]):
+        header = [cell.strip() for cell in sample[0]]
+        sample = sample[1:]
+    types = infer_column_types(sample)
+    columns = max(len(types), len(header or ()))
+    widths = _column_widths(chain([header] if header else [], sample), columns)
+
+    workbook = Workbook(write_only=True)
+    writer = _SheetWriter(workbook, header, widths)
+    rows = 0
+    for row in chain(sample, reader):
+        if not any(cell.strip() for cell in row):
+            continue
+        writer.append(_convert_row(row, types, writer))
+        rows += 1
+    workbook.save(out)
+    return SheetResult(rows=rows, columns=columns, sheets=writer.sheets, header=header is not None)
+
+
+def _joined_lines(lines: Iterable[str]) -> Iterator[str]:
+    # Выборка могла оборвать строку посередине: склеиваем её с продолжением из файла
+    pending = ""
+    for line in lines:
+        if pending:
+            line, pending = pending + line, ""
+        if line.endswith("\n") or line.endswith("\r"):
+            yield line
+        else:
+            pending = line
+    if pending:
+        yield pending
+
+
+def open_csv(path: str, *, sniff_bytes: int = _SNIFF_CHARS) -> TextIO:
+    """Открыть CSV-файл на чтение: UTF-8 (с BOM или без), иначе cp1251."""
+
+    with open(path, "rb") as fh:
+        head = fh.read(sniff_bytes)
+    try:
+        # неполный последний символ выборки не считается ошибкой
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "cp1251"
+    return open(path, "r", encoding=encoding, errors="replace", newline="")
+
+
+__all__ = [
+    "SHEET_MAX_ROWS",
+    "SheetResult",
+    "infer_column_types",
+    "open_csv",
+    "sniff_dialect",
+    "write_workbook",
+]
@@ -0,0 +1,153 @@
+"""Профилирование старта бота: время импорта модулей и фаз инициализации.
+
+Фазы отмечаются контекстным менеджером :func:`phase` в ``app.create_app()``;
+отчёт печатается при ``STARTUP_PROFILE=1``. Разбивка импорта строится по
+``python -X importtime`` в отдельном процессе, чтобы не зависеть от уже
+загруженных модулей.
+
+Запуск: ``python -m startup_profiler [--module bot] [--top 20]``.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ENABLED = os.getenv("STARTUP_PROFILE", "").lower() in {"1", "true", "yes"}
+
+_phases: List[Tuple[str, float]] = []
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Засечь длительность фазы инициализации (записывается всегда, это дёшево)."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - started))
+
+
+def phases() -> List[Tuple[str, float]]:
+    return list(_phases)
+
+
+def phase_report() -> str:
+    total = sum(seconds for _, seconds in _phases)
+    lines = ["Init phases:"]
+    for name, seconds in _phases:
+        lines.append(f"  {name:<28} {seconds * 1000:>9.1f} ms")
+    lines.append(f"  {'total':<28} {total * 1000:>9.1f} ms")
+    return "\n".join(lines)
+
+
+@dataclass
+class ImportProfile:
+    total_us: int = 0
+    # модуль -> (собственное время, накопленное время), мкс
+    modules: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    # модули, импортированные напрямую целевым (верхний уровень дерева)
+    top_level: List[str] = field(default_factory=list)
+
+    def cumulative(self, name: str) -> int:
+        return self.modules.get(name, (0, 0))[1]
+
+    def grouped(self) -> Dict[str, int]:
+        """Собственное время, просуммированное по пакетам верхнего уровня."""
+
+        totals: Dict[str, int] = {}
+        for name, (self_us, _) in self.modules.items():
+            root = name.split(".", 1)[0]
+            totals[root] = totals.get(root, 0) + self_us
+        return totals
+
+
+def parse_importtime(output: str, module: str) -> ImportProfile:
+    profile = ImportProfile()
+    for line in output.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        profile.modules[name] = (self_us, cumulative_us)
+        if len(indent) <= 1:
+            profile.top_level.append(name)
+    profile.total_us = profile.cumulative(module)
+    return profile
+
+
+def import_breakdown(
+    module: str = "bot",
+    *,
+    env: Optional[Dict[str, str]] = None,
+    cwd: Optional[str] = None,
+    timeout: float = 120.0,
+) -> ImportProfile:
+    """Импортировать ``module`` в чистом интерпретаторе с ``-X importtime``."""
+
+    root = os.path.dirname(os.path.abspath(__file__))
+    run_env = dict(os.environ if env is None else env)
+    run_env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, run_env.get("PYTHONPATH", "")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=run_env,
+        cwd=cwd or root,
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"import {module} failed:\n{tail}")
+    return parse_importtime(result.stderr, module)
+
+
+def format_import_breakdown(profile: ImportProfile, top: int = 20) -> str:
+    lines = [f"Import time: {profile.total_us / 1000:.1f} ms total", "  by package (self time):"]
+    for name, self_us in sorted(profile.grouped().items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"    {name:<30} {self_us / 1000:>9.1f} ms")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="bot")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--no-init", action="store_true", help="не собирать приложение через app.create_app()")
+    args = parser.parse_args()
+
+    print(format_import_breakdown(import_breakdown(args.module), args.top))
+    if args.no_init:
+        return
+    import importlib
+
+    # При запуске через ``-m`` этот файл — ``__main__``; фазы бота пишутся в ``startup_profiler``
+    profiler = importlib.import_module("startup_profiler")
+    with profiler.phase(f"import {args.module}"):
+        importlib.import_module(args.module)
+    importlib.import_module("app").create_app(start_background=False)
+    print(profiler.phase_report())
+
+
+__all__ = [
+    "ENABLED",
+    "ImportProfile",
+    "format_import_breakdown",
+    "import_breakdown",
+    "parse_importtime",
+    "phase",
+    "phase_report",
+    "phases",
+]
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,180 @@
 import json
-import sqlite3
+import random
 import threading
 import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import date
-from typing import Any, Dict, List, Set
+from typing import Any, Dict, Iterator, List, Optional
 
 try:
     import redis  # type: ignore
 except ImportError:  # pragma: no cover - fallback for environments without redis
     redis = None
 
+from backends import create_backend
+from db import database
+from history_archive import HistoryArchive
+from memory_redis import InMemoryRedis, ResponseError
+from quota import KINDS, QuotaEngine, month_key
+from redis_pool import create_client, pool_stats
+from result_cache import ResultCache
 from settings import (
+    EMBEDDED_KV_PATH,
+    HISTORY_ARCHIVE_AFTER_HOURS,
+    HISTORY_ARCHIVE_DIR,
+    HISTORY_ARCHIVE_SEGMENT_MB,
+    MEDIA_MONTHLY_LIMITS,
+    MEDIA_QUOTA_CACHE_TTL,
+    MEMORY_FALLBACK_MAXMEMORY,
     OWNER_ID,
-    REDIS_DB,
-    REDIS_HOST,
-    REDIS_PASSWORD,
-    REDIS_PORT,
+    REDIS_HEALTH_INTERVAL,
+    REDIS_OUTAGE_JOURNAL_LIMIT,
+    REDIS_OUTAGE_JOURNAL_MAX_MB,
+    REDIS_RECONNECT_BASE_DELAY,
+    REDIS_RECONNECT_MAX_DELAY,
+    RESULT_CACHE_DIR,
+    RESULT_CACHE_MAX_MB,
+    STORAGE_BACKEND,
+    VISION_CACHE_TTL_SEC,
     bot,
     is_owner,
 )
+from vision_cache import VisionCache
 
 TTL = 60 * 60 * 24 * 7  # 7 дней
-_REDIS_CHAT_SET_KEY = "chat:ids"
 _last_alert_date: date | None = None
 _last_status_ok = True
 
 
 def _create_redis_client() -> "redis.Redis | None":
-    if redis is None:
-        return None
-    try:
-        connection_kwargs = {
-            "host": REDIS_HOST,
-            "port": REDIS_PORT,
-            "db": REDIS_DB,
-            "decode_responses": True,
-        }
-        if REDIS_PASSWORD:
-            connection_kwargs["password"] = REDIS_PASSWORD
-        client = redis.Redis(**connection_kwargs)
-        client.ping()
-        return client
-    except redis.RedisError:
-        return None
+    # Все клиенты делят один пул: переподключение не плодит новые сокеты
+    return create_client()
 
 
-class InMemoryRedis:
-    """Простейшая in-memory реализация минимального набора команд Redis."""
+class _SafePipeline:
+    """Буфер команд SafeRedis: уходит в Redis одним запросом, при сбое исполняется в памяти."""
 
-    def __init__(self) -> None:
-        self._store: Dict[str, tuple[str, float | None]] = {}
-        self._sets: Dict[str, Set[str]] = {}
+    def __init__(self, owner: "SafeRedis") -> None:
+        self._owner = owner
+        self._commands: List[tuple[str, tuple, dict]] = []
 
-    def _purge_if_expired(self, key: str) -> None:
-        value = self._store.get(key)
-        if not value:
-            return
-        _, expires_at = value
-        if expires_at is not None and expires_at < time.time():
-            self._store.pop(key, None)
-
-    def setex(self, key: str, ttl: int, value: str) -> bool:
-        self._store[key] = (value, time.time() + ttl)
-        return True
-
-    def set(self, key: str, value: str, ex: int | None = None) -> bool:
-        expires_at = time.time() + ex if ex else None
-        self._store[key] = (value, expires_at)
-        return True
-
-    def get(self, key: str) -> str | None:
-        self._purge_if_expired(key)
-        entry = self._store.get(key)
-        if not entry:
-            return None
-        return entry[0]
-
-    def delete(self, key: str) -> int:
-        existed = key in self._store
-        self._store.pop(key, None)
-        return int(existed)
-
-    def sadd(self, key: str, member: int) -> int:
-        members = self._sets.setdefault(key, set())
-        before = len(members)
-        members.add(str(member))
-        return int(len(members) > before)
-
-    def smembers(self, key: str) -> Set[str]:
-        return set(self._sets.get(key, set()))
-
-    def srem(self, key: str, member: int) -> int:
-        members = self._sets.get(key)
-        if not members:
-            return 0
-        removed = str(member) in members
-        members.discard(str(member))
-        if not members:
-            self._sets.pop(key, None)
-        return int(removed)
-
-    def ping(self) -> bool:
-        return True
-
-    def pipeline(self):  # pragma: no cover - совместимость с redis
+    def __getattr__(self, command: str):
+        if command.startswith("_"):
+            raise AttributeError(command)
+
+        def queue(*args, **kwargs) -> "_SafePipeline":
+            self._commands.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def __enter__(self) -> "_SafePipeline":
         return self
 
-    def execute(self):  # pragma: no cover
-        return True
+    def __exit__(self, *exc_info) -> None:
+        self._commands.clear()
+
+    def execute(self) -> List[Any]:
+        commands, self._commands = self._commands, []
+        return self._owner._execute_pipeline(commands)
+
+
+# Команды, изменяющие данные: во время сбоя они журналируются для повтора в Redis.
+# SPOP сюда не входит — повтор выбрал бы в Redis другие случайные элементы.
+_WRITE_COMMANDS = frozenset({
+    "set", "setex", "delete", "expire", "incr", "incrby",
+    "sadd", "srem",
+    "hset", "hincrby", "hdel",
+    "zadd", "zincrby", "zrem", "zremrangebyscore",
+    "rpush", "lpush", "ltrim",
+})
+# Полная перезапись ключа: из журнала достаточно последней такой записи
+_OVERWRITE_COMMANDS = frozenset({"set", "setex", "delete"})
+_REPLAY_BATCH_SIZE = 500
+_JOURNAL_ENTRY_OVERHEAD = 64
+
+
+@dataclass(eq=False)
+class _JournalEntry:
+    command: str
+    args: tuple
+    kwargs: dict
+    size: int
+    # ключ перезаписи (SET/SETEX/DEL одного ключа), иначе None
+    key: Optional[str] = None
+    dead: bool = field(default=False)
+
+
+def _journal_entry(command: str, args: tuple, kwargs: dict) -> _JournalEntry:
+    # Размер — по строковому виду аргументов: история диалога в SETEX весит столько, сколько её JSON
+    size = _JOURNAL_ENTRY_OVERHEAD + sum(len(str(value)) for value in (*args, *kwargs.values()))
+    key = None
+    if command in _OVERWRITE_COMMANDS and args and (command != "delete" or len(args) == 1):
+        key = str(args[0])
+    return _JournalEntry(command, args, kwargs, size, key)
 
 
 class SafeRedis:
-    """Обёртка, которая прозрачно переключается на in-memory при ошибках."""
+    """Обёртка, которая прозрачно переключается на in-memory при ошибках.
+
+    Пока Redis недоступен, записи выполняются в ограниченном по памяти
+    локальном хранилище и попадают в журнал, который после переподключения
+    повторяется в Redis пакетами; затем локальный буфер очищается.
 
-    def __init__(self, client: "redis.Redis | None") -> None:
+    Журнал ограничен числом записей (``journal_limit``) и их общим размером
+    (``journal_max_bytes``); при переполнении теряются самые старые. Для
+    SET/SETEX/DEL одного ключа хранится только последняя запись: каждое
+    сохранение истории — это SETEX всего диалога, и без этого долгий сбой
+    держал бы в памяти все его промежуточные копии.
+    """
+
+    def __init__(self, client: "redis.Redis | None", *, journal_limit: int = 0, journal_max_bytes: int = 0) -> None:
         self._client = client
-        self._memory = InMemoryRedis()
+        self._memory = InMemoryRedis(maxmemory=MEMORY_FALLBACK_MAXMEMORY)
+        self._lock = threading.RLock()
+        self._journal: deque[_JournalEntry] = deque()
+        self._journal_limit = journal_limit
+        self._journal_max_bytes = journal_max_bytes
+        self._journal_live = 0
+        self._journal_bytes = 0
+        # последняя запись-перезапись по ключу, ещё не отправленная в Redis
+        self._journal_latest: Dict[str, _JournalEntry] = {}
+        self._outage_since: float | None = None
+        self.stats = {"outages": 0, "journaled": 0, "journal_coalesced": 0, "journal_dropped": 0, "replayed": 0}
 
     @property
     def is_real(self) -> bool:
         return self._client is not None
 
+    @property
+    def in_outage(self) -> bool:
+        """Redis был подключён, но сейчас недоступен, и записи копятся в журнале."""
+
+        return self._client is None and self._outage_since is not None
+
+    @property
+    def journal_size(self) -> int:
+        return self._journal_live
+
+    @property
+    def journal_bytes(self) -> int:
+        return self._journal_bytes
+
+    @contextmanager
+    def local(self) -> Iterator[Optional[InMemoryRedis]]:
+        """Локальный буфер под блокировкой, пока Redis недоступен; иначе ``None``.
+
+        Команды к буферу не журналируются: так из него можно забрать данные,
+        уже сохранённые в другом месте, не повторяя это в Redis.
+        """
+        with self._lock:
+            yield self._memory if self._client is None else None
+
     @property
     def client(self) -> "redis.Redis | None":
         return self._client
@@ -129,18 +183,150 @@ class SafeRedis:
     def client(self, value: "redis.Redis | None") -> None:
         self._client = value
 
-    def _execute(self, command: str, *args, **kwargs):
+    def _mark_failed(self, what: str, exc: Exception) -> None:
         global _last_status_ok
-        if self._client is not None:
+        with self._lock:
+            if self._client is None:
+                return
+            self._client = None
+            if self._outage_since is None:
+                self._outage_since = time.time()
+                self.stats["outages"] += 1
+        _last_status_ok = False
+        notify_owner(f"Redis {what} failed: {exc}")
+
+    def _journal_write(self, command: str, args: tuple, kwargs: dict) -> None:
+        if command not in _WRITE_COMMANDS or not self._journal_limit:
+            return
+        entry = _journal_entry(command, args, kwargs)
+        if entry.key is not None:
+            previous = self._journal_latest.get(entry.key)
+            if previous is not None:
+                # более ранняя перезапись того же ключа после повтора всё равно была бы затёрта
+                self._discard(previous)
+                self.stats["journal_coalesced"] += 1
+            self._journal_latest[entry.key] = entry
+        self._journal.append(entry)
+        self._journal_live += 1
+        self._journal_bytes += entry.size
+        self.stats["journaled"] += 1
+        while self._journal_live and (
+            self._journal_live > self._journal_limit
+            or (self._journal_max_bytes and self._journal_bytes > self._journal_max_bytes)
+        ):
+            oldest = self._journal.popleft()
+            if not oldest.dead:
+                self._discard(oldest)
+                self.stats["journal_dropped"] += 1
+        while self._journal and self._journal[0].dead:
+            self._journal.popleft()
+
+    def _discard(self, entry: _JournalEntry) -> None:
+        """Исключить запись из журнала (сама она удаляется из очереди при проходе)."""
+
+        entry.dead = True
+        # аргументы могут быть большими: освобождаем сразу
+        entry.args, entry.kwargs = (), {}
+        self._journal_live -= 1
+        self._journal_bytes -= entry.size
+        if entry.key is not None and self._journal_latest.get(entry.key) is entry:
+            del self._journal_latest[entry.key]
+
+    def _take_batch(self) -> List[_JournalEntry]:
+        batch: List[_JournalEntry] = []
+        while self._journal and len(batch) < _REPLAY_BATCH_SIZE:
+            entry = self._journal.popleft()
+            if entry.dead:
+                continue
+            self._journal_live -= 1
+            self._journal_bytes -= entry.size
+            if entry.key is not None and self._journal_latest.get(entry.key) is entry:
+                del self._journal_latest[entry.key]
+            batch.append(entry)
+        return batch
+
+    def _restore_batch(self, batch: List[_JournalEntry]) -> None:
+        # Вернуть в начало журнала: более новые записи останутся после них
+        self._journal.extendleft(reversed(batch))
+        self._journal_live += len(batch)
+        self._journal_bytes += sum(entry.size for entry in batch)
+
+    def _execute(self, command: str, *args, **kwargs):
+        client = self._client
+        if client is not None:
             try:
-                method = getattr(self._client, command)
+                method = getattr(client, command)
                 return method(*args, **kwargs)
             except Exception as exc:  # noqa: BLE001 - хотим поймать любые сбои клиента
-                _last_status_ok = False
-                notify_owner(f"Redis command '{command}' failed: {exc}")
-                self._client = None
-        memory_method = getattr(self._memory, command)
-        return memory_method(*args, **kwargs)
+                self._mark_failed(f"command '{command}'", exc)
+        if command not in _WRITE_COMMANDS:
+            return getattr(self._memory, command)(*args, **kwargs)
+        with self._lock:
+            if self._client is not None:  # Redis восстановился, пока ждали блокировку
+                return self._execute(command, *args, **kwargs)
+            result = getattr(self._memory, command)(*args, **kwargs)
+            self._journal_write(command, args, kwargs)
+            return result
+
+    def _execute_pipeline(self, commands: List[tuple[str, tuple, dict]]) -> List[Any]:
+        if not commands:
+            return []
+        client = self._client
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for command, args, kwargs in commands:
+                    getattr(pipe, command)(*args, **kwargs)
+                return pipe.execute()
+            except Exception as exc:  # noqa: BLE001
+                self._mark_failed("pipeline", exc)
+        with self._lock:
+            if self._client is not None:
+                return self._execute_pipeline(commands)
+            # По одной команде, как pipeline(transaction=False) в Redis: каждая выполненная
+            # запись сразу попадает в журнал, даже если следующая команда упадёт
+            results: List[Any] = []
+            for command, args, kwargs in commands:
+                try:
+                    results.append(getattr(self._memory, command)(*args, **kwargs))
+                except ResponseError as exc:
+                    # как redis-py: остальные команды выполняются, ошибка — после всех
+                    results.append(exc)
+                    continue
+                self._journal_write(command, args, kwargs)
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+            return results
+
+    def reconnect(self, client: "redis.Redis") -> bool:
+        """Повторить журнал в ``client`` и переключиться на него.
+
+        Возвращает False, если во время повтора Redis снова отказал; тогда
+        неповторённые записи остаются в журнале до следующей попытки.
+        """
+
+        while True:
+            with self._lock:
+                batch = self._take_batch()
+                if not batch:
+                    # Журнал пуст и новые записи ждут блокировку — можно переключаться
+                    self._client = client
+                    self._outage_since = None
+                    self._journal.clear()
+                    self._journal_latest.clear()
+                    self._memory.flushall()
+                    return True
+            try:
+                pipe = client.pipeline(transaction=False)
+                for entry in batch:
+                    getattr(pipe, entry.command)(*entry.args, **entry.kwargs)
+                pipe.execute()
+            except Exception:  # noqa: BLE001
+                with self._lock:
+                    self._restore_batch(batch)
+                return False
+            self.stats["replayed"] += len(batch)
 
     def setex(self, *args, **kwargs):
         return self._execute("setex", *args, **kwargs)
@@ -163,116 +349,222 @@ class SafeRedis:
     def srem(self, *args, **kwargs):
         return self._execute("srem", *args, **kwargs)
 
+    def spop(self, *args, **kwargs):
+        return self._execute("spop", *args, **kwargs)
+
+    def hset(self, *args, **kwargs):
+        return self._execute("hset", *args, **kwargs)
+
+    def hget(self, *args, **kwargs):
+        return self._execute("hget", *args, **kwargs)
+
+    def hgetall(self, *args, **kwargs):
+        return self._execute("hgetall", *args, **kwargs)
+
+    def hincrby(self, *args, **kwargs):
+        return self._execute("hincrby", *args, **kwargs)
+
+    def zadd(self, *args, **kwargs):
+        return self._execute("zadd", *args, **kwargs)
+
+    def zincrby(self, *args, **kwargs):
+        return self._execute("zincrby", *args, **kwargs)
+
+    def zscore(self, *args, **kwargs):
+        return self._execute("zscore", *args, **kwargs)
+
+    def zcard(self, *args, **kwargs):
+        return self._execute("zcard", *args, **kwargs)
+
+    def zrem(self, *args, **kwargs):
+        return self._execute("zrem", *args, **kwargs)
+
+    def zrevrange(self, *args, **kwargs):
+        return self._execute("zrevrange", *args, **kwargs)
+
+    def zrangebyscore(self, *args, **kwargs):
+        return self._execute("zrangebyscore", *args, **kwargs)
+
     def ping(self, *args, **kwargs):
         return self._execute("ping", *args, **kwargs)
 
-    def pipeline(self, *args, **kwargs):  # pragma: no cover - совместимость
-        return self._execute("pipeline", *args, **kwargs)
+    def pipeline(self) -> _SafePipeline:
+        return _SafePipeline(self)
 
-    def execute(self, *args, **kwargs):  # pragma: no cover
-        return self._execute("execute", *args, **kwargs)
 
+r = SafeRedis(
+    _create_redis_client(),
+    journal_limit=REDIS_OUTAGE_JOURNAL_LIMIT if redis is not None else 0,
+    journal_max_bytes=REDIS_OUTAGE_JOURNAL_MAX_MB * 1024 * 1024,
+)
 
-r = SafeRedis(_create_redis_client())
 
-# Имя файла базы (создастся автоматически при первом запуске)
-DB_PATH = "users.db"
+def _send_alert(text: str, *, reset_on_failure: bool) -> None:
+    global _last_alert_date
+    try:
+        bot.send_message(OWNER_ID, text)
+    except Exception:  # pragma: no cover - в офлайн среде уведомление не доставится
+        if reset_on_failure:
+            _last_alert_date = None
 
-# Локальный fallback, если Redis недоступен (офлайн режим)
-_memory_history: Dict[int, List[Dict[str, Any]]] = {}
 
 def notify_owner(msg: str) -> None:
-    """Уведомить владельца о проблеме с Redis (не чаще одного раза в день)."""
+    """Уведомить владельца о проблеме с Redis (не чаще одного раза в день).
+
+    Сообщение уходит из отдельного потока, чтобы запрос к Telegram не
+    задерживал команду Redis, во время которой обнаружен сбой.
+    """
 
     global _last_alert_date
     today = date.today()
     if _last_alert_date == today:
         return
-    try:
-        bot.send_message(OWNER_ID, f"⚠️ Redis alert: {msg}")
-        _last_alert_date = today
-    except Exception:  # pragma: no cover - в офлайн среде уведомление не доставится
-        pass
+    _last_alert_date = today
+    threading.Thread(
+        target=_send_alert,
+        args=(f"⚠️ Redis alert: {msg}",),
+        kwargs={"reset_on_failure": True},
+        daemon=True,
+    ).start()
 
 
 def notify_restored() -> None:
     """Уведомить владельца, что Redis снова доступен."""
 
     global _last_alert_date
-    try:
-        bot.send_message(OWNER_ID, "✅ Redis restored and working fine again")
-        _last_alert_date = None
-    except Exception:  # pragma: no cover - офлайн среда
-        pass
+    _last_alert_date = None
+    stats = r.stats
+    threading.Thread(
+        target=_send_alert,
+        args=(
+            "✅ Redis restored and working fine again "
+            f"(replayed {stats['replayed']}, dropped {stats['journal_dropped']} buffered writes)",
+        ),
+        kwargs={"reset_on_failure": False},
+        daemon=True,
+    ).start()
+
+
+def format_redis_status() -> str:
+    """Короткий отчёт для владельца: режим работы, сбои и загрузка пула соединений."""
+
+    stats = r.stats
+    pool = pool_stats()
+    mode = "Redis" if r.is_real else "память (сбой Redis)"
+    lines = [
+        "<b>Хранилище</b>",
+        f"Режим: {mode}",
+        f"Сбоев: {stats['outages']}, в журнале: {r.journal_size} ({r.journal_bytes / 2**20:.1f} МБ), "
+        f"повторено: {stats['replayed']}, объединено: {stats['journal_coalesced']}, потеряно: {stats['journal_dropped']}",
+        "<b>Пул соединений</b>",
+        f"Занято: {pool['in_use']} из {pool['max_connections']} (пик {pool['peak_in_use']}), "
+        f"открыто: {pool.get('opened', 0)}",
+        f"Ожидание: среднее {pool['wait_ms_avg']:.2f} мс, максимум {pool['wait_seconds_max'] * 1000:.1f} мс, "
+        f"отказов по таймауту: {pool['exhausted']}",
+    ]
+    async_pool = pool_stats("async")
+    if async_pool["checkouts"]:
+        lines.append(
+            f"Асинхронный пул: занято {async_pool['in_use']} из {async_pool['max_connections']} "
+            f"(пик {async_pool['peak_in_use']}), отказов по таймауту: {async_pool['exhausted']}"
+        )
+    return "\n".join(lines)
 
 
 def redis_health_check() -> None:
-    """Фоновая проверка доступности Redis и попытка переподключения."""
+    """Фоновая проверка доступности Redis и переподключение с экспоненциальной задержкой."""
 
     global _last_status_ok
+    delay = REDIS_RECONNECT_BASE_DELAY
     while True:
         if redis is None:
             time.sleep(86400)
             continue
 
-        if not r.is_real:
-            client = _create_redis_client()
-            if client is None:
-                _last_status_ok = False
-                notify_owner("Redis reconnect attempt failed")
-                time.sleep(86400)
-                continue
-            r.client = client
-
-        try:
-            pong = r.ping()
-        except Exception as exc:  # noqa: BLE001
-            _last_status_ok = False
-            notify_owner(f"Redis health-check failed: {exc}")
-            r.client = None
-            time.sleep(86400)
-            continue
-
-        if pong:
+        client = r.client
+        if client is not None:
+            try:
+                pong = client.ping()
+            except Exception as exc:  # noqa: BLE001
+                r._mark_failed("health-check", exc)
+            else:
+                if pong:
+                    _last_status_ok = True
+                    delay = REDIS_RECONNECT_BASE_DELAY
+                    time.sleep(REDIS_HEALTH_INTERVAL)
+                    continue
+                r._mark_failed("ping", RuntimeError("no PONG"))
+
+        client = _create_redis_client()
+        if client is not None and r.reconnect(client):
             if not _last_status_ok:
                 notify_restored()
             _last_status_ok = True
-        else:
-            _last_status_ok = False
-            notify_owner("Redis ping failed (no PONG)")
-            r.client = None
+            delay = REDIS_RECONNECT_BASE_DELAY
+            continue
+
+        _last_status_ok = False
+        notify_owner("Redis reconnect attempt failed")
+        # «Полный» джиттер: несколько процессов не штурмуют Redis одновременно
+        time.sleep(random.uniform(0, delay))
+        delay = min(delay * 2, REDIS_RECONNECT_MAX_DELAY)
+
+
+_health_check_lock = threading.Lock()
+_health_check_started = False
 
-        time.sleep(86400)
+
+def start_health_check() -> None:
+    """Запустить фоновую проверку Redis один раз на процесс (из ``app.create_app``)."""
+
+    global _health_check_started
+    with _health_check_lock:
+        if _health_check_started:
+            return
+        _health_check_started = True
+    threading.Thread(target=redis_health_check, name="redis-health", daemon=True).start()
 
 
-threading.Thread(target=redis_health_check, daemon=True).start()
+# История и язык идут через выбранный движок; usage_tracker работает с ``r`` напрямую
+_BACKEND = None
+_BACKEND_LOCK = threading.Lock()
 
 
-def _chat_key(chat_id: int) -> str:
-    return f"chat:{chat_id}"
+def get_backend():
+    """Движок хранения создаётся при первом обращении.
+
+    Встроенный движок берёт эксклюзивную блокировку файла, а ``storage``
+    импортируют и процессы-воркеры (ради ``result_cache``/``vision_cache``),
+    которым история не нужна: открытие при импорте роняло бы их рядом с ботом.
+    """
+    global _BACKEND
+    with _BACKEND_LOCK:
+        if _BACKEND is None:
+            _BACKEND = create_backend(STORAGE_BACKEND, redis_client=r, database=database, path=EMBEDDED_KV_PATH)
+        return _BACKEND
+
+
+# Холодный уровень: файлы открываются при первом обращении
+history_archive = HistoryArchive(HISTORY_ARCHIVE_DIR, segment_bytes=HISTORY_ARCHIVE_SEGMENT_MB * 1024 * 1024)
 
 
 def save_history(chat_id: int, messages: List[Dict[str, Any]]) -> None:
-    """Сохранить историю диалога в Redis (или локально, если Redis недоступен)."""
+    """Сохранить историю диалога (для Redis на время сбоя — в локальный буфер SafeRedis)."""
 
     serialized = json.dumps(messages, ensure_ascii=False)
 
     try:
-        r.setex(_chat_key(chat_id), TTL, serialized)
-        r.sadd(_REDIS_CHAT_SET_KEY, chat_id)
+        get_backend().save_history(chat_id, serialized, TTL)
     except Exception:  # pragma: no cover - fallback на память
         notify_owner("save_history failed (unexpected error)")
 
-    # Храним локально, чтобы не потерять при офлайн-режиме
-    _memory_history[chat_id] = json.loads(serialized)
-
 
 def load_history(chat_id: int) -> List[Dict[str, Any]]:
     """Загрузить историю диалога."""
 
     data = None
     try:
-        data = r.get(_chat_key(chat_id))
+        data = get_backend().load_history(chat_id)
     except Exception:  # pragma: no cover
         notify_owner("load_history failed (unexpected error)")
 
@@ -281,61 +573,112 @@ def load_history(chat_id: int) -> List[Dict[str, Any]]:
             return json.loads(data)
         except json.JSONDecodeError:
             clear_history(chat_id)
+        return []
+
+    return _restore_archived(chat_id)
+
 
-    history = _memory_history.get(chat_id, [])
-    # Возвращаем копию, чтобы не модифицировать оригинал
-    return json.loads(json.dumps(history)) if history else []
+def _restore_archived(chat_id: int) -> List[Dict[str, Any]]:
+    """Вернуть последний архивный фрагмент в горячее хранилище, когда пользователь вернулся."""
+
+    try:
+        messages = history_archive.latest(chat_id)
+        if messages is None:
+            return []
+        get_backend().save_history(chat_id, json.dumps(messages, ensure_ascii=False), TTL)
+        history_archive.pop(chat_id)
+        return messages
+    except Exception:  # pragma: no cover
+        notify_owner("history archive restore failed (unexpected error)")
+        return []
+
+
+def archive_history(chat_id: int) -> bool:
+    """Перенести историю чата из горячего хранилища в архив. True, если что-то перенесено."""
+
+    data = get_backend().load_history(chat_id)
+    if data:
+        history_archive.append(chat_id, data)
+    # Удаляем и пустые/истёкшие записи, чтобы не проверять их при следующем проходе
+    get_backend().delete_history(chat_id)
+    return bool(data)
+
+
+def archive_stale_histories(max_age_hours: float = HISTORY_ARCHIVE_AFTER_HOURS) -> int:
+    """Заархивировать истории, не обновлявшиеся дольше ``max_age_hours``; вернуть их число."""
+
+    moved = 0
+    try:
+        stale = get_backend().stale_history_chat_ids(time.time() - max_age_hours * 3600)
+    except Exception:  # pragma: no cover
+        notify_owner("archive_stale_histories failed (unexpected error)")
+        return 0
+    for chat_id in stale:
+        try:
+            moved += archive_history(chat_id)
+        except Exception:  # pragma: no cover
+            notify_owner("archive_history failed (unexpected error)")
+    try:
+        # снятые при возврате пользователей фрагменты копятся в сегментах
+        history_archive.maybe_compact()
+    except Exception:  # pragma: no cover
+        notify_owner("history archive compaction failed (unexpected error)")
+    return moved
 
 
 def clear_history(chat_id: int) -> None:
-    """Удалить историю вручную."""
+    """Удалить историю вручную (вместе с архивом)."""
 
     try:
-        r.delete(_chat_key(chat_id))
-        r.srem(_REDIS_CHAT_SET_KEY, chat_id)
+        get_backend().delete_history(chat_id)
+        history_archive.delete(chat_id)
     except Exception:  # pragma: no cover
         notify_owner("clear_history failed (unexpected error)")
 
-    _memory_history.pop(chat_id, None)
-
 
 def iter_history_chat_ids() -> List[int]:
     """Вернуть список chat_id, у которых есть сохранённая история."""
 
-    chat_ids = set(_memory_history.keys())
+    chat_ids: set[int] = set()
     try:
-        members = r.smembers(_REDIS_CHAT_SET_KEY)
-        chat_ids.update(int(member) for member in members)
+        chat_ids.update(get_backend().history_chat_ids())
     except Exception:  # pragma: no cover
         notify_owner("iter_history_chat_ids failed (unexpected error)")
     return list(chat_ids)
 
+
+def save_language(chat_id: int, lang: str) -> None:
+    try:
+        get_backend().set(f"lang:{chat_id}", lang, ttl=TTL)
+    except Exception:  # pragma: no cover
+        notify_owner("save_language failed (unexpected error)")
+
+
+def load_language(chat_id: int) -> str | None:
+    try:
+        return get_backend().get(f"lang:{chat_id}")
+    except Exception:  # pragma: no cover
+        notify_owner("load_language failed (unexpected error)")
+        return None
+
 # --- Инициализация базы ---
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        chat_id INTEGER PRIMARY KEY,
-        used_free INT DEFAULT 0,
-        has_tariff INTEGER DEFAULT 0
-    )
-    """)
-    # Миграция: если колонка has_tariff отсутствует в старой таблице — добавляем
-    c.execute("PRAGMA table_info(users)")
-    columns = [row[1] for row in c.fetchall()]
-    if "has_tariff" not in columns:
-        c.execute("ALTER TABLE users ADD COLUMN has_tariff INTEGER DEFAULT 0")
-    conn.commit()
-    conn.close()
+    with database.transaction():
+        database.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            chat_id INTEGER PRIMARY KEY,
+            used_free INT DEFAULT 0,
+            has_tariff INTEGER DEFAULT 0
+        )
+        """)
+        # Миграция: если колонка has_tariff отсутствует в старой таблице — добавляем
+        columns = [row[1] for row in database.query_all("PRAGMA table_info(users)")]
+        if "has_tariff" not in columns:
+            database.execute("ALTER TABLE users ADD COLUMN has_tariff INTEGER DEFAULT 0")
 
 # --- Получить информацию об использовании и тарифе пользователя ---
 def get_user_usage(chat_id: int) -> tuple[int, int]:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT used_free, has_tariff FROM users WHERE chat_id = ?", (chat_id,))
-    row = c.fetchone()
-    conn.close()
+    row = database.query_one("SELECT used_free, has_tariff FROM users WHERE chat_id = ?", (chat_id,))
     if not row:
         return 0, 0
     used_free = row[0] if row[0] is not None else 0
@@ -350,159 +693,81 @@ def get_used_free(chat_id: int) -> int:
 
 # --- Увеличить счётчик использованных сообщений ---
 def increment_used(chat_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Если пользователя ещё нет в базе — создаём
-    c.execute(
-        "INSERT OR IGNORE INTO users(chat_id, used_free, has_tariff) VALUES(?, 0, 0)",
+    # Если пользователя ещё нет в базе — создаём, иначе увеличиваем счётчик
+    database.execute(
+        """INSERT INTO users(chat_id, used_free, has_tariff) VALUES(?, 1, 0)
+           ON CONFLICT(chat_id) DO UPDATE SET used_free = used_free + 1""",
         (chat_id,),
     )
-    # Увеличиваем количество использованных сообщений
-    c.execute("UPDATE users SET used_free = used_free + 1 WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
 
 
 def reset_used_free(chat_id: int) -> None:
     """Сбросить счётчик бесплатных сообщений пользователя."""
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute(
-        "INSERT OR IGNORE INTO users(chat_id, used_free, has_tariff) VALUES(?, 0, 0)",
+    database.execute(
+        """INSERT INTO users(chat_id, used_free, has_tariff) VALUES(?, 0, 0)
+           ON CONFLICT(chat_id) DO UPDATE SET used_free = 0""",
         (chat_id,),
     )
-    c.execute("UPDATE users SET used_free = 0 WHERE chat_id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
 
-# ---- НИЖЕ ДОБАВИТЬ код для мультимедиа-лимитов ----
-import datetime
+# ---- Мультимедиа-лимиты (см. quota.py) ----
+_month_key = month_key
+
+# Один экземпляр на процесс: кэш остатков общий для всех хендлеров
+media_quota = QuotaEngine(
+    database,
+    monthly_limits=MEDIA_MONTHLY_LIMITS,
+    is_owner=is_owner,
+    cache_ttl=MEDIA_QUOTA_CACHE_TTL,
+)
+
+
+# Готовые документы и картинки: общий для бота и gpsbot-media (см. result_cache.py)
+result_cache = ResultCache(database, RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Анализ фото по file_unique_id: пересланные копии не скачиваются и не уходят модели (см. vision_cache.py)
+vision_cache = VisionCache(r, ttl=VISION_CACHE_TTL_SEC)
 
-def _month_key(d: datetime.date | None = None) -> str:
-    d = d or datetime.date.today()
-    return d.strftime("%Y-%m")  # например '2025-09'
 
 def init_media_tables():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Текущий баланс лимитов на месяц (осталось)
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS media_balance (
-        chat_id INTEGER,
-        month TEXT,
-        photos_left INT DEFAULT 0,
-        docs_left INT DEFAULT 0,
-        analysis_left INT DEFAULT 0,
-        PRIMARY KEY (chat_id, month)
-    )
-    """)
-    # Триальные разовые лимиты для неоформивших тариф
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS media_trials (
-        chat_id INTEGER PRIMARY KEY,
-        photo_used INT DEFAULT 0,
-        doc_used INT DEFAULT 0,
-        analysis_used INT DEFAULT 0
-    )
-    """)
-    conn.commit()
-    conn.close()
+    """Создать таблицы квот и кэша результатов. Вызывается из ``bot.startup()``, а не при импорте."""
+    media_quota.ensure_tables()
+    result_cache.ensure_tables()
+
+
+def _balance_row(balance: dict | None) -> dict:
+    if balance is None:
+        return {"photos_left": None, "docs_left": None, "analysis_left": None}
+    return {f"{kind}_left": balance[kind] for kind in KINDS}
 
-# вызывать при старте приложения
-init_media_tables()
 
 def get_media_balance(chat_id: int) -> dict:
     """Вернёт текущий остаток лимитов за этот месяц (или пусто, если ещё не инициализировали)."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    mk = _month_key()
-    c.execute("SELECT photos_left, docs_left, analysis_left FROM media_balance WHERE chat_id=? AND month=?",
-              (chat_id, mk))
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        return {"photos_left": None, "docs_left": None, "analysis_left": None}
-    return {"photos_left": row[0], "docs_left": row[1], "analysis_left": row[2]}
+    return _balance_row(media_quota.balance(chat_id))
 
 def set_media_balance(chat_id: int, photos: int, docs: int, analysis: int):
     """Жёстко выставить баланс на текущий месяц (используется при активации тарифа/первом обращении)."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    mk = _month_key()
-    c.execute("""INSERT INTO media_balance(chat_id, month, photos_left, docs_left, analysis_left)
-                 VALUES(?,?,?,?,?)
-                 ON CONFLICT(chat_id, month) DO UPDATE SET
-                 photos_left=excluded.photos_left,
-                 docs_left=excluded.docs_left,
-                 analysis_left=excluded.analysis_left
-                 """, (chat_id, mk, photos, docs, analysis))
-    conn.commit()
-    conn.close()
+    media_quota.set_balance(chat_id, photos, docs, analysis)
 
 def dec_media(chat_id: int, kind: str, amount: int = 1) -> bool:
     """Пробует списать лимит (photos/docs/analysis). Возвращает True при успехе."""
-    if is_owner(chat_id):
-        return True
-    assert kind in ("photos", "docs", "analysis")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    mk = _month_key()
-    col = {"photos":"photos_left", "docs":"docs_left", "analysis":"analysis_left"}[kind]
-    # Прочитать текущий остаток
-    c.execute(f"SELECT {col} FROM media_balance WHERE chat_id=? AND month=?", (chat_id, mk))
-    row = c.fetchone()
-    if not row or row[0] is None:
-        conn.close()
-        return False
-    left = row[0]
-    if left < amount:
-        conn.close()
-        return False
-    # Списать
-    c.execute(f"UPDATE media_balance SET {col} = {col} - ? WHERE chat_id=? AND month=?", (amount, chat_id, mk))
-    conn.commit()
-    conn.close()
-    return True
+    assert kind in KINDS
+    # Проверка и списание — один условный UPDATE, без гонки между SELECT и UPDATE
+    return media_quota.consume(chat_id, kind, amount, allow_trial=False) is not None
 
 def add_package(chat_id: int, kind: str, amount: int):
     """Добавить купленный пакет в остаток лимитов текущего месяца."""
-    assert kind in ("photos", "docs", "analysis")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    mk = _month_key()
-    col = {"photos":"photos_left", "docs":"docs_left", "analysis":"analysis_left"}[kind]
-    # гарантируем строку
-    c.execute("""INSERT OR IGNORE INTO media_balance(chat_id, month, photos_left, docs_left, analysis_left)
-                 VALUES(?,?,0,0,0)""", (chat_id, mk))
-    c.execute(f"UPDATE media_balance SET {col} = {col} + ? WHERE chat_id=? AND month=?", (amount, chat_id, mk))
-    conn.commit()
-    conn.close()
+    assert kind in KINDS
+    media_quota.add(chat_id, kind, amount)
 
 def get_or_init_month_balance(chat_id: int, defaults: dict):
     """Если нет строки на месяц — создаём по дефолтам (из тарифа)."""
-    bal = get_media_balance(chat_id)
-    if bal["photos_left"] is None:
-        set_media_balance(chat_id, defaults.get("photos", 0), defaults.get("docs", 0), defaults.get("analysis", 0))
-        return get_media_balance(chat_id)
-    return bal
+    return _balance_row(media_quota.ensure_month(chat_id, defaults))
 
 # Триал (по 1 штуке без тарифа)
 def read_trials(chat_id: int) -> dict:
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT photo_used, doc_used, analysis_used FROM media_trials WHERE chat_id=?", (chat_id,))
-    row = c.fetchone()
-    conn.close()
-    if not row:
-        return {"photo_used": 0, "doc_used": 0, "analysis_used": 0}
-    return {"photo_used": row[0], "doc_used": row[1], "analysis_used": row[2]}
+    trials = media_quota.trials(chat_id)
+    return {"photo_used": trials["photos"], "doc_used": trials["docs"], "analysis_used": trials["analysis"]}
 
 def mark_trial_used(chat_id: int, kind: str):
-    col = {"photos":"photo_used", "docs":"doc_used", "analysis":"analysis_used"}[kind]
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO media_trials(chat_id) VALUES(?)", (chat_id,))
-    c.execute(f"UPDATE media_trials SET {col}=1 WHERE chat_id=?", (chat_id,))
-    conn.commit()
-    conn.close()
+    media_quota.use_trial(chat_id, kind)
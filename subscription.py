@@ -0,0 +1,92 @@
+"""Проверка подписки на канал и группу проекта.
+
+Вынесено из ``bot.py``, чтобы хендлеры других модулей (``handlers.web``)
+не импортировали ``bot`` и не запускали его модульный код повторно.
+"""
+import time
+
+from telebot import types
+from telebot.apihelper import ApiTelegramException
+
+from settings import bot, is_owner
+
+CHANNEL_USERNAME = "AI Systems"
+CHANNEL_LINK = "https://t.me/SynteraAI"
+CHANNEL_CHAT_ID = "@SynteraAI"
+GROUP_NAME = "Hubconsult"
+GROUP_LINK = "https://t.me/HubConsult"
+GROUP_CHAT_ID = "@HubConsult"
+REQUIRED_CHATS = (
+    {"id": CHANNEL_CHAT_ID, "title": CHANNEL_USERNAME, "link": CHANNEL_LINK},
+    {"id": GROUP_CHAT_ID, "title": GROUP_NAME, "link": GROUP_LINK},
+)
+SUBSCRIPTION_PROMPT_COOLDOWN = 30
+_subscription_prompted: dict[int, float] = {}
+
+SUBSCRIPTION_MESSAGE = (
+    "<b>Доступ к SynteraGPT</b>\n\n"
+    "Перед использованием подпишись на канал AI Systems и вступи в группу Hubconsult. "
+    "После подписки нажми \"Проверить подписку\"."
+)
+
+
+def _fetch_subscription_status(user_id: int) -> bool:
+    for chat in REQUIRED_CHATS:
+        try:
+            member = bot.get_chat_member(chat["id"], user_id)
+        except ApiTelegramException:
+            return False
+
+        status = getattr(member, "status", None)
+        if status not in {"creator", "administrator", "member", "owner"}:
+            return False
+
+    return True
+
+
+def send_subscription_prompt(chat_id: int, *, force: bool = False) -> None:
+    now = time.time()
+    last_prompt = _subscription_prompted.get(chat_id, 0)
+    if not force and now - last_prompt < SUBSCRIPTION_PROMPT_COOLDOWN:
+        return
+
+    _subscription_prompted[chat_id] = now
+
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    for chat in REQUIRED_CHATS:
+        kb.add(
+            types.InlineKeyboardButton(
+                f"Подписаться: {chat['title']}",
+                url=chat["link"],
+            )
+        )
+
+    kb.add(types.InlineKeyboardButton("🔄 Проверить подписку", callback_data="check_subscription"))
+
+    bot.send_message(chat_id, SUBSCRIPTION_MESSAGE, parse_mode="HTML", reply_markup=kb)
+
+
+def ensure_subscription(chat_id: int, user_id: int | None = None, *, notify: bool = True) -> bool:
+    uid = user_id or chat_id
+
+    if is_owner(uid):
+        return True
+
+    status = _fetch_subscription_status(uid)
+
+    if status:
+        _subscription_prompted.pop(chat_id, None)
+        return True
+
+    if notify:
+        send_subscription_prompt(chat_id, force=True)
+    return False
+
+
+__all__ = [
+    "CHANNEL_CHAT_ID",
+    "GROUP_CHAT_ID",
+    "REQUIRED_CHATS",
+    "ensure_subscription",
+    "send_subscription_prompt",
+]
@@ -0,0 +1,34 @@
+"""Окружение для тестов модулей, которые читают ``settings`` при импорте.
+
+``settings`` требует ``BOT_TOKEN`` и ``OPENAI_API_KEY``, а ``storage`` при
+импорте подключается к Redis. Здесь подставляются фиктивные ключи, Redis на
+закрытом порту (``storage.r`` сразу уходит в локальный режим) и каталоги
+кэшей во временной папке, чтобы импорт ничего не создавал в репозитории.
+"""
+from __future__ import annotations
+
+import importlib
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="gpsbot-tests-")
+
+ENV = {
+    "BOT_TOKEN": "0:test",
+    "OPENAI_API_KEY": "test",
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": "1",
+    "REDIS_RETRIES": "0",
+    "REDIS_CONNECT_TIMEOUT": "0.2",
+    "RESULT_CACHE_DIR": os.path.join(_TMP, "result_cache"),
+    "HISTORY_ARCHIVE_DIR": os.path.join(_TMP, "history_archive"),
+    "EMBEDDED_KV_PATH": os.path.join(_TMP, "storage.kv"),
+}
+
+
+def load(name: str):
+    """Импортировать модуль бота с тестовым окружением."""
+
+    for key, value in ENV.items():
+        os.environ.setdefault(key, value)
+    return importlib.import_module(name)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from backends import EmbeddedBackend, MmapKV, RedisBackend, SQLiteBackend, StorageBackend, create_backend
+from bot_env import ENV
+from db import Database
+from memory_redis import InMemoryRedis
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_WORKER_PROBE = """
+import storage, worker_media
+try:
+    storage.get_backend()
+except RuntimeError:
+    print("locked")
+"""
+
+
+class BackendConformanceMixin:
+    """Одинаковые ожидания для всех движков ``StorageBackend``."""
+
+    backend: StorageBackend
+
+    def test_implements_protocol(self):
+        self.assertIsInstance(self.backend, StorageBackend)
+
+    def test_history_roundtrip_and_listing(self):
+        self.backend.save_history(1, '[{"role": "user"}]', 60)
+        self.backend.save_history(2, "[]", 60)
+        self.assertEqual(self.backend.load_history(1), '[{"role": "user"}]')
+        self.assertEqual(sorted(self.backend.history_chat_ids()), [1, 2])
+
+        self.backend.delete_history(1)
+        self.assertIsNone(self.backend.load_history(1))
+        self.assertEqual(self.backend.history_chat_ids(), [2])
+
+    def test_history_overwrite_keeps_latest(self):
+        for i in range(5):
+            self.backend.save_history(7, f"v{i}", 60)
+        self.assertEqual(self.backend.load_history(7), "v4")
+
+    def test_stale_history_listing(self):
+        self.backend.save_history(1, "[]", 60)
+        cutoff = time.time()
+        time.sleep(0.01)
+        self.backend.save_history(2, "[]", 60)
+        self.assertEqual(self.backend.stale_history_chat_ids(cutoff), [1])
+        self.backend.delete_history(1)
+        self.assertEqual(sorted(self.backend.stale_history_chat_ids(time.time())), [2])
+
+    def test_kv_roundtrip_and_unicode(self):
+        self.assertIsNone(self.backend.get("lang:1"))
+        self.backend.set("lang:1", "中文")
+        self.assertEqual(self.backend.get("lang:1"), "中文")
+        self.backend.delete("lang:1")
+        self.assertIsNone(self.backend.get("lang:1"))
+
+    def test_ttl_expires_values(self):
+        self.backend.set("short", "x", ttl=1)
+        self.backend.save_history(3, "[]", 1)
+        self.wait_for_expiry()
+        self.assertIsNone(self.backend.get("short"))
+        self.assertIsNone(self.backend.load_history(3))
+
+    def test_counters_increment(self):
+        self.assertEqual(self.backend.incr("u:1", "text"), 1)
+        self.assertEqual(self.backend.incr("u:1", "text", 4), 5)
+        self.backend.incr("u:1", "image")
+        self.assertEqual(self.backend.counters("u:1"), {"text": 5, "image": 1})
+        self.assertEqual(self.backend.counters("u:2"), {})
+
+    def test_concurrent_counter_increments(self):
+        def worker():
+            for _ in range(200):
+                self.backend.incr("hot", "n")
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.backend.counters("hot"), {"n": 800})
+
+    def wait_for_expiry(self):
+        time.sleep(1.1)
+
+
+class RedisBackendTests(BackendConformanceMixin, unittest.TestCase):
+    def setUp(self):
+        self.client = InMemoryRedis()
+        self.backend = RedisBackend(self.client)
+
+    def tearDown(self):
+        self.client.close()
+
+
+class SQLiteBackendTests(BackendConformanceMixin, unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = Database(str(Path(self._tmp.name) / "kv.db"))
+        self.backend = SQLiteBackend(self.db)
+
+    def tearDown(self):
+        self.db.close_all()
+        self._tmp.cleanup()
+
+    def test_purge_expired(self):
+        self.backend.set("gone", "x", ttl=1)
+        self.backend.set("kept", "y")
+        self.wait_for_expiry()
+        self.assertEqual(self.backend.purge_expired(), 1)
+        self.assertEqual(self.backend.get("kept"), "y")
+
+
+class EmbeddedBackendTests(BackendConformanceMixin, unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "store.kv")
+        self.backend = EmbeddedBackend(self.path)
+
+    def tearDown(self):
+        self.backend.close()
+        self._tmp.cleanup()
+
+    def test_reopen_rebuilds_index(self):
+        self.backend.save_history(1, "first", 60)
+        self.backend.set("lang:1", "en")
+        self.backend.delete("lang:1")
+        self.backend.incr("u", "n", 3)
+        self.backend.close()
+
+        self.backend = EmbeddedBackend(self.path)
+        self.assertEqual(self.backend.load_history(1), "first")
+        self.assertIsNone(self.backend.get("lang:1"))
+        self.assertEqual(self.backend.counters("u"), {"n": 3})
+
+    def test_truncated_tail_is_discarded(self):
+        self.backend.set("a", "1")
+        self.backend.set("b", "2")
+        self.backend.close()
+        with open(self.path, "r+b") as fh:
+            fh.truncate(os.path.getsize(self.path) - 1)
+
+        self.backend = EmbeddedBackend(self.path)
+        self.assertEqual(self.backend.get("a"), "1")
+        self.assertIsNone(self.backend.get("b"))
+        self.backend.set("c", "3")
+        self.assertEqual(self.backend.get("c"), "3")
+
+    def test_second_opener_is_rejected(self):
+        with self.assertRaises(RuntimeError):
+            MmapKV(self.path)
+
+
+class MmapKVCompactionTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "compact.kv")
+        self.kv = MmapKV(self.path, compact_min_bytes=4096)
+
+    def tearDown(self):
+        self.kv.close()
+        self._tmp.cleanup()
+
+    def test_overwrites_trigger_compaction(self):
+        for i in range(2000):
+            self.kv.put(f"k{i % 10}", b"x" * 64 + str(i).encode())
+        stats = self.kv.stats
+        self.assertEqual(stats["keys"], 10)
+        self.assertLess(stats["file_bytes"], 2000 * 64 // 2)
+        self.assertEqual(self.kv.get("k9"), b"x" * 64 + b"1999")
+
+        self.kv.close()
+        self.kv = MmapKV(self.path)
+        self.assertEqual(len(self.kv), 10)
+        self.assertEqual(self.kv.get("k0"), b"x" * 64 + b"1990")
+
+
+@unittest.skipIf(
+    any(importlib.util.find_spec(name) is None for name in ("telebot", "openai", "dotenv", "redis")),
+    "нет зависимостей бота",
+)
+class EmbeddedStorageImportTests(unittest.TestCase):
+    def test_worker_imports_storage_while_bot_holds_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "storage.kv")
+            # файл держит процесс бота
+            held = EmbeddedBackend(path)
+            env = dict(os.environ, **ENV)
+            env.update(STORAGE_BACKEND="embedded", EMBEDDED_KV_PATH=path, PYTHONPATH=str(ROOT))
+            try:
+                result = subprocess.run(
+                    [sys.executable, "-c", _WORKER_PROBE],
+                    capture_output=True,
+                    text=True,
+                    env=env,
+                    cwd=tmp,
+                    timeout=120,
+                )
+            finally:
+                held.close()
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        # импорт файл не открывает, а явное обращение по-прежнему упирается в блокировку
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "locked")
+
+
+class CreateBackendTests(unittest.TestCase):
+    def test_rejects_unknown_name(self):
+        with self.assertRaises(ValueError):
+            create_backend("lmdb")
+
+    def test_builds_redis_backend(self):
+        self.assertEqual(create_backend("Redis", redis_client=InMemoryRedis()).name, "redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
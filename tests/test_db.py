@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from db import Database
+
+
+class DatabaseTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = Database(str(Path(self._tmp.name) / "test.db"))
+        self.db.execute("CREATE TABLE counters (id INTEGER PRIMARY KEY, value INT DEFAULT 0)")
+
+    def tearDown(self):
+        self.db.close_all()
+        self._tmp.cleanup()
+
+    def test_enables_wal_and_pragmas(self):
+        self.assertEqual(self.db.query_one("PRAGMA journal_mode")[0], "wal")
+        self.assertEqual(self.db.query_one("PRAGMA busy_timeout")[0], 5000)
+
+    def test_reuses_connection_within_thread(self):
+        self.assertIs(self.db.connection(), self.db.connection())
+
+    def test_uses_separate_connection_per_thread(self):
+        seen = []
+        thread = threading.Thread(target=lambda: seen.append(self.db.connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(seen[0], self.db.connection())
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.execute("INSERT INTO counters(id, value) VALUES(1, 1)")
+                raise RuntimeError("boom")
+        self.assertIsNone(self.db.query_one("SELECT value FROM counters WHERE id = 1"))
+
+    def test_nested_transaction_joins_outer(self):
+        with self.db.transaction():
+            self.db.execute("INSERT INTO counters(id, value) VALUES(1, 1)")
+            with self.db.transaction():
+                self.db.execute("UPDATE counters SET value = 2 WHERE id = 1")
+        self.assertEqual(self.db.query_one("SELECT value FROM counters WHERE id = 1"), (2,))
+
+    def test_concurrent_increments_are_not_lost(self):
+        self.db.execute("INSERT INTO counters(id, value) VALUES(1, 0)")
+
+        def worker():
+            for _ in range(50):
+                self.db.execute("UPDATE counters SET value = value + 1 WHERE id = 1")
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.db.query_one("SELECT value FROM counters WHERE id = 1"), (200,))
+
+    def test_closed_connection_is_reopened(self):
+        first = self.db.connection()
+        self.db.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            first.execute("SELECT 1")
+        self.assertEqual(self.db.query_one("SELECT 1"), (1,))
+
+    def test_executemany_retry_rereads_generator_rows(self):
+        real = self.db.connection()
+
+        class _LockedOnce:
+            in_transaction = False
+            calls = 0
+
+            def executemany(self, sql, rows):
+                self.calls += 1
+                if self.calls == 1:
+                    list(rows)  # первая попытка успела прочитать строки
+                    raise sqlite3.OperationalError("database is locked")
+                return real.executemany(sql, rows)
+
+        self.db._local.conn = _LockedOnce()
+        self.db.executemany("INSERT INTO counters(id, value) VALUES(?, ?)", ((i, i) for i in range(3)))
+        self.db._local.conn = real
+        self.assertEqual(self.db.query_one("SELECT COUNT(*) FROM counters"), (3,))
+
+
+if __name__ == "__main__":  # pragma: no cover - direct execution
+    unittest.main()
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+
+import font_registry
+
+
+class FontRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "fonts", "DejaVuSans.ttf")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_materialize_writes_complete_font_once(self):
+        self.assertEqual(font_registry.materialize_font(self.path), self.path)
+        self.assertTrue(font_registry._is_complete_font(self.path))
+        self.assertNotIn("font_data", sys.modules)
+        mtime = os.stat(self.path).st_mtime_ns
+
+        font_registry.materialize_font(self.path)
+        self.assertEqual(os.stat(self.path).st_mtime_ns, mtime)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["DejaVuSans.ttf"])
+
+    def test_truncated_font_is_rewritten(self):
+        font_registry.materialize_font(self.path)
+        size = os.path.getsize(self.path)
+        with open(self.path, "r+b") as fh:
+            fh.truncate(size // 2)
+        self.assertFalse(font_registry._is_complete_font(self.path))
+
+        font_registry.materialize_font(self.path)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+    def test_font_buffer_maps_file(self):
+        buffer = font_registry.font_buffer(self.path)
+        with open(self.path, "rb") as fh:
+            self.assertEqual(buffer[:64], fh.read(64))
+        self.assertIs(font_registry.font_buffer(self.path), buffer)
+
+    @unittest.skipIf(importlib.util.find_spec("reportlab") is None, "reportlab не установлен")
+    def test_register_font_once(self):
+        from reportlab.pdfbase import pdfmetrics
+
+        self.assertEqual(font_registry.register_font(self.path), font_registry.FONT_NAME)
+        registered = pdfmetrics.getFont(font_registry.FONT_NAME)
+        font_registry.register_font(self.path)
+        self.assertIs(pdfmetrics.getFont(font_registry.FONT_NAME), registered)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from history_archive import HistoryArchive
+
+
+def _payload(*texts: str) -> str:
+    return json.dumps([{"role": "user", "content": text} for text in texts], ensure_ascii=False)
+
+
+class HistoryArchiveTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self._tmp.name, "archive")
+        self.archive = HistoryArchive(self.directory, segment_bytes=4096)
+
+    def tearDown(self):
+        self.archive.close()
+        self._tmp.cleanup()
+
+    def _reopen(self):
+        self.archive.close()
+        self.archive = HistoryArchive(self.directory, segment_bytes=4096)
+
+    def test_nothing_is_created_until_first_use(self):
+        self.assertFalse(os.path.exists(self.directory))
+        self.assertIsNone(self.archive.latest(1))
+        self.assertTrue(os.path.isdir(self.directory))
+
+    def test_chunks_accumulate_in_order(self):
+        self.archive.append(1, _payload("a", "b"))
+        self.archive.append(1, _payload("c"))
+        self.archive.append(2, _payload("other"))
+        self.assertEqual(self.archive.latest(1), [{"role": "user", "content": "c"}])
+        self.assertEqual(sorted(self.archive.chat_ids()), [1, 2])
+        self.archive.pop(1)
+        self.assertEqual([m["content"] for m in self.archive.latest(1)], ["a", "b"])
+
+    def test_pop_and_delete_survive_reopen(self):
+        self.archive.append(1, _payload("old"))
+        self.archive.append(1, _payload("recent"))
+        self.archive.append(2, _payload("gone"))
+        self.archive.pop(1)
+        self.archive.delete(2)
+        self._reopen()
+        self.assertEqual(self.archive.latest(1), [{"role": "user", "content": "old"}])
+        self.assertNotIn(2, self.archive)
+
+    def test_compresses_and_rotates_segments(self):
+        for chat_id in range(40):
+            self.archive.append(chat_id, _payload(*[f"повтор повтор повтор {chat_id}-{i}" for i in range(40)]))
+        stats = self.archive.stats
+        self.assertLess(stats["stored_bytes"] * 5, stats["raw_bytes"])
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        self._reopen()
+        self.assertEqual(len(self.archive.latest(39)), 40)
+
+    def test_truncated_tail_is_ignored(self):
+        self.archive.append(1, _payload("kept"))
+        self.archive.append(2, _payload("torn"))
+        self.archive.close()
+        segment = os.path.join(self.directory, sorted(os.listdir(self.directory))[-1])
+        with open(segment, "r+b") as fh:
+            fh.truncate(os.path.getsize(segment) - 3)
+        self._reopen()
+        self.assertIsNotNone(self.archive.latest(1))
+        self.assertIsNone(self.archive.latest(2))
+        self.archive.append(3, _payload("after"))
+        self.assertEqual(self.archive.latest(3), [{"role": "user", "content": "after"}])
+
+    def test_compact_drops_dead_records(self):
+        for i in range(10):
+            self.archive.append(1, _payload(f"v{i}"))
+            self.archive.pop(1)
+        with mock.patch("history_archive.time.time", return_value=1_000_000.0):
+            self.archive.append(2, _payload("live"))
+        self.archive.compact()
+        self.assertEqual(self.archive.chat_ids(), [2])
+        self._reopen()
+        self.assertEqual(self.archive.latest(2), [{"role": "user", "content": "live"}])
+        # время архивации переживает сжатие и повторное открытие
+        self.assertEqual([ref[3] for ref in self.archive._index[2]], [1_000_000.0])
+
+    def test_maybe_compact_waits_for_dead_share(self):
+        self.archive.close()
+        self.archive = HistoryArchive(self.directory, segment_bytes=4096, compact_min_bytes=256)
+        self.archive.append(1, _payload("live"))
+        self.assertFalse(self.archive.maybe_compact())
+
+        for i in range(20):
+            self.archive.append(2, _payload(f"v{i}"))
+            self.archive.pop(2)
+        self.archive.append(3, _payload("dropped"))
+        self.archive.delete(3)
+        dead = self.archive.dead_bytes
+        self.assertGreater(dead, 256)
+
+        # мёртвые байты восстанавливаются по журналу при открытии
+        self.archive.close()
+        self.archive = HistoryArchive(self.directory, segment_bytes=4096, compact_min_bytes=256)
+        self.assertEqual(self.archive.chat_ids(), [1])
+        self.assertEqual(self.archive.dead_bytes, dead)
+
+        self.assertTrue(self.archive.maybe_compact())
+        self.assertEqual(self.archive.dead_bytes, 0)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertFalse(self.archive.maybe_compact())
+        self.assertEqual(self.archive.latest(1), [{"role": "user", "content": "live"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import threading
+import unittest
+from types import SimpleNamespace
+
+import image_jobs
+
+
+class _FakeBot:
+    """Запоминает вызовы Bot API; ``send_photo`` возвращает сообщение с file_id."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls: list[tuple] = []
+        self.sent = threading.Event()
+        self._next_id = 100
+
+    def _record(self, *call):
+        with self.lock:
+            self.calls.append(call)
+
+    def send_message(self, chat_id, text):
+        with self.lock:
+            self._next_id += 1
+            self.calls.append(("send_message", chat_id, text, self._next_id))
+            return SimpleNamespace(message_id=self._next_id)
+
+    def edit_message_text(self, text, chat_id, message_id):
+        self._record("edit", chat_id, text, message_id)
+
+    def delete_message(self, chat_id, message_id):
+        self._record("delete", chat_id, message_id)
+
+    def send_chat_action(self, chat_id, action):
+        self._record("action", chat_id, action)
+
+    def send_photo(self, chat_id, photo, caption):
+        self._record("photo", chat_id, photo.read(), caption)
+        self.sent.set()
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="big")])
+
+    def of(self, name):
+        with self.lock:
+            return [call for call in self.calls if call[0] == name]
+
+
+class ImageJobsTests(unittest.TestCase):
+    def setUp(self):
+        self.bot = _FakeBot()
+        self.release = threading.Event()
+        self.done: list[tuple] = []
+        self.failed: list[tuple] = []
+        self.finished = threading.Semaphore(0)
+        self.started = threading.Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.jobs.shutdown()
+
+    def _generate(self, prompt):
+        self.started.set()
+        self.release.wait(5)
+        if prompt == "boom":
+            raise RuntimeError("content policy")
+        return prompt.encode()
+
+    def _jobs(self, **kwargs):
+        def on_done(job, message, data):
+            self.done.append((job.context, message.photo[-1].file_id, data))
+            self.finished.release()
+
+        def on_failed(job, exc):
+            self.failed.append((job.context, str(exc)))
+            self.finished.release()
+
+        options = dict(workers=1, queue_limit=5, per_chat_limit=2, progress_interval=0.05)
+        options.update(kwargs)
+        self.jobs = image_jobs.ImageJobs(self._generate, bot=self.bot, on_done=on_done, on_failed=on_failed, **options)
+        return self.jobs
+
+    def test_status_progress_and_delivery(self):
+        jobs = self._jobs()
+        first = jobs.submit(1, "cat", context="charge-1")
+        # иначе под нагрузкой первая задача ещё в очереди и вторая получит место 1
+        self.assertTrue(self.started.wait(5))
+        second = jobs.submit(2, "dog", context="charge-2")
+        self.assertTrue(first.accepted and second.accepted)
+
+        statuses = self.bot.of("send_message")
+        self.assertIn("Рисую", statuses[0][2])
+        # первая картинка занимает единственный поток: вторая ждёт в очереди
+        self.assertIn("в очереди", statuses[1][2])
+
+        # индикатор «отправляет фото» виден, пока картинка генерируется
+        for _ in range(100):
+            if self.bot.of("action"):
+                break
+            threading.Event().wait(0.02)
+        self.assertIn(("action", 1, "upload_photo"), self.bot.of("action"))
+
+        self.release.set()
+        for _ in range(2):
+            self.assertTrue(self.finished.acquire(timeout=5))
+
+        self.assertEqual(sorted(self.done), [("charge-1", "big", b"cat"), ("charge-2", "big", b"dog")])
+        self.assertEqual(sorted(call[1] for call in self.bot.of("photo")), [1, 2])
+        # статус второй задачи сменился на «рисую», затем оба статуса удалены
+        self.assertEqual(self.bot.of("edit")[0][1:], (2, "🎨 Очередь дошла, рисую картинку…", statuses[1][3]))
+        self.assertEqual(sorted(call[2] for call in self.bot.of("delete")), [statuses[0][3], statuses[1][3]])
+
+        stats = jobs.stats()
+        self.assertEqual((stats["accepted"], stats["completed"], stats["failed"]), (2, 2, 0))
+        self.assertEqual(stats["position_max"], 0)
+        self.assertGreater(stats["generate_sec"], 0.0)
+        self.assertIn("Картинки: в очереди 0", image_jobs.format_stats(stats))
+
+    def test_failure_reports_and_calls_back(self):
+        jobs = self._jobs()
+        self.release.set()
+        jobs.submit(1, "boom", context="charge")
+        self.assertTrue(self.finished.acquire(timeout=5))
+
+        self.assertEqual(self.failed, [("charge", "content policy")])
+        self.assertEqual(self.done, [])
+        self.assertEqual(self.bot.of("edit")[-1][2], "⚠️ Ошибка генерации: content policy")
+        self.assertEqual(self.bot.of("photo"), [])
+
+    def test_limits_reject_without_messages(self):
+        jobs = self._jobs(queue_limit=2, per_chat_limit=1)
+        # единственный поток занят: пределы считаются по ожидающим задачам
+        jobs.submit(9, "busy")
+        for _ in range(100):
+            if jobs.stats()["running"]:
+                break
+            threading.Event().wait(0.01)
+        self.assertTrue(jobs.submit(1, "a").accepted)
+        rejected = jobs.submit(1, "b")
+        self.assertFalse(rejected.accepted)
+        self.assertEqual(rejected.reason, "chat_limit")
+        self.assertTrue(jobs.submit(2, "c").accepted)
+        self.assertEqual(jobs.submit(3, "d").reason, "queue_full")
+
+        # отказ ничего не отправляет: сообщение о нём пишет вызывающий
+        self.assertEqual(len(self.bot.of("send_message")), 3)
+        self.assertEqual(jobs.stats()["rejected"], 2)
+
+    def test_shutdown_cancels_queued(self):
+        jobs = self._jobs()
+        jobs.submit(1, "a", context="running")
+        jobs.submit(2, "b", context="queued")
+        threading.Timer(0.1, self.release.set).start()
+        jobs.shutdown()
+
+        self.assertEqual([context for context, _ in self.failed], ["queued"])
+        self.assertTrue(any("перезапускается" in call[2] for call in self.bot.of("edit")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import io
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - Pillow не установлен
+    Image = None
+
+import image_prep
+
+
+def _sizes(*dims):
+    return [SimpleNamespace(file_id=f"{w}x{h}", width=w, height=h) for w, h in dims]
+
+
+def _encode(image, fmt: str, **kwargs) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+class SizingTests(unittest.TestCase):
+    def test_target_size_matches_model_downscale(self):
+        self.assertEqual(image_prep.target_size(2560, 1920), (1024, 768))
+        self.assertEqual(image_prep.target_size(1000, 4000), (512, 2048))
+        self.assertEqual(image_prep.target_size(800, 600), (800, 600))
+        self.assertEqual(image_prep.target_size(2560, 1920, "low"), (512, 384))
+
+    def test_vision_tokens(self):
+        self.assertEqual(image_prep.vision_tokens(1024, 1024), 765)
+        self.assertEqual(image_prep.vision_tokens(2048, 4096, "high"), 1105)
+        self.assertEqual(image_prep.vision_tokens(4000, 3000, "low"), 85)
+
+    def test_pick_smallest_adequate_photo_size(self):
+        telegram = _sizes((90, 68), (320, 240), (800, 600), (1280, 960), (2560, 1920))
+        self.assertEqual(image_prep.pick_photo_size(telegram).file_id, "1280x960")
+        self.assertEqual(image_prep.pick_photo_size(telegram, "low").file_id, "800x600")
+        # 16:9: у 1280x720 короткая сторона мельче 768 — нужен следующий размер
+        wide = _sizes((320, 180), (1280, 720), (2560, 1440))
+        self.assertEqual(image_prep.pick_photo_size(wide).file_id, "2560x1440")
+        self.assertEqual(image_prep.pick_photo_size(_sizes((90, 90), (320, 320))).file_id, "320x320")
+
+
+@unittest.skipIf(Image is None, "Pillow не установлен")
+class PrepareImageTests(unittest.TestCase):
+    def test_large_jpeg_is_downscaled(self):
+        source = _encode(Image.linear_gradient("L").resize((2560, 1920)).convert("RGB"), "JPEG", quality=95)
+        prepared = image_prep.prepare_image(source)
+        self.assertEqual((prepared.width, prepared.height), (1024, 768))
+        self.assertEqual((prepared.source_width, prepared.source_height, prepared.source_bytes), (2560, 1920, len(source)))
+        self.assertLess(len(prepared.data), len(source))
+        with Image.open(io.BytesIO(prepared.data)) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (1024, 768)))
+        self.assertTrue(prepared.data_url().startswith("data:image/jpeg;base64,"))
+
+    def test_small_jpeg_is_sent_as_is(self):
+        source = _encode(Image.new("RGB", (640, 480), "teal"), "JPEG")
+        self.assertIs(image_prep.prepare_image(source).data, source)
+
+    def test_transparent_png_becomes_jpeg_on_white(self):
+        source = _encode(Image.new("RGBA", (600, 300), (0, 0, 0, 0)), "PNG")
+        prepared = image_prep.prepare_image(source, detail="low")
+        with Image.open(io.BytesIO(prepared.data)) as img:
+            self.assertEqual((img.format, img.size), ("JPEG", (512, 256)))
+            self.assertGreater(min(img.getpixel((10, 10))), 240)
+
+    def test_exif_rotation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90°
+        source = _encode(Image.new("RGB", (2000, 1000), "red"), "JPEG", exif=exif)
+        prepared = image_prep.prepare_image(source)
+        self.assertEqual((prepared.source_width, prepared.source_height), (1000, 2000))
+        with Image.open(io.BytesIO(prepared.data)) as img:
+            self.assertEqual(img.size, (768, 1536))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    body = b"x" * 300_000
+
+    def do_GET(self):  # noqa: N802 - имя задаёт http.server
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class DownloadTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/photo.jpg"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_download_and_limit(self):
+        self.assertEqual(image_prep.download(self.url), _Handler.body)
+        self.assertIs(image_prep.session(), image_prep.session())
+        with self.assertRaises(ValueError):
+            image_prep.download(self.url, max_bytes=100_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from db import Database
+from job_queue import JobPump, RedisStreamQueue, SQLiteJobQueue
+
+try:
+    import redis  # type: ignore
+except ImportError:  # pragma: no cover - redis не установлен
+    redis = None
+
+_VISIBILITY = 0.3
+
+
+class JobQueueConformanceMixin:
+    """Одинаковые ожидания для очереди в Redis Streams и в SQLite."""
+
+    queue = None
+
+    def test_enqueue_is_idempotent(self):
+        self.assertTrue(self.queue.enqueue(1, "pdf", "a", job_id="1:10").created)
+        self.assertFalse(self.queue.enqueue(1, "pdf", "a", job_id="1:10").created)
+        self.queue.enqueue(1, "excel", "b", job_id="1:11")
+        self.queue.enqueue(2, "pptx", "c", job_id="2:10")
+        self.assertEqual((self.queue.depth(), self.queue.chat_depth(1), self.queue.chat_depth(3)), (3, 2, 0))
+
+    def test_claim_ack_in_order(self):
+        for n in range(3):
+            self.queue.enqueue(1, "pdf", f"p{n}", job_id=f"job-{n}")
+        first = self.queue.claim("a", 2)
+        self.assertEqual([(job.job_id, job.payload, job.deliveries) for job in first], [("job-0", "p0", 1), ("job-1", "p1", 1)])
+        # выданные задачи не достаются второму обработчику
+        self.assertEqual([job.job_id for job in self.queue.claim("b", 5)], ["job-2"])
+
+        for job in first:
+            self.queue.ack(job)
+        self.assertEqual((self.queue.depth(), self.queue.chat_depth(1)), (1, 1))
+        # подтверждённая задача остаётся дублем
+        self.assertFalse(self.queue.enqueue(1, "pdf", "p0", job_id="job-0").created)
+
+    def test_unacked_job_is_redelivered_after_visibility_timeout(self):
+        self.queue.enqueue(5, "pdf", "x", job_id="j")
+        self.assertEqual(len(self.queue.claim("crashed", 1)), 1)
+        self.assertEqual(self.queue.claim("b", 1), [])
+        time.sleep(_VISIBILITY + 0.1)
+        [job] = self.queue.claim("b", 1)
+        self.assertEqual((job.job_id, job.chat_id, job.deliveries), ("j", 5, 2))
+        self.queue.ack(job)
+        self.assertEqual(self.queue.depth(), 0)
+
+    def test_touch_extends_lease_and_release_returns_job(self):
+        self.queue.enqueue(5, "pdf", "x", job_id="j")
+        [job] = self.queue.claim("a", 1)
+        time.sleep(_VISIBILITY * 0.6)
+        self.queue.touch([job], "a")
+        time.sleep(_VISIBILITY * 0.6)
+        self.assertEqual(self.queue.claim("b", 1), [])
+
+        self.queue.release(job, "a")
+        [claimed] = self.queue.claim("b", 1)
+        # возврат без сбоя не считается попыткой, возврат после сбоя — считается
+        self.assertEqual((claimed.job_id, claimed.deliveries), ("j", 1))
+        self.queue.release(claimed, "b", failed=True)
+        self.assertEqual([again.deliveries for again in self.queue.claim("c", 1)], [2])
+
+    def test_consumer_stats_roundtrip(self):
+        self.queue.publish_stats("host-1", {"workers": 3, "service_sec": {"pdf": 1.5}})
+        stats = self.queue.consumers()
+        self.assertEqual(list(stats), ["host-1"])
+        self.assertEqual(stats["host-1"]["service_sec"], {"pdf": 1.5})
+
+
+class SQLiteJobQueueTests(JobQueueConformanceMixin, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = Database(str(Path(self.tmp.name) / "jobs.db"))
+        self.queue = SQLiteJobQueue(self.database, visibility_timeout=_VISIBILITY)
+
+    def tearDown(self):
+        self.database.close_all()
+        self.tmp.cleanup()
+
+    def test_jobs_survive_reopen(self):
+        self.queue.enqueue(1, "pdf", "kept", job_id="j")
+        self.database.close_all()
+        reopened = SQLiteJobQueue(Database(self.database.path), visibility_timeout=_VISIBILITY)
+        self.assertEqual([job.payload for job in reopened.claim("a", 1)], ["kept"])
+        reopened.database.close_all()
+
+
+@unittest.skipUnless(redis is not None and os.getenv("REDIS_TEST_URL"), "REDIS_TEST_URL не задан")
+class RedisStreamQueueTests(JobQueueConformanceMixin, unittest.TestCase):
+    """Те же проверки против настоящего Redis (база очищается — используйте отдельную)."""
+
+    def setUp(self):
+        self.client = redis.Redis.from_url(os.environ["REDIS_TEST_URL"], decode_responses=True)
+        self.client.flushdb()
+        self.queue = RedisStreamQueue(self.client, visibility_timeout=_VISIBILITY)
+
+    def tearDown(self):
+        self.client.flushdb()
+
+
+class JobPumpTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database = Database(str(Path(self.tmp.name) / "jobs.db"))
+        self.queue = SQLiteJobQueue(self.database, visibility_timeout=60)
+        self.submitted = []
+        self.dead = []
+
+    def tearDown(self):
+        self.database.close_all()
+        self.tmp.cleanup()
+
+    def _pump(self, **kwargs):
+        options = dict(consumer="c1", capacity=2, max_deliveries=2, on_dead=self.dead.append)
+        options.update(kwargs)
+        return JobPump([self.queue], lambda job: self.submitted.append(job.job_id) or True, **options)
+
+    def test_claims_within_capacity_and_acks_on_done(self):
+        for n in range(3):
+            self.queue.enqueue(1, "pdf", "x", job_id=f"j{n}")
+        pump = self._pump()
+        self.assertEqual(pump.poll_once(), 2)
+        self.assertEqual(pump.poll_once(), 0)
+
+        pump.done("j0")
+        self.assertEqual(pump.poll_once(), 1)
+        self.assertEqual(self.submitted, ["j0", "j1", "j2"])
+        self.assertEqual((self.queue.depth(), pump.held()), (2, 2))
+
+    def test_retry_then_dead_letter(self):
+        self.queue.enqueue(1, "pdf", "poison", job_id="p")
+        pump = self._pump()
+        for _ in range(2):
+            pump.poll_once()
+            pump.retry("p")
+        self.assertEqual(pump.poll_once(), 0)
+        self.assertEqual([job.job_id for job in self.dead], ["p"])
+        self.assertEqual((self.queue.depth(), pump.counters["dead"]), (0, 1))
+
+    def test_rejected_and_released_jobs_return_to_queue(self):
+        self.queue.enqueue(1, "pdf", "x", job_id="a")
+        self.queue.enqueue(1, "pdf", "x", job_id="b")
+        JobPump([self.queue], lambda job: False, consumer="c1", capacity=1).poll_once()
+        pump = self._pump()
+        pump.poll_once()
+        self.assertEqual(pump.release_held(), 2)
+        other = self._pump(consumer="c2")
+        self.assertEqual(other.poll_once(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import io
+import threading
+import unittest
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from media_engine import FairQueue, MediaEngine, MediaJob
+
+
+def _job(job_id: int, chat_id: int) -> MediaJob:
+    return MediaJob(job_id, chat_id, "pdf", None, 0.0)
+
+
+class FairQueueTests(unittest.TestCase):
+    def test_round_robin_across_chats(self):
+        queue = FairQueue()
+        for job_id, chat_id in enumerate([1, 1, 1, 2, 3], start=1):
+            queue.put(_job(job_id, chat_id))
+
+        order = [queue.pop().chat_id for _ in range(len(queue))]
+        self.assertEqual(order, [1, 2, 3, 1, 1])
+        self.assertIsNone(queue.pop())
+
+    def test_ahead_of_new(self):
+        queue = FairQueue()
+        for job_id, chat_id in enumerate([1, 1, 1, 2], start=1):
+            queue.put(_job(job_id, chat_id))
+        # новый чат встаёт за головами всех чатов
+        self.assertEqual(queue.ahead_of_new(9), 2)
+        # четвёртая задача чата 1 пропустит вперёд не больше одной задачи чата 2
+        self.assertEqual(queue.ahead_of_new(1), 4)
+
+
+class MediaEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.release = threading.Event()
+        self.started: list[tuple[int, str]] = []
+        self.done = threading.Semaphore(0)
+        self.factory_calls = 0
+        self.errors: list[MediaJob] = []
+
+    def tearDown(self):
+        self.release.set()
+        self.engine.shutdown()
+
+    def _run(self, chat_id, kind, payload):
+        self.started.append((chat_id, payload))
+        try:
+            if payload == "crash":
+                raise BrokenProcessPool("worker died")
+            self.release.wait(5)
+        finally:
+            self.done.release()
+
+    def _factory(self, workers):
+        self.factory_calls += 1
+        return ThreadPoolExecutor(max_workers=workers)
+
+    def _engine(self, **kwargs):
+        options = dict(workers=1, queue_limit=10, per_chat_limit=5)
+        options.update(kwargs)
+        self.engine = MediaEngine(
+            self._run,
+            executor_factory=self._factory,
+            on_error=lambda job, exc: self.errors.append(job),
+            **options,
+        )
+        return self.engine
+
+    def _wait_done(self, count):
+        for _ in range(count):
+            self.assertTrue(self.done.acquire(timeout=5))
+
+    def test_jobs_run_round_robin(self):
+        engine = self._engine()
+        engine.submit(1, "pdf", "a1")
+        self._wait_started(1)
+        for payload in ("a2", "a3"):
+            engine.submit(1, "pdf", payload)
+        engine.submit(2, "pdf", "b1")
+        self.release.set()
+        self._wait_done(4)
+        # первая задача ушла в работу сразу, дальше чаты чередуются
+        self.assertEqual([payload for _, payload in self.started], ["a1", "a2", "b1", "a3"])
+        self._wait_for(lambda: engine.stats()["completed"] == 4)
+        self.assertEqual(engine.stats()["queued"], 0)
+
+    def test_admission_limits(self):
+        engine = self._engine(queue_limit=3, per_chat_limit=2)
+        self.assertTrue(engine.submit(1, "pdf", "running").accepted)
+        self._wait_started(1)
+        self.assertTrue(engine.submit(1, "pdf", "q1").accepted)
+        self.assertTrue(engine.submit(1, "pdf", "q2").accepted)
+
+        rejected = engine.submit(1, "pdf", "q3")
+        self.assertFalse(rejected.accepted)
+        self.assertEqual(rejected.reason, "chat_limit")
+
+        self.assertTrue(engine.submit(2, "pdf", "q4").accepted)
+        full = engine.submit(3, "pdf", "q5")
+        self.assertEqual((full.accepted, full.reason), (False, "queue_full"))
+        self.assertEqual(engine.stats()["rejected"], 2)
+
+    def test_eta_grows_with_queue(self):
+        engine = self._engine(default_service_sec=2.0)
+        first = engine.submit(1, "pdf", "running")
+        self._wait_started(1)
+        etas = [engine.submit(chat_id, "pdf", "x").eta_seconds for chat_id in (2, 3, 4)]
+        self.assertEqual(first.eta_seconds, 2.0)
+        self.assertEqual(etas, [4.0, 6.0, 8.0])
+        self.assertEqual(engine.submit(5, "pdf", "x").position, 3)
+
+    def test_broken_pool_is_replaced(self):
+        engine = self._engine()
+        self.release.set()
+        engine.submit(1, "pdf", "crash")
+        self._wait_for(lambda: engine.stats()["failed"] == 1)
+        engine.submit(1, "pdf", "after")
+        self._wait_for(lambda: engine.stats()["completed"] == 1)
+
+        stats = engine.stats()
+        self.assertEqual((stats["failed"], stats["pool_restarts"]), (1, 1))
+        self.assertEqual(self.factory_calls, 2)
+        self.assertEqual([job.payload for job in self.errors], ["crash"])
+
+    def test_result_handed_off(self):
+        results = []
+        self.release.set()
+        self.engine = MediaEngine(
+            lambda chat_id, kind, payload: f"{kind}:{payload}",
+            workers=2,
+            queue_limit=10,
+            per_chat_limit=5,
+            executor_factory=self._factory,
+            on_result=lambda job, result: results.append((job.chat_id, job.ref, result)),
+        )
+        self.engine.submit(7, "pdf", "x", ref="job-1")
+        self._wait_for(lambda: results == [(7, "job-1", "pdf:x")])
+
+    def test_handler_failure_is_logged(self):
+        results = []
+
+        def on_result(job, result):
+            if job.payload == "bad":
+                raise ValueError("handler broke")
+            results.append(result)
+
+        self.release.set()
+        self.engine = MediaEngine(
+            lambda chat_id, kind, payload: payload,
+            workers=1,
+            queue_limit=10,
+            per_chat_limit=5,
+            executor_factory=self._factory,
+            on_result=on_result,
+        )
+        output = io.StringIO()
+        with redirect_stdout(output):
+            self.engine.submit(1, "pdf", "bad")
+            self.engine.submit(1, "pdf", "good")
+            self._wait_for(lambda: results == ["good"])
+        self.assertIn("[MEDIA] on_result for job 1 (pdf) failed: ValueError('handler broke')", output.getvalue())
+
+    def _wait_started(self, count):
+        self._wait_for(lambda: len(self.started) >= count)
+
+    def _wait_for(self, predicate):
+        for _ in range(500):
+            if predicate():
+                return
+            threading.Event().wait(0.01)
+        self.fail("condition not reached")
+
+
+if __name__ == "__main__":
+    unittest.main()
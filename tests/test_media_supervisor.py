@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import unittest
+
+from media_supervisor import JobAborted, SupervisedPool
+
+
+def _square(value):
+    return value * value
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def _exit(code):
+    os._exit(code)
+
+
+def _freeze():
+    # останавливаются все потоки воркера, включая пульс
+    os.kill(os.getpid(), signal.SIGSTOP)
+
+
+def _allocate(megabytes):
+    return len(bytearray(megabytes * 2**20))
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "воркеры под надзором проверяются на Linux")
+class SupervisedPoolTests(unittest.TestCase):
+    def _pool(self, **kwargs):
+        options = dict(job_timeout=5.0, heartbeat_interval=0.1, heartbeat_timeout=1.0)
+        options.update(kwargs)
+        pool = SupervisedPool(1, mp_context=multiprocessing.get_context("fork"), **options)
+        self.addCleanup(pool.shutdown, cancel_futures=True)
+        return pool
+
+    def _aborted(self, future) -> str:
+        with self.assertRaises(JobAborted) as ctx:
+            future.result(timeout=10)
+        return ctx.exception.reason
+
+    def test_results_and_errors(self):
+        pool = self._pool()
+        futures = [pool.submit(_square, n) for n in range(5)]
+        self.assertEqual([future.result(timeout=10) for future in futures], [0, 1, 4, 9, 16])
+        with self.assertRaisesRegex(ValueError, "плохой ввод"):
+            pool.submit(_fail, "плохой ввод").result(timeout=10)
+        self.assertEqual(pool.stats()["restarts"], {"crashed": 0, "timeout": 0, "hung": 0, "memory": 0})
+
+    def test_timeout_kills_worker_and_pool_recovers(self):
+        pool = self._pool(job_timeout=0.5)
+        self.assertEqual(self._aborted(pool.submit(_sleep, 30)), "timeout")
+        self.assertEqual(pool.submit(_square, 3).result(timeout=10), 9)
+        stats = pool.stats()
+        self.assertEqual((stats["restarts"]["timeout"], stats["spawned"], stats["alive"]), (1, 2, 1))
+
+    def test_crash_aborts_only_its_job(self):
+        pool = self._pool()
+        crashed = pool.submit(_exit, 3)
+        queued = pool.submit(_square, 4)
+        self.assertEqual(self._aborted(crashed), "crashed")
+        self.assertEqual(queued.result(timeout=10), 16)
+        self.assertEqual(pool.stats()["restarts"]["crashed"], 1)
+
+    def test_missing_heartbeat_means_hung(self):
+        pool = self._pool(job_timeout=60.0)
+        self.assertEqual(self._aborted(pool.submit(_freeze)), "hung")
+        self.assertEqual(pool.submit(_square, 2).result(timeout=10), 4)
+
+    def test_memory_limit(self):
+        pool = self._pool(memory_limit=64 * 2**20)
+        self.assertEqual(self._aborted(pool.submit(_allocate, 512)), "memory")
+        self.assertEqual(pool.submit(_allocate, 8).result(timeout=10), 8 * 2**20)
+        self.assertEqual(pool.stats()["restarts"]["memory"], 1)
+
+    def test_shutdown_waits_for_running_and_cancels_queued(self):
+        pool = self._pool()
+        running = pool.submit(_sleep, 0.3)
+        time.sleep(0.1)
+        queued = pool.submit(_square, 5)
+        pool.shutdown(wait=True, cancel_futures=True)
+        self.assertEqual(running.result(timeout=1), 0.3)
+        self.assertTrue(queued.cancelled())
+        with self.assertRaises(RuntimeError):
+            pool.submit(_square, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
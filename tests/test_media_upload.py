@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import threading
+import unittest
+
+from media_upload import Document, Uploader, is_transient, retry_after
+
+
+class FakeApiError(Exception):
+    def __init__(self, code: int, retry: float | None = None):
+        super().__init__(f"Error code: {code}")
+        self.error_code = code
+        self.result_json = {"ok": False, "error_code": code, "description": "fake"}
+        if retry is not None:
+            self.result_json["parameters"] = {"retry_after": retry}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
+
+
+class ClassificationTests(unittest.TestCase):
+    def test_retry_after_and_transient(self):
+        self.assertEqual(retry_after(FakeApiError(429, 7)), 7.0)
+        self.assertIsNone(retry_after(FakeApiError(500)))
+        self.assertTrue(is_transient(FakeApiError(502)))
+        self.assertTrue(is_transient(ConnectionError("reset")))
+        self.assertFalse(is_transient(FakeApiError(403)))
+        self.assertFalse(is_transient(ValueError("bad payload")))
+
+
+class UploaderTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.sent: list[int] = []
+        self.failures: list[tuple[int, BaseException]] = []
+        self.document = Document("document.pdf", "PDF", b"%PDF")
+
+    def _uploader(self, errors, **kwargs):
+        errors = list(errors)
+
+        def send(chat_id, document):
+            if errors:
+                raise errors.pop(0)
+            self.sent.append(chat_id)
+
+        self.uploader = Uploader(
+            send,
+            sleep=self.clock.sleep,
+            clock=self.clock,
+            on_failure=lambda chat_id, document, exc: self.failures.append((chat_id, exc)),
+            **kwargs,
+        )
+        return self.uploader
+
+    def tearDown(self):
+        self.uploader.shutdown()
+
+    def test_rate_limit_waits_retry_after(self):
+        uploader = self._uploader([FakeApiError(429, 5)])
+        self.assertTrue(uploader.submit(1, self.document).result(timeout=5))
+        self.assertEqual(self.sent, [1])
+        self.assertEqual(self.clock.sleeps, [5.0])
+        stats = uploader.stats()
+        self.assertEqual((stats["retries"], stats["rate_limited"], stats["uploaded"]), (1, 1, 1))
+
+    def test_server_errors_back_off_then_succeed(self):
+        uploader = self._uploader([FakeApiError(502), ConnectionError("reset")], base_delay=1.0, max_delay=4.0)
+        self.assertTrue(uploader.submit(2, self.document).result(timeout=5))
+        self.assertEqual(len(self.clock.sleeps), 2)
+        self.assertTrue(all(0 <= delay <= 4.0 for delay in self.clock.sleeps))
+
+    def test_client_error_is_not_retried(self):
+        uploader = self._uploader([FakeApiError(403)])
+        self.assertFalse(uploader.submit(3, self.document).result(timeout=5))
+        self.assertEqual(self.sent, [])
+        self.assertEqual([chat_id for chat_id, _ in self.failures], [3])
+        self.assertEqual(uploader.stats()["failed"], 1)
+
+    def test_gives_up_after_max_attempts(self):
+        uploader = self._uploader([FakeApiError(500)] * 5, max_attempts=3)
+        self.assertFalse(uploader.submit(4, self.document).result(timeout=5))
+        self.assertEqual(uploader.stats()["retries"], 2)
+        self.assertEqual(len(self.failures), 1)
+
+    def test_on_sent_receives_send_result(self):
+        delivered = []
+        uploader = Uploader(
+            lambda chat_id, document: f"message-{chat_id}",
+            on_sent=lambda chat_id, document, message: delivered.append(message),
+        )
+        self.uploader = uploader
+        self.assertTrue(uploader.submit(5, self.document).result(timeout=5))
+        self.assertEqual(delivered, ["message-5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
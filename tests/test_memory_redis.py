@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+import unittest
+
+from memory_redis import InMemoryRedis, ResponseError
+
+try:
+    import redis  # type: ignore
+except ImportError:  # pragma: no cover - redis не установлен
+    redis = None
+
+
+class RedisBehaviourMixin:
+    """Общие проверки семантики, которые должны совпадать с redis-py."""
+
+    r = None
+
+    def test_set_get_and_expiry(self):
+        self.assertTrue(self.r.set("s", "v"))
+        self.assertEqual(self.r.get("s"), "v")
+        self.assertEqual(self.r.ttl("s"), -1)
+        self.r.setex("s", 100, 5)
+        self.assertEqual(self.r.get("s"), "5")
+        self.assertTrue(0 < self.r.ttl("s") <= 100)
+        self.assertEqual(self.r.ttl("missing"), -2)
+
+    def test_set_nx_xx(self):
+        self.assertIsNone(self.r.set("s", "a", xx=True))
+        self.assertTrue(self.r.set("s", "a", nx=True))
+        self.assertIsNone(self.r.set("s", "b", nx=True))
+        self.assertEqual(self.r.get("s"), "a")
+
+    def test_incr_and_wrongtype(self):
+        self.assertEqual(self.r.incr("n"), 1)
+        self.assertEqual(self.r.incrby("n", 5), 6)
+        self.r.rpush("l", "x")
+        with self.assertRaises(ResponseError):
+            self.r.get("l")
+
+    def test_delete_and_exists(self):
+        self.r.set("a", "1")
+        self.r.sadd("b", 1)
+        self.assertEqual(self.r.exists("a", "b", "c"), 2)
+        self.assertEqual(self.r.delete("a", "b", "c"), 2)
+        self.assertEqual(self.r.exists("a", "b"), 0)
+
+    def test_lists(self):
+        self.assertEqual(self.r.rpush("l", "a", "b"), 2)
+        self.assertEqual(self.r.lpush("l", "y", "z"), 4)
+        self.assertEqual(self.r.lrange("l", 0, -1), ["z", "y", "a", "b"])
+        self.assertEqual(self.r.lpop("l"), "z")
+        self.assertEqual(self.r.rpop("l"), "b")
+        self.assertTrue(self.r.ltrim("l", 1, -1))
+        self.assertEqual(self.r.lrange("l", 0, -1), ["a"])
+        self.assertEqual(self.r.llen("l"), 1)
+        self.r.rpop("l")
+        self.assertEqual(self.r.exists("l"), 0)
+
+    def test_hashes(self):
+        self.assertEqual(self.r.hset("h", mapping={"a": 1, "b": "x"}), 2)
+        self.assertEqual(self.r.hset("h", "a", 2), 0)
+        self.assertEqual(self.r.hincrby("h", "a", 3), 5)
+        self.assertEqual(self.r.hgetall("h"), {"a": "5", "b": "x"})
+        self.assertEqual(self.r.hmget("h", ["a", "missing"]), ["5", None])
+        self.assertEqual(self.r.hdel("h", "a", "b"), 2)
+        self.assertEqual(self.r.hgetall("h"), {})
+
+    def test_sets(self):
+        self.assertEqual(self.r.sadd("s", 1, 2, 2), 2)
+        self.assertEqual(self.r.smembers("s"), {"1", "2"})
+        self.assertTrue(self.r.sismember("s", 1))
+        self.assertEqual(self.r.srem("s", 1, 3), 1)
+        self.assertEqual(self.r.spop("s", 5), ["2"])
+        self.assertEqual(self.r.spop("s", 5), [])
+        self.assertIsNone(self.r.spop("s"))
+
+    def test_sorted_sets(self):
+        self.assertEqual(self.r.zadd("z", {"a": 1, "b": 3, "c": 2}), 3)
+        self.assertEqual(self.r.zincrby("z", 5, "a"), 6.0)
+        self.assertEqual(self.r.zrevrange("z", 0, 1), ["a", "b"])
+        self.assertEqual(self.r.zrange("z", 0, -1, withscores=True), [("c", 2.0), ("b", 3.0), ("a", 6.0)])
+        self.assertEqual(self.r.zrangebyscore("z", "(2", "+inf"), ["b", "a"])
+        self.assertEqual(self.r.zremrangebyscore("z", "-inf", 3), 2)
+        self.assertEqual(self.r.zcard("z"), 1)
+        self.assertEqual(self.r.zscore("z", "a"), 6.0)
+        self.assertIsNone(self.r.zscore("z", "b"))
+
+    def test_sorted_set_tie_order(self):
+        self.r.zadd("z", {"a": 1, "b": 1, "c": 1})
+        self.assertEqual(self.r.zrevrange("z", 0, -1), ["c", "b", "a"])
+        self.assertEqual(self.r.zrange("z", 0, -1), ["a", "b", "c"])
+
+    def test_pipeline_returns_results_in_order(self):
+        pipe = self.r.pipeline()
+        pipe.set("a", "1")
+        pipe.incr("a")
+        pipe.hset("h", "f", "v")
+        pipe.get("a")
+        self.assertEqual(pipe.execute(), [True, 2, 1, "2"])
+
+    def test_pipeline_raises_after_running_remaining_commands(self):
+        self.r.rpush("l", "x")
+        pipe = self.r.pipeline()
+        pipe.get("l")
+        pipe.set("after", "1")
+        with self.assertRaises(ResponseError):
+            pipe.execute()
+        self.assertEqual(self.r.get("after"), "1")
+
+
+class InMemoryRedisBehaviourTests(RedisBehaviourMixin, unittest.TestCase):
+    def setUp(self):
+        self.r = InMemoryRedis(sweep_interval=0)
+
+    def tearDown(self):
+        self.r.close()
+
+
+@unittest.skipUnless(redis is not None and os.getenv("REDIS_TEST_URL"), "REDIS_TEST_URL не задан")
+class RealRedisBehaviourTests(RedisBehaviourMixin, unittest.TestCase):
+    """Те же проверки против настоящего Redis (база очищается — используйте отдельную)."""
+
+    def setUp(self):
+        self.r = redis.Redis.from_url(os.environ["REDIS_TEST_URL"], decode_responses=True)
+        self.r.flushdb()
+
+    def tearDown(self):
+        self.r.flushdb()
+
+
+class InMemoryRedisEngineTests(unittest.TestCase):
+    def test_active_expiry_removes_keys_without_access(self):
+        store = InMemoryRedis(sweep_interval=0.01)
+        try:
+            store.set("k", "v", px=20)
+            store.set("keep", "v")
+            time.sleep(0.2)
+            self.assertNotIn("k", store._data)
+            self.assertEqual(store.stats["expired_keys"], 1)
+            self.assertEqual(store.dbsize(), 1)
+        finally:
+            store.close()
+
+    def test_purge_ignores_stale_heap_entries(self):
+        store = InMemoryRedis(sweep_interval=0)
+        store.set("k", "v", px=1)
+        store.expire("k", 100)
+        time.sleep(0.01)
+        self.assertEqual(store.purge_expired(), 0)
+        self.assertEqual(store.get("k"), "v")
+
+    def test_lru_eviction_respects_maxmemory(self):
+        store = InMemoryRedis(maxmemory=2000, sweep_interval=0)
+        for index in range(10):
+            store.set(f"k{index}", "x" * 300)
+            store.get("k0")  # k0 остаётся «горячим»
+        self.assertLessEqual(store.used_memory, 2000)
+        self.assertEqual(store.get("k0"), "x" * 300)
+        self.assertEqual(store.get("k9"), "x" * 300)
+        self.assertIsNone(store.get("k1"))
+        self.assertGreater(store.stats["evicted_keys"], 0)
+
+    def test_memory_accounting_returns_to_zero(self):
+        store = InMemoryRedis(sweep_interval=0)
+        store.hset("h", mapping={"a": "1"})
+        store.hincrby("h", "a", 100)
+        store.sadd("s", "m")
+        store.zadd("z", {"m": 1})
+        store.rpush("l", "a", "b")
+        store.ltrim("l", 0, 0)
+        store.delete("h", "s", "z", "l")
+        self.assertEqual(store.used_memory, 0)
+
+    def test_concurrent_increments(self):
+        store = InMemoryRedis(sweep_interval=0)
+
+        def worker():
+            for _ in range(500):
+                store.hincrby("h", "n")
+                store.zincrby("z", 1, "m")
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(store.hget("h", "n"), "2000")
+        self.assertEqual(store.zscore("z", "m"), 2000.0)
+
+    def test_pipeline_executes_atomically(self):
+        store = InMemoryRedis(sweep_interval=0)
+        observed = []
+        pipe = store.pipeline()
+        pipe.set("a", "1")
+        pipe.set("b", "1")
+
+        with store._lock:
+            reader = threading.Thread(target=lambda: observed.append((store.get("a"), store.get("b"))))
+            reader.start()
+            pipe.execute()
+        reader.join()
+        self.assertEqual(observed, [("1", "1")])
+
+
+if __name__ == "__main__":  # pragma: no cover - direct execution
+    unittest.main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import io
+import unittest
+
+try:
+    import reportlab  # noqa: F401
+except ImportError:  # pragma: no cover - reportlab не установлен
+    reportlab = None
+
+import pdf_layout
+
+# Встроенный Type1-шрифт reportlab: не нужен файл TTF
+_FONT = "Helvetica"
+
+
+@unittest.skipIf(reportlab is None, "reportlab не установлен")
+class GlyphWidthsTests(unittest.TestCase):
+    def setUp(self):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        self.string_width = stringWidth
+        self.widths = pdf_layout.glyph_widths(_FONT)
+
+    def test_measure_matches_reportlab(self):
+        text = "Wrap me, please: 0123456789"
+        self.assertAlmostEqual(self.widths.measure(text) * 12, self.string_width(text, _FONT, 12), places=6)
+        self.assertIs(pdf_layout.glyph_widths(_FONT), self.widths)
+
+    def test_wrap_fits_width_and_keeps_words(self):
+        line = "  indented " + "lorem ipsum dolor sit amet " * 20
+        max_width = 300 / 12
+        parts = list(self.widths.wrap(line, max_width))
+        self.assertGreater(len(parts), 1)
+        self.assertTrue(all(self.widths.measure(part) <= max_width for part in parts))
+        self.assertTrue(parts[0].startswith("  indented"))
+        self.assertEqual(" ".join(part.strip() for part in parts), line.strip().replace("  ", " "))
+
+    def test_overlong_word_is_split_by_characters(self):
+        word = "x" * 500
+        parts = list(self.widths.wrap("short " + word, 100 / 12))
+        self.assertEqual(parts[0], "short")
+        self.assertEqual("".join(parts[1:]), word)
+        self.assertTrue(all(self.widths.measure(part) <= 100 / 12 for part in parts))
+
+    def test_blank_lines_are_kept(self):
+        lines = list(pdf_layout.layout_lines("a\n\n\tb\r\nc", self.widths))
+        self.assertEqual(lines, ["a", "", "    b", "c"])
+        self.assertEqual(list(pdf_layout.layout_lines("", self.widths)), ["(empty)"])
+
+
+@unittest.skipIf(reportlab is None, "reportlab не установлен")
+class RenderTextTests(unittest.TestCase):
+    def test_paginates_by_lines_per_page(self):
+        style = pdf_layout.PageStyle()
+        out = io.BytesIO()
+        result = pdf_layout.render_text("line\n" * (style.lines_per_page * 2 + 1), out, font_name=_FONT, style=style)
+        self.assertEqual((result.pages, result.truncated), (3, False))
+        self.assertEqual(result.size, len(out.getvalue()))
+        self.assertTrue(out.getvalue().startswith(b"%PDF"))
+
+    def test_page_limit_truncates_with_notice(self):
+        style = pdf_layout.PageStyle()
+        result = pdf_layout.render_text(
+            "line\n" * (style.lines_per_page * 5), io.BytesIO(), font_name=_FONT, style=style, max_pages=2
+        )
+        self.assertEqual((result.pages, result.lines, result.truncated), (2, style.lines_per_page * 2, True))
+
+    def test_exact_fit_is_not_truncated(self):
+        style = pdf_layout.PageStyle()
+        result = pdf_layout.render_text(
+            "line\n" * (style.lines_per_page * 2), io.BytesIO(), font_name=_FONT, style=style, max_pages=2
+        )
+        self.assertEqual((result.pages, result.truncated), (2, False))
+
+    def test_byte_limit(self):
+        with self.assertRaises(pdf_layout.PdfLimitError):
+            pdf_layout.render_text("word " * 5000, io.BytesIO(), font_name=_FONT, max_bytes=1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import unittest
+
+try:
+    import pptx
+    from pptx import Presentation
+except ImportError:  # pragma: no cover - python-pptx не установлен
+    pptx = None
+
+import presentation
+
+
+def _png() -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 20), "navy").save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _build(template, slides):
+    deck = presentation.DeckBuilder(template)
+    for title, bullets in slides:
+        deck.add_slide(title, bullets)
+    buf = io.BytesIO()
+    deck.save(buf)
+    return Presentation(io.BytesIO(buf.getvalue()))
+
+
+def _body(slide):
+    return [shape.text_frame.text for shape in slide.placeholders if shape.placeholder_format.idx == 1]
+
+
+@unittest.skipIf(pptx is None, "python-pptx не установлен")
+class DeckBuilderTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_slides_have_titles_bullets_and_unique_ids(self):
+        prs = _build(presentation.deck_template(), [("Первый", ["a", "b"]), ("Второй", []), ("Третий", ["c"])])
+        self.assertEqual([slide.shapes.title.text for slide in prs.slides], ["Первый", "Второй", "Третий"])
+        self.assertEqual([_body(slide) for slide in prs.slides], [["a\nb"], [" "], ["c"]])
+        self.assertEqual([slide.slide_id for slide in prs.slides], [256, 257, 258])
+        self.assertEqual({slide.slide_layout.name for slide in prs.slides}, {"Title and Content"})
+
+    def test_copies_are_independent(self):
+        template = presentation.deck_template()
+        first = _build(template, [("A", ["1"])])
+        second = _build(template, [("B", ["2"]), ("C", ["3"])])
+        self.assertEqual((len(first.slides), len(second.slides)), (1, 2))
+        self.assertIs(presentation.deck_template(), template)
+
+    def test_public_add_slide_fallback_matches(self):
+        deck = presentation.DeckBuilder(presentation.deck_template())
+        deck._fast = False
+        deck.add_slide("A", ["x", "y"])
+        buf = io.BytesIO()
+        deck.save(buf)
+        prs = Presentation(io.BytesIO(buf.getvalue()))
+        self.assertEqual((prs.slides[0].shapes.title.text, _body(prs.slides[0])), ("A", ["x\ny"]))
+
+    def test_custom_template_drops_its_slides_and_keeps_logo(self):
+        logo = os.path.join(self._tmp.name, "logo.png")
+        with open(logo, "wb") as fh:
+            fh.write(_png())
+        branded = _build(presentation.DeckTemplate(logo=logo), [("Образец", ["слайд шаблона"])])
+        path = os.path.join(self._tmp.name, "brand.pptx")
+        branded.save(path)
+
+        prs = _build(presentation.deck_template(path), [("Новый", ["пункт"])])
+        self.assertEqual([slide.shapes.title.text for slide in prs.slides], ["Новый"])
+        self.assertIn("Logo", [shape.name for shape in prs.slide_master.shapes])
+
+    def test_broken_logo_is_skipped(self):
+        logo = os.path.join(self._tmp.name, "logo.png")
+        with open(logo, "w") as fh:
+            fh.write("не картинка")
+        template = presentation.DeckTemplate(logo=logo)
+        self.assertIsNone(template.logo)
+        self.assertEqual(len(_build(template, [("A", [])]).slides), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
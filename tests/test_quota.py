@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import datetime
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from db import Database
+from quota import QuotaEngine, month_key
+
+_LIMITS = {"photos": 3, "docs": 2, "analysis": 1}
+
+
+class QuotaEngineTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.db = Database(str(Path(self._tmp.name) / "quota.db"))
+        self.db.execute("CREATE TABLE users (chat_id INTEGER PRIMARY KEY, used_free INT DEFAULT 0, has_tariff INTEGER DEFAULT 0)")
+        self.today = datetime.date(2025, 9, 15)
+        self.quota = QuotaEngine(
+            self.db,
+            monthly_limits=_LIMITS,
+            is_owner=lambda uid: uid == 1,
+            clock=lambda: self.today,
+        )
+        self.quota.ensure_tables()
+
+    def tearDown(self):
+        self.db.close_all()
+        self._tmp.cleanup()
+
+    def _subscribe(self, chat_id: int) -> None:
+        self.db.execute("INSERT INTO users(chat_id, has_tariff) VALUES(?, 1)", (chat_id,))
+
+    def test_owner_is_never_charged(self):
+        charge = self.quota.consume(1, "photos", amount=100)
+        self.assertEqual(charge.source, "owner")
+        self.assertIsNone(self.quota.balance(1))
+
+    def test_tariff_user_gets_lazy_monthly_balance(self):
+        self._subscribe(10)
+        for _ in range(3):
+            self.assertEqual(self.quota.consume(10, "photos").source, "balance")
+        # Баланс исчерпан, триал за фото остаётся одноразовым запасом
+        self.assertEqual(self.quota.consume(10, "photos").source, "trial")
+        self.assertIsNone(self.quota.consume(10, "photos"))
+        self.assertEqual(self.quota.balance(10)["photos"], 0)
+
+    def test_rollover_creates_new_month_row(self):
+        self._subscribe(10)
+        self.quota.consume(10, "docs")
+        self.today = datetime.date(2025, 10, 1)
+        self.quota.consume(10, "docs")
+        rows = self.db.query_all("SELECT month, docs_left FROM media_balance WHERE chat_id=10 ORDER BY month")
+        self.assertEqual(rows, [("2025-09", 1), ("2025-10", 1)])
+
+    def test_free_user_gets_single_trial(self):
+        self.assertEqual(self.quota.consume(20, "analysis").source, "trial")
+        self.assertIsNone(self.quota.consume(20, "analysis"))
+        self.assertIsNone(self.quota.consume(20, "analysis"))
+        self.assertEqual(self.quota.stats["denied"], 2)
+
+    def test_refund_restores_balance_and_trial(self):
+        self._subscribe(10)
+        charge = self.quota.consume(10, "analysis")
+        self.quota.refund(charge)
+        self.assertEqual(self.quota.balance(10)["analysis"], 1)
+
+        trial = self.quota.consume(30, "photos")
+        self.quota.refund(trial)
+        self.assertEqual(self.quota.consume(30, "photos").source, "trial")
+
+    def test_purchased_package_is_visible_to_cached_reader(self):
+        self.assertIsNone(self.quota.balance(40))
+        self.quota.add(40, "photos", 5)
+        self.assertEqual(self.quota.balance(40)["photos"], 5)
+        self.assertEqual(self.quota.consume(40, "photos", amount=5).source, "balance")
+
+    def test_purchase_in_another_process_is_not_denied_from_cache(self):
+        # другой процесс (веб-обработчик оплаты) со своим кэшем
+        other = QuotaEngine(self.db, monthly_limits=_LIMITS, clock=lambda: self.today)
+        self.quota.set_balance(60, photos=0, docs=0, analysis=0)
+        self.assertIsNone(self.quota.consume(60, "photos", allow_trial=False))
+
+        other.add(60, "photos", 2)
+        self.assertEqual(self.quota.consume(60, "photos", allow_trial=False).source, "balance")
+
+        # тариф, выданный другим процессом, тоже виден сразу
+        self.assertIsNone(self.quota.consume(61, "docs", allow_trial=False))
+        self._subscribe(61)
+        self.assertEqual(self.quota.consume(61, "docs", allow_trial=False).source, "balance")
+
+    def test_concurrent_consumers_never_overspend(self):
+        self.quota.set_balance(50, photos=25, docs=0, analysis=0)
+        engines = [
+            QuotaEngine(self.db, monthly_limits=_LIMITS, clock=lambda: self.today) for _ in range(4)
+        ]
+        granted = []
+        lock = threading.Lock()
+
+        def worker(engine):
+            for _ in range(20):
+                charge = engine.consume(50, "photos", allow_trial=False)
+                if charge is not None:
+                    with lock:
+                        granted.append(charge)
+
+        threads = [threading.Thread(target=worker, args=(engine,)) for engine in engines for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(granted), 25)
+        row = self.db.query_one(
+            "SELECT photos_left FROM media_balance WHERE chat_id=50 AND month=?", (month_key(self.today),)
+        )
+        self.assertEqual(row[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
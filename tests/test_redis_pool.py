@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from bot_env import load
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis не установлен
+    redis = None
+
+redis_pool = load("redis_pool")
+
+
+if redis is not None:
+
+    class _Ready(redis.Connection):
+        """Соединение без сокета: connect() ничего не делает, данных на чтение нет."""
+
+        def connect(self):
+            pass
+
+        def can_read(self, timeout=0):
+            return False
+
+    class _Refused(redis.Connection):
+        def connect(self):
+            raise redis.ConnectionError("connection refused")
+
+    class _AsyncReady(redis.asyncio.Connection):
+        async def connect(self):
+            pass
+
+        async def can_read(self, timeout=0):
+            return False
+
+    class _AsyncRefused(redis.asyncio.Connection):
+        async def connect(self):
+            raise redis.ConnectionError("connection refused")
+
+
+@unittest.skipIf(redis is None, "redis не установлен")
+class InstrumentedPoolTests(unittest.TestCase):
+    def _pool(self, connection_class, **kwargs):
+        return redis_pool._InstrumentedPool(connection_class=connection_class, max_connections=2, timeout=0.05, **kwargs)
+
+    def test_checkout_and_release_are_counted(self):
+        pool = self._pool(_Ready)
+        before = redis_pool.pool_stats()
+        first, second = pool.get_connection(), pool.get_connection()
+        during = redis_pool.pool_stats()
+        self.assertEqual(during["in_use"] - before["in_use"], 2)
+        self.assertGreaterEqual(during["peak_in_use"], during["in_use"])
+
+        with self.assertRaises(redis.ConnectionError):
+            pool.get_connection()
+        self.assertEqual(redis_pool.pool_stats()["exhausted"] - before["exhausted"], 1)
+
+        pool.release(first)
+        pool.release(second)
+        # повторный release того же соединения не уводит счётчик вниз
+        pool.release(second)
+        self.assertEqual(redis_pool.pool_stats()["in_use"], before["in_use"])
+
+    def test_failed_connect_does_not_undercount(self):
+        ready = self._pool(_Ready)
+        held = ready.get_connection()
+        before = redis_pool.pool_stats()
+
+        refused = self._pool(_Refused)
+        for _ in range(3):
+            with self.assertRaises(redis.ConnectionError):
+                refused.get_connection()
+        # redis-py сам вернул соединения в пул; занятое соединение из другого пула всё ещё учтено
+        self.assertEqual(redis_pool.pool_stats()["in_use"], before["in_use"])
+        self.assertEqual(redis_pool.pool_stats()["checkouts"], before["checkouts"])
+
+        ready.release(held)
+        self.assertEqual(redis_pool.pool_stats()["in_use"], before["in_use"] - 1)
+
+
+@unittest.skipIf(redis is None, "redis не установлен")
+class InstrumentedAsyncPoolTests(unittest.TestCase):
+    def _pool(self, connection_class):
+        return redis_pool._InstrumentedAsyncPool(connection_class=connection_class, max_connections=2, timeout=0.05)
+
+    def test_checkouts_are_counted_separately_from_sync_pool(self):
+        async def scenario():
+            pool = self._pool(_AsyncReady)
+            before = redis_pool.pool_stats("async")
+            sync_before = redis_pool.pool_stats()
+            first, second = await pool.get_connection(), await pool.get_connection()
+            during = redis_pool.pool_stats("async")
+            with self.assertRaises(redis.ConnectionError):
+                await pool.get_connection()
+            await pool.release(first)
+            await pool.release(second)
+            return before, sync_before, during, redis_pool.pool_stats("async")
+
+        before, sync_before, during, after = asyncio.run(scenario())
+        self.assertEqual(during["in_use"] - before["in_use"], 2)
+        self.assertEqual(after["exhausted"] - before["exhausted"], 1)
+        self.assertEqual(after["in_use"], before["in_use"])
+        self.assertEqual(redis_pool.pool_stats()["checkouts"], sync_before["checkouts"])
+
+    def test_failed_connect_does_not_undercount(self):
+        async def scenario():
+            before = redis_pool.pool_stats("async")
+            pool = self._pool(_AsyncRefused)
+            for _ in range(3):
+                with self.assertRaises(redis.ConnectionError):
+                    await pool.get_connection()
+            return before, redis_pool.pool_stats("async")
+
+        before, after = asyncio.run(scenario())
+        self.assertEqual((after["in_use"], after["checkouts"]), (before["in_use"], before["checkouts"]))
+
+    def test_async_client_shares_connection_settings(self):
+        client = redis_pool.get_async_client()
+        self.assertIs(client.connection_pool, redis_pool.get_async_client().connection_pool)
+        kwargs = client.connection_pool.connection_kwargs
+        expected = redis_pool._connection_kwargs()
+        self.assertEqual(
+            {key: kwargs[key] for key in ("host", "port", "db", "socket_timeout", "decode_responses")},
+            {key: expected[key] for key in ("host", "port", "db", "socket_timeout", "decode_responses")},
+        )
+        self.assertIsInstance(client.connection_pool, redis.asyncio.BlockingConnectionPool)
+
+
+if __name__ == "__main__":
+    unittest.main()
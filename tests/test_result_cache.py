@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from db import Database
+from result_cache import ResultCache, result_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        self.now += 1
+        return self.now
+
+
+class ResultKeyTests(unittest.TestCase):
+    def test_key_depends_on_kind_version_and_payload(self):
+        key = result_key("pdf", "1", "текст")
+        self.assertEqual(key, result_key("pdf", "1", "текст".encode("utf-8")))
+        self.assertNotEqual(key, result_key("pdf", "2", "текст"))
+        self.assertNotEqual(key, result_key("excel", "1", "текст"))
+        self.assertNotEqual(key, result_key("pdf", "1", "текст "))
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.database = Database(str(root / "cache.db"))
+        self.cache = self._cache(max_bytes=100)
+
+    def tearDown(self):
+        self.database.close_all()
+        self.tmp.cleanup()
+
+    def _cache(self, **kwargs):
+        cache = ResultCache(self.database, Path(self.tmp.name) / "blobs", clock=FakeClock(), **kwargs)
+        cache.ensure_tables()
+        return cache
+
+    def test_miss_then_blob_then_file_id(self):
+        self.assertIsNone(self.cache.lookup("k"))
+        self.assertTrue(self.cache.store_blob("k", b"x" * 10))
+        self.assertEqual(self.cache.lookup("k").data, b"x" * 10)
+
+        self.cache.remember_file_id("k", "FILE")
+        hit = self.cache.lookup("k")
+        self.assertEqual((hit.file_id, hit.data), ("FILE", b"x" * 10))
+        stats = self.cache.stats()
+        self.assertEqual((stats["misses"], stats["blob_hits"], stats["file_id_hits"]), (1, 1, 1))
+
+    def test_forget_file_id_falls_back_to_blob_or_miss(self):
+        self.cache.store_blob("with-blob", b"data")
+        self.cache.remember_file_id("with-blob", "A")
+        self.cache.remember_file_id("id-only", "B")
+        self.cache.forget_file_id("with-blob")
+        self.cache.forget_file_id("id-only")
+        self.assertEqual(self.cache.lookup("with-blob").file_id, None)
+        self.assertIsNone(self.cache.lookup("id-only"))
+
+    def test_lru_eviction_keeps_recent_blobs_and_file_ids(self):
+        for name in ("a", "b"):
+            self.cache.store_blob(name, name.encode() * 40)
+            self.cache.remember_file_id(name, f"id-{name}")
+        # «a» использовали позже «b» — при переполнении вытесняется «b»
+        self.cache.lookup("a")
+        self.cache.store_blob("c", b"c" * 40)
+
+        self.assertIsNone(self.cache.lookup("b").data)
+        self.assertEqual(self.cache.lookup("b").file_id, "id-b")
+        self.assertIsNotNone(self.cache.lookup("a").data)
+        stats = self.cache.stats()
+        self.assertLessEqual(stats["blob_bytes"], 100)
+        self.assertGreaterEqual(stats["evicted"], 1)
+
+    def test_oversized_blob_is_not_stored(self):
+        self.assertFalse(self.cache.store_blob("big", b"x" * 101))
+        self.assertIsNone(self.cache.lookup("big"))
+
+    def test_missing_blob_file_is_treated_as_evicted(self):
+        self.cache.store_blob("k", b"data")
+        self.cache._blob_path("k").unlink()
+        self.assertIsNone(self.cache.lookup("k"))
+
+    def test_entry_limit(self):
+        cache = self._cache(max_bytes=1000, max_entries=2)
+        for name in ("a", "b", "c"):
+            cache.store_blob(name, b"x")
+        self.assertIsNone(cache.lookup("a"))
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertEqual(len([p for p in (Path(self.tmp.name) / "blobs").rglob("*") if p.is_file()]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import unittest
+from unittest import mock
+
+from bot_env import load
+from memory_redis import InMemoryRedis, ResponseError
+
+storage = load("storage")
+
+
+class _Flaky:
+    """InMemoryRedis, который по флагу ``down`` отвечает ConnectionError, как упавший Redis."""
+
+    def __init__(self, *, fail_pipelines_after: int | None = None):
+        self.store = InMemoryRedis()
+        self.down = False
+        self.pipelines = 0
+        self.fail_pipelines_after = fail_pipelines_after
+
+    def __getattr__(self, command):
+        method = getattr(self.store, command)
+
+        def call(*args, **kwargs):
+            if self.down:
+                raise ConnectionError("redis down")
+            return method(*args, **kwargs)
+
+        return call
+
+    def pipeline(self, transaction=True):
+        flaky = self
+        pipe = self.store.pipeline(transaction)
+        execute = pipe.execute
+
+        def run(*args, **kwargs):
+            if flaky.down:
+                raise ConnectionError("redis down")
+            flaky.pipelines += 1
+            if flaky.fail_pipelines_after is not None and flaky.pipelines > flaky.fail_pipelines_after:
+                raise ConnectionError("redis down again")
+            return execute(*args, **kwargs)
+
+        pipe.execute = run
+        return pipe
+
+
+class SafeRedisJournalTests(unittest.TestCase):
+    def setUp(self):
+        patch = mock.patch.object(storage, "notify_owner")
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.client = _Flaky()
+
+    def _outage(self, **kwargs):
+        r = storage.SafeRedis(self.client, **kwargs)
+        r.set("warmup", "1")
+        self.client.down = True
+        return r
+
+    def test_writes_during_outage_are_journaled(self):
+        r = self._outage(journal_limit=100)
+        r.set("a", "1")
+        r.hincrby("h", "f", 2)
+        r.get("a")  # чтения не журналируются
+
+        self.assertTrue(r.in_outage)
+        self.assertEqual(r.get("a"), "1")
+        self.assertEqual(r.journal_size, 2)
+        self.assertEqual(r.stats["journaled"], 2)
+
+    def test_overwrites_of_one_key_keep_only_the_latest(self):
+        r = self._outage(journal_limit=100)
+        for turn in range(5):
+            r.setex("history:1", 60, "x" * 1000 + str(turn))
+        r.delete("gone")
+        r.set("gone", "back")
+
+        self.assertEqual(r.journal_size, 2)
+        self.assertEqual(r.stats["journal_coalesced"], 5)
+        self.assertLess(r.journal_bytes, 1300)
+
+        self.client.down = False
+        self.assertTrue(r.reconnect(self.client))
+        self.assertEqual(self.client.store.get("history:1"), "x" * 1000 + "4")
+        self.assertEqual(self.client.store.get("gone"), "back")
+
+    def test_journal_overflow_by_count_and_bytes(self):
+        r = self._outage(journal_limit=3)
+        for i in range(5):
+            r.hincrby("counters", f"n{i}", 1)
+        self.assertEqual((r.journal_size, r.stats["journal_dropped"]), (3, 2))
+
+        sized = storage.SafeRedis(_Flaky(), journal_limit=100, journal_max_bytes=1000)
+        sized.client = None
+        for i in range(3):
+            sized.set(f"k{i}", "v" * 400)
+        self.assertEqual(sized.journal_size, 2)
+        self.assertLessEqual(sized.journal_bytes, 1000)
+        self.assertEqual(sized.stats["journal_dropped"], 1)
+
+    def test_reconnect_replays_in_batches(self):
+        r = self._outage(journal_limit=100)
+        for i in range(5):
+            r.hset("log", str(i), i)
+        self.client.down = False
+
+        with mock.patch.object(storage, "_REPLAY_BATCH_SIZE", 2):
+            self.assertTrue(r.reconnect(self.client))
+        self.assertEqual(self.client.pipelines, 3)
+        self.assertEqual(self.client.store.hgetall("log"), {str(i): str(i) for i in range(5)})
+        self.assertEqual((r.journal_size, r.journal_bytes, r.stats["replayed"]), (0, 0, 5))
+        self.assertTrue(r.is_real)
+        self.assertFalse(r.in_outage)
+
+    def test_failed_replay_keeps_the_rest_in_order(self):
+        r = self._outage(journal_limit=100)
+        for i in range(5):
+            # одно поле перезаписывается: итог зависит от порядка повтора
+            r.hset("log", "last", i)
+        target = _Flaky(fail_pipelines_after=1)
+
+        with mock.patch.object(storage, "_REPLAY_BATCH_SIZE", 2):
+            self.assertFalse(r.reconnect(target))
+            self.assertEqual(r.journal_size, 3)
+            self.assertTrue(r.in_outage)
+            target.fail_pipelines_after = None
+            self.assertTrue(r.reconnect(target))
+        self.assertEqual(target.store.hgetall("log"), {"last": "4"})
+        self.assertEqual(r.stats["replayed"], 5)
+
+    def test_pipeline_error_still_journals_applied_writes(self):
+        r = self._outage(journal_limit=100)
+        pipe = r.pipeline()
+        pipe.set("a", "1")
+        pipe.hincrby("a", "f", 1)  # WRONGTYPE: "a" — строка
+        pipe.set("b", "2")
+        with self.assertRaises(ResponseError):
+            pipe.execute()
+        self.assertEqual(r.journal_size, 2)
+
+        self.client.down = False
+        self.assertTrue(r.reconnect(self.client))
+        self.assertEqual((self.client.store.get("a"), self.client.store.get("b")), ("1", "2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+try:
+    import openpyxl
+except ImportError:  # pragma: no cover - openpyxl не установлен
+    openpyxl = None
+
+import spreadsheet
+
+
+def _rows(data: bytes, sheet: int = 0):
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    return [list(row) for row in workbook.worksheets[sheet].iter_rows(values_only=True)]
+
+
+def _build(text: str):
+    out = io.BytesIO()
+    result = spreadsheet.write_workbook(io.StringIO(text, newline=""), out)
+    return result, out.getvalue()
+
+
+class InferenceTests(unittest.TestCase):
+    def test_column_types(self):
+        types = spreadsheet.infer_column_types([
+            ["1", "1,5", "01.02.2024", "2024-01-02 10:30", "007", "x"],
+            ["-20", "2.25", "2024-03-04", "2024-01-03T11:00:00", "012", "1"],
+            ["1 000", "1 234,5", "", "", "", ""],
+        ])
+        converted = [convert("1") if convert else None for convert in types[:2]]
+        self.assertEqual(converted, [1, 1.0])
+        self.assertEqual(types[2]("01.02.2024"), date(2024, 2, 1))
+        self.assertEqual(types[3]("2024-01-02 10:30"), datetime(2024, 1, 2, 10, 30))
+        # коды с ведущими нулями и смешанный столбец — текст
+        self.assertEqual(types[4:], [None, None])
+
+    def test_long_numbers_stay_text(self):
+        self.assertEqual(spreadsheet.infer_column_types([["4276123456789012345"]]), [None])
+
+    def test_sniffs_delimiter_and_quotes(self):
+        dialect = spreadsheet.sniff_dialect('a;b;c\n1;"x;y";3\n4;5;6\n')
+        self.assertEqual(dialect.delimiter, ";")
+        self.assertEqual(spreadsheet.sniff_dialect("просто текст").delimiter, ",")
+
+
+@unittest.skipIf(openpyxl is None, "openpyxl не установлен")
+class WriteWorkbookTests(unittest.TestCase):
+    def test_header_types_and_quoted_cells(self):
+        filler = "".join(f"Клиент {n};{n};0{n}.03.2024\n" for n in range(1, 10))
+        result, data = _build('Имя;Сумма;Дата\n"Иванов; Иван";1 234,5;01.02.2024\n' + filler + "Пётр;10;н/д\n")
+        self.assertEqual((result.rows, result.columns, result.header), (11, 3, True))
+        rows = _rows(data)
+        self.assertEqual(rows[0], ["Имя", "Сумма", "Дата"])
+        self.assertEqual(rows[1], ["Иванов; Иван", 1234.5, datetime(2024, 2, 1)])
+        # значение не по типу столбца остаётся текстом
+        self.assertEqual(rows[-1], ["Пётр", 10, "н/д"])
+
+    def test_numeric_first_row_is_data(self):
+        result, data = _build("1,2\n3,4.5\n")
+        self.assertFalse(result.header)
+        self.assertEqual(_rows(data), [[1, 2.0], [3, 4.5]])
+
+    def test_formulas_are_written_as_text(self):
+        _, data = _build("a,b\n=1+1,x\n")
+        self.assertEqual(_rows(data)[1], ["=1+1", "x"])
+
+    def test_rows_past_the_sheet_limit_go_to_next_sheet(self):
+        with mock.patch.object(spreadsheet, "SHEET_MAX_ROWS", 3):
+            result, data = _build("h\n" + "".join(f"r{n}\n" for n in range(5)))
+        self.assertEqual((result.rows, result.sheets), (5, 3))
+        self.assertEqual(_rows(data, 2), [["h"], ["r4"]])
+
+    def test_row_split_across_sniff_sample(self):
+        text = "a,b\n" + "".join(f"{n},{'x' * 50}\n" for n in range(3000))
+        with mock.patch.object(spreadsheet, "_SNIFF_CHARS", 1001):
+            result, data = _build(text)
+        self.assertEqual(result.rows, 3000)
+        self.assertTrue(all(row[1] == "x" * 50 for row in _rows(data)[1:]))
+
+
+class OpenCsvTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._tmp.name, "data.csv")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _read(self, raw: bytes) -> str:
+        with open(self.path, "wb") as fh:
+            fh.write(raw)
+        with spreadsheet.open_csv(self.path) as fh:
+            return fh.read()
+
+    def test_utf8_with_bom(self):
+        self.assertEqual(self._read("﻿имя,сумма\n".encode("utf-8")), "имя,сумма\n")
+
+    def test_cp1251_fallback(self):
+        self.assertEqual(self._read("имя;сумма\r\n".encode("cp1251")), "имя;сумма\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from startup_profiler import parse_importtime, phase, phase_report, phases
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Модули, которые процессу бота при импорте загружать не нужно.
+# PIL сюда не входит: его подтягивает сам telebot, если Pillow установлен.
+HEAVY_MODULES = ("reportlab", "openpyxl", "pptx", "font_data", "media_utils")
+# Бюджет на `import bot` с запасом под медленные CI-машины
+STARTUP_BUDGET_SEC = float(os.getenv("STARTUP_BUDGET_SEC", "3.0"))
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import bot
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+_FACTORY_PROBE = """
+import json, threading
+import bot
+from settings import bot as telebot_instance
+handlers_after_import = len(telebot_instance.message_handlers) + len(telebot_instance.callback_query_handlers)
+threads_after_import = sorted(t.name for t in threading.enumerate())
+import app
+first = app.create_app(start_background=False)
+second = app.create_app()
+print(json.dumps({
+    "same": first is second,
+    "handlers_after_import": handlers_after_import,
+    "threads_after_import": threads_after_import,
+    "message": [h["function"].__module__ + "." + h["function"].__name__ for h in first.message_handlers],
+    "callback": [h["function"].__module__ + "." + h["function"].__name__ for h in first.callback_query_handlers],
+}))
+"""
+
+
+def _missing_runtime_deps() -> list[str]:
+    return [name for name in ("telebot", "openai", "dotenv", "redis") if importlib.util.find_spec(name) is None]
+
+
+def _run_probe(code: str, cwd: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        BOT_TOKEN="1:abc",
+        OPENAI_API_KEY="x",
+        REDIS_HOST="127.0.0.1",
+        PYTHONPATH=str(ROOT),
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=cwd,
+        timeout=120,
+    )
+    if result.returncode != 0:
+        raise AssertionError(f"probe failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class ImportTimeParsingTests(unittest.TestCase):
+    def test_parses_self_and_cumulative_times(self):
+        output = "\n".join(
+            [
+                "import time: self [us] | cumulative | imported package",
+                "import time:       120 |        120 |     json.decoder",
+                "import time:       300 |        420 |   json",
+                "import time:      1000 |       1500 | bot",
+            ]
+        )
+        profile = parse_importtime(output, "bot")
+        self.assertEqual(profile.total_us, 1500)
+        self.assertEqual(profile.modules["json"], (300, 420))
+        self.assertEqual(profile.top_level, ["bot"])
+        self.assertEqual(profile.grouped()["json"], 420)
+
+    def test_phases_are_recorded(self):
+        before = len(phases())
+        with phase("unit"):
+            pass
+        self.assertEqual(len(phases()), before + 1)
+        self.assertIn("unit", phase_report())
+
+
+@unittest.skipIf(_missing_runtime_deps(), f"нет зависимостей бота: {_missing_runtime_deps()}")
+class BotImportBudgetTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.report = _run_probe(_PROBE, cls._tmp.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_heavy_modules_are_not_imported(self):
+        loaded = {name.split(".", 1)[0] for name in self.report["modules"]}
+        self.assertFalse(loaded & set(HEAVY_MODULES), f"загружены при импорте: {sorted(loaded & set(HEAVY_MODULES))}")
+
+    def test_import_does_not_create_tables(self):
+        self.assertFalse(os.path.exists(os.path.join(self._tmp.name, "users.db")))
+
+    def test_import_fits_budget(self):
+        self.assertLess(self.report["seconds"], STARTUP_BUDGET_SEC)
+
+
+@unittest.skipIf(_missing_runtime_deps(), f"нет зависимостей бота: {_missing_runtime_deps()}")
+class AppFactoryTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.report = _run_probe(_FACTORY_PROBE, cls._tmp.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmp.cleanup()
+
+    def test_import_has_no_side_effects(self):
+        self.assertEqual(self.report["handlers_after_import"], 0)
+        self.assertNotIn("redis-health", self.report["threads_after_import"])
+        self.assertNotIn("background-checker", self.report["threads_after_import"])
+
+    def test_factory_is_idempotent(self):
+        self.assertTrue(self.report["same"])
+        message = self.report["message"]
+        self.assertEqual(len(message), len(set(message)))
+        self.assertEqual(len(self.report["callback"]), len(set(self.report["callback"])))
+
+    def test_handler_order(self):
+        modules = [name.rsplit(".", 1)[0] for name in self.report["message"]]
+        order = [modules.index(module) for module in ("media", "handlers.web", "auto_post", "bot")]
+        self.assertEqual(order, sorted(order))
+        self.assertEqual(self.report["message"][-1], "bot.fallback")
+
+
+if __name__ == "__main__":
+    unittest.main()
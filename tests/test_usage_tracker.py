@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bot_env import load
+from db import Database
+from memory_redis import InMemoryRedis
+
+storage = load("storage")
+usage_tracker = load("usage_tracker")
+
+
+class UsageTrackerCase(unittest.TestCase):
+    """Счётчики в InMemoryRedis за ``SafeRedis`` (как настоящий Redis) и временная SQLite."""
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.database = Database(str(Path(self._tmp.name) / "usage.db"))
+        self.redis = InMemoryRedis()
+        self.r = storage.SafeRedis(self.redis)
+        patches = [
+            mock.patch.object(usage_tracker, "r", self.r),
+            mock.patch.object(usage_tracker, "database", self.database),
+            mock.patch.object(usage_tracker, "_SQLITE_READY", False),
+            # без миграции и фонового потока: тест сам вызывает сброс
+            mock.patch.object(usage_tracker.init_usage_tracking, "_initialized", True, create=True),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def tearDown(self):
+        self.database.close_all()
+        self._tmp.cleanup()
+
+    def sqlite_row(self, user_id):
+        return self.database.query_one(
+            "SELECT username, total_requests, text_requests, image_generations, doc_generations "
+            "FROM usage_stats WHERE user_id = ?",
+            (user_id,),
+        )
+
+
+class RecordAndFlushTests(UsageTrackerCase):
+    def test_counters_accumulate_in_hash(self):
+        usage_tracker.record_user_activity(1, category="text", display_name="@ann")
+        usage_tracker.record_user_activity(1, category="image")
+        usage_tracker.record_user_activity(1, category="document")
+
+        stats = usage_tracker.get_user_stats(1)
+        self.assertEqual(
+            (stats["username"], stats["total_requests"], stats["text_requests"],
+             stats["image_generations"], stats["doc_generations"]),
+            ("@ann", 3, 1, 1, 1),
+        )
+        self.assertGreater(stats["last_used_at"], 0)
+        self.assertEqual(self.redis.smembers("usage:dirty"), {"1"})
+
+    def test_flush_writes_totals_and_clears_dirty_set(self):
+        for _ in range(3):
+            usage_tracker.record_user_activity(1, display_name="@ann")
+        usage_tracker.record_user_activity(2, category="image", display_name="@bob")
+
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 2)
+        self.assertEqual(self.sqlite_row(1), ("@ann", 3, 3, 0, 0))
+        self.assertEqual(self.sqlite_row(2), ("@bob", 1, 0, 1, 0))
+        self.assertEqual(self.redis.smembers("usage:dirty"), set())
+        # без новых событий сбрасывать нечего
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 0)
+
+        # повторный сброс записывает итог из хэша, а не приращение
+        usage_tracker.record_user_activity(1)
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 1)
+        self.assertEqual(self.sqlite_row(1), ("@ann", 4, 4, 0, 0))
+
+    def test_failed_write_keeps_users_dirty(self):
+        usage_tracker.record_user_activity(1)
+        with mock.patch.object(usage_tracker, "_write_sqlite_records", return_value=False):
+            self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 0)
+        self.assertEqual(self.redis.smembers("usage:dirty"), {"1"})
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 1)
+
+
+class LeaderboardTests(UsageTrackerCase):
+    def test_ranking_per_category(self):
+        for user_id, texts, images in ((1, 5, 0), (2, 1, 3), (3, 2, 1)):
+            for _ in range(texts):
+                usage_tracker.record_user_activity(user_id, display_name=f"@u{user_id}")
+            for _ in range(images):
+                usage_tracker.record_user_activity(user_id, category="image")
+
+        top = usage_tracker.get_top_users(2)
+        self.assertEqual([(row[0], row[2]) for row in top], [(1, 5), (2, 4)])
+        self.assertEqual(self.redis.zrevrange("usage:top:image", 0, -1), ["2", "3"])
+        self.assertEqual(self.redis.zscore("usage:top:text", "1"), 5)
+
+        report = usage_tracker.format_usage_report(limit=3, category="image")
+        self.assertLess(report.index("@u2"), report.index("@u3"))
+        self.assertNotIn("@u1", report)
+
+    def test_leaderboards_built_once_from_hashes(self):
+        for user_id, total in ((1, 2), (2, 7)):
+            self.redis.hset(f"usage:stats:{user_id}", mapping={"total_requests": total, "doc_generations": total})
+            self.redis.sadd("usage:user_ids", user_id)
+
+        usage_tracker._ensure_leaderboards()
+        self.assertEqual(self.redis.zrevrange("usage:top:total", 0, -1, withscores=True), [("2", 7), ("1", 2)])
+        self.assertEqual(self.redis.zrevrange("usage:top:doc", 0, -1), ["2", "1"])
+        self.assertTrue(self.redis.get("usage:top:built"))
+
+        # маркер стоит: повторный вызов не пересчитывает рейтинги
+        self.redis.delete("usage:top:total")
+        usage_tracker._ensure_leaderboards()
+        self.assertEqual(self.redis.zrevrange("usage:top:total", 0, -1), [])
+
+    def test_empty_redis_is_rebuilt_from_sqlite(self):
+        usage_tracker._write_sqlite_records([
+            {"user_id": 10, "username": "@old", "total_requests": 40, "text_requests": 40},
+            {"user_id": 11, "username": "@new", "total_requests": 90, "image_generations": 90},
+        ])
+
+        top = usage_tracker.get_top_users(5)
+        self.assertEqual([(row[0], row[1], row[2]) for row in top], [(11, "@new", 90), (10, "@old", 40)])
+        self.assertEqual(self.redis.zrevrange("usage:top:image", 0, 0), ["11"])
+        self.assertEqual(usage_tracker.get_user_stats(10)["total_requests"], 40)
+
+
+class RedisDownAtStartTests(UsageTrackerCase):
+    """Redis недоступен с запуска: ``is_real`` ложно, но и ``in_outage`` ещё нет."""
+
+    def setUp(self):
+        super().setUp()
+        self.r = storage.SafeRedis(None, journal_limit=100)
+        patch = mock.patch.object(usage_tracker, "r", self.r)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_flush_adds_buffered_deltas_to_sqlite(self):
+        usage_tracker._write_sqlite_records([{"user_id": 1, "username": "@ann", "total_requests": 500, "text_requests": 500}])
+        usage_tracker.record_user_activity(1, category="image")
+        usage_tracker.record_user_activity(2, display_name="@bob")
+        self.assertFalse(self.r.in_outage)
+        journaled = self.r.journal_size
+
+        stats = usage_tracker.get_user_stats(1)
+        self.assertEqual(
+            (stats["total_requests"], stats["text_requests"], stats["image_generations"]), (501, 500, 1)
+        )
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 2)
+        self.assertEqual(self.sqlite_row(1), ("@ann", 501, 500, 1, 0))
+        self.assertEqual(self.sqlite_row(2), ("@bob", 1, 1, 0, 0))
+
+        # приращения сняты из буфера: ни двойного счёта, ни повторного сброса
+        self.assertIsNone(self.r.hget("usage:stats:1", "total_requests"))
+        self.assertIn("Всего запросов: 501", usage_tracker.format_user_stats(1))
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 0)
+        self.assertEqual(self.sqlite_row(1), ("@ann", 501, 500, 1, 0))
+        self.assertEqual([(row[0], row[2]) for row in usage_tracker.get_top_users(5)], [(1, 501), (2, 1)])
+        # снятие из буфера не попадает в журнал, который повторится в Redis
+        self.assertEqual(self.r.journal_size, journaled)
+
+    def test_failed_write_returns_deltas_to_buffer(self):
+        usage_tracker.record_user_activity(1, display_name="@ann")
+        with mock.patch.object(usage_tracker, "_write_sqlite_records", return_value=False):
+            self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 0)
+        usage_tracker.record_user_activity(1)
+
+        self.assertEqual(usage_tracker.flush_usage_to_sqlite(), 1)
+        self.assertEqual(self.sqlite_row(1), ("@ann", 2, 2, 0, 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import unittest
+
+from memory_redis import InMemoryRedis
+from vision_cache import KEY_PREFIX, VisionCache, format_stats, prompt_version
+
+
+class _BrokenRedis:
+    def get(self, name):
+        raise ConnectionError("redis down")
+
+    def setex(self, name, time_seconds, value):
+        raise ConnectionError("redis down")
+
+
+class VisionCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.redis = InMemoryRedis()
+        self.cache = VisionCache(self.redis, ttl=3600)
+        self.version = prompt_version("gpt-4o-mini", "auto", "Опиши фото")
+
+    def test_hit_after_store_with_ttl(self):
+        self.assertIsNone(self.cache.lookup("AQADxyz", self.version, size=200_000))
+        self.cache.store("AQADxyz", self.version, "На фото кот.", elapsed=2.0)
+
+        self.assertEqual(self.cache.lookup("AQADxyz", self.version, size=200_000), "На фото кот.")
+        key = f"{KEY_PREFIX}{self.version}:AQADxyz"
+        self.assertTrue(0 < self.redis.ttl(key) <= 3600)
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+        self.assertEqual(stats["saved_bytes"], 200_000)
+        self.assertEqual(stats["saved_sec"], 2.0)
+        self.assertIn("попаданий 1 из 2 (50%)", format_stats(stats))
+
+    def test_prompt_version_separates_answers(self):
+        self.cache.store("AQADxyz", self.version, "ответ")
+        other = prompt_version("gpt-4o-mini", "low", "Опиши фото")
+        self.assertNotEqual(other, self.version)
+        self.assertIsNone(self.cache.lookup("AQADxyz", other))
+        self.assertEqual(prompt_version("gpt-4o-mini", "auto", "Опиши фото"), self.version)
+
+    def test_disabled_and_broken_redis_only_count_misses(self):
+        disabled = VisionCache(self.redis, ttl=0)
+        disabled.store("AQADxyz", self.version, "ответ")
+        self.assertIsNone(disabled.lookup("AQADxyz", self.version))
+        self.assertEqual(self.redis.keys("*"), [])
+
+        broken = VisionCache(_BrokenRedis(), ttl=60)
+        broken.store("AQADxyz", self.version, "ответ")
+        self.assertIsNone(broken.lookup("AQADxyz", self.version))
+        stats = broken.stats()
+        self.assertEqual((stats["errors"], stats["misses"], stats["stores"]), (2, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
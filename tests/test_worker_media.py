@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import importlib.util
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from bot_env import load
+from db import Database
+from job_queue import SQLiteJobQueue
+
+_MISSING = [name for name in ("telebot", "openai", "dotenv", "redis", "requests") if importlib.util.find_spec(name) is None]
+worker_media = None if _MISSING else load("worker_media")
+
+
+class _DownQueue:
+    """Очередь Redis, пропавшего после запуска: каждая команда падает."""
+
+    name = "redis"
+
+    def __getattr__(self, command):
+        def call(*args, **kwargs):
+            raise ConnectionError("redis down")
+
+        return call
+
+
+@unittest.skipIf(_MISSING, "нет зависимостей бота")
+class EnqueueFallbackTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.database = Database(str(Path(self._tmp.name) / "jobs.db"))
+        self.sqlite_queue = SQLiteJobQueue(self.database, visibility_timeout=60)
+
+    def tearDown(self):
+        self.database.close_all()
+        self._tmp.cleanup()
+
+    def _enqueue(self, queues, job_id):
+        with mock.patch.object(worker_media, "_QUEUES", queues), mock.patch("builtins.print"):
+            return worker_media.enqueue_media_task(1, "pdf", "text", job_id=job_id)
+
+    def test_failed_redis_enqueue_goes_to_sqlite(self):
+        admission = self._enqueue([_DownQueue(), self.sqlite_queue], "j1")
+        self.assertTrue(admission.accepted)
+        self.assertEqual([job.job_id for job in self.sqlite_queue.claim("c", 5)], ["j1"])
+
+    def test_rejected_when_every_queue_fails(self):
+        admission = self._enqueue([_DownQueue()], "j2")
+        self.assertEqual((admission.accepted, admission.reason), (False, "stopped"))
+
+
+if __name__ == "__main__":
+    unittest.main()
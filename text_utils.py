@@ -4,7 +4,7 @@ import re
 
 from telebot import util as telebot_util
 
-__all__ = ["sanitize_model_output", "sanitize_for_telegram"]
+__all__ = ["map_links_ru", "sanitize_model_output", "sanitize_for_telegram"]
 
 
 _RESPONSE_REPR = re.compile(r"Response\w+Item\([^)]*\)")
@@ -34,3 +34,23 @@ def sanitize_for_telegram(text: object) -> str:
     cleaned = cleaned.replace("<reasoning>", "").replace("</reasoning>", "")
     cleaned = cleaned.replace("\x00", "")
     return telebot_util.escape(cleaned)
+
+
+# RU-only links mapping: ONLY for final user-visible text (do not touch SDK objects)
+def map_links_ru(text):
+    """
+    Безопасная фильтрация ссылок: оставляем российские домены,
+    заменяем зарубежные на доступные для РФ источники.
+    """
+    if not isinstance(text, str) or "http" not in text:
+        return text
+    rules = [
+        (r'https?://(?:www\.)?weather\.com[^\s)]+', 'https://yandex.ru/pogoda'),
+        (r'https?://(?:en\.)?wikipedia\.org[^\s)]+', 'https://ru.wikipedia.org'),
+        (r'https?://(?:www\.)?google\.com[^\s)]+',  'https://yandex.ru'),
+        (r'https?://(?:www\.)?bbc\.com[^\s)]+',     'https://tass.ru'),
+        (r'https?://(?:www\.)?cnn\.com[^\s)]+',     'https://ria.ru'),
+    ]
+    for pat, repl in rules:
+        text = re.sub(pat, repl, text, flags=re.IGNORECASE)
+    return text
@@ -0,0 +1,172 @@
+"""Пакетный перенос статистики использования между SQLite и Redis.
+
+``sqlite → redis`` читает ``usage_stats`` потоком (``fetchmany``) в порядке
+``user_id`` и пишет каждую пачку одним конвейером: хэш на пользователя,
+один ``SADD`` и по одному ``ZADD`` на рейтинг. Вместе с пачкой в Redis
+сохраняется курсор — последний перенесённый ``user_id``, поэтому после
+падения перенос продолжается с места остановки. Запись идемпотентна:
+повтор пачки даёт тот же результат.
+
+``redis → sqlite`` снимает полный снимок хэшей в ``usage_stats``.
+
+Запуск вручную: ``python -m usage_migration to-redis|to-sqlite [--batch-size N] [--restart]``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from db import database
+from storage import r
+from usage_tracker import (
+    _COUNTER_FIELDS,
+    _LEADERBOARD_MARKER_KEY,
+    _USAGE_INIT_MARKER_KEY,
+    _USAGE_USER_SET_KEY,
+    LEADERBOARD_CATEGORIES,
+    _ensure_sqlite_ready,
+    _leaderboard_key,
+    _load_user_records,
+    _record_from_row,
+    _user_key,
+    _write_sqlite_records,
+)
+
+MIGRATION_CURSOR_KEY = "usage:migration:cursor"
+DEFAULT_BATCH_SIZE = 1000
+
+
+@dataclass
+class MigrationReport:
+    direction: str
+    rows: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    resumed_from: Optional[int] = None
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        resumed = f", продолжено после user_id={self.resumed_from}" if self.resumed_from is not None else ""
+        return (
+            f"{self.direction}: {self.rows} строк, {self.batches} пачек за {self.seconds:.2f} с "
+            f"({self.rows_per_sec:,.0f} строк/с){resumed}"
+        )
+
+
+def _queue_batch(pipe, records: List[Dict[str, int | str]]) -> None:
+    """Поставить в конвейер пачку записей: по хэшу на пользователя и общие SADD/ZADD."""
+
+    for data in records:
+        pipe.hset(
+            _user_key(int(data["user_id"])),
+            mapping={
+                "username": str(data.get("username") or ""),
+                **{field: int(data.get(field, 0)) for field in _COUNTER_FIELDS},
+                "last_used_at": int(data.get("last_used_at", 0)),
+            },
+        )
+    pipe.sadd(_USAGE_USER_SET_KEY, *[int(data["user_id"]) for data in records])
+    for category, field in LEADERBOARD_CATEGORIES.items():
+        pipe.zadd(
+            _leaderboard_key(category),
+            {str(data["user_id"]): int(data.get(field, 0)) for data in records},
+        )
+
+
+def migrate_sqlite_to_redis(*, batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False) -> MigrationReport:
+    """Перенести ``usage_stats`` в Redis пачками с сохранением курсора."""
+
+    report = MigrationReport("sqlite → redis")
+    started = time.perf_counter()
+    if restart:
+        r.delete(MIGRATION_CURSOR_KEY)
+
+    cursor_raw = r.get(MIGRATION_CURSOR_KEY)
+    last_id = int(cursor_raw) if cursor_raw is not None else None
+    report.resumed_from = last_id
+
+    has_table = database.query_one("SELECT name FROM sqlite_master WHERE type='table' AND name='usage_stats'")
+    if has_table:
+        rows_cursor = database.execute(
+            """
+            SELECT user_id, username, total_requests, text_requests,
+                   image_generations, doc_generations, last_used_at
+            FROM usage_stats
+            WHERE user_id > ?
+            ORDER BY user_id
+            """,
+            (last_id if last_id is not None else -(2**63),),
+        )
+        while True:
+            rows = rows_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            records = [_record_from_row(row) for row in rows]
+            pipe = r.pipeline()
+            _queue_batch(pipe, records)
+            # Курсор — последняя команда пачки: при сбое пачка просто повторится
+            pipe.set(MIGRATION_CURSOR_KEY, str(records[-1]["user_id"]))
+            pipe.execute()
+            report.rows += len(records)
+            report.batches += 1
+
+    pipe = r.pipeline()
+    pipe.set(
+        _USAGE_INIT_MARKER_KEY,
+        json.dumps({"migrated": bool(report.rows or last_id is not None), "ts": int(time.time())}),
+    )
+    # Рейтинги заполнены вместе с хэшами
+    pipe.set(_LEADERBOARD_MARKER_KEY, str(int(time.time())))
+    pipe.delete(MIGRATION_CURSOR_KEY)
+    pipe.execute()
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def snapshot_redis_to_sqlite(*, batch_size: int = DEFAULT_BATCH_SIZE) -> MigrationReport:
+    """Записать в ``usage_stats`` текущие значения всех пользователей из Redis."""
+
+    report = MigrationReport("redis → sqlite")
+    started = time.perf_counter()
+    _ensure_sqlite_ready()
+    user_ids = sorted(int(member) for member in (r.smembers(_USAGE_USER_SET_KEY) or ()))
+    for offset in range(0, len(user_ids), batch_size):
+        records = _load_user_records(user_ids[offset:offset + batch_size])
+        if not _write_sqlite_records(records):
+            raise RuntimeError("не удалось записать пачку в usage_stats")
+        report.rows += len(records)
+        report.batches += 1
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("direction", choices=("to-redis", "to-sqlite"))
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="начать перенос в Redis заново, игнорируя курсор")
+    args = parser.parse_args()
+
+    if args.direction == "to-redis":
+        report = migrate_sqlite_to_redis(batch_size=args.batch_size, restart=args.restart)
+    else:
+        report = snapshot_redis_to_sqlite(batch_size=args.batch_size)
+    print(report)
+
+
+__all__ = [
+    "MIGRATION_CURSOR_KEY",
+    "MigrationReport",
+    "migrate_sqlite_to_redis",
+    "snapshot_redis_to_sqlite",
+]
+
+
+if __name__ == "__main__":
+    main()
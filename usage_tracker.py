@@ -2,35 +2,53 @@
 from __future__ import annotations
 
 import html
-import json
-import sqlite3
+import atexit
+import threading
 import time
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
-from storage import DB_PATH, r
+from db import database
+from settings import USAGE_FLUSH_INTERVAL
+from storage import r
 
-_USAGE_USER_KEY_PREFIX = "usage:user:"
+_USAGE_USER_KEY_PREFIX = "usage:stats:"
 _USAGE_USER_SET_KEY = "usage:user_ids"
-_USAGE_INIT_MARKER_KEY = "usage:initialized"
+_USAGE_DIRTY_SET_KEY = "usage:dirty"
+_USAGE_INIT_MARKER_KEY = "usage:initialized:v2"
+_LEADERBOARD_MARKER_KEY = "usage:top:built"
+_LEADERBOARD_KEY_PREFIX = "usage:top:"
+_FLUSH_BATCH_SIZE = 500
+
+_COUNTER_FIELDS = ("total_requests", "text_requests", "image_generations", "doc_generations")
+# Рейтинг по каждой категории хранится в отдельном sorted set
+LEADERBOARD_CATEGORIES = {
+    "total": "total_requests",
+    "text": "text_requests",
+    "image": "image_generations",
+    "doc": "doc_generations",
+}
 
 _SQLITE_READY = False
+_flusher_lock = threading.Lock()
+_flusher_started = False
 
 
 def _user_key(user_id: int) -> str:
     return f"{_USAGE_USER_KEY_PREFIX}{user_id}"
 
 
+def _leaderboard_key(category: str) -> str:
+    return f"{_LEADERBOARD_KEY_PREFIX}{category}"
+
+
 def _ensure_sqlite_ready() -> None:
     global _SQLITE_READY
     if _SQLITE_READY:
         return
 
-    conn: sqlite3.Connection | None = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
+        database.execute(
             """
             CREATE TABLE IF NOT EXISTS usage_stats (
                 user_id INTEGER PRIMARY KEY,
@@ -43,13 +61,9 @@ def _ensure_sqlite_ready() -> None:
             )
             """
         )
-        conn.commit()
         _SQLITE_READY = True
     except Exception:
         pass
-    finally:
-        if conn is not None:
-            conn.close()
 
 
 def init_usage_tracking() -> None:
@@ -65,55 +79,53 @@ def init_usage_tracking() -> None:
     except Exception:
         pass
 
+    start_usage_flusher()
+
     try:
         r.ping()
     except Exception:  # pragma: no cover - Redis недоступен, используем in-memory
         return
+    if not r.is_real:
+        # Переносим только в настоящий Redis: иначе копия в памяти переполнит журнал сбоя,
+        # а маркер завершения не доживёт до рестарта. Рейтинги читаются из SQLite.
+        return
 
     if r.get(_USAGE_INIT_MARKER_KEY):
+        _ensure_leaderboards()
         return
 
-    migrated = False
-    conn: sqlite3.Connection | None = None
+    # SQLite до перехода на хэши обновлялся синхронно, поэтому он и есть источник истины.
+    # Импорт здесь: usage_migration сам импортирует этот модуль.
+    from usage_migration import migrate_sqlite_to_redis
+
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='usage_stats'"
-        )
-        if cursor.fetchone():
-            cursor.execute(
-                """
-                SELECT user_id, username, total_requests, text_requests,
-                       image_generations, doc_generations, last_used_at
-                FROM usage_stats
-                """
-            )
-            rows = cursor.fetchall()
-            for row in rows:
-                user_id = int(row[0])
-                data = {
-                    "user_id": user_id,
-                    "username": row[1] or "",
-                    "total_requests": int(row[2] or 0),
-                    "text_requests": int(row[3] or 0),
-                    "image_generations": int(row[4] or 0),
-                    "doc_generations": int(row[5] or 0),
-                    "last_used_at": int(row[6] or 0),
-                }
-                r.set(_user_key(user_id), json.dumps(data, ensure_ascii=False))
-                r.sadd(_USAGE_USER_SET_KEY, user_id)
-            migrated = bool(rows)
-    except Exception:  # pragma: no cover - ошибки миграции не критичны
-        pass
-    finally:
-        if conn is not None:
-            conn.close()
+        report = migrate_sqlite_to_redis()
+        if report.rows:
+            print(f"[USAGE] {report}")
+    except Exception as exc:  # pragma: no cover - ошибки миграции не критичны, курсор сохранён
+        print(f"[USAGE] migration interrupted: {exc}")
 
-    r.set(
-        _USAGE_INIT_MARKER_KEY,
-        json.dumps({"migrated": migrated, "ts": int(time.time())}),
-    )
+
+def _ensure_leaderboards() -> None:
+    """Один раз построить рейтинги по уже накопленным хэшам пользователей."""
+
+    if r.get(_LEADERBOARD_MARKER_KEY):
+        return
+
+    try:
+        ids = [int(raw_id) for raw_id in r.smembers(_USAGE_USER_SET_KEY)]
+    except (TypeError, ValueError):
+        ids = []
+    for offset in range(0, len(ids), _FLUSH_BATCH_SIZE):
+        records = _load_user_records(ids[offset:offset + _FLUSH_BATCH_SIZE])
+        pipe = r.pipeline()
+        for category, field in LEADERBOARD_CATEGORIES.items():
+            scores = {record["user_id"]: int(record.get(field, 0)) for record in records}
+            if scores:
+                pipe.zadd(_leaderboard_key(category), scores)
+        pipe.execute()
+
+    r.set(_LEADERBOARD_MARKER_KEY, str(int(time.time())))
 
 
 def compose_display_name(
@@ -139,76 +151,243 @@ def _resolve_category_increments(category: str) -> Tuple[int, int, int]:
     return 1, 0, 0
 
 
-def _load_user_record(user_id: int) -> Optional[Dict[str, int | str]]:
-    raw = r.get(_user_key(user_id))
-    if not raw:
+def _record_from_row(row) -> Dict[str, int | str]:
+    return {
+        "user_id": int(row[0]),
+        "username": row[1] or "",
+        "total_requests": int(row[2] or 0),
+        "text_requests": int(row[3] or 0),
+        "image_generations": int(row[4] or 0),
+        "doc_generations": int(row[5] or 0),
+        "last_used_at": int(row[6] or 0),
+    }
+
+
+def _record_from_hash(user_id: int, data: Optional[Dict[str, str]]) -> Optional[Dict[str, int | str]]:
+    if not data:
         return None
     try:
-        data = json.loads(raw)
-    except (TypeError, json.JSONDecodeError):
+        return {
+            "user_id": int(user_id),
+            "username": str(data.get("username") or ""),
+            "total_requests": int(data.get("total_requests") or 0),
+            "text_requests": int(data.get("text_requests") or 0),
+            "image_generations": int(data.get("image_generations") or 0),
+            "doc_generations": int(data.get("doc_generations") or 0),
+            "last_used_at": int(data.get("last_used_at") or 0),
+        }
+    except (TypeError, ValueError):
         return None
-    if not isinstance(data, dict):
-        return None
-    return {
-        "user_id": int(data.get("user_id") or user_id),
-        "username": str(data.get("username") or ""),
-        "total_requests": int(data.get("total_requests") or 0),
-        "text_requests": int(data.get("text_requests") or 0),
-        "image_generations": int(data.get("image_generations") or 0),
-        "doc_generations": int(data.get("doc_generations") or 0),
-        "last_used_at": int(data.get("last_used_at") or 0),
-    }
 
 
-def _save_user_record(data: Dict[str, int | str]) -> None:
+def _load_user_record(user_id: int) -> Optional[Dict[str, int | str]]:
+    return _record_from_hash(user_id, r.hgetall(_user_key(user_id)))
+
+
+def _load_user_records(user_ids: List[int]) -> List[Dict[str, int | str]]:
+    """Загрузить записи нескольких пользователей одним пакетом команд."""
+
+    if not user_ids:
+        return []
+    pipe = r.pipeline()
+    for user_id in user_ids:
+        pipe.hgetall(_user_key(user_id))
+    records = []
+    for user_id, data in zip(user_ids, pipe.execute()):
+        record = _record_from_hash(user_id, data)
+        if record:
+            records.append(record)
+    return records
+
+
+def _queue_save_user_record(pipe, data: Dict[str, int | str]) -> None:
     user_id = int(data["user_id"])
-    r.set(_user_key(user_id), json.dumps(data, ensure_ascii=False))
-    r.sadd(_USAGE_USER_SET_KEY, user_id)
+    pipe.hset(
+        _user_key(user_id),
+        mapping={
+            "username": str(data.get("username") or ""),
+            **{field: int(data.get(field, 0)) for field in _COUNTER_FIELDS},
+            "last_used_at": int(data.get("last_used_at", 0)),
+        },
+    )
+    pipe.sadd(_USAGE_USER_SET_KEY, user_id)
+    for category, field in LEADERBOARD_CATEGORIES.items():
+        pipe.zadd(_leaderboard_key(category), {user_id: int(data.get(field, 0))})
 
 
-def _write_sqlite_record(data: Dict[str, int | str]) -> None:
-    if not data:
-        return
+def _save_user_record(data: Dict[str, int | str]) -> None:
+    pipe = r.pipeline()
+    _queue_save_user_record(pipe, data)
+    pipe.execute()
+
+
+_SQLITE_UPSERT = """
+    INSERT INTO usage_stats (
+        user_id, username, total_requests, text_requests,
+        image_generations, doc_generations, last_used_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+"""
+# Итоги из Redis заменяют строку целиком
+_SQLITE_REPLACE = _SQLITE_UPSERT + """
+        username=excluded.username,
+        total_requests=excluded.total_requests,
+        text_requests=excluded.text_requests,
+        image_generations=excluded.image_generations,
+        doc_generations=excluded.doc_generations,
+        last_used_at=excluded.last_used_at
+"""
+# Приращения из локального буфера прибавляются к итогам
+_SQLITE_ADD = _SQLITE_UPSERT + """
+        username=COALESCE(NULLIF(excluded.username, ''), usage_stats.username),
+        total_requests=usage_stats.total_requests + excluded.total_requests,
+        text_requests=usage_stats.text_requests + excluded.text_requests,
+        image_generations=usage_stats.image_generations + excluded.image_generations,
+        doc_generations=usage_stats.doc_generations + excluded.doc_generations,
+        last_used_at=MAX(usage_stats.last_used_at, excluded.last_used_at)
+"""
+
+
+def _write_sqlite_records(records: List[Dict[str, int | str]], *, additive: bool = False) -> bool:
+    """Записать пачку записей в ``usage_stats`` одной транзакцией.
+
+    ``additive`` — записи содержат приращения, а не итоги.
+    """
+
+    if not records:
+        return True
 
     try:
         _ensure_sqlite_ready()
+        with database.transaction():
+            database.executemany(
+                _SQLITE_ADD if additive else _SQLITE_REPLACE,
+                [
+                    (
+                        int(data.get("user_id", 0)),
+                        str(data.get("username") or ""),
+                        int(data.get("total_requests", 0)),
+                        int(data.get("text_requests", 0)),
+                        int(data.get("image_generations", 0)),
+                        int(data.get("doc_generations", 0)),
+                        int(data.get("last_used_at", 0)),
+                    )
+                    for data in records
+                ],
+            )
     except Exception:
-        return
+        return False
+    return True
 
-    conn: sqlite3.Connection | None = None
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            INSERT INTO usage_stats (
-                user_id, username, total_requests, text_requests,
-                image_generations, doc_generations, last_used_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                username=excluded.username,
-                total_requests=excluded.total_requests,
-                text_requests=excluded.text_requests,
-                image_generations=excluded.image_generations,
-                doc_generations=excluded.doc_generations,
-                last_used_at=excluded.last_used_at
-            """,
-            (
-                int(data.get("user_id", 0)),
-                str(data.get("username") or ""),
-                int(data.get("total_requests", 0)),
-                int(data.get("text_requests", 0)),
-                int(data.get("image_generations", 0)),
-                int(data.get("doc_generations", 0)),
-                int(data.get("last_used_at", 0)),
-            ),
-        )
-        conn.commit()
-    except Exception:
-        pass
-    finally:
-        if conn is not None:
-            conn.close()
+
+def _take_local_deltas(limit: int) -> Optional[Tuple[int, List[Dict[str, int | str]]]]:
+    """Забрать из локального буфера SafeRedis приращения грязных пользователей.
+
+    ``None`` — Redis доступен. Иначе число снятых отметок и записи; хэши
+    удаляются из буфера под его блокировкой, поэтому параллельные события
+    не теряются, а в журнал сбоя это не попадает.
+    """
+
+    with r.local() as memory:
+        if memory is None:
+            return None
+        popped = memory.spop(_USAGE_DIRTY_SET_KEY, limit) or []
+        records = []
+        for raw_id in popped:
+            try:
+                user_id = int(raw_id)
+            except (TypeError, ValueError):
+                continue
+            record = _record_from_hash(user_id, memory.hgetall(_user_key(user_id)))
+            memory.delete(_user_key(user_id))
+            if record:
+                records.append(record)
+        return len(popped), records
+
+
+def _restore_local_deltas(records: List[Dict[str, int | str]]) -> None:
+    """Вернуть в буфер приращения, которые не удалось записать в SQLite."""
+
+    with r.local() as memory:
+        if memory is None:
+            # Redis вернулся: журнал уже повторил эти приращения в нём
+            return
+        for record in records:
+            key = _user_key(int(record["user_id"]))
+            for field in _COUNTER_FIELDS:
+                if record.get(field):
+                    memory.hincrby(key, field, int(record[field]))
+            last_used_at = max(int(memory.hget(key, "last_used_at") or 0), int(record.get("last_used_at", 0)))
+            fields: Dict[str, int | str] = {"last_used_at": last_used_at}
+            if record.get("username") and not memory.hget(key, "username"):
+                fields["username"] = str(record["username"])
+            memory.hset(key, mapping=fields)
+            memory.sadd(_USAGE_DIRTY_SET_KEY, int(record["user_id"]))
+
+
+def flush_usage_to_sqlite() -> int:
+    """Перенести изменившиеся с прошлого сброса счётчики из Redis в SQLite.
+
+    Возвращает количество записанных пользователей.
+    """
+
+    flushed = 0
+    # Без Redis (сбой или недоступен с запуска) в локальном буфере лишь приращения
+    # с начала сбоя: они прибавляются к итогам в SQLite и снимаются из буфера.
+    while True:
+        taken = _take_local_deltas(_FLUSH_BATCH_SIZE)
+        if taken is None:
+            break
+        popped, records = taken
+        if not popped:
+            return flushed
+        if not _write_sqlite_records(records, additive=True):
+            _restore_local_deltas(records)
+            return flushed
+        flushed += len(records)
+    while True:
+        try:
+            popped = r.spop(_USAGE_DIRTY_SET_KEY, _FLUSH_BATCH_SIZE) or []
+        except Exception:  # pragma: no cover - Redis недоступен
+            return flushed
+        user_ids = []
+        for raw_id in popped:
+            try:
+                user_ids.append(int(raw_id))
+            except (TypeError, ValueError):
+                continue
+        if not user_ids:
+            return flushed
+
+        records = _load_user_records(user_ids)
+        if not _write_sqlite_records(records):
+            # Вернём пользователей в очередь, чтобы не потерять изменения
+            r.sadd(_USAGE_DIRTY_SET_KEY, *user_ids)
+            return flushed
+        flushed += len(records)
+
+
+def _usage_flusher_loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            flush_usage_to_sqlite()
+        except Exception:  # pragma: no cover - фоновая задача не должна падать
+            pass
+
+
+def start_usage_flusher(interval: float | None = None) -> None:
+    """Запустить фоновый сброс счётчиков в SQLite (повторный вызов ничего не делает)."""
+
+    global _flusher_started
+    with _flusher_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+
+    period = max(1.0, float(interval or USAGE_FLUSH_INTERVAL))
+    threading.Thread(target=_usage_flusher_loop, args=(period,), daemon=True).start()
+    atexit.register(flush_usage_to_sqlite)
 
 
 def _load_user_record_sqlite(user_id: int) -> Optional[Dict[str, int | str]]:
@@ -217,11 +396,8 @@ def _load_user_record_sqlite(user_id: int) -> Optional[Dict[str, int | str]]:
     except Exception:
         return None
 
-    conn: sqlite3.Connection | None = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
+        row = database.query_one(
             """
             SELECT user_id, username, total_requests, text_requests,
                    image_generations, doc_generations, last_used_at
@@ -230,25 +406,13 @@ def _load_user_record_sqlite(user_id: int) -> Optional[Dict[str, int | str]]:
             """,
             (int(user_id),),
         )
-        row = cursor.fetchone()
     except Exception:
         return None
-    finally:
-        if conn is not None:
-            conn.close()
 
     if not row:
         return None
 
-    return {
-        "user_id": int(row[0]),
-        "username": row[1] or "",
-        "total_requests": int(row[2] or 0),
-        "text_requests": int(row[3] or 0),
-        "image_generations": int(row[4] or 0),
-        "doc_generations": int(row[5] or 0),
-        "last_used_at": int(row[6] or 0),
-    }
+    return _record_from_row(row)
 
 
 def _load_all_sqlite() -> List[Dict[str, int | str]]:
@@ -257,11 +421,8 @@ def _load_all_sqlite() -> List[Dict[str, int | str]]:
     except Exception:
         return []
 
-    conn: sqlite3.Connection | None = None
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute(
+        rows = database.query_all(
             """
             SELECT user_id, username, total_requests, text_requests,
                    image_generations, doc_generations, last_used_at
@@ -269,27 +430,10 @@ def _load_all_sqlite() -> List[Dict[str, int | str]]:
             ORDER BY total_requests DESC, last_used_at DESC
             """
         )
-        rows = cursor.fetchall()
     except Exception:
         return []
-    finally:
-        if conn is not None:
-            conn.close()
-
-    result: List[Dict[str, int | str]] = []
-    for row in rows:
-        result.append(
-            {
-                "user_id": int(row[0]),
-                "username": row[1] or "",
-                "total_requests": int(row[2] or 0),
-                "text_requests": int(row[3] or 0),
-                "image_generations": int(row[4] or 0),
-                "doc_generations": int(row[5] or 0),
-                "last_used_at": int(row[6] or 0),
-            }
-        )
-    return result
+
+    return [_record_from_row(row) for row in rows]
 
 
 def record_user_activity(
@@ -305,30 +449,41 @@ def record_user_activity(
 
     init_usage_tracking()
 
-    now = int(time.time())
     text_inc, image_inc, doc_inc = _resolve_category_increments(category)
-    data = _load_user_record(user_id) or {
-        "user_id": int(user_id),
-        "username": "",
-        "total_requests": 0,
-        "text_requests": 0,
-        "image_generations": 0,
-        "doc_generations": 0,
-        "last_used_at": 0,
-    }
-
+    key = _user_key(user_id)
+
+    # Все изменения — одним пакетом: HINCRBY атомарен, поэтому параллельные
+    # обновления одного пользователя не теряют приращения.
+    pipe = r.pipeline()
+    pipe.hincrby(key, "total_requests", 1)
+    pipe.zincrby(_leaderboard_key("total"), 1, int(user_id))
+    for board, increment in zip(("text", "image", "doc"), (text_inc, image_inc, doc_inc)):
+        if increment:
+            pipe.hincrby(key, LEADERBOARD_CATEGORIES[board], increment)
+            pipe.zincrby(_leaderboard_key(board), increment, int(user_id))
+    fields: Dict[str, int | str] = {"last_used_at": int(time.time())}
     username = (display_name or "").strip()
     if username:
-        data["username"] = username
+        fields["username"] = username
+    pipe.hset(key, mapping=fields)
+    pipe.sadd(_USAGE_USER_SET_KEY, int(user_id))
+    pipe.sadd(_USAGE_DIRTY_SET_KEY, int(user_id))
+    pipe.execute()
+
 
-    data["total_requests"] = int(data.get("total_requests", 0)) + 1
-    data["text_requests"] = int(data.get("text_requests", 0)) + text_inc
-    data["image_generations"] = int(data.get("image_generations", 0)) + image_inc
-    data["doc_generations"] = int(data.get("doc_generations", 0)) + doc_inc
-    data["last_used_at"] = now
+def _top_records(category: str, limit: int) -> List[Dict[str, int | str]]:
+    """Вернуть записи лидеров категории: ZREVRANGE и один пакет HGETALL."""
 
-    _save_user_record(data)
-    _write_sqlite_record(data)
+    if limit <= 0:
+        return []
+    raw_ids = r.zrevrange(_leaderboard_key(category), 0, limit - 1)
+    ids: List[int] = []
+    for raw_id in raw_ids:
+        try:
+            ids.append(int(raw_id))
+        except (TypeError, ValueError):
+            continue
+    return _load_user_records(ids)
 
 
 def get_top_users(limit: int = 10) -> List[Tuple[int, Optional[str], int, int, int, int, int]]:
@@ -337,32 +492,24 @@ def get_top_users(limit: int = 10) -> List[Tuple[int, Optional[str], int, int, i
     init_usage_tracking()
 
     try:
-        user_ids = r.smembers(_USAGE_USER_SET_KEY)
+        # без Redis в памяти лишь приращения с начала сбоя, итоги — в SQLite
+        records = _top_records("total", limit) if r.is_real else []
     except Exception:  # pragma: no cover - при сбое Redis вернём пустой список
         return []
 
-    rows: List[Tuple[int, Optional[str], int, int, int, int, int]] = []
-    for raw_id in user_ids:
-        try:
-            user_id = int(raw_id)
-        except (TypeError, ValueError):
-            continue
-        record = _load_user_record(user_id)
-        if not record:
-            continue
-        rows.append(
-            (
-                user_id,
-                record.get("username") or None,
-                int(record.get("total_requests", 0)),
-                int(record.get("text_requests", 0)),
-                int(record.get("image_generations", 0)),
-                int(record.get("doc_generations", 0)),
-                int(record.get("last_used_at", 0)),
-            )
+    rows: List[Tuple[int, Optional[str], int, int, int, int, int]] = [
+        (
+            int(record["user_id"]),
+            record.get("username") or None,
+            int(record.get("total_requests", 0)),
+            int(record.get("text_requests", 0)),
+            int(record.get("image_generations", 0)),
+            int(record.get("doc_generations", 0)),
+            int(record.get("last_used_at", 0)),
         )
+        for record in records
+    ]
 
-    rows.sort(key=lambda item: (item[2], item[6]), reverse=True)
     if rows:
         return rows[:limit]
 
@@ -370,8 +517,11 @@ def get_top_users(limit: int = 10) -> List[Tuple[int, Optional[str], int, int, i
     if not fallback_records:
         return []
 
-    for record in fallback_records:
-        _save_user_record(record)
+    if r.is_real:
+        pipe = r.pipeline()
+        for record in fallback_records:
+            _queue_save_user_record(pipe, record)
+        pipe.execute()
 
     formatted = [
         (
@@ -388,9 +538,28 @@ def get_top_users(limit: int = 10) -> List[Tuple[int, Optional[str], int, int, i
     return formatted[:limit]
 
 
+def _with_pending(
+    base: Optional[Dict[str, int | str]], pending: Optional[Dict[str, int | str]]
+) -> Optional[Dict[str, int | str]]:
+    """Итог из SQLite плюс приращения, накопленные в памяти, пока Redis недоступен."""
+
+    if not base or not pending:
+        return base or pending
+    merged = dict(base)
+    for field in _COUNTER_FIELDS:
+        merged[field] = int(base.get(field, 0)) + int(pending.get(field, 0))
+    merged["username"] = pending.get("username") or base.get("username") or ""
+    merged["last_used_at"] = max(int(base.get("last_used_at", 0)), int(pending.get("last_used_at", 0)))
+    return merged
+
+
 def get_user_stats(user_id: int) -> Optional[Dict[str, int | str]]:
     init_usage_tracking()
     record = _load_user_record(user_id)
+    if not r.is_real:
+        # Копию из SQLite в память не кладём: запись попала бы в журнал сбоя
+        # и затёрла бы итоги в Redis после переподключения.
+        return _with_pending(_load_user_record_sqlite(user_id), record)
     if record:
         return record
 
@@ -433,16 +602,13 @@ def format_user_stats(user_id: int, display_hint: Optional[str] = None) -> str:
     return "\n".join(lines)
 
 
-def format_usage_report(limit: int = 20) -> str:
+def format_usage_report(limit: int = 20, category: str = "total") -> str:
     """Сводка по активности пользователей."""
+    if category not in LEADERBOARD_CATEGORIES:
+        category = "total"
     try:
-        ids = list(map(int, r.smembers(_USAGE_USER_SET_KEY)))
-        records = []
-        for uid in ids:
-            data = _load_user_record(uid)
-            if data:
-                records.append(data)
-        records.sort(key=lambda d: d.get("total_requests", 0), reverse=True)
+        init_usage_tracking()
+        records = _top_records(category, limit)
     except Exception as e:
         return f"⚠️ Ошибка чтения статистики: {e}"
 
@@ -450,7 +616,7 @@ def format_usage_report(limit: int = 20) -> str:
         return "📊 Пока нет данных об активности пользователей."
 
     lines = ["<b>📊 Топ активных пользователей</b>\n"]
-    for d in records[:limit]:
+    for d in records:
         lines.append(
             f"<b>{d.get('username') or '—'}</b> "
             f"(ID: <code>{d['user_id']}</code>)\n"
@@ -463,11 +629,14 @@ def format_usage_report(limit: int = 20) -> str:
 
 
 __all__ = [
+    "LEADERBOARD_CATEGORIES",
     "compose_display_name",
+    "flush_usage_to_sqlite",
     "format_usage_report",
     "format_user_stats",
     "get_top_users",
     "get_user_stats",
     "init_usage_tracking",
     "record_user_activity",
+    "start_usage_flusher",
 ]
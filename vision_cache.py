@@ -0,0 +1,112 @@
+"""Кэш ответов vision-модели по ``file_unique_id`` фото Telegram.
+
+Одно и то же фото пересылают снова и снова — в личку и в группах, — и каждая
+копия прежде скачивалась и уходила модели заново. ``file_unique_id`` у копий
+одинаковый (он не зависит ни от чата, ни от бота), поэтому ответ хранится в
+Redis под ключом ``vision:<версия>:<file_unique_id>`` со сроком жизни. Версия —
+хэш модели, ``detail`` и текста запроса (:func:`prompt_version`): смена любого
+из них даёт новые ключи, а старые истекают сами.
+
+Попадания, промахи, сэкономленные байты и время анализа копятся в процессе
+и показываются в ``/media_stats``.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional
+
+from result_cache import result_key
+
+KEY_PREFIX = "vision:"
+# Ответ модели длиннее сообщения Telegram всё равно не поместится
+_MAX_TEXT = 4096
+
+
+def prompt_version(model: str, detail: str, prompt: str) -> str:
+    """Короткая версия запроса: входит в ключ, смена модели или текста сбрасывает кэш."""
+
+    return result_key("vision", f"{model}:{detail}", prompt)[:12]
+
+
+class VisionCache:
+    """Ответы модели по ``file_unique_id`` в Redis (``get``/``setex``) с учётом попаданий."""
+
+    def __init__(self, redis, *, ttl: int) -> None:
+        self._redis = redis
+        # 0 — кэш выключен, но промахи всё равно считаются
+        self.ttl = int(ttl)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "errors": 0,
+            "saved_bytes": 0,
+            "analyses": 0,
+            "analysis_sec": 0.0,
+        }
+
+    @staticmethod
+    def _key(file_unique_id: str, version: str) -> str:
+        return f"{KEY_PREFIX}{version}:{file_unique_id}"
+
+    def lookup(self, file_unique_id: str, version: str, *, size: int = 0) -> Optional[str]:
+        """Сохранённый ответ или ``None``; ``size`` — байты, которые не придётся скачивать."""
+
+        text = None
+        if self.ttl > 0 and file_unique_id:
+            try:
+                text = self._redis.get(self._key(file_unique_id, version))
+            except Exception as exc:  # noqa: BLE001 - без кэша фото просто проанализируется заново
+                self._count("errors")
+                print(f"[MEDIA] vision cache lookup failed: {exc!r}")
+        with self._lock:
+            if text is None:
+                self._stats["misses"] += 1
+            else:
+                self._stats["hits"] += 1
+                self._stats["saved_bytes"] += size
+        return text
+
+    def store(self, file_unique_id: str, version: str, text: str, *, elapsed: float = 0.0) -> None:
+        """Запомнить ответ; ``elapsed`` — сколько занял анализ (оценка сэкономленного времени)."""
+
+        with self._lock:
+            self._stats["analyses"] += 1
+            self._stats["analysis_sec"] += elapsed
+        if self.ttl <= 0 or not file_unique_id or not text:
+            return
+        try:
+            self._redis.setex(self._key(file_unique_id, version), self.ttl, text[:_MAX_TEXT])
+        except Exception as exc:  # noqa: BLE001
+            self._count("errors")
+            print(f"[MEDIA] vision cache store failed: {exc!r}")
+            return
+        self._count("stores")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        # каждое попадание сэкономило примерно средний анализ
+        average = stats["analysis_sec"] / stats["analyses"] if stats["analyses"] else 0.0
+        stats["saved_sec"] = stats["hits"] * average
+        return stats
+
+
+def format_stats(stats: Dict[str, Any]) -> str:
+    """Строка для ``/media_stats``."""
+
+    return (
+        f"Кэш анализа фото: попаданий {stats['hits']:.0f} из {stats['hits'] + stats['misses']:.0f} "
+        f"({stats['hit_rate']:.0%}), не скачано {stats['saved_bytes'] / 2**20:.1f} МБ, "
+        f"сэкономлено ≈{stats['saved_sec']:.0f} с анализа, ошибок {stats['errors']:.0f}"
+    )
+
+
+__all__ = ["KEY_PREFIX", "VisionCache", "format_stats", "prompt_version"]
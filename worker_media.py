@@ -1,80 +1,528 @@
-"""Background worker for generating media files without blocking the bot."""
+"""Background workers for generating media files without blocking the bot.
+
+The bot only puts jobs into a persistent :mod:`job_queue` (Redis Streams, or
+SQLite when Redis is unavailable), so documents promised to users survive a
+restart. A consumer claims them into :class:`media_engine.MediaEngine`: a
+per-chat round-robin queue feeding a pool of ``MEDIA_WORKERS`` processes. The
+consumer runs inside the bot (``MEDIA_INLINE_WORKER``) and/or as the separate
+``gpsbot-media`` service (``python worker_media.py``); several consumers share
+the queue through a consumer group.
+
+Workers only render bytes. Uploading to Telegram is a separate stage:
+:class:`media_upload.Uploader` threads send the finished files with retries,
+so a slow upload never holds a CPU worker. Repeated inputs skip both stages:
+:mod:`result_cache` resends the earlier file by its Telegram ``file_id`` or
+uploads the bytes it kept on disk. A job is acknowledged only after
+its upload finished or the user was told about the failure; jobs of a
+consumer that died are redelivered after ``MEDIA_JOB_VISIBILITY_SEC``.
+
+Worker processes run under :class:`media_supervisor.SupervisedPool`: a render
+that exceeds ``MEDIA_JOB_TIMEOUT_SEC`` or ``MEDIA_WORKER_MEMORY_MB``, or a
+worker that stops sending heartbeats, is killed and replaced without taking
+the other workers' jobs down with it.
+"""
 
 from __future__ import annotations
 
-import io
-import multiprocessing as mp
-from multiprocessing.process import BaseProcess
-from typing import Any, Optional
+import json
+import os
+import signal
+import socket
+import tempfile
+import threading
+import uuid
+from concurrent.futures import CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
 
-from settings import bot
-import media_utils
+import requests
 
-_MEDIA_QUEUE: Optional[mp.Queue] = None
-_MEDIA_PROCESS: Optional[BaseProcess] = None
+import image_prep
+from db import database
+from job_queue import JobPump, JobQueue, QueuedJob, RedisStreamQueue, SQLiteJobQueue
+from media_engine import Admission, MediaEngine, MediaJob, estimate_wait
+from media_supervisor import JobAborted, SupervisedPool
+from media_upload import Document, Uploader, sent_file_id, telegram_sender
+from redis_pool import create_client
+from result_cache import result_key
+from settings import (
+    CSV_UPLOAD_MAX_MB,
+    MEDIA_HEARTBEAT_TIMEOUT_SEC,
+    MEDIA_INLINE_WORKER,
+    MEDIA_JOB_MAX_DELIVERIES,
+    MEDIA_JOB_TIMEOUT_SEC,
+    MEDIA_JOB_VISIBILITY_SEC,
+    MEDIA_PER_CHAT_LIMIT,
+    MEDIA_QUEUE_BACKEND,
+    MEDIA_QUEUE_LIMIT,
+    MEDIA_UPLOAD_ATTEMPTS,
+    MEDIA_UPLOAD_CONCURRENCY,
+    MEDIA_WORKER_MEMORY_MB,
+    MEDIA_WORKERS,
+    PDF_MAX_MB,
+    PDF_MAX_PAGES,
+    PPTX_LOGO,
+    PPTX_TEMPLATE,
+    TOKEN,
+    bot,
+)
+from storage import result_cache, vision_cache
+from vision_cache import format_stats as vision_cache_line
 
+_ENGINE: Optional[MediaEngine] = None
+_UPLOADER: Optional[Uploader] = None
+_PUMP: Optional[JobPump] = None
+_POOL: Optional[SupervisedPool] = None
+_ENGINE_LOCK = threading.Lock()
 
-def media_worker(task_queue: "mp.Queue") -> None:
-    """Worker loop that processes media generation tasks."""
-    while True:
-        chat_id, task_type, payload = task_queue.get()
-        try:
-            if task_type == "pdf":
-                pdf_bytes = media_utils.make_pdf(str(payload or ""))
-                bot.send_document(
-                    chat_id,
-                    io.BytesIO(pdf_bytes),
-                    visible_file_name="document.pdf",
-                    caption="PDF готов ✅",
-                )
-            elif task_type == "excel":
-                xlsx_bytes = media_utils.make_excel(str(payload or ""))
-                bot.send_document(
-                    chat_id,
-                    io.BytesIO(xlsx_bytes),
-                    visible_file_name="data.xlsx",
-                    caption="Excel готов ✅",
-                )
-            elif task_type == "pptx":
-                pptx_bytes = media_utils.make_pptx(str(payload or ""))
-                bot.send_document(
-                    chat_id,
-                    io.BytesIO(pptx_bytes),
-                    visible_file_name="slides.pptx",
-                    caption="Презентация готова ✅",
-                )
+_QUEUES: Optional[List[JobQueue]] = None
+_QUEUE_LOCK = threading.Lock()
+_ADMISSION: Dict[str, int] = {"accepted": 0, "rejected": 0, "duplicates": 0}
+
+
+def _init_worker() -> None:
+    """Per-process setup: renderers, the font and the slide template are loaded once, not per job."""
+    # Imported in worker processes only: the bot process never renders documents
+    import media_utils  # noqa: F401
+    from font_registry import register_font
+    from presentation import deck_template
+
+    try:
+        # Parse and register the TTF once, before the first PDF request arrives
+        register_font()
+    except Exception as exc:  # noqa: BLE001 - make_pdf retries and reports per task
+        print(f"[MEDIA] font preload failed: {exc}")
+    try:
+        deck_template(PPTX_TEMPLATE or None, PPTX_LOGO or None)
+    except Exception as exc:  # noqa: BLE001 - make_pptx retries and reports per task
+        print(f"[MEDIA] presentation template preload failed: {exc}")
+
+
+# kind -> (renderer, filename, caption, version). Bump the version when a
+# renderer's output changes: it is part of the result cache key.
+_DOCUMENTS = {
+    "pdf": ("make_pdf", "document.pdf", "PDF готов ✅", "2"),
+    "excel": ("make_excel", "data.xlsx", "Excel готов ✅", "2"),
+    "excel_file": ("make_excel_file", "data.xlsx", "Excel готов ✅", "1"),
+    "pptx": ("make_pptx", "slides.pptx", "Презентация готова ✅", "1"),
+}
+# Extra keyword arguments per renderer (limits and assets from settings);
+# they are part of the result cache key as well
+_RENDER_OPTIONS: Dict[str, Dict[str, Any]] = {
+    "pdf": {"max_pages": PDF_MAX_PAGES, "max_bytes": PDF_MAX_MB * 1024 * 1024},
+    "pptx": {"template": PPTX_TEMPLATE or None, "logo": PPTX_LOGO or None},
+}
+# Kinds whose payload is a JSON reference to a file the user uploaded to Telegram
+_FILE_INPUTS = {"excel_file"}
+_DOWNLOAD_CHUNK = 256 * 1024
+
+
+def _download_input(payload: str, path: str) -> None:
+    """Stream an uploaded file to ``path`` without holding it in memory."""
+    info = bot.get_file(json.loads(payload)["file_id"])
+    url = f"https://api.telegram.org/file/bot{TOKEN}/{info.file_path}"
+    limit = CSV_UPLOAD_MAX_MB * 1024 * 1024
+    size = 0
+    with requests.get(url, stream=True, timeout=30) as resp, open(path, "wb") as fh:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(_DOWNLOAD_CHUNK):
+            size += len(chunk)
+            if size > limit:
+                raise ValueError(f"файл больше {CSV_UPLOAD_MAX_MB} МБ")
+            fh.write(chunk)
+
+
+def render_media_task(chat_id: int, task_type: str, payload: Any) -> Document:
+    """Render one document (runs in a worker process).
+
+    The only network call here is fetching an uploaded input file; results
+    are uploaded by the bot process.
+    """
+    import media_utils
+
+    if task_type not in _DOCUMENTS:
+        raise ValueError(f"Неизвестная задача: {task_type}")
+    renderer, filename, caption, _ = _DOCUMENTS[task_type]
+    render = getattr(media_utils, renderer)
+    options = _RENDER_OPTIONS.get(task_type, {})
+    if task_type in _FILE_INPUTS:
+        with tempfile.TemporaryDirectory(prefix="media-input-") as tmp:
+            path = os.path.join(tmp, "input")
+            _download_input(str(payload), path)
+            data = render(path, **options)
+    else:
+        data = render(str(payload or ""), **options)
+    return Document(filename=filename, caption=caption, data=data)
+
+
+# --- persistent queue ---
+
+
+def _open_queues() -> List[JobQueue]:
+    """Queues in claim order: the producer writes to the first one.
+
+    Consumers on Redis also drain the SQLite queue, which holds jobs accepted
+    while Redis was unreachable: at startup, or when an enqueue to Redis fails
+    (see :func:`enqueue_media_task`).
+    """
+    global _QUEUES
+    with _QUEUE_LOCK:
+        if _QUEUES is None:
+            sqlite_queue = SQLiteJobQueue(database, visibility_timeout=MEDIA_JOB_VISIBILITY_SEC)
+            client = create_client() if MEDIA_QUEUE_BACKEND != "sqlite" else None
+            if client is not None:
+                _QUEUES = [RedisStreamQueue(client, visibility_timeout=MEDIA_JOB_VISIBILITY_SEC), sqlite_queue]
             else:
-                bot.send_message(chat_id, f"⚠️ Неизвестная задача: {task_type}")
-        except Exception as exc:  # noqa: BLE001 - хотим поймать любые сбои
-            bot.send_message(chat_id, f"⚠️ Ошибка обработки медиа: {exc}")
+                if MEDIA_QUEUE_BACKEND == "redis":
+                    print("[MEDIA] Redis is unavailable, the job queue falls back to SQLite")
+                _QUEUES = [sqlite_queue]
+        return _QUEUES
+
+
+def _consumer_stats(queue: JobQueue) -> Dict[str, Dict[str, Any]]:
+    consumers = queue.consumers()
+    if _PUMP is not None:
+        # our own numbers are fresher than the last published snapshot
+        consumers[_PUMP.consumer] = _local_stats()
+    return consumers
+
+
+def _estimate_eta(queue: JobQueue, ahead: int, task_type: str) -> float:
+    consumers = _consumer_stats(queue).values()
+    workers = sum(int(stats.get("workers", 0)) for stats in consumers) or MEDIA_WORKERS
+    samples: Dict[str, List[float]] = {}
+    for stats in consumers:
+        for kind, seconds in (stats.get("service_sec") or {}).items():
+            samples.setdefault(kind, []).append(float(seconds))
+    service = {kind: sum(values) / len(values) for kind, values in samples.items()}
+    return estimate_wait(ahead, workers, service, task_type)
+
+
+def enqueue_media_task(chat_id: int, task_type: str, payload: Any, *, job_id: Optional[str] = None) -> Admission:
+    """Persist a media generation task; the admission says whether it was queued.
+
+    ``job_id`` makes the call idempotent: a repeated id (for example, a
+    redelivered Telegram update) is reported with ``reason="duplicate"``.
+
+    If a queue fails (Redis went away after startup), the job goes to the
+    next one in claim order; only when every queue fails is it rejected.
+    """
+    job_id = job_id or uuid.uuid4().hex
+    for queue in _open_queues():
+        try:
+            depth = queue.depth()
+            if depth >= MEDIA_QUEUE_LIMIT:
+                _ADMISSION["rejected"] += 1
+                return Admission(False, position=depth, reason="queue_full")
+            chat_depth = queue.chat_depth(chat_id)
+            if chat_depth >= MEDIA_PER_CHAT_LIMIT:
+                _ADMISSION["rejected"] += 1
+                return Admission(False, position=chat_depth, reason="chat_limit")
+            result = queue.enqueue(chat_id, task_type, str(payload or ""), job_id=job_id)
+        except Exception as exc:  # noqa: BLE001 - storage outage: try the next queue
+            print(f"[MEDIA] enqueue to {queue.name} failed: {exc!r}")
+            continue
+        break
+    else:
+        # no queue accepted the job: tell the user instead of losing it silently
+        return Admission(False, reason="stopped")
+    if not result.created:
+        _ADMISSION["duplicates"] += 1
+        return Admission(True, reason="duplicate")
+    _ADMISSION["accepted"] += 1
+    try:
+        eta = _estimate_eta(queue, depth, task_type)
+    except Exception:  # noqa: BLE001 - the job is queued, the estimate is optional
+        eta = 0.0
+    return Admission(True, position=depth, eta_seconds=eta)
+
+
+# --- consumer ---
+
+
+def _make_executor(workers: int) -> SupervisedPool:
+    global _POOL
+    _POOL = SupervisedPool(
+        workers,
+        initializer=_init_worker,
+        job_timeout=MEDIA_JOB_TIMEOUT_SEC,
+        memory_limit=MEDIA_WORKER_MEMORY_MB * 1024 * 1024,
+        heartbeat_timeout=MEDIA_HEARTBEAT_TIMEOUT_SEC,
+    )
+    return _POOL
+
 
+def _document_key(kind: str, payload: Any) -> Optional[str]:
+    if kind not in _DOCUMENTS:
+        return None
+    if kind in _FILE_INPUTS:
+        # file_id differs between uploads of the same file, file_unique_id does not
+        payload = json.loads(str(payload))["file_unique_id"]
+    version = _DOCUMENTS[kind][3]
+    if kind in _RENDER_OPTIONS:
+        version += ":" + json.dumps(_RENDER_OPTIONS[kind], sort_keys=True)
+    return result_key(kind, version, str(payload or ""))
 
-def _ensure_queue() -> "mp.Queue":
-    global _MEDIA_QUEUE
-    if _MEDIA_QUEUE is None:
-        _MEDIA_QUEUE = mp.Queue()
-    return _MEDIA_QUEUE
 
+def _cached_document(job: QueuedJob) -> Optional[Document]:
+    key = _document_key(job.kind, job.payload)
+    if key is None:
+        return None
+    try:
+        cached = result_cache.lookup(key)
+    except Exception as exc:  # noqa: BLE001 - the cache is an optimisation, render instead
+        print(f"[MEDIA] result cache lookup failed: {exc!r}")
+        return None
+    if cached is None:
+        return None
+    _, filename, caption, _ = _DOCUMENTS[job.kind]
+    return Document(filename, caption, cached.data or b"", file_id=cached.file_id, cache_key=key)
 
-def start_media_worker() -> "mp.Queue":
-    """Ensure that the media worker process is running and return its queue."""
-    global _MEDIA_PROCESS
-    queue = _ensure_queue()
-    if _MEDIA_PROCESS is None or not _MEDIA_PROCESS.is_alive():
-        _MEDIA_PROCESS = mp.Process(target=media_worker, args=(queue,), daemon=True)
-        _MEDIA_PROCESS.start()
-    return queue
 
+def _upload(job_id: str, chat_id: int, document: Document) -> None:
+    upload = _UPLOADER.submit(chat_id, document)
+    upload.add_done_callback(lambda future: _after_upload(job_id, document, future.result()))
 
-def enqueue_media_task(chat_id: int, task_type: str, payload: Any) -> None:
-    """Schedule a media generation task for asynchronous processing."""
-    queue = start_media_worker()
-    queue.put((chat_id, task_type, payload))
 
+def _after_upload(job_id: str, document: Document, sent: bool) -> None:
+    if not sent and document.file_id:
+        # Telegram no longer accepts the cached file_id: the next delivery sends the bytes or renders again
+        result_cache.forget_file_id(document.cache_key)
+        _PUMP.retry(job_id)
+        return
+    _PUMP.done(job_id)
 
-__all__ = ["enqueue_media_task", "start_media_worker", "media_worker"]
+
+def _submit_claimed(job: QueuedJob) -> bool:
+    document = _cached_document(job)
+    if document is not None:
+        _upload(job.job_id, job.chat_id, document)
+        return True
+    return _ENGINE.submit(job.chat_id, job.kind, job.payload, ref=job.job_id).accepted
+
+
+def _on_job_error(job: MediaJob, exc: BaseException) -> None:
+    if isinstance(exc, CancelledError):
+        # Consumer is stopping: the job goes back to the queue
+        return
+    print(f"[MEDIA] job {job.ref} ({job.kind}) for chat {job.chat_id} failed: {exc!r}")
+    if isinstance(exc, JobAborted) and exc.reason != "crashed":
+        # The same input would hang or exhaust memory again: fail it instead of retrying
+        try:
+            bot.send_message(job.chat_id, _ABORT_MESSAGES.get(exc.reason, _ABORT_MESSAGES["timeout"]))
+        finally:
+            _PUMP.done(job.ref)
+        return
+    if isinstance(exc, (BrokenProcessPool, JobAborted)):
+        # A worker died: retry on a fresh one; an input that keeps crashing is dropped after MEDIA_JOB_MAX_DELIVERIES
+        _PUMP.retry(job.ref)
+        return
+    try:
+        bot.send_message(job.chat_id, f"⚠️ Ошибка обработки медиа: {exc}")
+    finally:
+        _PUMP.done(job.ref)
+
+
+_ABORT_MESSAGES = {
+    "timeout": "⚠️ Документ готовился слишком долго и был остановлен. Попробуй сократить текст или разбить его на части.",
+    "memory": "⚠️ Документ слишком большой: обработчику не хватило памяти. Попробуй сократить текст или разбить его на части.",
+}
+
+
+def _on_dead_job(job: QueuedJob) -> None:
+    print(f"[MEDIA] job {job.job_id} ({job.kind}) for chat {job.chat_id} dropped after {job.deliveries - 1} attempts")
+    bot.send_message(job.chat_id, "⚠️ Не получилось подготовить документ: обработчик несколько раз сбился. Попробуй ещё раз.")
+
+
+def _on_rendered(job: MediaJob, document: Document) -> None:
+    document.cache_key = _document_key(job.kind, job.payload)
+    try:
+        result_cache.store_blob(document.cache_key, document.data)
+    except Exception as exc:  # noqa: BLE001 - the upload does not depend on the cache
+        print(f"[MEDIA] result cache store failed: {exc!r}")
+    _upload(job.ref, job.chat_id, document)
+
+
+def _on_uploaded(chat_id: int, document: Document, message: object) -> None:
+    file_id = sent_file_id(message)
+    if document.cache_key and file_id:
+        result_cache.remember_file_id(document.cache_key, file_id)
+
+
+def _on_upload_failed(chat_id: int, document: Document, exc: BaseException) -> None:
+    if document.file_id:
+        # Sent from the cache: the job is retried without the file_id instead
+        return
+    bot.send_message(chat_id, f"⚠️ Файл {document.filename} готов, но отправить его не удалось: {exc}")
+
+
+def _local_stats() -> dict:
+    stats = _ENGINE.stats()
+    stats["upload"] = _UPLOADER.stats()
+    stats["pump"] = dict(_PUMP.counters)
+    stats["cache"] = result_cache.stats()
+    if _POOL is not None:
+        stats["supervisor"] = _POOL.stats()
+    return stats
+
+
+def _start_consumer() -> MediaEngine:
+    global _ENGINE, _UPLOADER, _PUMP
+    queues = _open_queues()
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            # Claim a little more than the pool runs so round-robin has jobs to choose from;
+            # the rest stays in the shared queue for other consumers
+            capacity = MEDIA_WORKERS * 2
+            _UPLOADER = Uploader(
+                telegram_sender(bot),
+                concurrency=MEDIA_UPLOAD_CONCURRENCY,
+                max_attempts=MEDIA_UPLOAD_ATTEMPTS,
+                on_start=lambda chat_id: bot.send_chat_action(chat_id, "upload_document"),
+                on_sent=_on_uploaded,
+                on_failure=_on_upload_failed,
+            )
+            _ENGINE = MediaEngine(
+                render_media_task,
+                workers=MEDIA_WORKERS,
+                queue_limit=capacity,
+                per_chat_limit=capacity,
+                executor_factory=_make_executor,
+                on_error=_on_job_error,
+                on_result=_on_rendered,
+            )
+            _PUMP = JobPump(
+                queues,
+                _submit_claimed,
+                consumer=f"{socket.gethostname()}-{os.getpid()}",
+                capacity=capacity,
+                max_deliveries=MEDIA_JOB_MAX_DELIVERIES,
+                on_dead=_on_dead_job,
+                lease_refresh=MEDIA_JOB_VISIBILITY_SEC / 3,
+                stats=_local_stats,
+            )
+        _ENGINE.start()
+        _PUMP.start()
+        return _ENGINE
+
+
+def start_media_worker() -> Optional[MediaEngine]:
+    """Start consuming the job queue in the bot process and return the engine.
+
+    With ``MEDIA_INLINE_WORKER=0`` only the queue is opened: jobs are left to
+    the ``gpsbot-media`` service.
+    """
+    if not MEDIA_INLINE_WORKER:
+        _open_queues()
+        return None
+    return _start_consumer()
+
+
+def stop_media_worker() -> None:
+    """Stop claiming, finish jobs already rendering, and hand the rest back to the queue."""
+    with _ENGINE_LOCK:
+        if _ENGINE is None:
+            return
+        _PUMP.stop()
+        # Queued jobs are cancelled; running renders finish and their uploads are acknowledged
+        _ENGINE.shutdown()
+        _UPLOADER.shutdown()
+        released = _PUMP.release_held()
+    print(f"[MEDIA] consumer {_PUMP.consumer} stopped, {released} jobs returned to the queue")
+
+
+def media_stats() -> dict:
+    queue = _open_queues()[0]
+    return {
+        "backend": queue.name,
+        "depth": queue.depth(),
+        "admission": dict(_ADMISSION),
+        "consumers": _consumer_stats(queue),
+    }
+
+
+def _format_consumer(name: str, stats: dict) -> List[str]:
+    upload = stats.get("upload") or {}
+    pump = stats.get("pump") or {}
+    cache = stats.get("cache") or {}
+    restarts = (stats.get("supervisor") or {}).get("restarts") or {}
+    service = ", ".join(f"{kind} {seconds:.1f} с" for kind, seconds in sorted(stats["service_sec"].items())) or "—"
+    return [
+        f"<i>{name}</i>",
+        f"Воркеров: {stats['workers']}, в работе: {stats['in_flight']}, взято из очереди: {stats['queued'] + stats['in_flight']}",
+        f"Готово: {stats['completed']}, сбоев: {stats['failed']}, перезапусков пула: {stats['pool_restarts']}, "
+        f"повторных выдач: {pump.get('retried', 0)}, брошено: {pump.get('dead', 0)}",
+        f"Ожидание: среднее {stats['wait_avg_sec']:.1f} с, p95 {stats['wait_p95_sec']:.1f} с, "
+        f"максимум {stats['wait_max_sec']:.1f} с",
+        f"Время рендера: {service}",
+        f"Воркеры убиты: по таймауту {restarts.get('timeout', 0)}, без пульса {restarts.get('hung', 0)}, "
+        f"по памяти {restarts.get('memory', 0)}, упали сами {restarts.get('crashed', 0)}",
+        f"Отправка: в очереди {upload.get('pending', 0)}, отправлено {upload.get('uploaded', 0)}, "
+        f"ошибок {upload.get('failed', 0)}, повторов {upload.get('retries', 0)} (из них 429: {upload.get('rate_limited', 0)}), "
+        f"среднее {upload.get('upload_avg_sec', 0.0):.1f} с",
+        f"Из кэша: по file_id {cache.get('file_id_hits', 0)}, с диска {cache.get('blob_hits', 0)}, "
+        f"промахов {cache.get('misses', 0)}",
+    ]
+
+
+def format_media_stats() -> str:
+    """Short owner report on the document queue and its consumers."""
+    stats = media_stats()
+    admission = stats["admission"]
+    lines = [
+        f"<b>Медиа-очередь</b> ({stats['backend']})",
+        f"Ждут или в работе: {stats['depth']} из {MEDIA_QUEUE_LIMIT}",
+        f"Принято: {admission['accepted']}, отклонено: {admission['rejected']}, повторных постановок: {admission['duplicates']}",
+    ]
+    cache = result_cache.stats()
+    lines.append(
+        f"Кэш результатов: записей {cache['entries']}, на диске {cache['blob_bytes'] / 2**20:.1f} "
+        f"из {cache['max_bytes'] / 2**20:.0f} МБ, вытеснено {cache['evicted']}"
+    )
+    vision = image_prep.stats()
+    if vision["images"]:
+        # photo analysis runs in the bot process: these numbers are local to it
+        count = vision["images"]
+        lines.append(
+            f"Анализ фото: {count:.0f}, скачано {vision['downloaded_bytes'] / 2**20:.1f} МБ вместо "
+            f"{vision['largest_bytes'] / 2**20:.1f} МБ, модели отправлено {vision['sent_bytes'] / 2**20:.1f} МБ, "
+            f"токенов ≈{vision['tokens_after']:.0f} вместо {vision['tokens_before']:.0f}; в среднем скачивание "
+            f"{vision['download_sec'] / count:.2f} с, подготовка {vision['prepare_sec'] / count:.2f} с"
+        )
+    cached = vision_cache.stats()
+    if cached["hits"] or cached["misses"]:
+        lines.append(vision_cache_line(cached))
+    if not stats["consumers"]:
+        lines.append("Обработчиков нет: задачи ждут запуска gpsbot-media")
+    for name, consumer in sorted(stats["consumers"].items()):
+        lines.extend(_format_consumer(name, consumer))
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Run as the standalone ``gpsbot-media`` consumer until SIGTERM."""
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.set())
+    result_cache.ensure_tables()
+    _start_consumer()
+    print(f"[MEDIA] consumer {_PUMP.consumer} is reading {', '.join(queue.name for queue in _open_queues())}")
+    stopping.wait()
+    stop_media_worker()
+
+
+__all__ = [
+    "enqueue_media_task",
+    "format_media_stats",
+    "media_stats",
+    "render_media_task",
+    "start_media_worker",
+    "stop_media_worker",
+]
 
 
 if __name__ == "__main__":
-    queue = mp.Queue()
-    media_worker(queue)
+    # Import under the real name so pool workers can unpickle render_media_task
+    import worker_media
+
+    worker_media.main()